@@ -213,17 +213,28 @@ def _check_and_install_playwright():
         appdata = os.getenv('APPDATA')
         if appdata:
             possible_paths.append(Path(appdata) / 'ms-playwright')
-    
+    else:
+        # Linux/macOS：已配置的浏览器目录与Playwright默认缓存目录
+        browsers_path = os.getenv('PLAYWRIGHT_BROWSERS_PATH')
+        if browsers_path and browsers_path != '0':
+            possible_paths.append(Path(browsers_path))
+        if sys.platform == 'darwin':
+            possible_paths.append(Path.home() / 'Library' / 'Caches' / 'ms-playwright')
+        else:
+            possible_paths.append(Path.home() / '.cache' / 'ms-playwright')
+
     # 检查是否存在chromium浏览器
+    browser_executables = ('chrome-win/chrome.exe', 'chrome-linux/chrome', 'chrome-linux/headless_shell',
+                           'chrome-mac/Chromium.app')
     for path in possible_paths:
         if path.exists():
             # 查找chromium目录
             chromium_dirs = list(path.glob('chromium-*'))
             if chromium_dirs:
                 for chromium_dir in chromium_dirs:
-                    chrome_win = chromium_dir / 'chrome-win'
-                    chrome_exe = chrome_win / 'chrome.exe'
-                    if chrome_exe.exists():
+                    chrome_exe = next((chromium_dir / name for name in browser_executables
+                                       if (chromium_dir / name).exists()), None)
+                    if chrome_exe is not None:
                         print(f"{_OK} 找到Playwright浏览器: {chrome_exe}")
                         # 设置环境变量
                         os.environ['PLAYWRIGHT_BROWSERS_PATH'] = str(path)
@@ -231,8 +242,25 @@ def _check_and_install_playwright():
                         break
                 if playwright_installed:
                     break
-    
-    # 如果没找到，尝试使用playwright命令检查
+
+    if playwright_installed:
+        return True
+
+    if not getattr(sys, 'frozen', False):
+        # 启动浏览器检测与安装耗时数秒到数分钟，放到后台线程，不阻塞Web服务与账号启动
+        # （安装完成前需要浏览器的功能会失败，与安装失败时相同）
+        import threading
+        print(f"{_INFO} 未在默认目录找到Playwright浏览器，在后台检测并安装")
+        threading.Thread(target=_verify_or_install_playwright, daemon=True, name='playwright-check').start()
+        return False
+    return _verify_or_install_playwright()
+
+
+def _verify_or_install_playwright():
+    """通过启动浏览器检测Playwright浏览器是否可用，不可用时提取（打包的exe）或安装"""
+    playwright_installed = False
+
+    # 尝试使用playwright命令检查
     if not playwright_installed:
         try:
             from playwright.sync_api import sync_playwright
@@ -448,18 +476,19 @@ if sys.platform.startswith('linux'):
     except Exception as e:
         logger.debug(f"设置事件循环策略失败: {e}")
 
-# 预导入numpy，确保打包时被检测到
-try:
+# 声明numpy/pandas依赖，确保打包时被检测到（运行时不预导入：两者导入约0.4秒，仅关键词导入导出时使用）
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
     import numpy
     import pandas
-except ImportError:
-    pass  # 如果未安装，继续运行（某些功能可能不可用）
 
 from config import AUTO_REPLY, COOKIES_LIST
 import cookie_manager as cm
 from db_manager import db_manager
 from file_log_collector import setup_file_logging
 from usage_statistics import report_user_count
+from utils.account_workers import create_account_worker_pool
+from utils.warm_start import warm_start
 
 
 def _start_api_server():
@@ -576,6 +605,21 @@ def load_keywords_file(path: str):
     return kw_list
 
 
+async def _wait_for_port(port: int, timeout: float = 10.0, interval: float = 0.2) -> bool:
+    """等待本机端口可连接，超时返回 False"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout=2)
+            writer.close()
+            return True
+        except Exception as e:
+            if asyncio.get_running_loop().time() >= deadline:
+                logger.debug(f"端口检查失败: {e}")
+                return False
+        await asyncio.sleep(interval)
+
+
 async def main():
     print("开始启动主程序...")
 
@@ -586,39 +630,18 @@ async def main():
 
     loop = asyncio.get_running_loop()
 
+    # 按配置启动账号工作进程池（未开启时所有账号在本进程中运行）
+    worker_pool = create_account_worker_pool()
+    if worker_pool is not None:
+        worker_pool.start()
+
     # 创建 CookieManager 并在全局暴露
     print("创建 CookieManager...")
-    cm.manager = cm.CookieManager(loop)
+    cm.manager = cm.CookieManager(loop, worker_pool=worker_pool)
     manager = cm.manager
     print("CookieManager 创建完成")
 
-    # 1) 从数据库加载的 Cookie 已经在 CookieManager 初始化时完成
-    # 为每个启用的 Cookie 启动任务
-    for cid, val in manager.cookies.items():
-        # 检查账号是否启用
-        if not manager.get_cookie_status(cid):
-            logger.info(f"跳过禁用的 Cookie: {cid}")
-            continue
-
-        try:
-            # 直接启动任务，不重新保存到数据库
-            from db_manager import db_manager
-            logger.info(f"正在获取Cookie详细信息: {cid}")
-            cookie_info = db_manager.get_cookie_details(cid)
-            user_id = cookie_info.get('user_id') if cookie_info else None
-            logger.info(f"Cookie详细信息获取成功: {cid}, user_id: {user_id}")
-
-            logger.info(f"正在创建异步任务: {cid}")
-            task = loop.create_task(manager._run_xianyu(cid, val, user_id))
-            manager.tasks[cid] = task
-            logger.info(f"启动数据库中的 Cookie 任务: {cid} (用户ID: {user_id})")
-            logger.info(f"任务已添加到管理器，当前任务数: {len(manager.tasks)}")
-        except Exception as e:
-            logger.error(f"启动 Cookie 任务失败: {cid}, {e}")
-            import traceback
-            logger.error(f"详细错误信息: {traceback.format_exc()}")
-    
-    # 2) 如果配置文件中有新的 Cookie，也加载它们
+    # 1) 如果配置文件中有新的 Cookie，先加载它们
     for entry in COOKIES_LIST:
         cid = entry.get('id')
         val = entry.get('value')
@@ -630,42 +653,34 @@ async def main():
         manager.add_cookie(cid, val, kw_list)
         logger.info(f"从配置文件加载 Cookie: {cid}")
 
-    # 3) 若老环境变量仍提供单账号 Cookie，则作为 default 账号
+    # 2) 若老环境变量仍提供单账号 Cookie，则作为 default 账号
     env_cookie = os.getenv('COOKIES_STR')
     if env_cookie and 'default' not in manager.list_cookies():
         manager.add_cookie('default', env_cookie)
         logger.info("从环境变量加载 default Cookie")
 
+    # 3) 数据库中的账号（CookieManager 初始化时已加载）按优先级分批启动：
+    #    有待处理订单的账号优先，限制同时启动的账号数；上面已启动的账号自动跳过
+    warm_start.start(manager)
+
     # 启动 API 服务线程
     print("\n启动 API 服务线程...")
     api_thread = threading.Thread(target=_start_api_server, daemon=True)
     api_thread.start()
     print("API 服务线程已启动")
     
-    # 等待一小段时间，确保服务器有时间启动
-    import time
-    time.sleep(3)  # 等待3秒让服务器启动
-    
     # 获取实际使用的端口号
     api_conf = AUTO_REPLY.get('api', {})
     check_port = int(os.getenv('API_PORT', api_conf.get('port', 8080)))
-    
-    # 检查服务器是否正常启动
-    try:
-        import socket
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(2)
-        result = sock.connect_ex(('127.0.0.1', check_port))
-        sock.close()
-        if result == 0:
-            print(f"✓ Web服务器端口 {check_port} 检查通过，可以访问了！")
-            print(f"  浏览器访问: http://localhost:{check_port}")
-            print(f"  默认账号: admin / admin123\n")
-        else:
-            print(f"⚠ Web服务器端口 {check_port} 检查失败，请查看日志")
-            print(f"  可以尝试访问: http://localhost:{check_port}\n")
-    except Exception as e:
-        logger.debug(f"端口检查失败: {e}")
+
+    # 检查服务器是否正常启动（异步等待端口可连接，不阻塞账号启动）
+    if await _wait_for_port(check_port):
+        print(f"✓ Web服务器端口 {check_port} 检查通过，可以访问了！")
+        print(f"  浏览器访问: http://localhost:{check_port}")
+        print(f"  默认账号: admin / admin123\n")
+    else:
+        print(f"⚠ Web服务器端口 {check_port} 检查失败，请查看日志")
+        print(f"  可以尝试访问: http://localhost:{check_port}\n")
 
     # 上报用户统计
     try:
@@ -675,7 +690,10 @@ async def main():
 
     # 阻塞保持运行
     print("主程序启动完成，保持运行...")
-    await asyncio.Event().wait()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        warm_start.cancel()
 
 
 if __name__ == '__main__':
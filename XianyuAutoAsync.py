@@ -9,7 +9,7 @@ from enum import Enum
 from loguru import logger
 import websockets
 from utils.xianyu_utils import (
-    decrypt, generate_mid, generate_uuid, trans_cookies,
+    decrypt_to_dict, generate_mid, generate_uuid, trans_cookies,
     generate_device_id, generate_sign
 )
 from config import (
@@ -21,7 +21,17 @@ from config import (
 import sys
 import aiohttp
 from collections import defaultdict
-from db_manager import db_manager
+from db_manager import db_manager, async_db
+from utils.order_enrichment import OrderEnrichmentQueue
+from utils.browser_pool import browser_pool, parse_cookie_string
+from utils.ingress_queue import IngressQueue
+from utils.periodic_scheduler import periodic_scheduler
+from utils.outbound_queue import OutboundQueue, PRIORITY_CONTROL, PRIORITY_DELIVERY, PRIORITY_REPLY
+from utils.chat_actor import ChatActorExecutor
+from utils.timer_wheel import timer_wheel
+from utils.warm_start import warm_start
+from utils.dedup_store import MessageDedupStore
+from utils.frame_recorder import create_frame_recorder
 
 # 滑块验证补丁已废弃，使用集成的 Playwright 登录方法
 # 不再需要猴子补丁，所有功能已集成到 XianyuSliderStealth 类中
@@ -42,12 +52,12 @@ class AutoReplyPauseManager:
         # 存储每个chat_id的暂停信息 {chat_id: pause_until_timestamp}
         self.paused_chats = {}
 
-    def pause_chat(self, chat_id: str, cookie_id: str):
+    async def pause_chat(self, chat_id: str, cookie_id: str):
         """暂停指定chat_id的自动回复，使用账号特定的暂停时间"""
         # 获取账号特定的暂停时间
         try:
-            from db_manager import db_manager
-            pause_minutes = db_manager.get_cookie_pause_duration(cookie_id)
+            from db_manager import async_db
+            pause_minutes = await async_db.get_cookie_pause_duration(cookie_id)
         except Exception as e:
             logger.error(f"获取账号 {cookie_id} 暂停时间失败: {e}，使用默认10分钟")
             pause_minutes = 10
@@ -60,6 +70,7 @@ class AutoReplyPauseManager:
         pause_duration_seconds = pause_minutes * 60
         pause_until = time.time() + pause_duration_seconds
         self.paused_chats[chat_id] = pause_until
+        timer_wheel.expire_key(self.paused_chats, chat_id, pause_duration_seconds, subsystem='auto_reply_pause')
 
         # 计算暂停结束时间
         end_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(pause_until))
@@ -91,15 +102,6 @@ class AutoReplyPauseManager:
 
         return remaining
 
-    def cleanup_expired_pauses(self):
-        """清理已过期的暂停记录"""
-        current_time = time.time()
-        expired_chats = [chat_id for chat_id, pause_until in self.paused_chats.items()
-                        if current_time >= pause_until]
-
-        for chat_id in expired_chats:
-            del self.paused_chats[chat_id]
-
 
 # 全局暂停管理器实例
 pause_manager = AutoReplyPauseManager()
@@ -160,8 +162,10 @@ class XianyuLive:
     _order_locks = defaultdict(lambda: asyncio.Lock())
     # 记录锁的最后使用时间，用于清理
     _lock_usage_times = {}
-    # 记录锁的持有状态和释放时间 {lock_key: {'locked': bool, 'release_time': float, 'task': asyncio.Task}}
+    # 记录锁的持有状态和释放时间 {lock_key: {'locked': bool, 'release_time': float, 'timer': TimerHandle}}
     _lock_hold_info = {}
+    # 锁的最大保留时间（秒），超过该时间未使用的锁由时间轮清理
+    LOCK_MAX_AGE = 24 * 3600
 
     # 独立的锁字典，用于订单详情获取（不使用延迟锁机制）
     _order_detail_locks = defaultdict(lambda: asyncio.Lock())
@@ -214,24 +218,11 @@ class XianyuLive:
             else:
                 logger.info(state_msg)
 
-    async def _interruptible_sleep(self, duration: float):
-        """可中断的sleep，将长时间sleep拆分成多个短时间sleep，以便及时响应取消信号
-        
-        Args:
-            duration: 总睡眠时间（秒）
-        """
-        # 将长时间sleep拆分成多个1秒的短sleep，这样可以及时响应取消信号
-        chunk_size = 1.0  # 每次sleep 1秒
-        remaining = duration
-        
-        while remaining > 0:
-            sleep_time = min(chunk_size, remaining)
-            try:
-                await asyncio.sleep(sleep_time)
-                remaining -= sleep_time
-            except asyncio.CancelledError:
-                # 如果收到取消信号，立即抛出
-                raise
+            # 记录启动阶段（供启动就绪检查）
+            if new_state == ConnectionState.CONNECTED:
+                warm_start.mark(self.cookie_id, 'connected')
+            elif new_state == ConnectionState.FAILED:
+                warm_start.mark(self.cookie_id, 'failed', reason)
 
     def _reset_background_tasks(self):
         """直接重置后台任务引用，不等待取消（用于快速重连）
@@ -464,56 +455,6 @@ class XianyuLive:
         else:
             return min(5 * self.connection_failures, 30)
 
-    def _cleanup_instance_caches(self):
-        """清理实例级别的缓存，防止内存泄漏"""
-        try:
-            current_time = time.time()
-            cleaned_total = 0
-            
-            # 清理过期的通知记录（保留30分钟内的，从1小时优化）
-            max_notification_age = 1800  # 30分钟（从3600优化）
-            expired_notifications = [
-                key for key, last_time in self.last_notification_time.items()
-                if current_time - last_time > max_notification_age
-            ]
-            for key in expired_notifications:
-                del self.last_notification_time[key]
-            if expired_notifications:
-                cleaned_total += len(expired_notifications)
-                logger.warning(f"【{self.cookie_id}】清理了 {len(expired_notifications)} 个过期通知记录")
-            
-            # 清理过期的发货记录（保留30分钟内的）
-            max_delivery_age = 1800  # 30分钟
-            expired_deliveries = [
-                order_id for order_id, last_time in self.last_delivery_time.items()
-                if current_time - last_time > max_delivery_age
-            ]
-            for order_id in expired_deliveries:
-                del self.last_delivery_time[order_id]
-            if expired_deliveries:
-                cleaned_total += len(expired_deliveries)
-                logger.warning(f"【{self.cookie_id}】清理了 {len(expired_deliveries)} 个过期发货记录")
-            
-            # 清理过期的订单确认记录（保留30分钟内的）
-            max_confirm_age = 1800  # 30分钟
-            expired_confirms = [
-                order_id for order_id, last_time in self.confirmed_orders.items()
-                if current_time - last_time > max_confirm_age
-            ]
-            for order_id in expired_confirms:
-                del self.confirmed_orders[order_id]
-            if expired_confirms:
-                cleaned_total += len(expired_confirms)
-                logger.warning(f"【{self.cookie_id}】清理了 {len(expired_confirms)} 个过期订单确认记录")
-            
-            # 只有实际清理了内容才记录总数日志
-            if cleaned_total > 0:
-                logger.info(f"【{self.cookie_id}】实例缓存清理完成，共清理 {cleaned_total} 条记录")
-                logger.warning(f"【{self.cookie_id}】当前缓存数量 - 通知: {len(self.last_notification_time)}, 发货: {len(self.last_delivery_time)}, 确认: {len(self.confirmed_orders)}")
-        
-        except Exception as e:
-            logger.error(f"【{self.cookie_id}】清理实例缓存时出错: {self._safe_str(e)}")
-    
     async def _cleanup_playwright_cache(self):
         """清理Playwright浏览器临时文件和缓存（Docker环境专用）"""
         try:
@@ -722,21 +663,66 @@ class XianyuLive:
         # 后台任务追踪（用于清理未等待的任务）
         self.background_tasks = set()  # 追踪所有后台任务
         
-        # 消息处理并发控制（防止内存泄漏）
-        self.message_semaphore = asyncio.Semaphore(100)  # 最多100个并发消息处理任务
-        self.active_message_tasks = 0  # 当前活跃的消息处理任务数
-
-        # 消息防抖管理器：用于处理用户连续发送消息的情况
-        # {chat_id: {'task': asyncio.Task, 'last_message': dict, 'timer': float}}
-        self.message_debounce_tasks = {}  # 存储每个chat_id的防抖任务
+        # 消息入口队列：有界队列 + 固定工作协程，同一会话按顺序处理（替代每帧创建一个任务，防止积压时内存暴涨）
+        from config import config
+        ingress_config = config.get('MESSAGE_INGRESS', {})
+        self.ingress_queue = IngressQueue(
+            self.cookie_id,
+            handler=self._process_ingress_item,
+            workers=ingress_config.get('workers', 16),
+            max_size=ingress_config.get('max_size', 1000),
+            overflow=ingress_config.get('overflow', 'drop_oldest')
+        )
+
+        # 消息出站队列：所有 WebSocket 写操作由单个写协程按优先级发出，聊天消息按令牌桶限速
+        outbound_config = config.get('OUTBOUND_QUEUE', {})
+        self.outbound_queue = OutboundQueue(
+            self.cookie_id,
+            rate=outbound_config.get('rate', 2.0),
+            burst=outbound_config.get('burst', 3),
+            max_size=outbound_config.get('max_size', 500),
+            send_timeout=outbound_config.get('send_timeout', 10.0)
+        )
+
+        # Token缓存：重启后复用仍有效的 accessToken 与设备ID，Token有效性在注册响应中校验
+        token_cache_config = config.get('TOKEN_CACHE', {})
+        self.token_cache_enabled = token_cache_config.get('enabled', True)
+        self.token_cache_min_remaining = token_cache_config.get('min_remaining', 300)
+        self.token_from_cache = False  # 当前Token是否来自缓存且尚未经过注册校验
+        self._token_cache_checked = False
+        self._pending_reg_mid = None
+
+        # 会话执行器：用户连续发送消息时合并防抖窗口内的消息，每个会话的回复按顺序执行
         self.message_debounce_delay = 1  # 防抖延迟时间（秒）：用户停止发送消息1秒后才回复
-        self.message_debounce_lock = asyncio.Lock()  # 防抖任务管理的锁
+        self.chat_executor = ChatActorExecutor(
+            self.cookie_id,
+            handler=self._process_debounced_reply,
+            debounce_delay=self.message_debounce_delay
+        )
         
         # 消息去重机制：防止同一条消息被处理多次
-        self.processed_message_ids = {}  # 存储已处理的消息ID和时间戳 {message_id: timestamp}
-        self.processed_message_ids_lock = asyncio.Lock()  # 消息ID去重的锁
-        self.processed_message_ids_max_size = 10000  # 最大保存10000个消息ID，防止内存泄漏
-        self.message_expire_time = 3600  # 消息过期时间（秒），默认1小时后可以重复回复
+        # 已处理的消息ID按处理时间有序保存，过期（默认1小时）后可以重复回复；可持久化，重启后不重复回复
+        dedup_config = config.get('MESSAGE_DEDUP', {})
+        self.message_dedup = MessageDedupStore(
+            self.cookie_id,
+            ttl=dedup_config.get('ttl', 3600),
+            max_size=dedup_config.get('max_size', 10000),
+            persist=dedup_config.get('persist', True),
+            flush_interval=dedup_config.get('flush_interval', 1.0)
+        )
+
+        # 订单详情补全队列：订单详情在后台拉取，不阻塞消息回复；发货时按需等待指定订单
+        enrichment_config = config.get('ORDER_ENRICHMENT', {})
+        self.order_enrichment = OrderEnrichmentQueue(
+            self.cookie_id,
+            fetcher=self.fetch_order_detail_info,
+            max_concurrency=enrichment_config.get('max_concurrency', 2),
+            result_ttl=enrichment_config.get('result_ttl', 600)
+        )
+        self.order_enrichment_wait_timeout = enrichment_config.get('wait_timeout', 60)
+
+        # WebSocket帧录制（FRAME_RECORDER.enabled 开启时录制收到的原始帧，用于离线回放）
+        self.frame_recorder = create_frame_recorder(self.cookie_id, self.myid, self.cookies_str)
 
         # 初始化订单状态处理器
         self._init_order_status_handler()
@@ -795,11 +781,11 @@ class XianyuLive:
         task.add_done_callback(self.background_tasks.discard)
         return task
 
-    def is_auto_confirm_enabled(self) -> bool:
+    async def is_auto_confirm_enabled(self) -> bool:
         """检查当前账号是否启用自动确认发货"""
         try:
-            from db_manager import db_manager
-            return db_manager.get_auto_confirm(self.cookie_id)
+            from db_manager import async_db
+            return await async_db.get_auto_confirm(self.cookie_id)
         except Exception as e:
             logger.error(f"【{self.cookie_id}】获取自动确认发货设置失败: {self._safe_str(e)}")
             return True  # 出错时默认启用
@@ -848,38 +834,14 @@ class XianyuLive:
         else:
             logger.warning(f"【{self.cookie_id}】订单状态处理器为None，跳过自动发货状态更新: {order_id}")
 
-    async def _delayed_lock_release(self, lock_key: str, delay_minutes: int = 10):
-        """
-        延迟释放锁的异步任务
-
-        Args:
-            lock_key: 锁的键
-            delay_minutes: 延迟时间（分钟），默认10分钟
-        """
-        try:
-            delay_seconds = delay_minutes * 60
-            logger.info(f"【{self.cookie_id}】订单锁 {lock_key} 将在 {delay_minutes} 分钟后释放")
-
-            # 等待指定时间
-            await asyncio.sleep(delay_seconds)
-
-            # 检查锁是否仍然存在且需要释放
-            if lock_key in self._lock_hold_info:
-                lock_info = self._lock_hold_info[lock_key]
-                if lock_info.get('locked', False):
-                    # 释放锁
-                    lock_info['locked'] = False
-                    lock_info['release_time'] = time.time()
-                    logger.info(f"【{self.cookie_id}】订单锁 {lock_key} 延迟释放完成")
-
-                    # 清理锁信息（可选，也可以保留用于统计）
-                    # del self._lock_hold_info[lock_key]
-
-        except asyncio.CancelledError:
-            logger.info(f"【{self.cookie_id}】订单锁 {lock_key} 延迟释放任务被取消")
-            raise
-        except Exception as e:
-            logger.error(f"【{self.cookie_id}】订单锁 {lock_key} 延迟释放失败: {self._safe_str(e)}")
+    def _release_order_lock(self, lock_key: str):
+        """订单锁延迟释放（由时间轮到期回调）"""
+        lock_info = self._lock_hold_info.get(lock_key)
+        if lock_info and lock_info.get('locked', False):
+            lock_info['locked'] = False
+            lock_info['release_time'] = time.time()
+            lock_info['timer'] = None
+            logger.info(f"【{self.cookie_id}】订单锁 {lock_key} 延迟释放完成")
 
     def is_lock_held(self, lock_key: str) -> bool:
         """
@@ -897,59 +859,29 @@ class XianyuLive:
         lock_info = self._lock_hold_info[lock_key]
         return lock_info.get('locked', False)
 
-    def cleanup_expired_locks(self, max_age_hours: int = 24):
-        """
-        清理过期的锁（包括自动发货锁和订单详情锁）
-
-        Args:
-            max_age_hours: 锁的最大保留时间（小时），默认24小时
-        """
-        try:
-            current_time = time.time()
-            max_age_seconds = max_age_hours * 3600
-
-            # 清理自动发货锁
-            expired_delivery_locks = []
-            for order_id, last_used in self._lock_usage_times.items():
-                if current_time - last_used > max_age_seconds:
-                    expired_delivery_locks.append(order_id)
-
-            # 清理过期的自动发货锁
-            for order_id in expired_delivery_locks:
-                if order_id in self._order_locks:
-                    del self._order_locks[order_id]
-                if order_id in self._lock_usage_times:
-                    del self._lock_usage_times[order_id]
-                # 清理锁持有信息
-                if order_id in self._lock_hold_info:
-                    lock_info = self._lock_hold_info[order_id]
-                    # 取消延迟释放任务
-                    if 'task' in lock_info and lock_info['task']:
-                        lock_info['task'].cancel()
-                    del self._lock_hold_info[order_id]
-
-            # 清理订单详情锁
-            expired_detail_locks = []
-            for order_id, last_used in self._order_detail_lock_times.items():
-                if current_time - last_used > max_age_seconds:
-                    expired_detail_locks.append(order_id)
-
-            # 清理过期的订单详情锁
-            for order_id in expired_detail_locks:
-                if order_id in self._order_detail_locks:
-                    del self._order_detail_locks[order_id]
-                if order_id in self._order_detail_lock_times:
-                    del self._order_detail_lock_times[order_id]
-
-            total_expired = len(expired_delivery_locks) + len(expired_detail_locks)
-            if total_expired > 0:
-                logger.info(f"【{self.cookie_id}】清理了 {total_expired} 个过期锁 (发货锁: {len(expired_delivery_locks)}, 详情锁: {len(expired_detail_locks)})")
-                logger.warning(f"【{self.cookie_id}】当前锁数量 - 发货锁: {len(self._order_locks)}, 详情锁: {len(self._order_detail_locks)}")
-
-        except Exception as e:
-            logger.error(f"【{self.cookie_id}】清理过期锁时发生错误: {self._safe_str(e)}")
+    @classmethod
+    def _touch_lock(cls, locks: dict, usage_times: dict, lock_key: str):
+        """记录锁的使用时间，并在时间轮上注册到期清理（期间再次使用的锁由新的定时器负责）"""
+        used_at = usage_times[lock_key] = time.time()
+        timer_wheel.call_later(cls.LOCK_MAX_AGE, cls._expire_lock, locks, usage_times, lock_key, used_at,
+                               subsystem='lock_expiry')
 
-    
+    @classmethod
+    def _expire_lock(cls, locks: dict, usage_times: dict, lock_key: str, used_at: float):
+        """清理超过最大保留时间未使用的锁（自动发货锁或订单详情锁）"""
+        if usage_times.get(lock_key) != used_at:
+            return
+        lock = locks.get(lock_key)
+        if lock is not None and lock.locked():
+            # 仍在使用中，顺延
+            cls._touch_lock(locks, usage_times, lock_key)
+            return
+        locks.pop(lock_key, None)
+        del usage_times[lock_key]
+        if locks is cls._order_locks:
+            lock_info = cls._lock_hold_info.pop(lock_key, None)
+            if lock_info and lock_info.get('timer'):
+                lock_info['timer'].cancel()
 
     def _is_auto_delivery_trigger(self, message: str) -> bool:
         """检查消息是否为自动发货触发关键字"""
@@ -1087,8 +1019,8 @@ class XianyuLive:
             # 检查商品是否属于当前cookies
             if item_id and item_id != "未知商品":
                 try:
-                    from db_manager import db_manager
-                    item_info = db_manager.get_item_info(self.cookie_id, item_id)
+                    from db_manager import async_db
+                    item_info = await async_db.get_item_info(self.cookie_id, item_id)
                     if not item_info:
                         logger.warning(f'[{msg_time}] 【{self.cookie_id}】❌ 商品 {item_id} 不属于当前账号，跳过自动发货')
                         return
@@ -1125,7 +1057,7 @@ class XianyuLive:
             order_lock = self._order_locks[lock_key]
 
             # 更新锁的使用时间
-            self._lock_usage_times[lock_key] = time.time()
+            self._touch_lock(self._order_locks, self._lock_usage_times, lock_key)
 
             # 使用异步锁防止同一订单的并发处理
             async with order_lock:
@@ -1152,17 +1084,18 @@ class XianyuLive:
                     logger.info(f"【{self.cookie_id}】准备自动发货: item_id={item_id}, item_title={item_title}")
 
                     # 检查是否需要多数量发货
-                    from db_manager import db_manager
+                    from db_manager import async_db
                     quantity_to_send = 1  # 默认发送1个
 
                     # 检查商品是否开启了多数量发货
-                    multi_quantity_delivery = db_manager.get_item_multi_quantity_delivery_status(self.cookie_id, item_id)
+                    multi_quantity_delivery = await async_db.get_item_multi_quantity_delivery_status(self.cookie_id, item_id)
 
                     if multi_quantity_delivery and order_id:
                         logger.info(f"商品 {item_id} 开启了多数量发货，获取订单详情...")
                         try:
                             # 使用现有方法获取订单详情
-                            order_detail = await self.fetch_order_detail_info(order_id, item_id, send_user_id)
+                            order_detail = await self.order_enrichment.wait_for(
+                                order_id, item_id, send_user_id, timeout=self.order_enrichment_wait_timeout)
                             if order_detail and order_detail.get('quantity'):
                                 try:
                                     order_quantity = int(order_detail['quantity'])
@@ -1189,7 +1122,8 @@ class XianyuLive:
                     for i in range(quantity_to_send):
                         try:
                             # 每次调用都可能获取不同的内容（API卡券、批量数据等）
-                            delivery_content = await self._auto_delivery(item_id, item_title, order_id, send_user_id)
+                            delivery_content = await self._auto_delivery(item_id, item_title, order_id, send_user_id,
+                                                                         quantity=quantity_to_send, unit_index=i)
                             if delivery_content:
                                 delivery_contents.append(delivery_content)
                                 success_count += 1
@@ -1204,17 +1138,18 @@ class XianyuLive:
                         # 标记已发货（防重复）- 基于订单ID
                         self.mark_delivery_sent(order_id)
 
-                        # 标记锁为持有状态，并启动延迟释放任务
+                        # 标记锁为持有状态，10分钟后由时间轮释放
+                        previous = self._lock_hold_info.get(lock_key)
+                        if previous and previous.get('timer'):
+                            previous['timer'].cancel()
                         self._lock_hold_info[lock_key] = {
                             'locked': True,
                             'lock_time': time.time(),
                             'release_time': None,
-                            'task': None
+                            'timer': timer_wheel.call_later(600, self._release_order_lock, lock_key,
+                                                            subsystem='order_lock_release')
                         }
-
-                        # 启动延迟释放锁的异步任务（10分钟后释放）
-                        delay_task = asyncio.create_task(self._delayed_lock_release(lock_key, delay_minutes=10))
-                        self._lock_hold_info[lock_key]['task'] = delay_task
+                        logger.info(f"【{self.cookie_id}】订单锁 {lock_key} 将在 10 分钟后释放")
 
                         # 发送所有获取到的发货内容
                         for i, delivery_content in enumerate(delivery_contents):
@@ -1236,28 +1171,22 @@ class XianyuLive:
                                         image_url = image_data
 
                                     # 发送图片消息
-                                    await self.send_image_msg(websocket, chat_id, send_user_id, image_url, card_id=card_id)
+                                    # 发送图片消息（多数量发货的发送间隔由出站队列的令牌桶控制）
+                                    await self.send_image_msg(websocket, chat_id, send_user_id, image_url, card_id=card_id,
+                                                              priority=PRIORITY_DELIVERY)
                                     if len(delivery_contents) > 1:
                                         logger.info(f'[{msg_time}] 【多数量自动发货图片】第 {i+1}/{len(delivery_contents)} 张已向 {user_url} 发送图片: {image_url}')
                                     else:
                                         logger.info(f'[{msg_time}] 【自动发货图片】已向 {user_url} 发送图片: {image_url}')
 
-                                    # 多数量发货时，消息间隔1秒
-                                    if len(delivery_contents) > 1 and i < len(delivery_contents) - 1:
-                                        await asyncio.sleep(1)
-
                                 else:
                                     # 普通文本发货内容
-                                    await self.send_msg(websocket, chat_id, send_user_id, delivery_content)
+                                    await self.send_msg(websocket, chat_id, send_user_id, delivery_content, priority=PRIORITY_DELIVERY)
                                     if len(delivery_contents) > 1:
                                         logger.info(f'[{msg_time}] 【多数量自动发货】第 {i+1}/{len(delivery_contents)} 条已向 {user_url} 发送发货内容')
                                     else:
                                         logger.info(f'[{msg_time}] 【自动发货】已向 {user_url} 发送发货内容')
 
-                                    # 多数量发货时，消息间隔1秒
-                                    if len(delivery_contents) > 1 and i < len(delivery_contents) - 1:
-                                        await asyncio.sleep(1)
-
                             except Exception as e:
                                 logger.error(f"发送第 {i+1} 条消息失败: {self._safe_str(e)}")
 
@@ -1284,6 +1213,15 @@ class XianyuLive:
 
 
     async def refresh_token(self, captcha_retry_count: int = 0):
+        """刷新token（占用全局Token刷新名额，名额用尽时排队，避免所有账号同时请求Token接口）
+
+        Args:
+            captcha_retry_count: 滑块验证重试次数，用于防止无限递归
+        """
+        async with periodic_scheduler.slot('token_refresh', self.cookie_id):
+            return await self._refresh_token(captcha_retry_count)
+
+    async def _refresh_token(self, captcha_retry_count: int = 0):
         """刷新token
 
         Args:
@@ -1326,8 +1264,8 @@ class XianyuLive:
             logger.info(f"【{self.cookie_id}】开始执行Cookie刷新任务...")
             # await self._execute_cookie_refresh(time.time())
             try:
-                from db_manager import db_manager
-                account_info = db_manager.get_cookie_details(self.cookie_id)
+                from db_manager import async_db
+                account_info = await async_db.get_cookie_details(self.cookie_id)
                 if account_info and account_info.get('cookie_value'):
                     new_cookies_str = account_info.get('cookie_value')
                     if new_cookies_str != self.cookies_str:
@@ -1486,6 +1424,7 @@ class XianyuLive:
                                 new_token = res_json['data']['accessToken']
                                 self.current_token = new_token
                                 self.last_token_refresh_time = time.time()
+                                self._save_token_cache()
 
                                 # 【消息接收时间重置】Token刷新成功后重置消息接收标志，与 cookie_refresh_loop 保持一致
                                 self.last_message_received_time = 0
@@ -1507,8 +1446,8 @@ class XianyuLive:
                         # 添加风控日志记录
                         log_id = None
                         try:
-                            from db_manager import db_manager
-                            success = db_manager.add_risk_control_log(
+                            from db_manager import async_db
+                            success = await async_db.add_risk_control_log(
                                 cookie_id=self.cookie_id,
                                 event_type='slider_captcha',
                                 event_description=f"检测到需要滑块验证，触发场景: Token刷新, URL: {verification_url}",
@@ -1516,7 +1455,7 @@ class XianyuLive:
                             )
                             if success:
                                 # 获取刚插入的记录ID（简单方式，实际应该返回ID）
-                                logs = db_manager.get_risk_control_logs(cookie_id=self.cookie_id, limit=1)
+                                logs = await async_db.get_risk_control_logs(cookie_id=self.cookie_id, limit=1)
                                 if logs:
                                     log_id = logs[0].get('id')
                                 logger.info(f"【{self.cookie_id}】风控日志记录成功，ID: {log_id}")
@@ -1535,8 +1474,8 @@ class XianyuLive:
                                 # 更新风控日志为成功状态
                                 if 'log_id' in locals() and log_id:
                                     try:
-                                        from db_manager import db_manager
-                                        db_manager.update_risk_control_log(
+                                        from db_manager import async_db
+                                        await async_db.update_risk_control_log(
                                             log_id=log_id,
                                             processing_result=f"滑块验证成功，耗时: {captcha_duration:.2f}秒, cookies长度: {len(new_cookies_str)}",
                                             processing_status='success'
@@ -1555,8 +1494,8 @@ class XianyuLive:
                                 # 更新风控日志为失败状态
                                 if 'log_id' in locals() and log_id:
                                     try:
-                                        from db_manager import db_manager
-                                        db_manager.update_risk_control_log(
+                                        from db_manager import async_db
+                                        await async_db.update_risk_control_log(
                                             log_id=log_id,
                                             processing_result=f"滑块验证失败，耗时: {captcha_duration:.2f}秒, 原因: 未获取到新cookies",
                                             processing_status='failed'
@@ -1573,8 +1512,8 @@ class XianyuLive:
                             captcha_duration = time.time() - captcha_start_time if 'captcha_start_time' in locals() else 0
                             if 'log_id' in locals() and log_id:
                                 try:
-                                    from db_manager import db_manager
-                                    db_manager.update_risk_control_log(
+                                    from db_manager import async_db
+                                    await async_db.update_risk_control_log(
                                         log_id=log_id,
                                         processing_result=f"滑块验证处理异常，耗时: {captcha_duration:.2f}秒",
                                         processing_status='failed',
@@ -1704,6 +1643,11 @@ class XianyuLive:
             return False
 
     async def _handle_captcha_verification(self, res_json: dict) -> str:
+        """处理滑块验证，返回新的cookies字符串（占用全局浏览器刷新名额）"""
+        async with periodic_scheduler.slot('browser_refresh', self.cookie_id):
+            return await self._handle_captcha_verification_impl(res_json)
+
+    async def _handle_captcha_verification_impl(self, res_json: dict) -> str:
         """处理滑块验证，返回新的cookies字符串"""
         try:
             logger.info(f"【{self.cookie_id}】开始处理滑块验证...")
@@ -2024,7 +1968,7 @@ class XianyuLive:
     async def update_config_cookies(self):
         """更新数据库中的cookies（不会覆盖账号密码等其他字段）"""
         try:
-            from db_manager import db_manager
+            from db_manager import async_db
 
             # 更新数据库中的Cookie
             if hasattr(self, 'cookie_id') and self.cookie_id:
@@ -2036,7 +1980,7 @@ class XianyuLive:
 
                     # 使用 update_cookie_account_info 避免覆盖其他字段（如 username, password, pause_duration, remark 等）
                     # 这个方法会自动处理新账号和现有账号的情况，不会覆盖账号密码
-                    success = db_manager.update_cookie_account_info(
+                    success = await async_db.update_cookie_account_info(
                         self.cookie_id, 
                         cookie_value=self.cookies_str,
                         user_id=current_user_id  # 如果是新账号，需要提供user_id
@@ -2061,6 +2005,11 @@ class XianyuLive:
             await self.send_token_refresh_notification(f"Cookie更新失败: {str(e)}", "cookie_update_failed")
 
     async def _try_password_login_refresh(self, trigger_reason: str = "令牌/Session过期"):
+        """尝试通过密码登录刷新Cookie并重启实例（占用全局浏览器刷新名额）"""
+        async with periodic_scheduler.slot('browser_refresh', self.cookie_id):
+            return await self._try_password_login_refresh_impl(trigger_reason)
+
+    async def _try_password_login_refresh_impl(self, trigger_reason: str = "令牌/Session过期"):
         """尝试通过密码登录刷新Cookie并重启实例
         
         Args:
@@ -2088,8 +2037,8 @@ class XianyuLive:
 
         try:
             # 从数据库获取账号登录信息
-            from db_manager import db_manager
-            account_info = db_manager.get_cookie_details(self.cookie_id)
+            from db_manager import async_db
+            account_info = await async_db.get_cookie_details(self.cookie_id)
             
             if not account_info:
                 logger.error(f"【{self.cookie_id}】无法获取账号信息")
@@ -2463,13 +2412,13 @@ class XianyuLive:
                 logger.warning(f"跳过保存商品信息：商品标题或详情不完整 - {item_id}")
                 return
 
-            from db_manager import db_manager
+            from db_manager import async_db
 
             # 直接使用传入的详情内容
             item_data = item_detail
 
             # 保存到数据库
-            success = db_manager.save_item_info(self.cookie_id, item_id, item_data)
+            success = await async_db.save_item_info(self.cookie_id, item_id, item_data)
             if success:
                 logger.info(f"商品信息已保存到数据库: {item_id}")
             else:
@@ -2481,10 +2430,10 @@ class XianyuLive:
     async def save_item_detail_only(self, item_id, item_detail):
         """仅保存商品详情（不影响标题等基本信息）"""
         try:
-            from db_manager import db_manager
+            from db_manager import async_db
 
             # 使用专门的详情更新方法
-            success = db_manager.update_item_detail(self.cookie_id, item_id, item_detail)
+            success = await async_db.update_item_detail(self.cookie_id, item_id, item_detail)
 
             if success:
                 logger.info(f"商品详情已更新: {item_id}")
@@ -2613,133 +2562,46 @@ class XianyuLive:
 
     async def _fetch_item_detail_from_browser(self, item_id: str) -> str:
         """使用浏览器获取商品详情"""
-        playwright = None
-        browser = None
         try:
-            from playwright.async_api import async_playwright
-
             logger.info(f"开始使用浏览器获取商品详情: {item_id}")
 
-            playwright = await async_playwright().start()
-
-            # 启动浏览器（参照order_detail_fetcher的配置）
-            browser_args = [
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-renderer-backgrounding',
-                '--disable-features=TranslateUI',
-                '--disable-ipc-flooding-protection',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--disable-sync',
-                '--disable-translate',
-                '--hide-scrollbars',
-                '--mute-audio',
-                '--no-default-browser-check',
-                '--no-pings'
-            ]
-
-            # 在Docker环境中添加额外参数
-            if os.getenv('DOCKER_ENV'):
-                browser_args.extend([
-                    # '--single-process',  # 注释掉，避免多用户并发时的进程冲突和资源泄漏
-                    '--disable-background-networking',
-                    '--disable-client-side-phishing-detection',
-                    '--disable-hang-monitor',
-                    '--disable-popup-blocking',
-                    '--disable-prompt-on-repost',
-                    '--disable-web-resources',
-                    '--metrics-recording-only',
-                    '--safebrowsing-disable-auto-update',
-                    '--enable-automation',
-                    '--password-store=basic',
-                    '--use-mock-keychain'
-                ])
-
-            browser = await playwright.chromium.launch(
-                headless=True,
-                args=browser_args
-            )
-
-            # 创建浏览器上下文
-            context = await browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
-            )
-
-            # 设置Cookie
-            cookies = []
-            for cookie_pair in self.cookies_str.split('; '):
-                if '=' in cookie_pair:
-                    name, value = cookie_pair.split('=', 1)
-                    cookies.append({
-                        'name': name.strip(),
-                        'value': value.strip(),
-                        'domain': '.goofish.com',
-                        'path': '/'
-                    })
-
-            await context.add_cookies(cookies)
-            logger.warning(f"已设置 {len(cookies)} 个Cookie")
+            # 从共享浏览器池租用账号的浏览器上下文（Cookie已预先写入）
+            async with browser_pool.lease(self.cookie_id, self.cookies_str) as browser_lease:
+                page = browser_lease.page
 
-            # 创建页面
-            page = await context.new_page()
+                # 构造商品详情页面URL
+                item_url = f"https://www.goofish.com/item?id={item_id}"
+                logger.info(f"访问商品页面: {item_url}")
 
-            # 构造商品详情页面URL
-            item_url = f"https://www.goofish.com/item?id={item_id}"
-            logger.info(f"访问商品页面: {item_url}")
+                # 访问页面
+                await page.goto(item_url, wait_until='networkidle', timeout=30000)
 
-            # 访问页面
-            await page.goto(item_url, wait_until='networkidle', timeout=30000)
+                # 等待页面完全加载
+                await asyncio.sleep(3)
 
-            # 等待页面完全加载
-            await asyncio.sleep(3)
-
-            # 获取商品详情内容
-            detail_text = ""
-            try:
-                # 等待目标元素出现
-                await page.wait_for_selector('.desc--GaIUKUQY', timeout=10000)
-
-                # 获取商品详情文本
-                detail_element = await page.query_selector('.desc--GaIUKUQY')
-                if detail_element:
-                    detail_text = await detail_element.inner_text()
-                    logger.info(f"成功获取商品详情: {item_id}, 长度: {len(detail_text)}")
-                    return detail_text.strip()
-                else:
-                    logger.warning(f"未找到商品详情元素: {item_id}")
+                # 获取商品详情内容
+                detail_text = ""
+                try:
+                    # 等待目标元素出现
+                    await page.wait_for_selector('.desc--GaIUKUQY', timeout=10000)
+
+                    # 获取商品详情文本
+                    detail_element = await page.query_selector('.desc--GaIUKUQY')
+                    if detail_element:
+                        detail_text = await detail_element.inner_text()
+                        logger.info(f"成功获取商品详情: {item_id}, 长度: {len(detail_text)}")
+                        return detail_text.strip()
+                    else:
+                        logger.warning(f"未找到商品详情元素: {item_id}")
 
-            except Exception as e:
-                logger.warning(f"获取商品详情元素失败: {item_id}, 错误: {self._safe_str(e)}")
+                except Exception as e:
+                    logger.warning(f"获取商品详情元素失败: {item_id}, 错误: {self._safe_str(e)}")
 
-            return ""
+                return ""
 
         except Exception as e:
             logger.error(f"浏览器获取商品详情异常: {item_id}, 错误: {self._safe_str(e)}")
             return ""
-        finally:
-            # 确保资源被正确清理
-            try:
-                if browser:
-                    await browser.close()
-                    logger.warning(f"Browser已关闭: {item_id}")
-            except Exception as e:
-                logger.warning(f"关闭browser时出错: {self._safe_str(e)}")
-            
-            try:
-                if playwright:
-                    await playwright.stop()
-                    logger.warning(f"Playwright已停止: {item_id}")
-            except Exception as e:
-                logger.warning(f"停止playwright时出错: {self._safe_str(e)}")
 
 
     async def save_items_list_to_db(self, items_list):
@@ -2749,7 +2611,7 @@ class XianyuLive:
             items_list: 从get_item_list_info获取的商品列表
         """
         try:
-            from db_manager import db_manager
+            from db_manager import async_db
 
             # 准备批量数据
             batch_data = []
@@ -2777,7 +2639,7 @@ class XianyuLive:
                 }
 
                 # 检查数据库中是否已有详情
-                existing_item = db_manager.get_item_info(self.cookie_id, item_id)
+                existing_item = await async_db.get_item_info(self.cookie_id, item_id)
                 has_detail = existing_item and existing_item.get('item_detail') and existing_item['item_detail'].strip()
 
                 batch_data.append({
@@ -2802,7 +2664,7 @@ class XianyuLive:
                 return 0
 
             # 使用批量保存方法（并发安全）
-            saved_count = db_manager.batch_save_item_basic_info(batch_data)
+            saved_count = await async_db.batch_save_item_basic_info(batch_data)
             logger.info(f"批量保存商品信息完成: {saved_count}/{len(batch_data)} 个商品")
 
             # 异步获取缺失的商品详情
@@ -2935,7 +2797,7 @@ class XianyuLive:
 
         try:
             async with self.session.post(
-                'https://h5api.m.goofish.com/h5/mtop.taobao.idle.pc.detail/1.0/',
+                API_ENDPOINTS.get('item_detail', 'https://h5api.m.goofish.com/h5/mtop.taobao.idle.pc.detail/1.0/'),
                 params=params,
                 data=data
             ) as response:
@@ -3091,11 +2953,11 @@ class XianyuLive:
     async def get_default_reply(self, send_user_name: str, send_user_id: str, send_message: str, chat_id: str, item_id: str = None) -> str:
         """获取默认回复内容，支持指定商品回复、变量替换和只回复一次功能"""
         try:
-            from db_manager import db_manager
+            from db_manager import async_db
 
             # 1. 优先检查指定商品回复
             if item_id:
-                item_reply = db_manager.get_item_reply(self.cookie_id, item_id)
+                item_reply = await async_db.get_item_reply(self.cookie_id, item_id)
                 if item_reply and item_reply.get('reply_content'):
                     reply_content = item_reply['reply_content']
                     logger.info(f"【{self.cookie_id}】使用指定商品回复: 商品ID={item_id}")
@@ -3118,7 +2980,7 @@ class XianyuLive:
                     logger.warning(f"【{self.cookie_id}】商品ID {item_id} 没有配置指定回复，使用默认回复")
 
             # 2. 获取当前账号的默认回复设置
-            default_reply_settings = db_manager.get_default_reply(self.cookie_id)
+            default_reply_settings = await async_db.get_default_reply(self.cookie_id)
 
             if not default_reply_settings or not default_reply_settings.get('enabled', False):
                 logger.warning(f"账号 {self.cookie_id} 未启用默认回复")
@@ -3127,7 +2989,7 @@ class XianyuLive:
             # 检查"只回复一次"功能
             if default_reply_settings.get('reply_once', False) and chat_id:
                 # 检查是否已经回复过这个chat_id
-                if db_manager.has_default_reply_record(self.cookie_id, chat_id):
+                if await async_db.has_default_reply_record(self.cookie_id, chat_id):
                     logger.info(f"【{self.cookie_id}】chat_id {chat_id} 已使用过默认回复，跳过（只回复一次）")
                     return None
 
@@ -3139,7 +3001,7 @@ class XianyuLive:
             # 进行变量替换
             try:
                 # 获取当前商品是否有设置自动回复
-                item_replay = db_manager.get_item_replay(item_id)
+                item_replay = await async_db.get_item_replay(item_id)
 
                 formatted_reply = reply_content.format(
                     send_user_name=send_user_name,
@@ -3152,7 +3014,7 @@ class XianyuLive:
 
                 # 如果开启了"只回复一次"功能，记录这次回复
                 if default_reply_settings.get('reply_once', False) and chat_id:
-                    db_manager.add_default_reply_record(self.cookie_id, chat_id)
+                    await async_db.add_default_reply_record(self.cookie_id, chat_id)
                     logger.info(f"【{self.cookie_id}】记录默认回复: chat_id={chat_id}")
 
                 logger.info(f"【{self.cookie_id}】使用默认回复: {formatted_reply}")
@@ -3169,85 +3031,28 @@ class XianyuLive:
     async def get_keyword_reply(self, send_user_name: str, send_user_id: str, send_message: str, item_id: str = None) -> str:
         """获取关键词匹配回复（支持商品ID优先匹配和图片类型）"""
         try:
-            from db_manager import db_manager
+            from utils.keyword_matcher import keyword_matcher_cache
 
-            # 获取当前账号的关键词列表（包含类型信息）
-            keywords = db_manager.get_keywords_with_type(self.cookie_id)
+            # 获取当前账号已编译的关键词匹配器（关键词变更时由API层使缓存失效）
+            matcher = await keyword_matcher_cache.get_async(self.cookie_id)
 
-            if not keywords:
+            if not matcher.keywords:
                 logger.warning(f"账号 {self.cookie_id} 没有配置关键词")
                 return None
 
-            # 1. 如果有商品ID，优先匹配该商品ID对应的关键词
-            if item_id:
-                for keyword_data in keywords:
-                    keyword = keyword_data['keyword']
-                    reply = keyword_data['reply']
-                    keyword_item_id = keyword_data['item_id']
-                    keyword_type = keyword_data.get('type', 'text')
-                    image_url = keyword_data.get('image_url')
-
-                    if keyword_item_id == item_id and keyword.lower() in send_message.lower():
-                        logger.info(f"商品ID关键词匹配成功: 商品{item_id} '{keyword}' (类型: {keyword_type})")
-
-                        # 根据关键词类型处理
-                        if keyword_type == 'image' and image_url:
-                            # 图片类型关键词，发送图片
-                            return await self._handle_image_keyword(keyword, image_url, send_user_name, send_user_id, send_message)
-                        else:
-                            # 文本类型关键词，检查回复内容是否为空
-                            if not reply or (reply and reply.strip() == ''):
-                                logger.info(f"商品ID关键词 '{keyword}' 回复内容为空，不进行回复")
-                                return "EMPTY_REPLY"  # 返回特殊标记表示匹配到但不回复
+            send_message_lower = send_message.lower()
 
-                            # 进行变量替换
-                            try:
-                                formatted_reply = reply.format(
-                                    send_user_name=send_user_name,
-                                    send_user_id=send_user_id,
-                                    send_message=send_message
-                                )
-                                logger.info(f"商品ID文本关键词回复: {formatted_reply}")
-                                return formatted_reply
-                            except Exception as format_error:
-                                logger.error(f"关键词回复变量替换失败: {self._safe_str(format_error)}")
-                                # 如果变量替换失败，返回原始内容
-                                return reply
+            # 1. 如果有商品ID，优先匹配该商品ID对应的关键词
+            keyword_data = matcher.match_item(send_message_lower, item_id)
+            if keyword_data:
+                logger.info(f"商品ID关键词匹配成功: 商品{item_id} '{keyword_data['keyword']}' (类型: {keyword_data.get('type', 'text')})")
+                return await self._build_keyword_reply(keyword_data, '商品ID', send_user_name, send_user_id, send_message)
 
             # 2. 如果商品ID匹配失败或没有商品ID，匹配没有商品ID的通用关键词
-            for keyword_data in keywords:
-                keyword = keyword_data['keyword']
-                reply = keyword_data['reply']
-                keyword_item_id = keyword_data['item_id']
-                keyword_type = keyword_data.get('type', 'text')
-                image_url = keyword_data.get('image_url')
-
-                if not keyword_item_id and keyword.lower() in send_message.lower():
-                    logger.info(f"通用关键词匹配成功: '{keyword}' (类型: {keyword_type})")
-
-                    # 根据关键词类型处理
-                    if keyword_type == 'image' and image_url:
-                        # 图片类型关键词，发送图片
-                        return await self._handle_image_keyword(keyword, image_url, send_user_name, send_user_id, send_message)
-                    else:
-                        # 文本类型关键词，检查回复内容是否为空
-                        if not reply or (reply and reply.strip() == ''):
-                            logger.info(f"通用关键词 '{keyword}' 回复内容为空，不进行回复")
-                            return "EMPTY_REPLY"  # 返回特殊标记表示匹配到但不回复
-
-                        # 进行变量替换
-                        try:
-                            formatted_reply = reply.format(
-                                send_user_name=send_user_name,
-                                send_user_id=send_user_id,
-                                send_message=send_message
-                            )
-                            logger.info(f"通用文本关键词回复: {formatted_reply}")
-                            return formatted_reply
-                        except Exception as format_error:
-                            logger.error(f"关键词回复变量替换失败: {self._safe_str(format_error)}")
-                            # 如果变量替换失败，返回原始内容
-                            return reply
+            keyword_data = matcher.match_generic(send_message_lower)
+            if keyword_data:
+                logger.info(f"通用关键词匹配成功: '{keyword_data['keyword']}' (类型: {keyword_data.get('type', 'text')})")
+                return await self._build_keyword_reply(keyword_data, '通用', send_user_name, send_user_id, send_message)
 
             logger.warning(f"未找到匹配的关键词: {send_message}")
             return None
@@ -3256,6 +3061,42 @@ class XianyuLive:
             logger.error(f"获取关键词回复失败: {self._safe_str(e)}")
             return None
 
+    async def _build_keyword_reply(self, keyword_data: dict, scope: str, send_user_name: str, send_user_id: str, send_message: str) -> str:
+        """根据命中的关键词生成回复内容
+
+        Args:
+            keyword_data: 命中的关键词数据
+            scope: 关键词范围描述（商品ID/通用），用于日志
+        """
+        keyword = keyword_data['keyword']
+        reply = keyword_data['reply']
+        keyword_type = keyword_data.get('type', 'text')
+        image_url = keyword_data.get('image_url')
+
+        # 根据关键词类型处理
+        if keyword_type == 'image' and image_url:
+            # 图片类型关键词，发送图片
+            return await self._handle_image_keyword(keyword, image_url, send_user_name, send_user_id, send_message)
+
+        # 文本类型关键词，检查回复内容是否为空
+        if not reply or (reply and reply.strip() == ''):
+            logger.info(f"{scope}关键词 '{keyword}' 回复内容为空，不进行回复")
+            return "EMPTY_REPLY"  # 返回特殊标记表示匹配到但不回复
+
+        # 进行变量替换
+        try:
+            formatted_reply = reply.format(
+                send_user_name=send_user_name,
+                send_user_id=send_user_id,
+                send_message=send_message
+            )
+            logger.info(f"{scope}文本关键词回复: {formatted_reply}")
+            return formatted_reply
+        except Exception as format_error:
+            logger.error(f"关键词回复变量替换失败: {self._safe_str(format_error)}")
+            # 如果变量替换失败，返回原始内容
+            return reply
+
     async def _handle_image_keyword(self, keyword: str, image_url: str, send_user_name: str, send_user_id: str, send_message: str) -> str:
         """处理图片类型关键词"""
         try:
@@ -3332,9 +3173,11 @@ class XianyuLive:
     async def _update_keyword_image_url(self, keyword: str, new_image_url: str):
         """更新关键词的图片URL"""
         try:
-            from db_manager import db_manager
-            success = db_manager.update_keyword_image_url(self.cookie_id, keyword, new_image_url)
+            from db_manager import async_db
+            success = await async_db.update_keyword_image_url(self.cookie_id, keyword, new_image_url)
             if success:
+                from utils.keyword_matcher import keyword_matcher_cache
+                keyword_matcher_cache.invalidate(self.cookie_id)
                 logger.info(f"图片URL已更新: {keyword} -> {new_image_url}")
             else:
                 logger.warning(f"图片URL更新失败: {keyword}")
@@ -3344,8 +3187,8 @@ class XianyuLive:
     async def _update_card_image_url(self, card_id: int, new_image_url: str):
         """更新卡券的图片URL"""
         try:
-            from db_manager import db_manager
-            success = db_manager.update_card_image_url(card_id, new_image_url)
+            from db_manager import async_db
+            success = await async_db.update_card_image_url(card_id, new_image_url)
             if success:
                 logger.info(f"卡券图片URL已更新: 卡券ID={card_id} -> {new_image_url}")
             else:
@@ -3356,16 +3199,16 @@ class XianyuLive:
     async def get_ai_reply(self, send_user_name: str, send_user_id: str, send_message: str, item_id: str, chat_id: str):
         """获取AI回复"""
         try:
-            from ai_reply_engine import ai_reply_engine
+            from ai_reply_engine import async_ai_reply_engine
 
             # 检查是否启用AI回复
-            if not ai_reply_engine.is_ai_enabled(self.cookie_id):
+            if not await async_ai_reply_engine.is_ai_enabled_async(self.cookie_id):
                 logger.warning(f"账号 {self.cookie_id} 未启用AI回复")
                 return None
 
             # 从数据库获取商品信息
-            from db_manager import db_manager
-            item_info_raw = db_manager.get_item_info(self.cookie_id, item_id)
+            from db_manager import async_db
+            item_info_raw = await async_db.get_item_info(self.cookie_id, item_id)
 
             if not item_info_raw:
                 logger.warning(f"数据库中无商品信息: {item_id}")
@@ -3383,9 +3226,9 @@ class XianyuLive:
                     'desc': item_info_raw.get('item_detail', '暂无商品描述')
                 }
 
-            # 生成AI回复
+            # 生成AI回复（原生异步，LLM请求不阻塞事件循环）
             # 由于外部已实现防抖机制，跳过内部等待（skip_wait=True）
-            reply = ai_reply_engine.generate_reply(
+            reply = await async_ai_reply_engine.generate_reply_async(
                 message=send_message,
                 item_info=item_info,
                 chat_id=chat_id,
@@ -3420,7 +3263,7 @@ class XianyuLive:
     async def send_notification(self, send_user_name: str, send_user_id: str, send_message: str, item_id: str = None, chat_id: str = None):
         """发送消息通知"""
         try:
-            from db_manager import db_manager
+            from db_manager import async_db
             import aiohttp
             import hashlib
 
@@ -3450,21 +3293,15 @@ class XianyuLive:
                         logger.warning(f"📱 通知在冷却期内（剩余 {remaining_seconds} 秒），跳过重复发送 - 账号: {self.cookie_id}, 买家: {send_user_name}, 消息: {send_message[:30]}...")
                         return
                 
-                # 更新通知发送时间
+                # 更新通知发送时间，冷却期结束后由时间轮删除记录
                 self.last_notification_time[notification_hash] = current_time
-                
-                # 清理过期的通知记录（超过1小时的记录）
-                expired_keys = [
-                    key for key, timestamp in self.last_notification_time.items()
-                    if current_time - timestamp > 3600  # 1小时
-                ]
-                for key in expired_keys:
-                    del self.last_notification_time[key]
+                timer_wheel.expire_key(self.last_notification_time, notification_hash,
+                                       self.notification_cooldown, subsystem='notification_cooldown')
 
             logger.info(f"📱 开始发送消息通知 - 账号: {self.cookie_id}, 买家: {send_user_name}")
 
             # 获取当前账号的通知配置
-            notifications = db_manager.get_account_notifications(self.cookie_id)
+            notifications = await async_db.get_account_notifications(self.cookie_id)
 
             if not notifications:
                 logger.warning(f"📱 账号 {self.cookie_id} 未配置消息通知，跳过通知发送")
@@ -4085,10 +3922,10 @@ class XianyuLive:
                 logger.warning(f"Token刷新通知在冷却期内，跳过发送: {notification_type} (还需等待 {time_desc})")
                 return
 
-            from db_manager import db_manager
+            from db_manager import async_db
 
             # 获取当前账号的通知配置
-            notifications = db_manager.get_account_notifications(self.cookie_id)
+            notifications = await async_db.get_account_notifications(self.cookie_id)
 
             if not notifications:
                 logger.warning("未配置消息通知，跳过Token刷新通知")
@@ -4163,6 +4000,8 @@ class XianyuLive:
             # 如果成功发送了通知，更新最后发送时间
             if notification_sent:
                 self.last_notification_time[notification_type] = current_time
+                timer_wheel.expire_key(self.last_notification_time, notification_type,
+                                       cooldown_time, subsystem='notification_cooldown')
 
                 # 根据错误消息内容使用不同的冷却时间
                 if self._is_token_related_error(error_message):
@@ -4253,10 +4092,10 @@ class XianyuLive:
     async def send_delivery_failure_notification(self, send_user_name: str, send_user_id: str, item_id: str, error_message: str, chat_id: str = None):
         """发送自动发货失败通知"""
         try:
-            from db_manager import db_manager
+            from db_manager import async_db
 
             # 获取当前账号的通知配置
-            notifications = db_manager.get_account_notifications(self.cookie_id)
+            notifications = await async_db.get_account_notifications(self.cookie_id)
 
             if not notifications:
                 logger.warning("未配置消息通知，跳过自动发货通知")
@@ -4344,6 +4183,7 @@ class XianyuLive:
             if secure_confirm.current_token != self.current_token:
                 self.current_token = secure_confirm.current_token
                 self.last_token_refresh_time = secure_confirm.last_token_refresh_time
+                self._save_token_cache()
                 logger.warning(f"【{self.cookie_id}】已同步确认发货模块更新的token")
 
             return result
@@ -4381,7 +4221,7 @@ class XianyuLive:
         order_detail_lock = self._order_detail_locks[order_id]
 
         # 记录订单详情锁的使用时间
-        self._order_detail_lock_times[order_id] = time.time()
+        self._touch_lock(self._order_detail_locks, self._order_detail_lock_times, order_id)
 
         async with order_detail_lock:
             logger.info(f"🔍 【{self.cookie_id}】获取订单详情锁 {order_id}，开始处理...")
@@ -4391,7 +4231,7 @@ class XianyuLive:
 
                 # 导入订单详情获取器
                 from utils.order_detail_fetcher import fetch_order_detail_simple
-                from db_manager import db_manager
+                from db_manager import async_db
 
                 # 获取当前账号的cookie字符串
                 cookie_string = self.cookies_str
@@ -4403,7 +4243,7 @@ class XianyuLive:
                     logger.info(f"【{self.cookie_id}】🖥️ 启用有头模式进行调试")
 
                 # 异步获取订单详情（使用当前账号的cookie）
-                result = await fetch_order_detail_simple(order_id, cookie_string, headless=headless_mode)
+                result = await fetch_order_detail_simple(order_id, cookie_string, headless=headless_mode, cookie_id=self.cookie_id)
 
                 if result:
                     logger.info(f"【{self.cookie_id}】订单详情获取成功: {order_id}")
@@ -4426,12 +4266,12 @@ class XianyuLive:
                     # 插入或更新订单信息到数据库
                     try:
                         # 检查cookie_id是否在cookies表中存在
-                        cookie_info = db_manager.get_cookie_by_id(self.cookie_id)
+                        cookie_info = await async_db.get_cookie_by_id(self.cookie_id)
                         if not cookie_info:
                             logger.warning(f"Cookie ID {self.cookie_id} 不存在于cookies表中，丢弃订单 {order_id}")
                         else:
                             # 先保存订单基本信息
-                            success = db_manager.insert_or_update_order(
+                            success = await async_db.insert_or_update_order(
                                 order_id=order_id,
                                 item_id=item_id,
                                 buyer_id=buyer_id,
@@ -4483,10 +4323,11 @@ class XianyuLive:
                 logger.error(f"【{self.cookie_id}】获取订单详情异常: {self._safe_str(e)}")
                 return None
 
-    async def _auto_delivery(self, item_id: str, item_title: str = None, order_id: str = None, send_user_id: str = None):
+    async def _auto_delivery(self, item_id: str, item_title: str = None, order_id: str = None, send_user_id: str = None,
+                             quantity: int = 1, unit_index: int = 0):
         """自动发货功能 - 获取卡券规则，执行延时，确认发货，发送内容"""
         try:
-            from db_manager import db_manager
+            from db_manager import async_db
 
             logger.info(f"开始自动发货检查: 商品ID={item_id}")
 
@@ -4498,7 +4339,7 @@ class XianyuLive:
                 # 直接从数据库获取商品信息（发货时不再调用API）
                 try:
                     logger.info(f"从数据库获取商品信息: {item_id}")
-                    db_item_info = db_manager.get_item_info(self.cookie_id, item_id)
+                    db_item_info = await async_db.get_item_info(self.cookie_id, item_id)
                     if db_item_info:
                         # 拼接商品标题和详情作为搜索文本
                         item_title_db = db_item_info.get('item_title', '') or ''
@@ -4553,7 +4394,7 @@ class XianyuLive:
             logger.info(f"使用搜索文本匹配发货规则: {search_text[:100]}...")
 
             # 检查商品是否为多规格商品
-            is_multi_spec = db_manager.get_item_multi_spec_status(self.cookie_id, item_id)
+            is_multi_spec = await async_db.get_item_multi_spec_status(self.cookie_id, item_id)
             spec_name = None
             spec_value = None
 
@@ -4561,7 +4402,8 @@ class XianyuLive:
             if is_multi_spec and order_id:
                 logger.info(f"检测到多规格商品，获取订单规格信息: {order_id}")
                 try:
-                    order_detail = await self.fetch_order_detail_info(order_id, item_id, send_user_id)
+                    order_detail = await self.order_enrichment.wait_for(
+                        order_id, item_id, send_user_id, timeout=self.order_enrichment_wait_timeout)
                     # 确保order_detail是字典类型
                     if order_detail and isinstance(order_detail, dict):
                         spec_name = order_detail.get('spec_name', '')
@@ -4581,7 +4423,7 @@ class XianyuLive:
             # 第一步：如果有规格信息，尝试精确匹配多规格发货规则
             if spec_name and spec_value:
                 logger.info(f"尝试精确匹配多规格发货规则: {search_text[:50]}... [{spec_name}:{spec_value}]")
-                delivery_rules = db_manager.get_delivery_rules_by_keyword_and_spec(search_text, spec_name, spec_value)
+                delivery_rules = await async_db.get_delivery_rules_by_keyword_and_spec(search_text, spec_name, spec_value)
 
                 if delivery_rules:
                     logger.info(f"✅ 找到精确匹配的多规格发货规则: {len(delivery_rules)}个")
@@ -4591,7 +4433,7 @@ class XianyuLive:
             # 第二步：如果精确匹配失败，尝试兜底匹配（普通发货规则）
             if not delivery_rules:
                 logger.info(f"尝试兜底匹配普通发货规则: {search_text[:50]}...")
-                delivery_rules = db_manager.get_delivery_rules_by_keyword(search_text)
+                delivery_rules = await async_db.get_delivery_rules_by_keyword(search_text)
 
                 if delivery_rules:
                     logger.info(f"✅ 找到兜底匹配的普通发货规则: {len(delivery_rules)}个")
@@ -4609,8 +4451,8 @@ class XianyuLive:
             # 尝试获取商品标题
             item_title_for_save = None
             try:
-                from db_manager import db_manager
-                db_item_info = db_manager.get_item_info(self.cookie_id, item_id)
+                from db_manager import async_db
+                db_item_info = await async_db.get_item_info(self.cookie_id, item_id)
                 if db_item_info:
                     item_title_for_save = db_item_info.get('item_title', '').strip()
             except:
@@ -4648,7 +4490,7 @@ class XianyuLive:
             # 如果有订单ID，执行确认发货
             if order_id:
                 # 检查是否启用自动确认发货
-                if not self.is_auto_confirm_enabled():
+                if not await self.is_auto_confirm_enabled():
                     logger.info(f"自动确认发货已关闭，跳过订单 {order_id}")
                 else:
                     # 检查确认发货冷却时间
@@ -4666,6 +4508,8 @@ class XianyuLive:
                         confirm_result = await self.auto_confirm(order_id, item_id)
                         if confirm_result.get('success'):
                             self.confirmed_orders[order_id] = current_time
+                            timer_wheel.expire_key(self.confirmed_orders, order_id,
+                                                   self.order_confirm_cooldown, subsystem='order_confirm_cooldown')
                             logger.info(f"🎉 自动确认发货成功！订单ID: {order_id}")
                         else:
                             logger.warning(f"⚠️ 自动确认发货失败: {confirm_result.get('error', '未知错误')}")
@@ -4675,17 +4519,17 @@ class XianyuLive:
             if order_id:
                 # 保存订单基本信息到数据库（如果还没有详细信息）
                 try:
-                    from db_manager import db_manager
+                    from db_manager import async_db
 
                     # 检查cookie_id是否在cookies表中存在
-                    cookie_info = db_manager.get_cookie_by_id(self.cookie_id)
+                    cookie_info = await async_db.get_cookie_by_id(self.cookie_id)
                     if not cookie_info:
                         logger.warning(f"Cookie ID {self.cookie_id} 不存在于cookies表中，丢弃订单 {order_id}")
                     else:
-                        existing_order = db_manager.get_order_by_id(order_id)
+                        existing_order = await async_db.get_order_by_id(order_id)
                         if not existing_order:
                             # 插入基本订单信息
-                            success = db_manager.insert_or_update_order(
+                            success = await async_db.insert_or_update_order(
                                 order_id=order_id,
                                 item_id=item_id,
                                 buyer_id=send_user_id,
@@ -4723,8 +4567,9 @@ class XianyuLive:
                     delivery_content = rule['text_content']
 
                 elif rule['card_type'] == 'data':
-                    # 批量数据类型：获取并消费第一条数据
-                    delivery_content = db_manager.consume_batch_data(rule['card_id'])
+                    # 批量数据类型：按订单一次领取全部数量（同一订单重复调用返回已领取的数据，不会重复扣减库存）
+                    claimed = await async_db.claim_card_inventory(rule['card_id'], order_id, quantity)
+                    delivery_content = claimed[unit_index] if unit_index < len(claimed) else None
 
                 elif rule['card_type'] == 'image':
                     # 图片类型：返回图片发送标记，包含卡券ID
@@ -4741,7 +4586,7 @@ class XianyuLive:
                     final_content = self._process_delivery_content_with_description(delivery_content, rule.get('card_description', ''))
 
                     # 增加发货次数统计
-                    db_manager.increment_delivery_times(rule['id'])
+                    await async_db.increment_delivery_times(rule['id'])
                     logger.info(f"自动发货成功: 规则ID={rule['id']}, 内容长度={len(final_content)}")
                     return final_content
                 else:
@@ -4899,12 +4744,13 @@ class XianyuLive:
             # 如果有订单ID，获取订单信息
             if order_id:
                 try:
-                    from db_manager import db_manager
+                    from db_manager import async_db
                     # 尝试从数据库获取订单信息
-                    order_info = db_manager.get_order_by_id(order_id)
+                    order_info = await async_db.get_order_by_id(order_id)
                     if not order_info:
                         # 如果数据库中没有，尝试通过API获取
-                        order_detail = await self.fetch_order_detail_info(order_id, item_id, buyer_id)
+                        order_detail = await self.order_enrichment.wait_for(
+                            order_id, item_id, buyer_id, timeout=self.order_enrichment_wait_timeout)
                         if order_detail:
                             order_info = order_detail
                             logger.warning(f"通过API获取到订单信息: {order_id}")
@@ -4918,8 +4764,8 @@ class XianyuLive:
             # 如果有商品ID，获取商品信息
             if item_id:
                 try:
-                    from db_manager import db_manager
-                    item_info = db_manager.get_item_info(self.cookie_id, item_id)
+                    from db_manager import async_db
+                    item_info = await async_db.get_item_info(self.cookie_id, item_id)
                     if item_info:
                         logger.warning(f"从数据库获取到商品信息: {item_id}")
                     else:
@@ -5003,7 +4849,9 @@ class XianyuLive:
             return obj
 
     async def token_refresh_loop(self):
-        """Token刷新循环"""
+        """Token刷新循环（由全局调度器安排刷新时间，刷新间隔带随机抖动）"""
+        job = periodic_scheduler.register(self.cookie_id, 'token_refresh', self.token_refresh_interval)
+        retrying = False  # 刷新失败后的重试不受刷新间隔限制
         try:
             while True:
                 try:
@@ -5013,54 +4861,59 @@ class XianyuLive:
                         logger.info(f"【{self.cookie_id}】账号已禁用，停止Token刷新循环")
                         break
 
-                    current_time = time.time()
-                    if current_time - self.last_token_refresh_time >= self.token_refresh_interval:
-                        logger.info("Token即将过期，准备刷新...")
-                        new_token = await self.refresh_token()
-                        if new_token:
-                            logger.info(f"【{self.cookie_id}】Token刷新成功，将关闭WebSocket以使用新Token重连")
-                            
-                            # Token刷新成功后，需要关闭WebSocket连接，让它用新Token重新连接
-                            # 原因：WebSocket连接建立时使用的是旧Token，新Token需要重新建立连接才能生效
-                            # 注意：只关闭WebSocket，不重启整个实例（后台任务继续运行）
-                            
-                            # 关闭当前WebSocket连接
-                            if self.ws and not self.ws.closed:
-                                try:
-                                    logger.info(f"【{self.cookie_id}】关闭当前WebSocket连接以使用新Token重连...")
-                                    await self.ws.close()
-                                    logger.info(f"【{self.cookie_id}】WebSocket连接已关闭，将自动重连")
-                                except Exception as close_e:
-                                    logger.warning(f"【{self.cookie_id}】关闭WebSocket时出错: {self._safe_str(close_e)}")
-                            
-                            # 退出Token刷新循环，让main循环重新建立连接
-                            # 后台任务（心跳、清理等）继续运行
-                            logger.info(f"【{self.cookie_id}】Token刷新完成，WebSocket将使用新Token重新连接")
-                            break
+                    # 到期时间加抖动，避免同时启动的账号在同一时刻刷新Token
+                    remaining = self.last_token_refresh_time + job.period() - time.time()
+                    if remaining > 0 and not retrying:
+                        await job.sleep(remaining, jitter=False)
+                        continue
+
+                    logger.info("Token即将过期，准备刷新...")
+                    new_token = await self.refresh_token()
+                    job.rejitter()
+                    retrying = False
+                    if new_token:
+                        logger.info(f"【{self.cookie_id}】Token刷新成功，将关闭WebSocket以使用新Token重连")
+
+                        # Token刷新成功后，需要关闭WebSocket连接，让它用新Token重新连接
+                        # 原因：WebSocket连接建立时使用的是旧Token，新Token需要重新建立连接才能生效
+                        # 注意：只关闭WebSocket，不重启整个实例（后台任务继续运行）
+
+                        # 关闭当前WebSocket连接
+                        if self.ws and not self.ws.closed:
+                            try:
+                                logger.info(f"【{self.cookie_id}】关闭当前WebSocket连接以使用新Token重连...")
+                                await self.ws.close()
+                                logger.info(f"【{self.cookie_id}】WebSocket连接已关闭，将自动重连")
+                            except Exception as close_e:
+                                logger.warning(f"【{self.cookie_id}】关闭WebSocket时出错: {self._safe_str(close_e)}")
+
+                        # 退出Token刷新循环，让main循环重新建立连接
+                        # 后台任务（心跳、清理等）继续运行
+                        logger.info(f"【{self.cookie_id}】Token刷新完成，WebSocket将使用新Token重新连接")
+                        break
+                    else:
+                        # 根据上一次刷新状态决定日志级别（冷却/已重启为正常情况）
+                        if getattr(self, 'last_token_refresh_status', None) in ("skipped_cooldown", "restarted_after_cookie_refresh"):
+                            logger.info(f"【{self.cookie_id}】Token刷新未执行或已重启（正常），将在{self.token_retry_interval // 60}分钟后重试")
                         else:
-                            # 根据上一次刷新状态决定日志级别（冷却/已重启为正常情况）
-                            if getattr(self, 'last_token_refresh_status', None) in ("skipped_cooldown", "restarted_after_cookie_refresh"):
-                                logger.info(f"【{self.cookie_id}】Token刷新未执行或已重启（正常），将在{self.token_retry_interval // 60}分钟后重试")
-                            else:
-                                logger.error(f"【{self.cookie_id}】Token刷新失败，将在{self.token_retry_interval // 60}分钟后重试")
+                            logger.error(f"【{self.cookie_id}】Token刷新失败，将在{self.token_retry_interval // 60}分钟后重试")
 
-                            # 清空当前token，确保下次重试时重新获取
-                            self.current_token = None
+                        # 清空当前token，确保下次重试时重新获取
+                        self.current_token = None
 
-                            # 发送Token刷新失败通知
-                            await self.send_token_refresh_notification("Token定时刷新失败，将自动重试", "token_scheduled_refresh_failed")
-                            await self._interruptible_sleep(self.token_retry_interval)
-                            continue
-                    await self._interruptible_sleep(60)
+                        # 发送Token刷新失败通知
+                        await self.send_token_refresh_notification("Token定时刷新失败，将自动重试", "token_scheduled_refresh_failed")
+                        await job.sleep(self.token_retry_interval)
+                        retrying = True
                 except asyncio.CancelledError:
                     # 收到取消信号，立即退出循环
                     logger.info(f"【{self.cookie_id}】Token刷新循环收到取消信号，准备退出")
                     raise
                 except Exception as e:
                     logger.error(f"Token刷新循环出错: {self._safe_str(e)}")
-                    # 出错后也等待1分钟再重试，使用可中断的sleep
+                    # 出错后也等待1分钟再重试
                     try:
-                        await self._interruptible_sleep(60)
+                        await job.sleep(60)
                     except asyncio.CancelledError:
                         logger.info(f"【{self.cookie_id}】Token刷新循环在重试等待时收到取消信号，准备退出")
                         raise
@@ -5070,6 +4923,7 @@ class XianyuLive:
             raise
         finally:
             # 确保任务能正常结束
+            job.cancel()
             logger.info(f"【{self.cookie_id}】Token刷新循环已退出")
 
     async def create_chat(self, ws, toid, item_id='891198795482'):
@@ -5093,16 +4947,11 @@ class XianyuLive:
                 }
             ]
         }
-        await ws.send(json.dumps(msg))
+        await self.outbound_queue.send(ws, json.dumps(msg), priority=PRIORITY_REPLY)
 
-    async def send_msg(self, ws, cid, toid, text):
-        text = {
-            "contentType": 1,
-            "text": {
-                "text": text
-            }
-        }
-        text_base64 = str(base64.b64encode(json.dumps(text).encode('utf-8')), 'utf-8')
+    def _build_send_frame(self, cid, toid, content: dict) -> str:
+        """构造并序列化 sendByReceiverScope 消息帧（文本、图片共用），在入队前完成以减少写协程的工作"""
+        content_base64 = str(base64.b64encode(json.dumps(content, ensure_ascii=False).encode('utf-8')), 'utf-8')
         msg = {
             "lwp": "/r/MessageSend/sendByReceiverScope",
             "headers": {
@@ -5117,7 +4966,7 @@ class XianyuLive:
                         "contentType": 101,
                         "custom": {
                             "type": 1,
-                            "data": text_base64
+                            "data": content_base64
                         }
                     },
                     "redPointPolicy": 0,
@@ -5139,9 +4988,108 @@ class XianyuLive:
                 }
             ]
         }
-        await ws.send(json.dumps(msg))
+        return json.dumps(msg)
+
+    async def send_msg(self, ws, cid, toid, text, priority=PRIORITY_REPLY):
+        """发送文本消息（经出站队列按优先级限速发出）
+
+        Args:
+            priority: 出站优先级，自动发货使用 PRIORITY_DELIVERY，API 手动发送使用 PRIORITY_ECHO
+        """
+        content = {
+            "contentType": 1,
+            "text": {
+                "text": text
+            }
+        }
+        # 自动发货的多张卡券内容可能相同，不能合并；回复/手动发送排队中的重复消息只发一次
+        coalesce_key = None if priority == PRIORITY_DELIVERY else ('text', cid, text)
+        await self.outbound_queue.send(ws, self._build_send_frame(cid, toid, content),
+                                       priority=priority, coalesce_key=coalesce_key)
+
+    async def _restore_cached_token(self):
+        """从数据库恢复重启前缓存的Token与设备ID（每个实例只尝试一次，Token有效性在注册时校验）"""
+        if self._token_cache_checked or not self.token_cache_enabled:
+            return
+        self._token_cache_checked = True
+        try:
+            cached = await async_db.get_account_token(self.cookie_id)
+        except Exception as e:
+            logger.warning(f"【{self.cookie_id}】读取Token缓存失败: {self._safe_str(e)}")
+            return
+        if not cached or cached['user_id'] != self.myid:
+            return
+
+        # Token与设备ID绑定，Token过期时也沿用缓存的设备ID，保持设备标识稳定
+        self.device_id = cached['device_id']
+        remaining = cached['expires_at'] - time.time()
+        if remaining < self.token_cache_min_remaining:
+            logger.info(f"【{self.cookie_id}】缓存的Token已过期或即将过期，重新获取")
+            return
+        self.current_token = cached['access_token']
+        self.last_token_refresh_time = cached['obtained_at']
+        self.token_from_cache = True
+        logger.info(f"【{self.cookie_id}】复用缓存的Token（剩余有效期 {int(remaining // 60)} 分钟），跳过Token刷新")
+
+    def _save_token_cache(self):
+        """缓存当前Token与设备ID，重启后可直接复用"""
+        self.token_from_cache = False
+        if not self.token_cache_enabled or not self.current_token:
+            return
+        try:
+            future = db_manager.save_account_token(
+                self.cookie_id, self.myid, self.current_token, self.device_id,
+                self.last_token_refresh_time, self.last_token_refresh_time + self.token_refresh_interval
+            )
+            future.add_done_callback(lambda done: self._log_token_cache_write_failure(done, '保存'))
+        except Exception as e:
+            logger.warning(f"【{self.cookie_id}】保存Token缓存失败: {self._safe_str(e)}")
+
+    def _discard_token_cache(self):
+        """删除Token缓存（Token被拒绝或连接失败需要重新获取Token时调用）"""
+        self.token_from_cache = False
+        self._pending_reg_mid = None
+        if not self.token_cache_enabled:
+            return
+        try:
+            future = db_manager.delete_account_token(self.cookie_id)
+            future.add_done_callback(lambda done: self._log_token_cache_write_failure(done, '删除'))
+        except Exception as e:
+            logger.warning(f"【{self.cookie_id}】删除Token缓存失败: {self._safe_str(e)}")
+
+    def _log_token_cache_write_failure(self, future, action: str):
+        """Token缓存写入完成回调（在写线程中执行），写入失败时记录日志"""
+        if future.cancelled():
+            logger.warning(f"【{self.cookie_id}】{action}Token缓存已取消")
+            return
+        error = future.exception()
+        if error is not None:
+            logger.warning(f"【{self.cookie_id}】{action}Token缓存失败: {self._safe_str(error)}")
+
+    async def _check_registration_response(self, message_data, websocket) -> bool:
+        """校验使用缓存Token的注册响应，Token被拒绝时丢弃缓存并关闭连接，重连时获取新Token
+
+        Returns:
+            bool: 是否为被拒绝的注册响应（已处理）
+        """
+        headers = message_data.get("headers") or {}
+        if headers.get("mid") != self._pending_reg_mid:
+            return False
+        self._pending_reg_mid = None
+        if message_data.get("code") == 200:
+            logger.info(f"【{self.cookie_id}】缓存的Token注册成功")
+            return False
+        logger.warning(f"【{self.cookie_id}】缓存的Token被拒绝（code={message_data.get('code')}），丢弃缓存并重新获取Token")
+        self._discard_token_cache()
+        self.current_token = None
+        await websocket.close()
+        return True
 
     async def init(self, ws):
+        # 首次连接时尝试复用重启前缓存的Token
+        if not self.current_token:
+            await self._restore_cached_token()
+
         # 如果没有token或者token过期，获取新token
         token_refresh_attempted = False
         if not self.current_token or (time.time() - self.last_token_refresh_time) >= self.token_refresh_interval:
@@ -5158,6 +5106,7 @@ class XianyuLive:
             else:
                 logger.info("由于刚刚尝试过token刷新，跳过重复的初始化失败通知")
             raise Exception("Token获取失败")
+        warm_start.mark(self.cookie_id, 'token')
 
         msg = {
             "lwp": "/reg",
@@ -5173,7 +5122,9 @@ class XianyuLive:
                 "mid": generate_mid()
             }
         }
-        await ws.send(json.dumps(msg))
+        # 使用缓存的Token注册时记录注册消息ID，收到注册响应后校验Token是否仍然有效
+        self._pending_reg_mid = msg["headers"]["mid"] if self.token_from_cache else None
+        await self.outbound_queue.send(ws, json.dumps(msg), priority=PRIORITY_CONTROL)
         await asyncio.sleep(1)
         current_time = int(time.time() * 1000)
         msg = {
@@ -5192,7 +5143,7 @@ class XianyuLive:
                 }
             ]
         }
-        await ws.send(json.dumps(msg))
+        await self.outbound_queue.send(ws, json.dumps(msg), priority=PRIORITY_CONTROL)
         logger.info(f'【{self.cookie_id}】连接注册完成')
 
     async def send_heartbeat(self, ws):
@@ -5209,7 +5160,7 @@ class XianyuLive:
         }
         # 添加超时保护，避免在WebSocket关闭时阻塞
         try:
-            await asyncio.wait_for(ws.send(json.dumps(msg)), timeout=2.0)
+            await asyncio.wait_for(self.outbound_queue.send(ws, json.dumps(msg), priority=PRIORITY_CONTROL), timeout=2.0)
             self.last_heartbeat_time = time.time()
             logger.warning(f"【{self.cookie_id}】心跳包已发送")
         except asyncio.TimeoutError:
@@ -5219,9 +5170,10 @@ class XianyuLive:
             raise
 
     async def heartbeat_loop(self, ws):
-        """心跳循环"""
+        """心跳循环（由全局调度器安排发送时间）"""
         consecutive_failures = 0
         max_failures = 3  # 连续失败3次后停止心跳
+        job = periodic_scheduler.register(self.cookie_id, 'heartbeat', self.heartbeat_interval)
 
         try:
             while True:
@@ -5240,7 +5192,7 @@ class XianyuLive:
                     await self.send_heartbeat(ws)
                     consecutive_failures = 0  # 重置失败计数
 
-                    await self._interruptible_sleep(self.heartbeat_interval)
+                    await job.sleep(self.heartbeat_interval)
 
                 except asyncio.CancelledError:
                     # 收到取消信号，立即退出循环
@@ -5254,9 +5206,9 @@ class XianyuLive:
                         logger.error(f"【{self.cookie_id}】心跳连续失败{max_failures}次，停止心跳循环")
                         break
 
-                    # 失败后短暂等待再重试，使用可中断的sleep
+                    # 失败后短暂等待再重试
                     try:
-                        await self._interruptible_sleep(5)
+                        await job.sleep(5, jitter=False)
                     except asyncio.CancelledError:
                         # 在等待重试时收到取消信号，立即退出
                         logger.info(f"【{self.cookie_id}】心跳循环在重试等待时收到取消信号，准备退出")
@@ -5267,6 +5219,7 @@ class XianyuLive:
             raise
         finally:
             # 确保任务能正常结束
+            job.cancel()
             logger.info(f"【{self.cookie_id}】心跳循环已退出")
 
     async def handle_heartbeat_response(self, message_data):
@@ -5281,8 +5234,10 @@ class XianyuLive:
         return False
 
     async def pause_cleanup_loop(self):
-        """定期清理过期的暂停记录、锁和缓存"""
+        """定期清理过期的缓存、临时文件和历史数据（首次运行在启动后随机分散）"""
+        job = periodic_scheduler.register(self.cookie_id, 'cleanup', 300)
         try:
+            await job.sleep(job.startup_delay(), jitter=False)
             while True:
                 try:
                     # 检查账号是否启用
@@ -5291,14 +5246,7 @@ class XianyuLive:
                         logger.info(f"【{self.cookie_id}】账号已禁用，停止清理循环")
                         break
 
-                    # 清理过期的暂停记录
-                    pause_manager.cleanup_expired_pauses()
-                    await asyncio.sleep(0)  # 让出控制权，允许检查取消信号
-
-                    # 清理过期的锁（每5分钟清理一次，保留24小时内的锁）
-                    self.cleanup_expired_locks(max_age_hours=24)
-                    await asyncio.sleep(0)  # 让出控制权，允许检查取消信号
-
+                    # 暂停记录、锁、通知冷却等过期数据由时间轮到期删除，无需在此扫描
                     # 清理过期的商品详情缓存
                     try:
                         cleaned_count = await self._cleanup_item_cache()
@@ -5309,10 +5257,6 @@ class XianyuLive:
                     except Exception as cache_clean_e:
                         logger.warning(f"【{self.cookie_id}】清理商品详情缓存时出错: {cache_clean_e}")
 
-                    # 清理过期的通知、发货和订单确认记录（防止内存泄漏）
-                    self._cleanup_instance_caches()
-                    await asyncio.sleep(0)  # 让出控制权，允许检查取消信号
-
                     # 清理QR登录过期会话（每5分钟检查一次）
                     try:
                         from utils.qr_login import qr_login_manager
@@ -5356,7 +5300,7 @@ class XianyuLive:
                             # 数据库清理可能很耗时，使用线程池执行，避免阻塞事件循环
                             # 这样即使清理操作很慢，也能响应取消信号
                             try:
-                                stats = await asyncio.to_thread(db_manager.cleanup_old_data, days=90)
+                                stats = await async_db.cleanup_old_data(days=90)
                                 if 'error' not in stats:
                                     logger.info(f"【{self.cookie_id}】数据库清理完成: {stats}")
                                     self.__class__._last_db_cleanup_time = current_time
@@ -5371,16 +5315,16 @@ class XianyuLive:
                         logger.error(f"【{self.cookie_id}】清理数据库历史数据时出错: {db_clean_e}")
 
                     # 每5分钟清理一次
-                    await self._interruptible_sleep(300)
+                    await job.sleep(300)
                 except asyncio.CancelledError:
                     # 收到取消信号，立即退出循环
                     logger.info(f"【{self.cookie_id}】清理循环收到取消信号，准备退出")
                     raise
                 except Exception as e:
                     logger.error(f"【{self.cookie_id}】清理任务失败: {self._safe_str(e)}")
-                    # 出错后也等待5分钟再重试，使用可中断的sleep
+                    # 出错后也等待5分钟再重试
                     try:
-                        await self._interruptible_sleep(300)
+                        await job.sleep(300)
                     except asyncio.CancelledError:
                         logger.info(f"【{self.cookie_id}】清理循环在重试等待时收到取消信号，准备退出")
                         raise
@@ -5390,12 +5334,16 @@ class XianyuLive:
             raise
         finally:
             # 确保任务能正常结束
+            job.cancel()
             logger.info(f"【{self.cookie_id}】清理循环已退出")
 
 
     async def cookie_refresh_loop(self):
-        """Cookie刷新定时任务 - 每小时执行一次"""
+        """Cookie刷新定时任务（由全局调度器安排刷新时间，首次刷新在启动后随机分散）"""
+        job = periodic_scheduler.register(self.cookie_id, 'cookie_refresh', self.cookie_refresh_interval)
         try:
+            # 进程重启后不让所有账号同时启动浏览器刷新
+            await job.sleep(job.startup_delay(), jitter=False)
             while True:
                 try:
                     # 检查账号是否启用
@@ -5407,37 +5355,42 @@ class XianyuLive:
                     # 检查Cookie刷新功能是否启用
                     if not self.cookie_refresh_enabled:
                         logger.warning(f"【{self.cookie_id}】Cookie刷新功能已禁用，跳过执行")
-                        await self._interruptible_sleep(300)  # 5分钟后再检查
+                        await job.sleep(300)  # 5分钟后再检查
                         continue
 
                     current_time = time.time()
-                    if current_time - self.last_cookie_refresh_time >= self.cookie_refresh_interval:
-                        # 检查是否在消息接收后的冷却时间内
-                        time_since_last_message = current_time - self.last_message_received_time
-                        if time_since_last_message < self.message_cookie_refresh_cooldown:
-                            remaining_time = self.message_cookie_refresh_cooldown - time_since_last_message
-                            remaining_minutes = int(remaining_time // 60)
-                            remaining_seconds = int(remaining_time % 60)
-                            logger.warning(f"【{self.cookie_id}】收到消息后冷却中，还需等待 {remaining_minutes}分{remaining_seconds}秒 才能执行Cookie刷新")
-                        # 检查是否已有Cookie刷新任务在执行
-                        elif self.cookie_refresh_lock.locked():
-                            logger.warning(f"【{self.cookie_id}】Cookie刷新任务已在执行中，跳过本次触发")
-                        else:
-                            logger.info(f"【{self.cookie_id}】开始执行Cookie刷新任务...")
-                            # 在独立的任务中执行Cookie刷新，避免阻塞主循环
-                            asyncio.create_task(self._execute_cookie_refresh(current_time))
+                    remaining = self.last_cookie_refresh_time + job.period() - current_time
+                    if remaining > 0:
+                        await job.sleep(remaining, jitter=False)
+                        continue
 
-                    # 每分钟检查一次是否需要执行
-                    await self._interruptible_sleep(60)
+                    # 检查是否在消息接收后的冷却时间内
+                    time_since_last_message = current_time - self.last_message_received_time
+                    if time_since_last_message < self.message_cookie_refresh_cooldown:
+                        remaining_time = self.message_cookie_refresh_cooldown - time_since_last_message
+                        remaining_minutes = int(remaining_time // 60)
+                        remaining_seconds = int(remaining_time % 60)
+                        logger.warning(f"【{self.cookie_id}】收到消息后冷却中，还需等待 {remaining_minutes}分{remaining_seconds}秒 才能执行Cookie刷新")
+                    # 检查是否已有Cookie刷新任务在执行
+                    elif self.cookie_refresh_lock.locked():
+                        logger.warning(f"【{self.cookie_id}】Cookie刷新任务已在执行中，跳过本次触发")
+                    else:
+                        logger.info(f"【{self.cookie_id}】开始执行Cookie刷新任务...")
+                        # 在独立的任务中执行Cookie刷新，避免阻塞主循环
+                        asyncio.create_task(self._execute_cookie_refresh(current_time))
+                        job.rejitter()
+
+                    # 每分钟检查一次是否可以执行
+                    await job.sleep(60)
                 except asyncio.CancelledError:
                     # 收到取消信号，立即退出循环
                     logger.info(f"【{self.cookie_id}】Cookie刷新循环收到取消信号，准备退出")
                     raise
                 except Exception as e:
                     logger.error(f"【{self.cookie_id}】Cookie刷新循环失败: {self._safe_str(e)}")
-                    # 出错后也等待1分钟再重试，使用可中断的sleep
+                    # 出错后也等待1分钟再重试
                     try:
-                        await self._interruptible_sleep(60)
+                        await job.sleep(60)
                     except asyncio.CancelledError:
                         logger.info(f"【{self.cookie_id}】Cookie刷新循环在重试等待时收到取消信号，准备退出")
                         raise
@@ -5447,6 +5400,7 @@ class XianyuLive:
             raise
         finally:
             # 确保任务能正常结束
+            job.cancel()
             logger.info(f"【{self.cookie_id}】Cookie刷新循环已退出")
 
     async def _execute_cookie_refresh(self, current_time):
@@ -5454,81 +5408,83 @@ class XianyuLive:
 
         # 使用Lock确保原子性，防止重复执行
         async with self.cookie_refresh_lock:
-            try:
-                logger.info(f"【{self.cookie_id}】开始Cookie刷新任务，暂时暂停心跳以避免连接冲突...")
-
-                # 暂时暂停心跳任务，避免与浏览器操作冲突
-                heartbeat_was_running = False
-                if self.heartbeat_task and not self.heartbeat_task.done():
-                    heartbeat_was_running = True
-                    self.heartbeat_task.cancel()
-                    logger.warning(f"【{self.cookie_id}】已暂停心跳任务")
-
-                # 为整个Cookie刷新任务添加超时保护（3分钟，缩短时间减少影响）
-                success = await asyncio.wait_for(
-                    self._refresh_cookies_via_browser(),
-                    timeout=180.0  # 3分钟超时，减少对WebSocket的影响
-                )
+            # 先取得全局浏览器刷新名额再暂停心跳，排队期间连接不受影响，排队时间也不计入刷新超时
+            async with periodic_scheduler.slot('browser_refresh', self.cookie_id):
+                try:
+                    logger.info(f"【{self.cookie_id}】开始Cookie刷新任务，暂时暂停心跳以避免连接冲突...")
+
+                    # 暂时暂停心跳任务，避免与浏览器操作冲突
+                    heartbeat_was_running = False
+                    if self.heartbeat_task and not self.heartbeat_task.done():
+                        heartbeat_was_running = True
+                        self.heartbeat_task.cancel()
+                        logger.warning(f"【{self.cookie_id}】已暂停心跳任务")
+
+                    # 为整个Cookie刷新任务添加超时保护（3分钟，缩短时间减少影响）
+                    success = await asyncio.wait_for(
+                        self._refresh_cookies_via_browser(),
+                        timeout=180.0  # 3分钟超时，减少对WebSocket的影响
+                    )
 
-                # 重新启动心跳任务
-                if heartbeat_was_running and self.ws and not self.ws.closed:
-                    logger.warning(f"【{self.cookie_id}】重新启动心跳任务")
-                    self.heartbeat_task = asyncio.create_task(self.heartbeat_loop(self.ws))
+                    # 重新启动心跳任务
+                    if heartbeat_was_running and self.ws and not self.ws.closed:
+                        logger.warning(f"【{self.cookie_id}】重新启动心跳任务")
+                        self.heartbeat_task = asyncio.create_task(self.heartbeat_loop(self.ws))
 
-                if success:
-                    self.last_cookie_refresh_time = current_time
-                    logger.info(f"【{self.cookie_id}】Cookie刷新任务完成，心跳已恢复")
+                    if success:
+                        self.last_cookie_refresh_time = current_time
+                        logger.info(f"【{self.cookie_id}】Cookie刷新任务完成，心跳已恢复")
                     
-                    # 刷新成功后，验证Cookie有效性
-                    logger.info(f"【{self.cookie_id}】开始验证刷新后的Cookie有效性...")
-                    try:
-                        validation_result = await self._verify_cookie_validity()
+                        # 刷新成功后，验证Cookie有效性
+                        logger.info(f"【{self.cookie_id}】开始验证刷新后的Cookie有效性...")
+                        try:
+                            validation_result = await self._verify_cookie_validity()
                         
-                        if not validation_result['valid']:
-                            logger.warning(f"【{self.cookie_id}】❌ Cookie验证失败: {validation_result['details']}")
-                            logger.warning(f"【{self.cookie_id}】检测到Cookie可能无法用于关键API，尝试通过密码登录重新获取...")
+                            if not validation_result['valid']:
+                                logger.warning(f"【{self.cookie_id}】❌ Cookie验证失败: {validation_result['details']}")
+                                logger.warning(f"【{self.cookie_id}】检测到Cookie可能无法用于关键API，尝试通过密码登录重新获取...")
                             
-                            # 触发密码登录刷新
-                            password_refresh_success = await self._try_password_login_refresh("Cookie验证失败(关键API不可用)")
+                                # 触发密码登录刷新
+                                password_refresh_success = await self._try_password_login_refresh("Cookie验证失败(关键API不可用)")
                             
-                            if password_refresh_success:
-                                logger.info(f"【{self.cookie_id}】✅ 密码登录刷新成功，Cookie已更新")
+                                if password_refresh_success:
+                                    logger.info(f"【{self.cookie_id}】✅ 密码登录刷新成功，Cookie已更新")
+                                else:
+                                    logger.warning(f"【{self.cookie_id}】⚠️ 密码登录刷新失败，Cookie可能仍然无效")
+                                    # 发送通知
+                                    await self.send_token_refresh_notification(
+                                        f"Cookie验证失败且密码登录刷新也失败\n验证详情: {validation_result['details']}",
+                                        "cookie_validation_failed"
+                                    )
                             else:
-                                logger.warning(f"【{self.cookie_id}】⚠️ 密码登录刷新失败，Cookie可能仍然无效")
-                                # 发送通知
-                                await self.send_token_refresh_notification(
-                                    f"Cookie验证失败且密码登录刷新也失败\n验证详情: {validation_result['details']}",
-                                    "cookie_validation_failed"
-                                )
-                        else:
-                            logger.info(f"【{self.cookie_id}】✅ Cookie验证通过: {validation_result['details']}")
+                                logger.info(f"【{self.cookie_id}】✅ Cookie验证通过: {validation_result['details']}")
                             
-                    except Exception as verify_e:
-                        logger.error(f"【{self.cookie_id}】Cookie验证过程异常: {self._safe_str(verify_e)}")
-                        import traceback
-                        logger.error(f"【{self.cookie_id}】详细堆栈:\n{traceback.format_exc()}")
-                else:
-                    logger.warning(f"【{self.cookie_id}】Cookie刷新任务失败")
-                    # 即使失败也要更新时间，避免频繁重试
-                    self.last_cookie_refresh_time = current_time
+                        except Exception as verify_e:
+                            logger.error(f"【{self.cookie_id}】Cookie验证过程异常: {self._safe_str(verify_e)}")
+                            import traceback
+                            logger.error(f"【{self.cookie_id}】详细堆栈:\n{traceback.format_exc()}")
+                    else:
+                        logger.warning(f"【{self.cookie_id}】Cookie刷新任务失败")
+                        # 即使失败也要更新时间，避免频繁重试
+                        self.last_cookie_refresh_time = current_time
 
-            except asyncio.TimeoutError:
-                # 超时也要更新时间，避免频繁重试
-                self.last_cookie_refresh_time = current_time
-            except Exception as e:
-                logger.error(f"【{self.cookie_id}】执行Cookie刷新任务异常: {self._safe_str(e)}")
-                # 异常也要更新时间，避免频繁重试
-                self.last_cookie_refresh_time = current_time
-            finally:
-                # 确保心跳任务恢复（如果WebSocket仍然连接）
-                if (self.ws and not self.ws.closed and
-                    (not self.heartbeat_task or self.heartbeat_task.done())):
-                    logger.info(f"【{self.cookie_id}】Cookie刷新完成，心跳任务正常运行")
-                    self.heartbeat_task = asyncio.create_task(self.heartbeat_loop(self.ws))
+                except asyncio.TimeoutError:
+                    # 超时也要更新时间，避免频繁重试
+                    self.last_cookie_refresh_time = current_time
+                except Exception as e:
+                    logger.error(f"【{self.cookie_id}】执行Cookie刷新任务异常: {self._safe_str(e)}")
+                    # 异常也要更新时间，避免频繁重试
+                    self.last_cookie_refresh_time = current_time
+                finally:
+                    # 确保心跳任务恢复（如果WebSocket仍然连接）
+                    if (self.ws and not self.ws.closed and
+                        (not self.heartbeat_task or self.heartbeat_task.done())):
+                        logger.info(f"【{self.cookie_id}】Cookie刷新完成，心跳任务正常运行")
+                        self.heartbeat_task = asyncio.create_task(self.heartbeat_loop(self.ws))
 
-                # 清空消息接收标志，允许下次正常执行Cookie刷新
-                self.last_message_received_time = 0
-                logger.warning(f"【{self.cookie_id}】Cookie刷新完成，已清空消息接收标志")
+                    # 清空消息接收标志，允许下次正常执行Cookie刷新
+                    self.last_message_received_time = 0
+                    logger.warning(f"【{self.cookie_id}】Cookie刷新完成，已清空消息接收标志")
 
 
 
@@ -5550,14 +5506,12 @@ class XianyuLive:
         Returns:
             bool: 成功返回True，失败返回False
         """
-        playwright = None
-        browser = None
+        browser_lease = None
         target_cookie_id = cookie_id or self.cookie_id
         target_user_id = user_id or self.user_id
 
         try:
             import asyncio
-            from playwright.async_api import async_playwright
             from utils.xianyu_utils import trans_cookies
 
             logger.info(f"【{target_cookie_id}】开始使用扫码登录cookie获取真实cookie...")
@@ -5567,134 +5521,10 @@ class XianyuLive:
             qr_cookies_dict = trans_cookies(qr_cookies_str)
             logger.info(f"【{target_cookie_id}】扫码cookie字段数: {len(qr_cookies_dict)}")
 
-            # Docker环境下修复asyncio子进程问题
-            is_docker = os.getenv('DOCKER_ENV') or os.path.exists('/.dockerenv')
-
-            if is_docker:
-                logger.warning(f"【{target_cookie_id}】检测到Docker环境，应用asyncio修复")
-
-                # 创建一个完整的虚拟子进程监视器
-                class DummyChildWatcher:
-                    def __enter__(self):
-                        return self
-                    def __exit__(self, *args):
-                        pass
-                    def is_active(self):
-                        return True
-                    def add_child_handler(self, *args, **kwargs):
-                        pass
-                    def remove_child_handler(self, *args, **kwargs):
-                        pass
-                    def attach_loop(self, *args, **kwargs):
-                        pass
-                    def close(self):
-                        pass
-                    def __del__(self):
-                        pass
-
-                # 创建自定义事件循环策略
-                class DockerEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
-                    def get_child_watcher(self):
-                        return DummyChildWatcher()
-
-                # 临时设置策略
-                old_policy = asyncio.get_event_loop_policy()
-                asyncio.set_event_loop_policy(DockerEventLoopPolicy())
-
-                try:
-                    # 添加超时机制，避免无限等待
-                    playwright = await asyncio.wait_for(
-                        async_playwright().start(),
-                        timeout=30.0  # 30秒超时
-                    )
-                    logger.warning(f"【{target_cookie_id}】Docker环境下Playwright启动成功")
-                except asyncio.TimeoutError:
-                    logger.error(f"【{target_cookie_id}】Docker环境下Playwright启动超时")
-                    return False
-                finally:
-                    # 恢复原策略
-                    asyncio.set_event_loop_policy(old_policy)
-            else:
-                # 非Docker环境，正常启动（也添加超时保护）
-                try:
-                    playwright = await asyncio.wait_for(
-                        async_playwright().start(),
-                        timeout=30.0  # 30秒超时
-                    )
-                except asyncio.TimeoutError:
-                    logger.error(f"【{target_cookie_id}】Playwright启动超时")
-                    return False
-
-            # 启动浏览器（参照商品搜索的配置）
-            browser_args = [
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-renderer-backgrounding',
-                '--disable-features=TranslateUI',
-                '--disable-ipc-flooding-protection',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--disable-sync',
-                '--disable-translate',
-                '--hide-scrollbars',
-                '--mute-audio',
-                '--no-default-browser-check',
-                '--no-pings'
-            ]
-
-            # 在Docker环境中添加额外参数
-            if os.getenv('DOCKER_ENV'):
-                browser_args.extend([
-                    # '--single-process',  # 注释掉，避免多用户并发时的进程冲突和资源泄漏
-                    '--disable-background-networking',
-                    '--disable-client-side-phishing-detection',
-                    '--disable-hang-monitor',
-                    '--disable-popup-blocking',
-                    '--disable-prompt-on-repost',
-                    '--disable-web-resources',
-                    '--metrics-recording-only',
-                    '--safebrowsing-disable-auto-update',
-                    '--enable-automation',
-                    '--password-store=basic',
-                    '--use-mock-keychain'
-                ])
-
-            # 使用无头浏览器
-            browser = await playwright.chromium.launch(
-                headless=True,  # 改回无头模式
-                args=browser_args
-            )
-
-            # 创建浏览器上下文
-            context_options = {
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
-            }
-
-            # 使用标准窗口大小
-            context_options['viewport'] = {'width': 1920, 'height': 1080}
-
-            context = await browser.new_context(**context_options)
-
-            # 设置扫码登录获取的Cookie
-            cookies = []
-            for cookie_pair in qr_cookies_str.split('; '):
-                if '=' in cookie_pair:
-                    name, value = cookie_pair.split('=', 1)
-                    cookies.append({
-                        'name': name.strip(),
-                        'value': value.strip(),
-                        'domain': '.goofish.com',
-                        'path': '/'
-                    })
-
-            await context.add_cookies(cookies)
+            # 从共享浏览器池租用账号的浏览器上下文（Cookie已预先写入）
+            browser_lease = await browser_pool.acquire(target_cookie_id, qr_cookies_str)
+            context = browser_lease.context
+            cookies = parse_cookie_string(qr_cookies_str)
             logger.info(f"【{target_cookie_id}】已设置 {len(cookies)} 个扫码Cookie到浏览器")
 
             # 打印设置的扫码Cookie详情
@@ -5702,8 +5532,7 @@ class XianyuLive:
             for i, cookie in enumerate(cookies, 1):
                 logger.info(f"【{target_cookie_id}】{i:2d}. {cookie['name']}: {cookie['value'][:50]}{'...' if len(cookie['value']) > 50 else ''}")
 
-            # 创建页面
-            page = await context.new_page()
+            page = browser_lease.page
 
             # 等待页面准备
             await asyncio.sleep(0.1)
@@ -5854,16 +5683,16 @@ class XianyuLive:
                     logger.info(f"【{target_cookie_id}】{cookie_name}: [不存在]")
 
             # 保存真实Cookie到数据库
-            from db_manager import db_manager
+            from db_manager import async_db
             
             # 检查是否为新账号
-            existing_cookie = db_manager.get_cookie_details(target_cookie_id)
+            existing_cookie = await async_db.get_cookie_details(target_cookie_id)
             if existing_cookie:
                 # 现有账号，使用 update_cookie_account_info 避免覆盖其他字段（如 pause_duration, remark 等）
-                success = db_manager.update_cookie_account_info(target_cookie_id, cookie_value=real_cookies_str)
+                success = await async_db.update_cookie_account_info(target_cookie_id, cookie_value=real_cookies_str)
             else:
                 # 新账号，使用 save_cookie
-                success = db_manager.save_cookie(target_cookie_id, real_cookies_str, target_user_id)
+                success = await async_db.save_cookie(target_cookie_id, real_cookies_str, target_user_id)
 
             if success:
                 logger.info(f"【{target_cookie_id}】真实Cookie已成功保存到数据库")
@@ -5887,44 +5716,9 @@ class XianyuLive:
             logger.error(f"【{target_cookie_id}】使用扫码cookie获取真实cookie失败: {self._safe_str(e)}")
             return False
         finally:
-            # 确保资源清理
-            try:
-                # 先关闭浏览器，再关闭Playwright（顺序很重要）
-                if browser:
-                    try:
-                        await asyncio.wait_for(browser.close(), timeout=5.0)
-                        logger.warning(f"【{target_cookie_id}】浏览器关闭完成")
-                    except asyncio.TimeoutError:
-                        logger.warning(f"【{target_cookie_id}】浏览器关闭超时（5秒），资源可能未完全释放")
-                        # 尝试取消浏览器相关的任务
-                        try:
-                            if hasattr(browser, '_connection'):
-                                browser._connection = None
-                        except:
-                            pass
-                    except Exception as e:
-                        logger.warning(f"【{target_cookie_id}】关闭浏览器时出错: {self._safe_str(e)}")
-                
-                # Playwright关闭：使用更短的超时，超时后立即放弃
-                if playwright:
-                    try:
-                        logger.warning(f"【{target_cookie_id}】正在关闭Playwright...")
-                        await asyncio.wait_for(playwright.stop(), timeout=2.0)
-                        logger.warning(f"【{target_cookie_id}】Playwright关闭完成")
-                    except asyncio.TimeoutError:
-                        logger.warning(f"【{target_cookie_id}】Playwright关闭超时（2秒），进程可能仍在运行")
-                        logger.warning(f"【{target_cookie_id}】提示：如果后续Playwright启动失败，可能需要手动清理残留进程")
-                        # 尝试清理Playwright的内部状态
-                        try:
-                            # 取消可能正在运行的Playwright任务
-                            if hasattr(playwright, '_transport'):
-                                playwright._transport = None
-                        except:
-                            pass
-                    except Exception as e:
-                        logger.warning(f"【{target_cookie_id}】关闭Playwright时出错: {self._safe_str(e)}")
-            except Exception as cleanup_e:
-                logger.warning(f"【{target_cookie_id}】清理浏览器资源时出错: {self._safe_str(cleanup_e)}")
+            # 归还浏览器租用，上下文保留在池中供后续复用
+            if browser_lease:
+                await browser_lease.release()
 
     async def _refresh_cookies_via_browser_page(self, current_cookies_str: str):
         """使用当前cookie访问指定页面获取真实cookie并更新
@@ -5938,12 +5732,10 @@ class XianyuLive:
         Returns:
             bool: 成功返回True，失败返回False
         """
-        playwright = None
-        browser = None
+        browser_lease = None
 
         try:
             import asyncio
-            from playwright.async_api import async_playwright
             from utils.xianyu_utils import trans_cookies
 
             logger.info(f"【{self.cookie_id}】开始使用当前cookie访问指定页面获取真实cookie...")
@@ -5953,137 +5745,13 @@ class XianyuLive:
             current_cookies_dict = trans_cookies(current_cookies_str)
             logger.info(f"【{self.cookie_id}】当前cookie字段数: {len(current_cookies_dict)}")
 
-            # Docker环境下修复asyncio子进程问题
-            is_docker = os.getenv('DOCKER_ENV') or os.path.exists('/.dockerenv')
-
-            if is_docker:
-                logger.warning(f"【{self.cookie_id}】检测到Docker环境，应用asyncio修复")
-
-                # 创建一个完整的虚拟子进程监视器
-                class DummyChildWatcher:
-                    def __enter__(self):
-                        return self
-                    def __exit__(self, *args):
-                        pass
-                    def is_active(self):
-                        return True
-                    def add_child_handler(self, *args, **kwargs):
-                        pass
-                    def remove_child_handler(self, *args, **kwargs):
-                        pass
-                    def attach_loop(self, *args, **kwargs):
-                        pass
-                    def close(self):
-                        pass
-                    def __del__(self):
-                        pass
-
-                # 创建自定义事件循环策略
-                class DockerEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
-                    def get_child_watcher(self):
-                        return DummyChildWatcher()
-
-                # 临时设置策略
-                old_policy = asyncio.get_event_loop_policy()
-                asyncio.set_event_loop_policy(DockerEventLoopPolicy())
-
-                try:
-                    # 添加超时机制，避免无限等待
-                    playwright = await asyncio.wait_for(
-                        async_playwright().start(),
-                        timeout=30.0  # 30秒超时
-                    )
-                    logger.warning(f"【{self.cookie_id}】Docker环境下Playwright启动成功")
-                except asyncio.TimeoutError:
-                    logger.error(f"【{self.cookie_id}】Docker环境下Playwright启动超时")
-                    return False
-                finally:
-                    # 恢复原策略
-                    asyncio.set_event_loop_policy(old_policy)
-            else:
-                # 非Docker环境，正常启动（也添加超时保护）
-                try:
-                    playwright = await asyncio.wait_for(
-                        async_playwright().start(),
-                        timeout=30.0  # 30秒超时
-                    )
-                except asyncio.TimeoutError:
-                    logger.error(f"【{self.cookie_id}】Playwright启动超时")
-                    return False
-
-            # 启动浏览器（参照商品搜索的配置）
-            browser_args = [
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-renderer-backgrounding',
-                '--disable-features=TranslateUI',
-                '--disable-ipc-flooding-protection',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--disable-sync',
-                '--disable-translate',
-                '--hide-scrollbars',
-                '--mute-audio',
-                '--no-default-browser-check',
-                '--no-pings'
-            ]
-
-            # 在Docker环境中添加额外参数
-            if os.getenv('DOCKER_ENV'):
-                browser_args.extend([
-                    '--disable-background-networking',
-                    '--disable-client-side-phishing-detection',
-                    '--disable-hang-monitor',
-                    '--disable-popup-blocking',
-                    '--disable-prompt-on-repost',
-                    '--disable-web-resources',
-                    '--metrics-recording-only',
-                    '--safebrowsing-disable-auto-update',
-                    '--enable-automation',
-                    '--password-store=basic',
-                    '--use-mock-keychain'
-                ])
-
-            # 使用无头浏览器
-            browser = await playwright.chromium.launch(
-                headless=True,
-                args=browser_args
-            )
-
-            # 创建浏览器上下文
-            context_options = {
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
-            }
-
-            # 使用标准窗口大小
-            context_options['viewport'] = {'width': 1920, 'height': 1080}
-
-            context = await browser.new_context(**context_options)
-
-            # 设置当前的Cookie
-            cookies = []
-            for cookie_pair in current_cookies_str.split('; '):
-                if '=' in cookie_pair:
-                    name, value = cookie_pair.split('=', 1)
-                    cookies.append({
-                        'name': name.strip(),
-                        'value': value.strip(),
-                        'domain': '.goofish.com',
-                        'path': '/'
-                    })
-
-            await context.add_cookies(cookies)
+            # 从共享浏览器池租用账号的浏览器上下文（Cookie已预先写入）
+            browser_lease = await browser_pool.acquire(self.cookie_id, current_cookies_str)
+            context = browser_lease.context
+            cookies = parse_cookie_string(current_cookies_str)
             logger.info(f"【{self.cookie_id}】已设置 {len(cookies)} 个当前Cookie到浏览器")
 
-            # 创建页面
-            page = await context.new_page()
+            page = browser_lease.page
 
             # 等待页面准备
             await asyncio.sleep(0.1)
@@ -6187,30 +5855,9 @@ class XianyuLive:
             logger.error(f"【{self.cookie_id}】使用当前cookie访问指定页面获取真实cookie失败: {self._safe_str(e)}")
             return False
         finally:
-            # 确保资源清理
-            try:
-                # 先关闭浏览器，再关闭Playwright（顺序很重要）
-                if browser:
-                    try:
-                        await asyncio.wait_for(browser.close(), timeout=5.0)
-                        logger.warning(f"【{self.cookie_id}】浏览器关闭完成")
-                    except asyncio.TimeoutError:
-                        logger.warning(f"【{self.cookie_id}】浏览器关闭超时（5秒），资源可能未完全释放")
-                    except Exception as e:
-                        logger.warning(f"【{self.cookie_id}】关闭浏览器时出错: {self._safe_str(e)}")
-                
-                # Playwright关闭：使用更短的超时，超时后立即放弃
-                if playwright:
-                    try:
-                        logger.warning(f"【{self.cookie_id}】正在关闭Playwright...")
-                        await asyncio.wait_for(playwright.stop(), timeout=2.0)
-                        logger.warning(f"【{self.cookie_id}】Playwright关闭完成")
-                    except asyncio.TimeoutError:
-                        logger.warning(f"【{self.cookie_id}】Playwright关闭超时（2秒），进程可能仍在运行")
-                    except Exception as e:
-                        logger.warning(f"【{self.cookie_id}】关闭Playwright时出错: {self._safe_str(e)}")
-            except Exception as cleanup_e:
-                logger.warning(f"【{self.cookie_id}】清理浏览器资源时出错: {self._safe_str(cleanup_e)}")
+            # 归还浏览器租用，上下文保留在池中供后续复用
+            if browser_lease:
+                await browser_lease.release()
 
     def reset_qr_cookie_refresh_flag(self):
         """重置扫码登录Cookie刷新标志，允许立即执行_refresh_cookies_via_browser"""
@@ -6225,6 +5872,15 @@ class XianyuLive:
         return int(remaining_time)
 
     async def _refresh_cookies_via_browser(self, triggered_by_refresh_token: bool = False):
+        """通过浏览器刷新Cookie（占用全局浏览器刷新名额）
+
+        Args:
+            triggered_by_refresh_token: 是否由refresh_token方法触发，如果是True则设置browser_cookie_refreshed标志
+        """
+        async with periodic_scheduler.slot('browser_refresh', self.cookie_id):
+            return await self._refresh_cookies_via_browser_impl(triggered_by_refresh_token)
+
+    async def _refresh_cookies_via_browser_impl(self, triggered_by_refresh_token: bool = False):
         """通过浏览器访问指定页面刷新Cookie
 
         Args:
@@ -6232,11 +5888,9 @@ class XianyuLive:
         """
 
 
-        playwright = None
-        browser = None
+        browser_lease = None
         try:
             import asyncio
-            from playwright.async_api import async_playwright
 
             # 检查是否需要等待扫码登录Cookie刷新的冷却时间
             current_time = time.time()
@@ -6255,138 +5909,13 @@ class XianyuLive:
             logger.info(f"【{self.cookie_id}】刷新前Cookie长度: {len(self.cookies_str)}")
             logger.info(f"【{self.cookie_id}】刷新前Cookie字段数: {len(self.cookies)}")
 
-            # Docker环境下修复asyncio子进程问题
-            is_docker = os.getenv('DOCKER_ENV') or os.path.exists('/.dockerenv')
-
-            if is_docker:
-                logger.warning(f"【{self.cookie_id}】检测到Docker环境，应用asyncio修复")
-
-                # 创建一个完整的虚拟子进程监视器
-                class DummyChildWatcher:
-                    def __enter__(self):
-                        return self
-                    def __exit__(self, *args):
-                        pass
-                    def is_active(self):
-                        return True
-                    def add_child_handler(self, *args, **kwargs):
-                        pass
-                    def remove_child_handler(self, *args, **kwargs):
-                        pass
-                    def attach_loop(self, *args, **kwargs):
-                        pass
-                    def close(self):
-                        pass
-                    def __del__(self):
-                        pass
-
-                # 创建自定义事件循环策略
-                class DockerEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
-                    def get_child_watcher(self):
-                        return DummyChildWatcher()
-
-                # 临时设置策略
-                old_policy = asyncio.get_event_loop_policy()
-                asyncio.set_event_loop_policy(DockerEventLoopPolicy())
-
-                try:
-                    # 添加超时机制，避免无限等待
-                    playwright = await asyncio.wait_for(
-                        async_playwright().start(),
-                        timeout=30.0  # 30秒超时
-                    )
-                    logger.warning(f"【{self.cookie_id}】Docker环境下Playwright启动成功")
-                except asyncio.TimeoutError:
-                    logger.error(f"【{self.cookie_id}】Docker环境下Playwright启动超时")
-                    return False
-                finally:
-                    # 恢复原策略
-                    asyncio.set_event_loop_policy(old_policy)
-            else:
-                # 非Docker环境，正常启动（也添加超时保护）
-                try:
-                    playwright = await asyncio.wait_for(
-                        async_playwright().start(),
-                        timeout=30.0  # 30秒超时
-                    )
-                except asyncio.TimeoutError:
-                    logger.error(f"【{self.cookie_id}】Playwright启动超时")
-                    return False
-
-            # 启动浏览器（参照商品搜索的配置）
-            browser_args = [
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-accelerated-2d-canvas',
-                '--no-first-run',
-                '--no-zygote',
-                '--disable-gpu',
-                '--disable-background-timer-throttling',
-                '--disable-backgrounding-occluded-windows',
-                '--disable-renderer-backgrounding',
-                '--disable-features=TranslateUI',
-                '--disable-ipc-flooding-protection',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--disable-sync',
-                '--disable-translate',
-                '--hide-scrollbars',
-                '--mute-audio',
-                '--no-default-browser-check',
-                '--no-pings'
-            ]
-
-            # 在Docker环境中添加额外参数
-            if os.getenv('DOCKER_ENV'):
-                browser_args.extend([
-                    # '--single-process',  # 注释掉，避免多用户并发时的进程冲突和资源泄漏
-                    '--disable-background-networking',
-                    '--disable-client-side-phishing-detection',
-                    '--disable-hang-monitor',
-                    '--disable-popup-blocking',
-                    '--disable-prompt-on-repost',
-                    '--disable-web-resources',
-                    '--metrics-recording-only',
-                    '--safebrowsing-disable-auto-update',
-                    '--enable-automation',
-                    '--password-store=basic',
-                    '--use-mock-keychain'
-                ])
-
-            # Cookie刷新模式使用无头浏览器
-            browser = await playwright.chromium.launch(
-                headless=True,
-                args=browser_args
-            )
-
-            # 创建浏览器上下文
-            context_options = {
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
-            }
-
-            # 使用标准窗口大小
-            context_options['viewport'] = {'width': 1920, 'height': 1080}
-
-            context = await browser.new_context(**context_options)
-
-            # 设置当前Cookie
-            cookies = []
-            for cookie_pair in self.cookies_str.split('; '):
-                if '=' in cookie_pair:
-                    name, value = cookie_pair.split('=', 1)
-                    cookies.append({
-                        'name': name.strip(),
-                        'value': value.strip(),
-                        'domain': '.goofish.com',
-                        'path': '/'
-                    })
-
-            await context.add_cookies(cookies)
+            # 从共享浏览器池租用账号的浏览器上下文（Cookie已预先写入）
+            browser_lease = await browser_pool.acquire(self.cookie_id, self.cookies_str)
+            context = browser_lease.context
+            cookies = parse_cookie_string(self.cookies_str)
             logger.info(f"【{self.cookie_id}】已设置 {len(cookies)} 个Cookie到浏览器")
 
-            # 创建页面
-            page = await context.new_page()
+            page = browser_lease.page
 
             # 等待页面准备
             await asyncio.sleep(0.1)
@@ -6537,145 +6066,9 @@ class XianyuLive:
             logger.error(f"【{self.cookie_id}】通过浏览器刷新Cookie失败: {self._safe_str(e)}")
             return False
         finally:
-            # 异步关闭浏览器：创建清理任务并等待完成，确保资源正确释放
-            close_task = None
-            try:
-                if browser or playwright:
-                    # 创建关闭任务
-                    close_task = asyncio.create_task(
-                        self._async_close_browser(browser, playwright)
-                    )
-                    logger.info(f"【{self.cookie_id}】浏览器异步关闭任务已启动")
-                    
-                    # 等待关闭任务完成，但设置超时避免阻塞太久
-                    try:
-                        await asyncio.wait_for(close_task, timeout=15.0)
-                        logger.info(f"【{self.cookie_id}】浏览器关闭任务已完成")
-                    except asyncio.TimeoutError:
-                        logger.warning(f"【{self.cookie_id}】浏览器关闭任务超时（15秒），强制继续")
-                        # 取消任务，避免资源泄漏
-                        if not close_task.done():
-                            close_task.cancel()
-                            try:
-                                await close_task
-                            except (asyncio.CancelledError, Exception):
-                                pass
-                    except Exception as wait_e:
-                        logger.warning(f"【{self.cookie_id}】等待浏览器关闭任务时出错: {self._safe_str(wait_e)}")
-                        # 确保任务被取消
-                        if close_task and not close_task.done():
-                            close_task.cancel()
-                            try:
-                                await close_task
-                            except (asyncio.CancelledError, Exception):
-                                pass
-            except Exception as cleanup_e:
-                logger.warning(f"【{self.cookie_id}】创建浏览器关闭任务时出错: {self._safe_str(cleanup_e)}")
-                # 如果创建任务失败，尝试直接关闭
-                if browser or playwright:
-                    try:
-                        await self._force_close_resources(browser, playwright)
-                    except Exception:
-                        pass
-
-    async def _async_close_browser(self, browser, playwright):
-        """异步关闭：正常关闭，超时后强制关闭"""
-        try:
-            logger.info(f"【{self.cookie_id}】开始异步关闭浏览器...")  # 改为info级别
-            
-            # 正常关闭，设置超时
-            await asyncio.wait_for(
-                self._normal_close_resources(browser, playwright),
-                timeout=10.0
-            )
-            logger.info(f"【{self.cookie_id}】浏览器正常关闭完成")  # 改为info级别
-            
-        except asyncio.TimeoutError:
-            logger.warning(f"【{self.cookie_id}】正常关闭超时，开始强制关闭...")
-            await self._force_close_resources(browser, playwright)
-            
-        except Exception as e:
-            logger.warning(f"【{self.cookie_id}】异步关闭时出错，强制关闭: {self._safe_str(e)}")
-            await self._force_close_resources(browser, playwright)
-
-    async def _normal_close_resources(self, browser, playwright):
-        """正常关闭资源：浏览器+Playwright短超时关闭"""
-        try:
-            # 先关闭浏览器，再关闭Playwright
-            if browser:
-                try:
-                    # 关闭浏览器，设置超时
-                    await asyncio.wait_for(browser.close(), timeout=5.0)
-                    logger.info(f"【{self.cookie_id}】浏览器关闭完成")
-                except asyncio.TimeoutError:
-                    logger.warning(f"【{self.cookie_id}】浏览器关闭超时，尝试强制关闭")
-                    try:
-                        # 尝试强制关闭
-                        if hasattr(browser, '_connection'):
-                            browser._connection.dispose()
-                    except Exception:
-                        pass
-                except Exception as e:
-                    logger.warning(f"【{self.cookie_id}】关闭浏览器时出错: {e}")
-            
-            # 关闭Playwright：使用短超时，如果超时就放弃
-            if playwright:
-                try:
-                    logger.info(f"【{self.cookie_id}】正在关闭Playwright...")
-                    # 增加超时时间，确保Playwright有足够时间清理资源
-                    await asyncio.wait_for(playwright.stop(), timeout=5.0)
-                    logger.info(f"【{self.cookie_id}】Playwright关闭完成")
-                except asyncio.TimeoutError:
-                    logger.warning(f"【{self.cookie_id}】Playwright关闭超时，将自动清理")
-                    # 尝试强制清理Playwright的内部连接
-                    try:
-                        if hasattr(playwright, '_connection'):
-                            playwright._connection.dispose()
-                    except Exception:
-                        pass
-                except Exception as e:
-                    logger.warning(f"【{self.cookie_id}】关闭Playwright时出错: {e}")
-                
-        except Exception as e:
-            logger.error(f"【{self.cookie_id}】正常关闭时出现异常: {e}")
-            raise
-
-    
-    async def _force_close_resources(self, browser, playwright):
-        """强制关闭资源：强制关闭浏览器+Playwright超时等待"""
-        try:
-            logger.warning(f"【{self.cookie_id}】开始强制关闭资源...")
-            
-            # 强制关闭浏览器+Playwright，设置短超时
-            force_tasks = []
-            if browser:
-                force_tasks.append(asyncio.wait_for(browser.close(), timeout=3.0))
-            if playwright:
-                force_tasks.append(asyncio.wait_for(playwright.stop(), timeout=3.0))
-            
-            if force_tasks:
-                # 使用gather执行，所有失败都会被忽略
-                results = await asyncio.gather(*force_tasks, return_exceptions=True)
-                
-                # 检查是否有超时或异常，尝试强制清理
-                for i, result in enumerate(results):
-                    if isinstance(result, (asyncio.TimeoutError, Exception)):
-                        resource_name = "浏览器" if i == 0 and browser else "Playwright"
-                        logger.warning(f"【{self.cookie_id}】{resource_name}强制关闭失败，尝试直接清理连接")
-                        try:
-                            if i == 0 and browser and hasattr(browser, '_connection'):
-                                browser._connection.dispose()
-                            elif playwright and hasattr(playwright, '_connection'):
-                                playwright._connection.dispose()
-                        except Exception:
-                            pass
-                
-                logger.info(f"【{self.cookie_id}】强制关闭完成")
-            else:
-                logger.info(f"【{self.cookie_id}】没有需要强制关闭的资源")
-            
-        except Exception as e:
-            logger.warning(f"【{self.cookie_id}】强制关闭时出现异常（已忽略）: {e}")
+            # 归还浏览器租用，上下文保留在池中供后续复用
+            if browser_lease:
+                await browser_lease.release()
 
     async def send_msg_once(self, toid, item_id, text):
         headers = {
@@ -6863,17 +6256,47 @@ class XianyuLive:
             logger.error(f"调用API出错: {self._safe_str(e)}")
             return None
 
-    async def _handle_message_with_semaphore(self, message_data, websocket):
-        """带信号量的消息处理包装器，防止并发任务过多"""
-        async with self.message_semaphore:
-            self.active_message_tasks += 1
-            try:
-                await self.handle_message(message_data, websocket)
-            finally:
-                self.active_message_tasks -= 1
-                # 定期记录活跃任务数（每100个任务记录一次）
-                if self.active_message_tasks % 100 == 0 and self.active_message_tasks > 0:
-                    logger.info(f"【{self.cookie_id}】当前活跃消息处理任务数: {self.active_message_tasks}")
+    def _ingress_routing(self, message_data):
+        """预解码同步包消息，返回 (会话键, 解码后的消息, 是否受保护)
+
+        会话键用于入口队列分道，保证同一会话的消息按顺序处理；解码结果随消息传给 handle_message，避免重复解密。
+        非同步包或无法解密（如未加密的系统消息）时返回 (None, None, True)，由 handle_message 按原逻辑处理。
+        只有普通买家聊天消息不受保护，订单/系统消息（如「我已付款，等待你发货」）在队列积压时不会被丢弃。
+        """
+        if not self.is_sync_package(message_data):
+            return None, None, True
+        try:
+            data = message_data["body"]["syncPushPackage"]["data"][0].get("data")
+            if not data:
+                return None, None, True
+            message = decrypt_to_dict(data)
+        except Exception:
+            return None, None, True
+
+        chat_key = None
+        message_1 = message.get("1") if isinstance(message, dict) else None
+        if isinstance(message_1, dict):
+            chat_id_raw = message_1.get("2")
+            if isinstance(chat_id_raw, str) and chat_id_raw:
+                chat_key = chat_id_raw.split('@')[0]
+        return chat_key, message, self._is_protected_message(message)
+
+    def _is_protected_message(self, message) -> bool:
+        """判断解码后的消息是否为订单/系统消息（入口队列积压时不丢弃）"""
+        if not self.is_chat_message(message):
+            return True
+        if isinstance(message.get("3"), dict) and message["3"].get("redReminder"):
+            return True
+        content = message["1"]["10"].get("reminderContent", "")
+        if not isinstance(content, str):
+            return True
+        # 系统消息与卡片消息的内容为「[...]」格式，如 [我已付款，等待你发货]、[卡片消息]
+        return content.startswith('[') or self._is_auto_delivery_trigger(content)
+
+    async def _process_ingress_item(self, item):
+        """入口队列的消息处理函数"""
+        message_data, websocket, decoded_message = item
+        await self.handle_message(message_data, websocket, decoded_message)
 
     def _extract_message_id(self, message_data: dict) -> str:
         """
@@ -6952,119 +6375,42 @@ class XianyuLive:
                 # 如果提取失败，使用当前时间戳
                 message_id = f"{chat_id}_{send_message}_{int(time.time() * 1000)}"
         
-        async with self.processed_message_ids_lock:
-            current_time = time.time()
-            
-            # 检查消息是否已处理且未过期
-            if message_id in self.processed_message_ids:
-                last_process_time = self.processed_message_ids[message_id]
-                time_elapsed = current_time - last_process_time
-                
-                # 如果消息处理时间未超过1小时，跳过
-                if time_elapsed < self.message_expire_time:
-                    remaining_time = int(self.message_expire_time - time_elapsed)
-                    logger.warning(f"【{self.cookie_id}】消息ID {message_id[:50]}... 已处理过，距离可重复回复还需 {remaining_time} 秒")
-                    return
-                else:
-                    # 超过1小时，可以重新处理
-                    logger.info(f"【{self.cookie_id}】消息ID {message_id[:50]}... 已超过 {int(time_elapsed/60)} 分钟，允许重新回复")
-            
-            # 标记消息ID为已处理（更新或添加时间戳）
-            self.processed_message_ids[message_id] = current_time
-            
-            # 定期清理过期的消息ID
-            if len(self.processed_message_ids) > self.processed_message_ids_max_size:
-                # 清理超过1小时的旧记录
-                expired_ids = [
-                    msg_id for msg_id, timestamp in self.processed_message_ids.items()
-                    if current_time - timestamp > self.message_expire_time
-                ]
-                
-                for msg_id in expired_ids:
-                    del self.processed_message_ids[msg_id]
-                
-                logger.info(f"【{self.cookie_id}】已清理 {len(expired_ids)} 个过期消息ID")
-                
-                # 如果清理后仍然过大，删除最旧的一半
-                if len(self.processed_message_ids) > self.processed_message_ids_max_size:
-                    sorted_ids = sorted(self.processed_message_ids.items(), key=lambda x: x[1])
-                    remove_count = len(sorted_ids) // 2
-                    for msg_id, _ in sorted_ids[:remove_count]:
-                        del self.processed_message_ids[msg_id]
-                    logger.info(f"【{self.cookie_id}】消息ID去重字典过大，已清理 {remove_count} 个最旧记录")
+        current_time = time.time()
         
-        async with self.message_debounce_lock:
-            # 如果该chat_id已有防抖任务，取消它
-            if chat_id in self.message_debounce_tasks:
-                old_task = self.message_debounce_tasks[chat_id].get('task')
-                if old_task and not old_task.done():
-                    old_task.cancel()
-                    logger.warning(f"【{self.cookie_id}】取消chat_id {chat_id} 的旧防抖任务")
-            
-            # 更新最后一条消息信息
-            current_timer = time.time()
-            self.message_debounce_tasks[chat_id] = {
-                'last_message': {
-                    'message_data': message_data,
-                    'websocket': websocket,
-                    'send_user_name': send_user_name,
-                    'send_user_id': send_user_id,
-                    'send_message': send_message,
-                    'item_id': item_id,
-                    'msg_time': msg_time
-                },
-                'timer': current_timer
-            }
-            
-            # 创建新的防抖任务
-            async def debounce_task():
-                saved_timer = current_timer  # 保存创建任务时的时间戳
-                try:
-                    # 等待防抖延迟时间
-                    await asyncio.sleep(self.message_debounce_delay)
-                    
-                    # 检查是否仍然是最新的消息（防止在等待期间有新消息）
-                    async with self.message_debounce_lock:
-                        if chat_id not in self.message_debounce_tasks:
-                            return
-                        
-                        debounce_info = self.message_debounce_tasks[chat_id]
-                        # 检查时间戳是否匹配（确保这是最新的消息）
-                        if saved_timer != debounce_info['timer']:
-                            logger.warning(f"【{self.cookie_id}】chat_id {chat_id} 在防抖期间有新消息，跳过旧消息处理")
-                            return
-                        
-                        # 获取最后一条消息
-                        last_msg = debounce_info['last_message']
-                        
-                        # 从防抖任务中移除
-                        del self.message_debounce_tasks[chat_id]
-                    
-                    # 处理最后一条消息
-                    logger.info(f"【{self.cookie_id}】防抖延迟结束，开始处理chat_id {chat_id} 的最后一条消息: {last_msg['send_message'][:30]}...")
-                    await self._process_chat_message_reply(
-                        last_msg['message_data'],
-                        last_msg['websocket'],
-                        last_msg['send_user_name'],
-                        last_msg['send_user_id'],
-                        last_msg['send_message'],
-                        last_msg['item_id'],
-                        chat_id,
-                        last_msg['msg_time']
-                    )
-                    
-                except asyncio.CancelledError:
-                    logger.warning(f"【{self.cookie_id}】chat_id {chat_id} 的防抖任务被取消")
-                except Exception as e:
-                    logger.error(f"【{self.cookie_id}】处理防抖回复时发生错误: {self._safe_str(e)}")
-                    # 确保从防抖任务中移除
-                    async with self.message_debounce_lock:
-                        if chat_id in self.message_debounce_tasks:
-                            del self.message_debounce_tasks[chat_id]
-            
-            task = self._create_tracked_task(debounce_task())
-            self.message_debounce_tasks[chat_id]['task'] = task
-            logger.warning(f"【{self.cookie_id}】为chat_id {chat_id} 创建防抖任务，延迟 {self.message_debounce_delay} 秒")
+        # 检查消息是否已处理且未过期
+        last_process_time = self.message_dedup.seen_at(message_id)
+        if last_process_time is not None:
+            remaining_time = int(self.message_dedup.ttl - (current_time - last_process_time))
+            logger.warning(f"【{self.cookie_id}】消息ID {message_id[:50]}... 已处理过，距离可重复回复还需 {remaining_time} 秒")
+            return
+
+        # 标记消息ID为已处理
+        self.message_dedup.mark(message_id, current_time)
+
+        # 投递到会话执行器：防抖窗口内的连续消息只回复最后一条，同一会话的回复按顺序执行
+        self.chat_executor.submit(chat_id, {
+            'message_data': message_data,
+            'websocket': websocket,
+            'send_user_name': send_user_name,
+            'send_user_id': send_user_id,
+            'send_message': send_message,
+            'item_id': item_id,
+            'msg_time': msg_time
+        })
+
+    async def _process_debounced_reply(self, chat_id: str, last_msg: dict):
+        """会话执行器的处理函数：防抖窗口结束后回复会话的最后一条消息"""
+        logger.info(f"【{self.cookie_id}】防抖延迟结束，开始处理chat_id {chat_id} 的最后一条消息: {last_msg['send_message'][:30]}...")
+        await self._process_chat_message_reply(
+            last_msg['message_data'],
+            last_msg['websocket'],
+            last_msg['send_user_name'],
+            last_msg['send_user_id'],
+            last_msg['send_message'],
+            last_msg['item_id'],
+            chat_id,
+            last_msg['msg_time']
+        )
 
     async def _process_chat_message_reply(self, message_data: dict, websocket, send_user_name: str,
                                          send_user_id: str, send_message: str, item_id: str,
@@ -7170,8 +6516,12 @@ class XianyuLive:
         except Exception as e:
             logger.error(f"处理聊天消息回复时发生错误: {self._safe_str(e)}")
 
-    async def handle_message(self, message_data, websocket):
-        """处理所有类型的消息"""
+    async def handle_message(self, message_data, websocket, decoded_message=None):
+        """处理所有类型的消息
+
+        Args:
+            decoded_message: 入口队列已解密的消息（可选），提供时跳过重复解密
+        """
         try:
             # 检查账号是否启用
             from cookie_manager import manager as cookie_manager
@@ -7195,7 +6545,7 @@ class XianyuLive:
                     ack["headers"]["ua"] = message["headers"]["ua"]
                 if 'dt' in message["headers"]:
                     ack["headers"]["dt"] = message["headers"]["dt"]
-                await websocket.send(json.dumps(ack))
+                self.outbound_queue.send_nowait(websocket, json.dumps(ack))
             except Exception as e:
                 pass
 
@@ -7237,9 +6587,8 @@ class XianyuLive:
                         # 如果不是系统消息，将解析的数据作为message
                         message = parsed_data
                 except Exception as e:
-                    # 如果JSON解析失败，尝试解密
-                    decrypted_data = decrypt(data)
-                    message = json.loads(decrypted_data)
+                    # 如果JSON解析失败，尝试解密（直接解码为字典，无需JSON往返）
+                    message = decoded_message if decoded_message is not None else decrypt_to_dict(data)
             except Exception as e:
                 logger.error(f"消息解密失败: {self._safe_str(e)}")
                 return
@@ -7314,12 +6663,9 @@ class XianyuLive:
                         except:
                             pass
 
-                        # 调用订单详情获取方法
-                        order_detail = await self.fetch_order_detail_info(order_id, temp_item_id, temp_user_id)
-                        if order_detail:
-                            logger.info(f'[{msg_time}] 【{self.cookie_id}】✅ 订单详情获取成功: {order_id}')
-                        else:
-                            logger.warning(f'[{msg_time}] 【{self.cookie_id}】⚠️ 订单详情获取失败: {order_id}')
+                        # 提交到订单详情补全队列，后台拉取，不阻塞后续消息处理
+                        self.order_enrichment.submit(order_id, temp_item_id, temp_user_id)
+                        logger.info(f'[{msg_time}] 【{self.cookie_id}】订单详情已提交后台获取: {order_id}')
 
                     except Exception as detail_e:
                         logger.error(f'[{msg_time}] 【{self.cookie_id}】❌ 获取订单详情异常: {self._safe_str(detail_e)}')
@@ -7432,7 +6778,7 @@ class XianyuLive:
                 logger.info(f"[{msg_time}] 【手动发出】 商品({item_id}): {send_message}")
 
                 # 暂停该chat_id的自动回复10分钟
-                pause_manager.pause_chat(chat_id, self.cookie_id)
+                await pause_manager.pause_chat(chat_id, self.cookie_id)
 
                 return
             else:
@@ -7567,8 +6913,8 @@ class XianyuLive:
                         # 检查商品是否属于当前cookies
                         if item_id and item_id != "未知商品":
                             try:
-                                from db_manager import db_manager
-                                item_info = db_manager.get_item_info(self.cookie_id, item_id)
+                                from db_manager import async_db
+                                item_info = await async_db.get_item_info(self.cookie_id, item_id)
                                 if not item_info:
                                     logger.warning(f'[{msg_time}] 【{self.cookie_id}】❌ 商品 {item_id} 不属于当前账号，跳过免拼发货')
                                     return
@@ -7625,6 +6971,7 @@ class XianyuLive:
         try:
             logger.info(f"【{self.cookie_id}】开始启动XianyuLive主程序...")
             await self.create_session()  # 创建session
+            await self.message_dedup.load()  # 加载重启前已处理的消息ID
             logger.info(f"【{self.cookie_id}】Session创建完成，开始WebSocket连接循环...")
 
             while True:
@@ -7706,15 +7053,23 @@ class XianyuLive:
                                 logger.info(f"【{self.cookie_id}】收到WebSocket消息: {len(message) if message else 0} 字节")
                                 try:
                                     message_data = json.loads(message)
+                                    if self.frame_recorder is not None:
+                                        self.frame_recorder.record(message_data)
+
+                                    # 使用缓存Token时校验注册响应
+                                    if self._pending_reg_mid is not None and \
+                                            await self._check_registration_response(message_data, websocket):
+                                        continue
 
                                     # 处理心跳响应
                                     if await self.handle_heartbeat_response(message_data):
                                         continue
 
                                     # 处理其他消息
-                                    # 使用追踪的异步任务处理消息，防止阻塞后续消息接收
-                                    # 并通过信号量控制并发数量，防止内存泄漏
-                                    self._create_tracked_task(self._handle_message_with_semaphore(message_data, websocket))
+                                    # 放入有界入口队列，由固定工作协程处理，不阻塞后续消息接收（队列满时按溢出策略处理）
+                                    chat_key, decoded_message, protected = self._ingress_routing(message_data)
+                                    await self.ingress_queue.put(chat_key, (message_data, websocket, decoded_message),
+                                                                 protected=protected)
 
                                 except Exception as e:
                                     logger.error(f"处理消息出错: {self._safe_str(e)}")
@@ -7832,6 +7187,7 @@ class XianyuLive:
                         if self.current_token:
                             logger.warning(f"【{self.cookie_id}】清空当前token，重新连接时将重新获取")
                             self.current_token = None
+                            self._discard_token_cache()
 
                         # 直接重置任务引用，不等待取消（快速重连方案）
                         # 这样可以避免等待任务取消导致的阻塞问题
@@ -7973,6 +7329,53 @@ class XianyuLive:
                 except asyncio.TimeoutError:
                     logger.warning(f"【{self.cookie_id}】后台任务清理超时，强制继续")
             
+            # 停止消息入口队列
+            try:
+                await self.ingress_queue.close()
+            except Exception as e:
+                logger.warning(f"【{self.cookie_id}】关闭消息入口队列失败: {self._safe_str(e)}")
+
+            # 停止会话执行器（取消待回复的防抖定时器）
+            try:
+                await self.chat_executor.close()
+            except Exception as e:
+                logger.warning(f"【{self.cookie_id}】关闭会话执行器失败: {self._safe_str(e)}")
+
+            # 停止消息出站队列（未发出的消息以连接关闭结束）
+            try:
+                await self.outbound_queue.close()
+            except Exception as e:
+                logger.warning(f"【{self.cookie_id}】关闭消息出站队列失败: {self._safe_str(e)}")
+
+            # 结束帧录制
+            if self.frame_recorder is not None:
+                self.frame_recorder.close()
+
+            # 写出消息去重记录
+            try:
+                self.message_dedup.close()
+            except Exception as e:
+                logger.warning(f"【{self.cookie_id}】保存消息去重记录失败: {self._safe_str(e)}")
+
+            # 停止订单详情补全队列
+            try:
+                await self.order_enrichment.close()
+            except Exception as e:
+                logger.warning(f"【{self.cookie_id}】关闭订单详情补全队列失败: {self._safe_str(e)}")
+
+            # 释放该账号在共享浏览器池中的空闲上下文
+            try:
+                await browser_pool.close_account(self.cookie_id)
+            except Exception as e:
+                logger.warning(f"【{self.cookie_id}】释放浏览器池上下文失败: {self._safe_str(e)}")
+
+            # 释放该账号占用的AI连接池客户端
+            try:
+                from ai_reply_engine import async_ai_reply_engine
+                await async_ai_reply_engine.close_account(self.cookie_id)
+            except Exception as e:
+                logger.warning(f"【{self.cookie_id}】释放AI连接池客户端失败: {self._safe_str(e)}")
+
             # 确保关闭session
             await self.close_session()
 
@@ -8038,7 +7441,7 @@ class XianyuLive:
 
         try:
             async with self.session.post(
-                'https://h5api.m.goofish.com/h5/mtop.idle.web.xyh.item.list/1.0/',
+                API_ENDPOINTS.get('item_list', 'https://h5api.m.goofish.com/h5/mtop.idle.web.xyh.item.list/1.0/'),
                 params=params,
                 data={'data': data_val}
             ) as response:
@@ -8206,8 +7609,8 @@ class XianyuLive:
             "items": all_items
         }
 
-    async def send_image_msg(self, ws, cid, toid, image_url, width=800, height=600, card_id=None):
-        """发送图片消息"""
+    async def send_image_msg(self, ws, cid, toid, image_url, width=800, height=600, card_id=None, priority=PRIORITY_REPLY):
+        """发送图片消息（上传完成后经出站队列发出）"""
         try:
             # 检查图片URL是否需要上传到CDN
             original_url = image_url
@@ -8277,52 +7680,8 @@ class XianyuLive:
                 }
             }
 
-            # Base64编码
-            content_json = json.dumps(image_content, ensure_ascii=False)
-            content_base64 = str(base64.b64encode(content_json.encode('utf-8')), 'utf-8')
-
-            logger.info(f"【{self.cookie_id}】图片内容JSON: {content_json}")
-            logger.info(f"【{self.cookie_id}】Base64编码长度: {len(content_base64)}")
-
-            # 构造WebSocket消息（完全参考send_msg的格式）
-            msg = {
-                "lwp": "/r/MessageSend/sendByReceiverScope",
-                "headers": {
-                    "mid": generate_mid()
-                },
-                "body": [
-                    {
-                        "uuid": generate_uuid(),
-                        "cid": f"{cid}@goofish",
-                        "conversationType": 1,
-                        "content": {
-                            "contentType": 101,
-                            "custom": {
-                                "type": 1,
-                                "data": content_base64
-                            }
-                        },
-                        "redPointPolicy": 0,
-                        "extension": {
-                            "extJson": "{}"
-                        },
-                        "ctx": {
-                            "appVersion": "1.0",
-                            "platform": "web"
-                        },
-                        "mtags": {},
-                        "msgReadStatusSetting": 1
-                    },
-                    {
-                        "actualReceivers": [
-                            f"{toid}@goofish",
-                            f"{self.myid}@goofish"
-                        ]
-                    }
-                ]
-            }
-
-            await ws.send(json.dumps(msg))
+            # 构造WebSocket消息（与send_msg共用消息帧格式），经出站队列发送
+            await self.outbound_queue.send(ws, self._build_send_frame(cid, toid, image_content), priority=priority)
             logger.info(f"【{self.cookie_id}】图片消息发送成功: {image_url}")
 
         except Exception as e:
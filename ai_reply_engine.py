@@ -13,12 +13,27 @@ import os
 import json
 import time
 import sqlite3
+import asyncio
+import contextlib
 import requests  # 确保已导入
 import threading
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
+import httpx
 from loguru import logger
-from openai import OpenAI
 from db_manager import db_manager
+from config import config
+
+if TYPE_CHECKING:
+    # openai 导入较慢（约0.5秒），仅在创建客户端时导入
+    from openai import OpenAI, AsyncOpenAI
+
+
+# 各AI服务商默认请求超时时间（秒）
+DEFAULT_PROVIDER_TIMEOUTS = {
+    'openai': 30,
+    'dashscope': 30,
+    'gemini': 30,
+}
 
 
 class AIReplyEngine:
@@ -59,7 +74,7 @@ class AIReplyEngine:
 注意：结合商品信息，给出实用建议。'''
         }
     
-    def _create_openai_client(self, cookie_id: str) -> Optional[OpenAI]:
+    def _create_openai_client(self, cookie_id: str) -> Optional['OpenAI']:
         """
         (原 get_client) 创建指定账号的OpenAI客户端
         修复 P0-2: 移除了缓存逻辑，以支持多进程无状态部署
@@ -70,9 +85,11 @@ class AIReplyEngine:
         
         try:
             logger.info(f"创建新的OpenAI客户端实例 {cookie_id}: base_url={settings['base_url']}, api_key={'***' + settings['api_key'][-4:] if settings['api_key'] else 'None'}")
+            from openai import OpenAI
             client = OpenAI(
                 api_key=settings['api_key'],
-                base_url=settings['base_url']
+                base_url=settings['base_url'],
+                timeout=self._get_provider_timeout('openai')
             )
             logger.info(f"为账号 {cookie_id} 创建OpenAI客户端成功，实际base_url: {client.base_url}")
             return client
@@ -80,6 +97,19 @@ class AIReplyEngine:
             logger.error(f"创建OpenAI客户端失败 {cookie_id}: {e}")
             return None
 
+    def _get_provider_timeout(self, provider: str) -> float:
+        """获取指定AI服务商的请求超时时间（秒），可在 global_config.yml 的 AI_REPLY.timeouts 中配置"""
+        timeouts = config.get('AI_REPLY', {}).get('timeouts', {}) or {}
+        return float(timeouts.get(provider, DEFAULT_PROVIDER_TIMEOUTS.get(provider, 30)))
+
+    def _get_provider(self, settings: dict) -> str:
+        """根据设置判断AI服务商类型: dashscope / gemini / openai"""
+        if self._is_dashscope_api(settings):
+            return 'dashscope'
+        if self._is_gemini_api(settings):
+            return 'gemini'
+        return 'openai'
+
     def _is_dashscope_api(self, settings: dict) -> bool:
         """判断是否为DashScope API - 只有选择自定义模型时才使用"""
         model_name = settings.get('model_name', '')
@@ -97,8 +127,8 @@ class AIReplyEngine:
         model_name = settings.get('model_name', '').lower()
         return 'gemini' in model_name
 
-    def _call_dashscope_api(self, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
-        """调用DashScope API"""
+    def _build_dashscope_request(self, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> Tuple[str, dict, dict]:
+        """构建DashScope API请求，返回 (url, headers, data)"""
         base_url = settings['base_url']
         if '/apps/' in base_url:
             app_id = base_url.split('/apps/')[-1].split('/')[0]
@@ -136,13 +166,14 @@ class AIReplyEngine:
         logger.info(f"发送的prompt: {prompt[:100]}...") # 避免 prompt 过长
         logger.debug(f"请求数据: {json.dumps(data, ensure_ascii=False)}")
 
-        response = requests.post(url, headers=headers, json=data, timeout=30)
+        return url, headers, data
 
-        if response.status_code != 200:
-            logger.error(f"DashScope API请求失败: {response.status_code} - {response.text}")
-            raise Exception(f"DashScope API请求失败: {response.status_code} - {response.text}")
+    def _parse_dashscope_response(self, status_code: int, text: str, result: Optional[dict]) -> str:
+        """解析DashScope API响应"""
+        if status_code != 200:
+            logger.error(f"DashScope API请求失败: {status_code} - {text}")
+            raise Exception(f"DashScope API请求失败: {status_code} - {text}")
 
-        result = response.json()
         logger.debug(f"DashScope API响应: {json.dumps(result, ensure_ascii=False)}")
 
         if 'output' in result and 'text' in result['output']:
@@ -150,9 +181,16 @@ class AIReplyEngine:
         else:
             raise Exception(f"DashScope API响应格式错误: {result}")
 
-    def _call_gemini_api(self, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
+    def _call_dashscope_api(self, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
+        """调用DashScope API"""
+        url, headers, data = self._build_dashscope_request(settings, messages, max_tokens, temperature)
+        response = requests.post(url, headers=headers, json=data, timeout=self._get_provider_timeout('dashscope'))
+        result = response.json() if response.status_code == 200 else None
+        return self._parse_dashscope_response(response.status_code, response.text, result)
+
+    def _build_gemini_request(self, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> Tuple[str, dict, dict]:
         """
-        调用Google Gemini REST API (v1beta)
+        构建Google Gemini REST API (v1beta) 请求，返回 (url, headers, payload)
         """
         api_key = settings['api_key']
         model_name = settings['model_name'] 
@@ -202,14 +240,24 @@ class AIReplyEngine:
 
         logger.info(f"Calling Gemini REST API: {url.split('?')[0]}")
         logger.debug(f"Gemini Payload: {json.dumps(payload, ensure_ascii=False)}")
-        
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
 
-        if response.status_code != 200:
-            logger.error(f"Gemini API 请求失败: {response.status_code} - {response.text}")
-            raise Exception(f"Gemini API 请求失败: {response.status_code} - {response.text}")
-            
-        result = response.json()
+        return url, headers, payload
+
+    def _call_gemini_api(self, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
+        """
+        调用Google Gemini REST API (v1beta)
+        """
+        url, headers, payload = self._build_gemini_request(settings, messages, max_tokens, temperature)
+        response = requests.post(url, headers=headers, json=payload, timeout=self._get_provider_timeout('gemini'))
+        result = response.json() if response.status_code == 200 else None
+        return self._parse_gemini_response(response.status_code, response.text, result)
+
+    def _parse_gemini_response(self, status_code: int, text: str, result: Optional[dict]) -> str:
+        """解析Gemini API响应"""
+        if status_code != 200:
+            logger.error(f"Gemini API 请求失败: {status_code} - {text}")
+            raise Exception(f"Gemini API 请求失败: {status_code} - {text}")
+
         logger.debug(f"Gemini API 响应: {json.dumps(result, ensure_ascii=False)}")
 
         try:
@@ -219,7 +267,7 @@ class AIReplyEngine:
             logger.error(f"Gemini API 响应格式错误: {result} - {e}")
             raise Exception(f"Gemini API 响应格式错误: {result}")
 
-    def _call_openai_api(self, client: OpenAI, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
+    def _call_openai_api(self, client: 'OpenAI', settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
         """调用OpenAI兼容API"""
         response = client.chat.completions.create(
             model=settings['model_name'],
@@ -234,15 +282,17 @@ class AIReplyEngine:
         settings = db_manager.get_ai_reply_settings(cookie_id)
         return settings['ai_enabled']
     
-    def detect_intent(self, message: str, cookie_id: str) -> str:
+    def detect_intent(self, message: str, cookie_id: str, settings: Optional[dict] = None) -> str:
         """
         检测用户消息意图 (基于关键词的本地检测)
         修复 P1-1: 移除了AI调用，以降低成本和延迟。
+        调用方已取得AI回复设置时通过 settings 传入，避免重复查询数据库。
         """
         try:
             # 检查AI是否启用，如果未启用，不应执行任何AI相关逻辑
             # 注意：此检查在 generate_reply 的开头已经做过，但保留此处作为第二道防线
-            settings = db_manager.get_ai_reply_settings(cookie_id)
+            if settings is None:
+                settings = db_manager.get_ai_reply_settings(cookie_id)
             if not settings['ai_enabled']:
                 return 'default'
 
@@ -280,6 +330,96 @@ class AIReplyEngine:
                 self._chat_locks[chat_id] = threading.Lock()
             return self._chat_locks[chat_id]
     
+    def _log_message_saved(self, cookie_id: str, message: str, message_created_at, skip_wait: bool):
+        """记录用户消息已保存，并说明是否需要等待收集后续消息"""
+        if not skip_wait:
+            logger.info(f"【{cookie_id}】消息已保存，等待10秒收集后续消息: {message[:20]}... (时间:{message_created_at})")
+        else:
+            logger.info(f"【{cookie_id}】消息已保存（外部防抖已启用，跳过内部等待）: {message[:20]}... (时间:{message_created_at})")
+
+    def _get_recent_query_seconds(self, skip_wait: bool) -> int:
+        """获取查询最近用户消息的时间窗口（秒）"""
+        # 如果 skip_wait=True（外部防抖），查询窗口为6秒（1秒防抖 + 5秒缓冲）
+        # 如果 skip_wait=False（内部等待），查询窗口为25秒（10秒等待 + 10秒消息间隔 + 5秒缓冲）
+        return 6 if skip_wait else 25
+
+    def _is_latest_message(self, cookie_id: str, message: str, message_created_at,
+                           recent_messages: List[Dict], query_seconds: int) -> bool:
+        """判断当前消息是否为时间窗口内最新的用户消息（只处理最后一条）"""
+        logger.info(f"【{cookie_id}】最近{query_seconds}秒内的消息: {[msg['content'][:20] for msg in recent_messages]}")
+
+        if not recent_messages:
+            return True
+
+        latest_message = recent_messages[-1]
+        if message_created_at != latest_message['created_at']:
+            logger.info(f"【{cookie_id}】检测到有更新的消息，跳过当前消息: {message[:20]}... (时间:{message_created_at})，最新消息: {latest_message['content'][:20]}... (时间:{latest_message['created_at']})")
+            return False
+
+        logger.info(f"【{cookie_id}】当前消息是最新消息，开始处理: {message[:20]}... (时间:{message_created_at})")
+        return True
+
+    def _get_bargain_limit_reply(self, settings: dict, intent: str, bargain_count: int) -> Optional[str]:
+        """议价次数达到上限时返回拒绝话术，否则返回 None"""
+        if intent != "price":
+            return None
+
+        max_bargain_rounds = settings.get('max_bargain_rounds', 3)
+        if bargain_count < max_bargain_rounds:
+            return None
+
+        logger.info(f"议价次数已达上限 ({bargain_count}/{max_bargain_rounds})，拒绝继续议价")
+        return "抱歉，这个价格已经是最优惠的了，不能再便宜了哦！"
+
+    def _log_reply_error(self, cookie_id: str, e: Exception):
+        """记录AI回复生成失败的详细信息"""
+        logger.error(f"AI回复生成失败 {cookie_id}: {e}")
+        if hasattr(e, 'response') and hasattr(e.response, 'url'):
+            logger.error(f"请求URL: {e.response.url}")
+        if hasattr(e, 'request') and hasattr(e.request, 'url'):
+            logger.error(f"请求URL: {e.request.url}")
+
+    def _build_reply_messages(self, settings: dict, intent: str, message: str, item_info: dict,
+                              context: List[Dict], bargain_count: int) -> List[Dict]:
+        """根据意图、商品信息、对话历史和议价设置构建发送给AI的消息列表"""
+        # 6. 构建提示词
+        custom_prompts = json.loads(settings['custom_prompts']) if settings['custom_prompts'] else {}
+        system_prompt = custom_prompts.get(intent, self.default_prompts[intent])
+
+        # 7. 构建商品信息
+        item_desc = f"商品标题: {item_info.get('title', '未知')}\n"
+        item_desc += f"商品价格: {item_info.get('price', '未知')}元\n"
+        item_desc += f"商品描述: {item_info.get('desc', '无')}"
+
+        # 8. 构建对话历史
+        context_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in context[-10:]])  # 最近10条
+
+        # 9. 构建用户消息
+        max_bargain_rounds = settings.get('max_bargain_rounds', 3)
+        max_discount_percent = settings.get('max_discount_percent', 10)
+        max_discount_amount = settings.get('max_discount_amount', 100)
+
+        user_prompt = f"""商品信息：
+{item_desc}
+
+对话历史：
+{context_str}
+
+议价设置：
+- 当前议价次数：{bargain_count}
+- 最大议价轮数：{max_bargain_rounds}
+- 最大优惠百分比：{max_discount_percent}%
+- 最大优惠金额：{max_discount_amount}元
+
+用户消息：{message}
+
+请根据以上信息生成回复："""
+
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
     def generate_reply(self, message: str, item_info: dict, chat_id: str,
                       cookie_id: str, user_id: str, item_id: str,
                       skip_wait: bool = False) -> Optional[str]:
@@ -296,33 +436,21 @@ class AIReplyEngine:
             message_created_at = self.save_conversation(chat_id, cookie_id, user_id, item_id, "user", message, intent)
             
             # 如果调用方已经实现了去抖（debounce），可以通过 skip_wait=True 跳过内部等待
+            self._log_message_saved(cookie_id, message, message_created_at, skip_wait)
             if not skip_wait:
-                logger.info(f"【{cookie_id}】消息已保存，等待10秒收集后续消息: {message[:20]}... (时间:{message_created_at})")
                 # 固定等待10秒，等待可能的后续消息（在锁外延迟，避免阻塞其他消息保存）
                 time.sleep(10)
-            else:
-                logger.info(f"【{cookie_id}】消息已保存（外部防抖已启用，跳过内部等待）: {message[:20]}... (时间:{message_created_at})")
             
             # 获取该chat_id的锁，确保同一对话的消息串行处理
             chat_lock = self._get_chat_lock(chat_id)
             
             # 使用锁确保同一chat_id的消息串行处理
             with chat_lock:
-                # 获取最近时间窗口内的所有用户消息
-                # 如果 skip_wait=True（外部防抖），查询窗口为6秒（1秒防抖 + 5秒缓冲）
-                # 如果 skip_wait=False（内部等待），查询窗口为25秒（10秒等待 + 10秒消息间隔 + 5秒缓冲）
-                query_seconds = 6 if skip_wait else 25
+                # 获取最近时间窗口内的所有用户消息，只处理最后一条消息（时间戳最新的）
+                query_seconds = self._get_recent_query_seconds(skip_wait)
                 recent_messages = self._get_recent_user_messages(chat_id, cookie_id, seconds=query_seconds)
-                logger.info(f"【{cookie_id}】最近{query_seconds}秒内的消息: {[msg['content'][:20] for msg in recent_messages]}")
-                
-                if recent_messages and len(recent_messages) > 0:
-                    # 只处理最后一条消息（时间戳最新的）
-                    latest_message = recent_messages[-1]
-                    if message_created_at != latest_message['created_at']:
-                        logger.info(f"【{cookie_id}】检测到有更新的消息，跳过当前消息: {message[:20]}... (时间:{message_created_at})，最新消息: {latest_message['content'][:20]}... (时间:{latest_message['created_at']})")
-                        return None
-                    else:
-                        logger.info(f"【{cookie_id}】当前消息是最新消息，开始处理: {message[:20]}... (时间:{message_created_at})")
+                if not self._is_latest_message(cookie_id, message, message_created_at, recent_messages, query_seconds):
+                    return None
                 
                 # 1. 获取AI回复设置
                 settings = db_manager.get_ai_reply_settings(cookie_id)
@@ -334,52 +462,13 @@ class AIReplyEngine:
                 bargain_count = self.get_bargain_count(chat_id, cookie_id)
 
                 # 5. 检查议价轮数限制 (P0-1 竞争条件风险点 - 遵照指示未修改)
-                if intent == "price":
-                    max_bargain_rounds = settings.get('max_bargain_rounds', 3)
-                    if bargain_count >= max_bargain_rounds:
-                        logger.info(f"议价次数已达上限 ({bargain_count}/{max_bargain_rounds})，拒绝继续议价")
-                        refuse_reply = f"抱歉，这个价格已经是最优惠的了，不能再便宜了哦！"
-                        self.save_conversation(chat_id, cookie_id, user_id, item_id, "assistant", refuse_reply, intent)
-                        return refuse_reply
-
-                # 6. 构建提示词
-                custom_prompts = json.loads(settings['custom_prompts']) if settings['custom_prompts'] else {}
-                system_prompt = custom_prompts.get(intent, self.default_prompts[intent])
-
-                # 7. 构建商品信息
-                item_desc = f"商品标题: {item_info.get('title', '未知')}\n"
-                item_desc += f"商品价格: {item_info.get('price', '未知')}元\n"
-                item_desc += f"商品描述: {item_info.get('desc', '无')}"
-
-                # 8. 构建对话历史
-                context_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in context[-10:]])  # 最近10条
-
-                # 9. 构建用户消息
-                max_bargain_rounds = settings.get('max_bargain_rounds', 3)
-                max_discount_percent = settings.get('max_discount_percent', 10)
-                max_discount_amount = settings.get('max_discount_amount', 100)
-
-                user_prompt = f"""商品信息：
-{item_desc}
+                refuse_reply = self._get_bargain_limit_reply(settings, intent, bargain_count)
+                if refuse_reply:
+                    self.save_conversation(chat_id, cookie_id, user_id, item_id, "assistant", refuse_reply, intent)
+                    return refuse_reply
 
-对话历史：
-{context_str}
-
-议价设置：
-- 当前议价次数：{bargain_count}
-- 最大议价轮数：{max_bargain_rounds}
-- 最大优惠百分比：{max_discount_percent}%
-- 最大优惠金额：{max_discount_amount}元
-
-用户消息：{message}
-
-请根据以上信息生成回复："""
-
-                # 10. 调用AI生成回复
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
+                # 6-10. 构建提示词并调用AI生成回复
+                messages = self._build_reply_messages(settings, intent, message, item_info, context, bargain_count)
 
                 reply = None # 初始化 reply 变量
 
@@ -412,11 +501,7 @@ class AIReplyEngine:
                 return reply
                 
         except Exception as e:
-            logger.error(f"AI回复生成失败 {cookie_id}: {e}")
-            if hasattr(e, 'response') and hasattr(e.response, 'url'):
-                logger.error(f"请求URL: {e.response.url}")
-            if hasattr(e, 'request') and hasattr(e.request, 'url'):
-                logger.error(f"请求URL: {e.request.url}")
+            self._log_reply_error(cookie_id, e)
             return None
 
     async def generate_reply_async(self, message: str, item_info: dict, chat_id: str,
@@ -436,7 +521,7 @@ class AIReplyEngine:
     def get_conversation_context(self, chat_id: str, cookie_id: str, limit: int = 20) -> List[Dict]:
         """获取对话上下文"""
         try:
-            with db_manager.lock:
+            with db_manager.reader():
                 cursor = db_manager.conn.cursor()
                 cursor.execute('''
                 SELECT role, content FROM ai_conversations 
@@ -455,29 +540,30 @@ class AIReplyEngine:
                          item_id: str, role: str, content: str, intent: str = None) -> Optional[str]:
         """保存对话记录，返回创建时间"""
         try:
-            with db_manager.lock:
-                cursor = db_manager.conn.cursor()
+            def _insert(cursor):
                 cursor.execute('''
                 INSERT INTO ai_conversations 
                 (cookie_id, chat_id, user_id, item_id, role, content, intent)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''', (cookie_id, chat_id, user_id, item_id, role, content, intent))
-                db_manager.conn.commit()
-                
+
                 # 获取刚插入记录的created_at
                 cursor.execute('''
                 SELECT created_at FROM ai_conversations 
-                WHERE rowid = last_insert_rowid()
-                ''')
+                WHERE rowid = ?
+                ''', (cursor.lastrowid,))
                 result = cursor.fetchone()
                 return result[0] if result else None
+
+            # 通过单写线程队列写入，消息突发时与其他写操作合并提交
+            return db_manager.execute_write(_insert)
         except Exception as e:
             logger.error(f"保存对话记录失败: {e}")
             return None
     def get_bargain_count(self, chat_id: str, cookie_id: str) -> int:
         """获取议价次数"""
         try:
-            with db_manager.lock:
+            with db_manager.reader():
                 cursor = db_manager.conn.cursor()
                 cursor.execute('''
                 SELECT COUNT(*) FROM ai_conversations 
@@ -493,7 +579,7 @@ class AIReplyEngine:
     def _get_recent_user_messages(self, chat_id: str, cookie_id: str, seconds: int = 2) -> List[Dict]:
         """获取最近seconds秒内的所有用户消息（包含内容和时间戳）"""
         try:
-            with db_manager.lock:
+            with db_manager.reader():
                 cursor = db_manager.conn.cursor()
                 # 先查询所有该chat的user消息，用于调试
                 cursor.execute('''
@@ -539,5 +625,220 @@ class AIReplyEngine:
     #     pass
 
 
+class AsyncAIReplyEngine(AIReplyEngine):
+    """
+    原生异步AI回复引擎
+
+    - 按 (base_url, api_key) 复用长连接的 HTTP 客户端（连接池），避免每次请求重新建连
+    - 各服务商使用独立的超时设置（AI_REPLY.timeouts）
+    - 数据库读写放到线程池执行，LLM 请求全程 await，不阻塞事件循环
+    - 记录使用各客户端的账号，账号停止时通过 close_account 关闭已无人使用的客户端
+    """
+
+    def __init__(self):
+        super().__init__()
+        # {(loop, provider, base_url, api_key): AsyncOpenAI | httpx.AsyncClient}
+        self._clients = {}
+        # {(loop, provider, base_url, api_key): {cookie_id, ...}}
+        self._client_owners = {}
+        # 异步版本的chat锁（asyncio.Lock 只能在所属事件循环内使用）
+        # {chat_id: [asyncio.Lock, 持有或等待该锁的协程数]}，计数归零时移除，避免随会话数无限增长
+        self._async_chat_locks = {}
+
+    def _get_pool_limits(self) -> httpx.Limits:
+        """获取连接池限制，可在 global_config.yml 的 AI_REPLY.pool 中配置"""
+        pool_config = config.get('AI_REPLY', {}).get('pool', {}) or {}
+        return httpx.Limits(
+            max_connections=pool_config.get('max_connections', 20),
+            max_keepalive_connections=pool_config.get('max_keepalive_connections', 10),
+            keepalive_expiry=pool_config.get('keepalive_expiry', 60)
+        )
+
+    def _get_http_client(self, cookie_id: str, provider: str, base_url: str, api_key: str) -> httpx.AsyncClient:
+        """获取（或创建）指定服务商与凭据对应的长连接HTTP客户端，并记录使用该客户端的账号"""
+        loop = asyncio.get_running_loop()
+        key = (loop, provider, base_url, api_key)
+        self._client_owners.setdefault(key, set()).add(cookie_id)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            timeout = self._get_provider_timeout(provider)
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(timeout, connect=min(10.0, timeout)),
+                limits=self._get_pool_limits()
+            )
+            self._clients[key] = client
+            logger.info(f"创建AI连接池客户端: provider={provider}, base_url={base_url}, timeout={timeout}s")
+        return client
+
+    def _get_async_openai_client(self, cookie_id: str, settings: dict) -> Optional['AsyncOpenAI']:
+        """获取（或创建）与 (base_url, api_key) 绑定的 AsyncOpenAI 客户端"""
+        if not settings['api_key']:
+            return None
+
+        loop = asyncio.get_running_loop()
+        key = (loop, 'openai-sdk', settings['base_url'], settings['api_key'])
+        http_client = self._get_http_client(cookie_id, 'openai', settings['base_url'], settings['api_key'])
+        client = self._clients.get(key)
+        if client is None:
+            from openai import AsyncOpenAI
+            client = AsyncOpenAI(
+                api_key=settings['api_key'],
+                base_url=settings['base_url'],
+                timeout=self._get_provider_timeout('openai'),
+                http_client=http_client
+            )
+            self._clients[key] = client
+        return client
+
+    @contextlib.asynccontextmanager
+    async def _async_chat_lock(self, chat_id: str):
+        """持有指定chat_id的异步锁，最后一个使用者释放后移除该锁"""
+        entry = self._async_chat_locks.get(chat_id)
+        if entry is None:
+            entry = self._async_chat_locks[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and self._async_chat_locks.get(chat_id) is entry:
+                del self._async_chat_locks[chat_id]
+
+    async def _call_dashscope_api_async(self, cookie_id: str, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
+        """异步调用DashScope API"""
+        url, headers, data = self._build_dashscope_request(settings, messages, max_tokens, temperature)
+        client = self._get_http_client(cookie_id, 'dashscope', settings['base_url'], settings['api_key'])
+        response = await client.post(url, headers=headers, json=data)
+        result = response.json() if response.status_code == 200 else None
+        return self._parse_dashscope_response(response.status_code, response.text, result)
+
+    async def _call_gemini_api_async(self, cookie_id: str, settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
+        """异步调用Google Gemini REST API"""
+        url, headers, payload = self._build_gemini_request(settings, messages, max_tokens, temperature)
+        client = self._get_http_client(cookie_id, 'gemini', settings['base_url'], settings['api_key'])
+        response = await client.post(url, headers=headers, json=payload)
+        result = response.json() if response.status_code == 200 else None
+        return self._parse_gemini_response(response.status_code, response.text, result)
+
+    async def _call_openai_api_async(self, client: 'AsyncOpenAI', settings: dict, messages: list, max_tokens: int = 100, temperature: float = 0.7) -> str:
+        """异步调用OpenAI兼容API"""
+        response = await client.chat.completions.create(
+            model=settings['model_name'],
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        return response.choices[0].message.content.strip()
+
+    async def is_ai_enabled_async(self, cookie_id: str) -> bool:
+        """异步检查指定账号是否启用AI回复"""
+        return await asyncio.to_thread(self.is_ai_enabled, cookie_id)
+
+    async def generate_reply_async(self, message: str, item_info: dict, chat_id: str,
+                                   cookie_id: str, user_id: str, item_id: str,
+                                   skip_wait: bool = False) -> Optional[str]:
+        """生成AI回复（原生异步版本，不阻塞事件循环）"""
+        settings = await asyncio.to_thread(db_manager.get_ai_reply_settings, cookie_id)
+        if not settings['ai_enabled']:
+            return None
+
+        try:
+            # 先检测意图（纯本地关键词匹配，复用上面已取得的设置，无IO）
+            intent = self.detect_intent(message, cookie_id, settings)
+            logger.info(f"检测到意图: {intent} (账号: {cookie_id})")
+
+            # 在锁外先保存用户消息到数据库，让所有消息都能立即保存
+            message_created_at = await asyncio.to_thread(
+                self.save_conversation, chat_id, cookie_id, user_id, item_id, "user", message, intent
+            )
+
+            self._log_message_saved(cookie_id, message, message_created_at, skip_wait)
+            if not skip_wait:
+                await asyncio.sleep(10)
+
+            # 使用锁确保同一chat_id的消息串行处理
+            async with self._async_chat_lock(chat_id):
+                query_seconds = self._get_recent_query_seconds(skip_wait)
+                recent_messages = await asyncio.to_thread(
+                    self._get_recent_user_messages, chat_id, cookie_id, query_seconds
+                )
+                if not self._is_latest_message(cookie_id, message, message_created_at, recent_messages, query_seconds):
+                    return None
+
+                context = await asyncio.to_thread(self.get_conversation_context, chat_id, cookie_id)
+                bargain_count = await asyncio.to_thread(self.get_bargain_count, chat_id, cookie_id)
+
+                refuse_reply = self._get_bargain_limit_reply(settings, intent, bargain_count)
+                if refuse_reply:
+                    await asyncio.to_thread(
+                        self.save_conversation, chat_id, cookie_id, user_id, item_id, "assistant", refuse_reply, intent
+                    )
+                    return refuse_reply
+
+                messages = self._build_reply_messages(settings, intent, message, item_info, context, bargain_count)
+
+                provider = self._get_provider(settings)
+                if provider == 'dashscope':
+                    logger.info("使用DashScope API生成回复（异步）")
+                    reply = await self._call_dashscope_api_async(cookie_id, settings, messages, max_tokens=100, temperature=0.7)
+                elif provider == 'gemini':
+                    logger.info("使用Gemini API生成回复（异步）")
+                    reply = await self._call_gemini_api_async(cookie_id, settings, messages, max_tokens=100, temperature=0.7)
+                else:
+                    logger.info("使用OpenAI兼容API生成回复（异步）")
+                    client = self._get_async_openai_client(cookie_id, settings)
+                    if not client:
+                        return None
+                    logger.info(f"messages:{messages}")
+                    reply = await self._call_openai_api_async(client, settings, messages, max_tokens=100, temperature=0.7)
+
+                await asyncio.to_thread(
+                    self.save_conversation, chat_id, cookie_id, user_id, item_id, "assistant", reply, intent
+                )
+
+                logger.info(f"AI回复生成成功 (账号: {cookie_id}): {reply}")
+                return reply
+
+        except Exception as e:
+            self._log_reply_error(cookie_id, e)
+            return None
+
+    async def _close_client(self, key: tuple):
+        """关闭并移除指定的连接池客户端"""
+        client = self._clients.pop(key, None)
+        try:
+            if isinstance(client, httpx.AsyncClient):
+                await client.aclose()
+        except Exception as e:
+            logger.warning(f"关闭AI连接池客户端失败: {e}")
+
+    async def close_account(self, cookie_id: str):
+        """释放账号占用的连接池客户端，已无其他账号使用的客户端随即关闭（账号停止时调用）"""
+        loop = asyncio.get_running_loop()
+        for key in [k for k in self._client_owners if k[0] is loop]:
+            owners = self._client_owners[key]
+            owners.discard(cookie_id)
+            if owners:
+                continue
+            del self._client_owners[key]
+            _, provider, base_url, api_key = key
+            if provider == 'openai':
+                self._clients.pop((loop, 'openai-sdk', base_url, api_key), None)
+            await self._close_client(key)
+            logger.info(f"【{cookie_id}】已关闭无人使用的AI连接池客户端: provider={provider}, base_url={base_url}")
+
+    async def aclose(self):
+        """关闭当前事件循环下的所有连接池客户端"""
+        loop = asyncio.get_running_loop()
+        for key in [k for k in self._client_owners if k[0] is loop]:
+            del self._client_owners[key]
+        for key in [k for k in self._clients if k[0] is loop]:
+            await self._close_client(key)
+
+
 # 全局AI回复引擎实例
-ai_reply_engine = AIReplyEngine()
\ No newline at end of file
+ai_reply_engine = AIReplyEngine()
+
+# 全局异步AI回复引擎实例（供事件循环内的调用方使用）
+async_ai_reply_engine = AsyncAIReplyEngine()
\ No newline at end of file
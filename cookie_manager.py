@@ -3,6 +3,9 @@ import asyncio
 from typing import Dict, List, Tuple, Optional
 from loguru import logger
 from db_manager import db_manager
+from utils.command_bus import CommandError, command_bus
+from utils.settings_cache import settings_cache
+from utils.warm_start import warm_start
 
 __all__ = ["CookieManager", "manager"]
 
@@ -10,8 +13,14 @@ __all__ = ["CookieManager", "manager"]
 class CookieManager:
     """管理多账号 Cookie 及其对应的 XianyuLive 任务和关键字"""
 
-    def __init__(self, loop: asyncio.AbstractEventLoop):
+    def __init__(self, loop: asyncio.AbstractEventLoop, worker_pool=None):
+        """
+        Args:
+            loop: 账号任务所在的事件循环
+            worker_pool: 账号工作进程池（utils.account_workers），为 None 时所有账号在本进程中运行
+        """
         self.loop = loop
+        self.worker_pool = worker_pool
         self.cookies: Dict[str, str] = {}
         self.tasks: Dict[str, asyncio.Task] = {}
         self.keywords: Dict[str, List[Tuple[str, str]]] = {}
@@ -19,6 +28,15 @@ class CookieManager:
         self.auto_confirm_settings: Dict[str, bool] = {}  # 自动确认发货设置
         self._task_locks: Dict[str, asyncio.Lock] = {}  # 每个cookie_id的任务锁，防止重复创建
         self._load_from_db()
+        # API 线程对账号的操作经命令总线投递到本事件循环执行
+        command_bus.bind(loop)
+        self._register_commands()
+        if worker_pool is not None:
+            # 发货规则或卡券变更后，同步使工作进程中的规则索引失效
+            db_manager.add_delivery_rule_listener(lambda: worker_pool.broadcast('invalidate_delivery_rules'))
+            # 账号配置变更后，同步使工作进程中的配置缓存失效
+            db_manager.add_settings_listener(
+                lambda cookie_id=None: worker_pool.broadcast('invalidate_settings', cookie_id=cookie_id))
 
     def _load_from_db(self):
         """从数据库加载所有Cookie、关键字和状态"""
@@ -47,8 +65,11 @@ class CookieManager:
         old_cookies_count = len(self.cookies)
         old_keywords_count = len(self.keywords)
 
-        # 重新加载数据
+        # 重新加载数据（数据库可能被整体替换，先清空账号配置缓存）
+        settings_cache.invalidate()
         self._load_from_db()
+        if self.worker_pool is not None:
+            self.worker_pool.broadcast('reload_from_db')
 
         new_cookies_count = len(self.cookies)
         new_keywords_count = len(self.keywords)
@@ -56,7 +77,113 @@ class CookieManager:
         logger.info(f"数据重新加载完成: Cookie {old_cookies_count} -> {new_cookies_count}, 关键字组 {old_keywords_count} -> {new_keywords_count}")
         return True
 
+    def _in_own_loop(self) -> bool:
+        """当前是否运行在账号事件循环中"""
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _register_commands(self):
+        """登记可由 API 线程经命令总线调用的账号操作"""
+        command_bus.register('add_cookie', self._add_cookie_async)
+        command_bus.register('remove_cookie', self._remove_cookie_async)
+        command_bus.register('update_cookie', self._update_cookie_async)
+        command_bus.register('stop_task', self._stop_task_async)
+        command_bus.register('send_message', self._send_message_command)
+        command_bus.register('send_token_refresh_notification', self._send_notification_command)
+        command_bus.register('qr_cooldown', self._qr_cooldown_command)
+        command_bus.register('instance_metrics', self._instance_metrics_command)
+
+    async def call_account(self, cookie_id: str, name: str, timeout: float = None, **kwargs):
+        """在账号所在的事件循环中执行命令（启用工作进程池时转发到账号所在的工作进程）"""
+        if self.worker_pool is not None:
+            return await self.worker_pool.call_async(cookie_id, 'command', timeout=timeout, name=name, kwargs=kwargs)
+        return await command_bus.call(name, timeout=timeout, cookie_id=cookie_id, **kwargs)
+
+    @staticmethod
+    def _get_live_instance(cookie_id: str):
+        from XianyuAutoAsync import XianyuLive
+        live_instance = XianyuLive.get_instance(cookie_id)
+        if not live_instance:
+            raise CommandError('账号实例不存在或未连接，请检查账号状态')
+        return live_instance
+
+    async def _send_message_command(self, cookie_id: str, chat_id: str, to_user_id: str, message: str):
+        """通过账号的 WebSocket 发送消息"""
+        live_instance = self._get_live_instance(cookie_id)
+        if not live_instance.ws or live_instance.ws.closed:
+            raise CommandError('账号WebSocket连接已断开，请等待重连')
+        from utils.outbound_queue import PRIORITY_ECHO
+        await live_instance.send_msg(live_instance.ws, chat_id, to_user_id, message, priority=PRIORITY_ECHO)
+        return True
+
+    async def _send_notification_command(self, cookie_id: str, error_message: str, notification_type: str = "token_refresh",
+                                         verification_url: str = None, attachment_path: str = None):
+        """发送账号通知（使用账号自身的会话）"""
+        live_instance = self._get_live_instance(cookie_id)
+        await live_instance.send_token_refresh_notification(
+            error_message=error_message,
+            notification_type=notification_type,
+            verification_url=verification_url,
+            attachment_path=attachment_path
+        )
+        return True
+
+    async def _qr_cooldown_command(self, cookie_id: str, reset: bool = False):
+        """查询（或重置）扫码登录Cookie刷新冷却，账号没有运行中的实例时返回 None"""
+        from XianyuAutoAsync import XianyuLive
+        live_instance = XianyuLive.get_instance(cookie_id)
+        if not live_instance:
+            return None
+        remaining_time = live_instance.get_qr_cookie_refresh_remaining_time()
+        if reset:
+            live_instance.reset_qr_cookie_refresh_flag()
+        return {
+            'remaining_time': remaining_time,
+            'cooldown_duration': live_instance.qr_cookie_refresh_cooldown,
+            'last_refresh_time': live_instance.last_qr_cookie_refresh_time,
+        }
+
+    async def _instance_metrics_command(self):
+        """各账号实例的入口队列、会话执行器、消息去重与出站队列指标"""
+        from XianyuAutoAsync import XianyuLive
+        instances = XianyuLive.get_all_instances()
+        return {
+            'queues': {cookie_id: instance.ingress_queue.get_metrics() for cookie_id, instance in instances.items()},
+            'chats': {cookie_id: instance.chat_executor.get_metrics() for cookie_id, instance in instances.items()},
+            'dedup': {cookie_id: instance.message_dedup.get_metrics() for cookie_id, instance in instances.items()},
+            'outbound': {cookie_id: instance.outbound_queue.get_metrics() for cookie_id, instance in instances.items()},
+        }
+
     # ------------------------ 内部协程 ------------------------
+    async def _run_account(self, cookie_id: str, cookie_value: str, user_id: int = None):
+        """运行账号任务：启用工作进程池时在所属工作进程中运行，否则在本事件循环中运行"""
+        if self.worker_pool is None:
+            await self._run_xianyu(cookie_id, cookie_value, user_id)
+        else:
+            await self._run_in_worker(cookie_id, cookie_value, user_id)
+
+    async def _run_in_worker(self, cookie_id: str, cookie_value: str, user_id: int = None):
+        """在工作进程中启动账号，本任务代表该账号的运行状态，取消时停止工作进程中的账号"""
+        worker_index = self.worker_pool.worker_for(cookie_id)
+        try:
+            try:
+                await self.worker_pool.start_account(cookie_id, cookie_value, user_id)
+                warm_start.mark(cookie_id, 'worker_started')
+                logger.info(f"【{cookie_id}】已分配到工作进程 #{worker_index}")
+            except Exception as e:
+                # 账号已登记，工作进程连接（或重启）后会自动启动
+                logger.warning(f"【{cookie_id}】工作进程 #{worker_index} 暂不可用，连接后自动启动: {e}")
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            try:
+                await self.worker_pool.stop_account(cookie_id)
+            except Exception as e:
+                logger.warning(f"【{cookie_id}】停止工作进程 #{worker_index} 中的账号失败: {e}")
+            logger.info(f"【{cookie_id}】XianyuLive 任务已取消")
+            raise
+
     async def _run_xianyu(self, cookie_id: str, cookie_value: str, user_id: int = None):
         """在事件循环中启动 XianyuLive.main"""
         logger.info(f"【{cookie_id}】_run_xianyu方法开始执行...")
@@ -148,7 +275,7 @@ class CookieManager:
                 if cookie_info:
                     actual_user_id = cookie_info.get('user_id')
 
-            task = self.loop.create_task(self._run_xianyu(cookie_id, cookie_value, actual_user_id))
+            task = self.loop.create_task(self._run_account(cookie_id, cookie_value, actual_user_id))
             self.tasks[cookie_id] = task
             logger.info(f"已启动账号任务: {cookie_id} (用户ID: {actual_user_id})")
 
@@ -187,29 +314,72 @@ class CookieManager:
             self.keywords[cookie_id] = kw_list
         else:
             self.keywords.setdefault(cookie_id, [])
-        try:
-            current_loop = asyncio.get_running_loop()
-        except RuntimeError:
-            current_loop = None
-
-        if current_loop and current_loop == self.loop:
+        if self._in_own_loop():
             # 同一事件循环中，直接调度
             return self.loop.create_task(self._add_cookie_async(cookie_id, cookie_value, user_id))
-        else:
-            fut = asyncio.run_coroutine_threadsafe(self._add_cookie_async(cookie_id, cookie_value, user_id), self.loop)
-            return fut.result()
+        return command_bus.call_sync('add_cookie', cookie_id=cookie_id, cookie_value=cookie_value, user_id=user_id)
 
     def remove_cookie(self, cookie_id: str):
-        try:
-            current_loop = asyncio.get_running_loop()
-        except RuntimeError:
-            current_loop = None
-
-        if current_loop and current_loop == self.loop:
+        if self._in_own_loop():
             return self.loop.create_task(self._remove_cookie_async(cookie_id))
-        else:
-            fut = asyncio.run_coroutine_threadsafe(self._remove_cookie_async(cookie_id), self.loop)
-            return fut.result()
+        return command_bus.call_sync('remove_cookie', cookie_id=cookie_id)
+
+    async def _update_cookie_async(self, cookie_id: str, new_value: str, save_to_db: bool = True):
+        """替换 Cookie 并重启任务（在账号事件循环中执行）"""
+        # 获取或创建该cookie_id的锁
+        if cookie_id not in self._task_locks:
+            self._task_locks[cookie_id] = asyncio.Lock()
+        
+        async with self._task_locks[cookie_id]:
+            # 获取原有的user_id和关键词
+            original_user_id = None
+            original_keywords = []
+            original_status = True
+
+            cookie_info = db_manager.get_cookie_details(cookie_id)
+            if cookie_info:
+                original_user_id = cookie_info.get('user_id')
+
+            # 保存原有的关键词和状态
+            if cookie_id in self.keywords:
+                original_keywords = self.keywords[cookie_id].copy()
+            if cookie_id in self.cookie_status:
+                original_status = self.cookie_status[cookie_id]
+
+            # 先移除任务（但不删除数据库记录）
+            task = self.tasks.pop(cookie_id, None)
+            if task:
+                logger.info(f"【{cookie_id}】正在停止旧任务...")
+                task.cancel()
+                try:
+                    # 等待任务完全清理，确保资源释放
+                    await asyncio.wait_for(task, timeout=10.0)
+                except asyncio.TimeoutError:
+                    logger.warning(f"【{cookie_id}】等待旧任务停止超时（10秒），强制继续")
+                except asyncio.CancelledError:
+                    # 任务被取消是预期行为
+                    logger.debug(f"【{cookie_id}】旧任务已取消")
+                    pass
+                except Exception as e:
+                    logger.error(f"等待任务清理时出错: {cookie_id}, {e}")
+                logger.info(f"【{cookie_id}】旧任务已停止")
+
+            # 更新Cookie值
+            self.cookies[cookie_id] = new_value
+            
+            # 只有在需要时才保存到数据库（避免覆盖其他字段如pause_duration、remark等）
+            if save_to_db:
+                db_manager.save_cookie(cookie_id, new_value, original_user_id)
+
+            # 恢复关键词和状态
+            self.keywords[cookie_id] = original_keywords
+            self.cookie_status[cookie_id] = original_status
+
+            # 重新启动任务
+            task = self.loop.create_task(self._run_account(cookie_id, new_value, original_user_id))
+            self.tasks[cookie_id] = task
+
+            logger.info(f"已更新Cookie并重启任务: {cookie_id} (用户ID: {original_user_id}, 关键词: {len(original_keywords)}条)")
 
     # 更新 Cookie 值
     def update_cookie(self, cookie_id: str, new_value: str, save_to_db: bool = True):
@@ -220,72 +390,9 @@ class CookieManager:
             new_value: 新的Cookie值
             save_to_db: 是否保存到数据库（默认True）。当API层已经更新数据库时应设为False，避免覆盖其他字段
         """
-        async def _update():
-            # 获取或创建该cookie_id的锁
-            if cookie_id not in self._task_locks:
-                self._task_locks[cookie_id] = asyncio.Lock()
-            
-            async with self._task_locks[cookie_id]:
-                # 获取原有的user_id和关键词
-                original_user_id = None
-                original_keywords = []
-                original_status = True
-
-                cookie_info = db_manager.get_cookie_details(cookie_id)
-                if cookie_info:
-                    original_user_id = cookie_info.get('user_id')
-
-                # 保存原有的关键词和状态
-                if cookie_id in self.keywords:
-                    original_keywords = self.keywords[cookie_id].copy()
-                if cookie_id in self.cookie_status:
-                    original_status = self.cookie_status[cookie_id]
-
-                # 先移除任务（但不删除数据库记录）
-                task = self.tasks.pop(cookie_id, None)
-                if task:
-                    logger.info(f"【{cookie_id}】正在停止旧任务...")
-                    task.cancel()
-                    try:
-                        # 等待任务完全清理，确保资源释放
-                        await asyncio.wait_for(task, timeout=10.0)
-                    except asyncio.TimeoutError:
-                        logger.warning(f"【{cookie_id}】等待旧任务停止超时（10秒），强制继续")
-                    except asyncio.CancelledError:
-                        # 任务被取消是预期行为
-                        logger.debug(f"【{cookie_id}】旧任务已取消")
-                        pass
-                    except Exception as e:
-                        logger.error(f"等待任务清理时出错: {cookie_id}, {e}")
-                    logger.info(f"【{cookie_id}】旧任务已停止")
-
-                # 更新Cookie值
-                self.cookies[cookie_id] = new_value
-                
-                # 只有在需要时才保存到数据库（避免覆盖其他字段如pause_duration、remark等）
-                if save_to_db:
-                    db_manager.save_cookie(cookie_id, new_value, original_user_id)
-
-                # 恢复关键词和状态
-                self.keywords[cookie_id] = original_keywords
-                self.cookie_status[cookie_id] = original_status
-
-                # 重新启动任务
-                task = self.loop.create_task(self._run_xianyu(cookie_id, new_value, original_user_id))
-                self.tasks[cookie_id] = task
-
-                logger.info(f"已更新Cookie并重启任务: {cookie_id} (用户ID: {original_user_id}, 关键词: {len(original_keywords)}条)")
-
-        try:
-            current_loop = asyncio.get_running_loop()
-        except RuntimeError:
-            current_loop = None
-
-        if current_loop and current_loop == self.loop:
-            return self.loop.create_task(_update())
-        else:
-            fut = asyncio.run_coroutine_threadsafe(_update(), self.loop)
-            return fut.result()
+        if self._in_own_loop():
+            return self.loop.create_task(self._update_cookie_async(cookie_id, new_value, save_to_db))
+        return command_bus.call_sync('update_cookie', cookie_id=cookie_id, new_value=new_value, save_to_db=save_to_db)
 
     def update_keywords(self, cookie_id: str, kw_list: List[Tuple[str, str]]):
         """线程安全更新关键字"""
@@ -294,6 +401,16 @@ class CookieManager:
         db_manager.save_keywords(cookie_id, kw_list)
         logger.info(f"更新关键字: {cookie_id} -> {len(kw_list)} 条")
 
+    def reload_keywords(self, cookie_id: str = None):
+        """关键词变更后使匹配器缓存失效（cookie_id 为 None 时全部失效），启用工作进程池时同步到工作进程"""
+        from utils.keyword_matcher import keyword_matcher_cache
+        keyword_matcher_cache.invalidate(cookie_id)
+        if self.worker_pool is not None:
+            if cookie_id is None:
+                self.worker_pool.broadcast('reload_keywords')
+            else:
+                self.worker_pool.submit(cookie_id, 'reload_keywords')
+
     # 查询接口
     def list_cookies(self):
         return list(self.cookies.keys())
@@ -348,15 +465,12 @@ class CookieManager:
 
             # 使用异步方式启动任务
             if hasattr(self.loop, 'is_running') and self.loop.is_running():
-                # 事件循环正在运行，使用run_coroutine_threadsafe
-                fut = asyncio.run_coroutine_threadsafe(
-                    self._add_cookie_async(cookie_id, cookie_value, user_id),
-                    self.loop
-                )
-                fut.result(timeout=5)  # 等待最多5秒
+                # 事件循环正在运行，经命令总线在事件循环中启动
+                command_bus.call_sync('add_cookie', timeout=5, cookie_id=cookie_id,
+                                      cookie_value=cookie_value, user_id=user_id)
             else:
                 # 事件循环未运行，直接创建任务
-                task = self.loop.create_task(self._run_xianyu(cookie_id, cookie_value, user_id))
+                task = self.loop.create_task(self._run_account(cookie_id, cookie_value, user_id))
                 self.tasks[cookie_id] = task
 
             logger.info(f"成功启动Cookie任务: {cookie_id}")
@@ -369,31 +483,10 @@ class CookieManager:
             logger.warning(f"Cookie任务不存在，跳过停止: {cookie_id}")
             return
 
-        async def _stop_task_async():
-            """异步停止任务并等待清理"""
-            try:
-                task = self.tasks[cookie_id]
-                if not task.done():
-                    task.cancel()
-                    try:
-                        # 等待任务完全清理，确保资源释放
-                        await task
-                    except asyncio.CancelledError:
-                        # 任务被取消是预期行为
-                        pass
-                    except Exception as e:
-                        logger.error(f"等待任务清理时出错: {cookie_id}, {e}")
-                    logger.info(f"已取消Cookie任务: {cookie_id}")
-                del self.tasks[cookie_id]
-                logger.info(f"成功停止Cookie任务: {cookie_id}")
-            except Exception as e:
-                logger.error(f"停止Cookie任务失败: {cookie_id}, {e}")
-
         try:
             # 在事件循环中执行异步停止
             if hasattr(self.loop, 'is_running') and self.loop.is_running():
-                fut = asyncio.run_coroutine_threadsafe(_stop_task_async(), self.loop)
-                fut.result(timeout=10)  # 等待最多10秒
+                command_bus.call_sync('stop_task', timeout=10, cookie_id=cookie_id)
             else:
                 logger.warning(f"事件循环未运行，无法正常等待任务清理: {cookie_id}")
                 # 直接取消任务（非最佳方案）
@@ -404,6 +497,28 @@ class CookieManager:
         except Exception as e:
             logger.error(f"停止Cookie任务失败: {cookie_id}, {e}")
 
+    async def _stop_task_async(self, cookie_id: str):
+        """停止任务并等待清理（在账号事件循环中执行）"""
+        try:
+            task = self.tasks.get(cookie_id)
+            if task is None:
+                return
+            if not task.done():
+                task.cancel()
+                try:
+                    # 等待任务完全清理，确保资源释放
+                    await task
+                except asyncio.CancelledError:
+                    # 任务被取消是预期行为
+                    pass
+                except Exception as e:
+                    logger.error(f"等待任务清理时出错: {cookie_id}, {e}")
+                logger.info(f"已取消Cookie任务: {cookie_id}")
+            self.tasks.pop(cookie_id, None)
+            logger.info(f"成功停止Cookie任务: {cookie_id}")
+        except Exception as e:
+            logger.error(f"停止Cookie任务失败: {cookie_id}, {e}")
+
     def update_auto_confirm_setting(self, cookie_id: str, auto_confirm: bool):
         """实时更新账号的自动确认发货设置"""
         try:
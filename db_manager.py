@@ -1,18 +1,363 @@
 import sqlite3
 import os
+import asyncio
 import threading
+import functools
+import queue
 import hashlib
 import time
 import json
 import random
 import string
-import aiohttp
 import io
 import base64
-from PIL import Image, ImageDraw, ImageFont
-from typing import List, Tuple, Dict, Optional, Any
+from typing import List, Tuple, Dict, Optional, Any, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from loguru import logger
 
+from utils.settings_cache import settings_cache, MISSING
+
+
+class _WriterLock:
+    """写连接锁
+
+    在可重入锁的基础上记录当前线程的持有深度，读方法据此判断自己是否处于写操作内部
+    （处于写操作内部时必须继续使用写连接，才能看到尚未提交的修改）。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            self._local.depth = getattr(self._local, 'depth', 0) + 1
+        return acquired
+
+    def release(self):
+        self._local.depth -= 1
+        self._lock.release()
+
+    def held_by_current_thread(self) -> bool:
+        return getattr(self._local, 'depth', 0) > 0
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class _NoLock:
+    """读连接上下文中使用的空锁：读连接为线程独占，无需再串行化"""
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        return True
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NO_LOCK = _NoLock()
+
+
+class _ReadConnectionPool:
+    """只读连接池（WAL模式下读操作不会被写操作阻塞）"""
+
+    def __init__(self, db_path: str, size: int):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        conn.execute('PRAGMA busy_timeout = 5000')
+        conn.execute('PRAGMA query_only = ON')
+        return conn
+
+    def acquire(self, timeout: float = 5.0) -> Optional[sqlite3.Connection]:
+        """获取一个只读连接，池满且超时后返回 None"""
+        if self._closed:
+            return None
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def release(self, conn: sqlite3.Connection):
+        """归还只读连接"""
+        if self._closed:
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    def close(self):
+        """关闭池中所有空闲连接（使用中的连接在归还时关闭）"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            except Exception:
+                pass
+
+
+class _WriteQueue:
+    """单写线程队列
+
+    排队的写操作由后台线程按批取出，在同一个事务中依次执行后只提交一次（group commit），
+    高频写入（如AI对话记录）在消息突发时不再每条都单独 fsync。
+    每个操作使用独立的 SAVEPOINT，单个操作失败不影响同批其他操作。
+    """
+
+    def __init__(self, manager: 'DBManager', max_batch: int = 100):
+        self.manager = manager
+        self.max_batch = max(1, max_batch)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.stats = {'operations': 0, 'commits': 0, 'max_batch': 0}
+
+    def submit(self, operation: Callable[[sqlite3.Cursor], Any]) -> Future:
+        """提交写操作，operation 接收写连接的 cursor，返回值通过 Future 传回"""
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                    self._thread.start()
+        future = Future()
+        self._queue.put((operation, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._execute_batch(batch)
+
+    def _execute_batch(self, batch: list):
+        manager = self.manager
+        results = []
+        with manager.lock:
+            try:
+                cursor = manager.conn.cursor()
+                # 显式开启事务：没有外层事务时 RELEASE SAVEPOINT 会直接提交，每个操作都会单独 fsync
+                if not manager.conn.in_transaction:
+                    cursor.execute('BEGIN IMMEDIATE')
+                for operation, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        cursor.execute('SAVEPOINT write_queue_op')
+                        result = operation(cursor)
+                        cursor.execute('RELEASE SAVEPOINT write_queue_op')
+                        results.append((future, result, None))
+                    except Exception as e:
+                        try:
+                            cursor.execute('ROLLBACK TO SAVEPOINT write_queue_op')
+                            cursor.execute('RELEASE SAVEPOINT write_queue_op')
+                        except Exception:
+                            pass
+                        results.append((future, None, e))
+                manager.conn.commit()
+            except Exception as e:
+                logger.error(f"批量写入提交失败: {e}")
+                try:
+                    manager.conn.rollback()
+                except Exception:
+                    pass
+                for operation, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+        self.stats['operations'] += len(results)
+        self.stats['commits'] += 1
+        self.stats['max_batch'] = max(self.stats['max_batch'], len(results))
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+# SQLite LIKE 只对ASCII字母忽略大小写，索引匹配时使用相同的折叠规则
+_ASCII_CASE_FOLD = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+
+class _DeliveryRuleIndex:
+    """发货规则内存索引
+
+    替代 `? LIKE '%' || keyword || '%' OR keyword LIKE '%' || ? || '%'` 的全表扫描：
+    启用的规则与卡券在构建时一次性联表加载并预先折叠大小写，查询时只需对文本做一次折叠
+    和逐条子串判断。排序与原SQL一致：文本包含关键字时按关键字长度，关键字包含文本时按长度/2，
+    降序排列后再按规则ID（多规格查询按发货次数）排序。
+    """
+
+    __slots__ = ('entries',)
+
+    # 联表查询列顺序
+    COLUMNS = ('id', 'keyword', 'card_id', 'delivery_count', 'enabled', 'description', 'delivery_times',
+               'card_name', 'card_type', 'api_config', 'text_content', 'data_content', 'image_url',
+               'card_enabled', 'card_description', 'card_delay_seconds', 'is_multi_spec', 'spec_name', 'spec_value')
+
+    def __init__(self, rows: list):
+        self.entries = []
+        for row in rows:
+            entry = dict(zip(self.COLUMNS, row))
+            keyword = entry['keyword']
+            if keyword is None:
+                # NULL 关键字在 LIKE 中永远不匹配
+                continue
+            entry['_folded'] = keyword.translate(_ASCII_CASE_FOLD)
+            entry['_length'] = len(keyword)
+            self.entries.append(entry)
+
+    def _search(self, text: str, entry_filter=None) -> list:
+        """返回 [(得分, 条目)]，得分规则同原SQL中的 CASE 表达式"""
+        if text is None:
+            return []
+        folded_text = text.translate(_ASCII_CASE_FOLD)
+        matches = []
+        for entry in self.entries:
+            if entry_filter is not None and not entry_filter(entry):
+                continue
+            keyword = entry['_folded']
+            if keyword in folded_text:
+                matches.append((entry['_length'], entry))
+            elif folded_text in keyword:
+                matches.append((entry['_length'] // 2, entry))
+        return matches
+
+    @staticmethod
+    def _parse_api_config(api_config):
+        if api_config:
+            try:
+                return json.loads(api_config)
+            except (json.JSONDecodeError, TypeError):
+                # 如果解析失败，保持原始字符串
+                pass
+        return api_config
+
+    def match(self, text: str) -> list:
+        """对应 get_delivery_rules_by_keyword：不区分单规格/多规格"""
+        matches = self._search(text)
+        matches.sort(key=lambda m: (-m[0], m[1]['id']))
+        rules = []
+        for _, entry in matches:
+            rules.append({
+                'id': entry['id'],
+                'keyword': entry['keyword'],
+                'card_id': entry['card_id'],
+                'delivery_count': entry['delivery_count'],
+                'enabled': bool(entry['enabled']),
+                'description': entry['description'],
+                'delivery_times': entry['delivery_times'],
+                'card_name': entry['card_name'],
+                'card_type': entry['card_type'],
+                'api_config': self._parse_api_config(entry['api_config']),
+                'text_content': entry['text_content'],
+                'data_content': entry['data_content'],
+                'image_url': entry['image_url'],
+                'card_enabled': bool(entry['card_enabled']),
+                'card_description': entry['card_description'],
+                'card_delay_seconds': entry['card_delay_seconds'] or 0
+            })
+        return rules
+
+    def match_spec(self, text: str, spec_name: str = None, spec_value: str = None) -> list:
+        """对应 get_delivery_rules_by_keyword_and_spec：指定规格时只匹配该规格的多规格卡券，否则只匹配普通卡券"""
+        if spec_name is not None and spec_value is not None:
+            entry_filter = lambda e: (e['is_multi_spec'] == 1 and e['spec_name'] == spec_name
+                                      and e['spec_value'] == spec_value)
+        else:
+            entry_filter = lambda e: not e['is_multi_spec']
+        matches = self._search(text, entry_filter)
+        # SQLite 中 NULL 在升序排序中排在最前
+        matches.sort(key=lambda m: (-m[0], -1 if m[1]['delivery_times'] is None else m[1]['delivery_times'], m[1]['id']))
+        rules = []
+        for _, entry in matches:
+            rules.append({
+                'id': entry['id'],
+                'keyword': entry['keyword'],
+                'card_id': entry['card_id'],
+                'delivery_count': entry['delivery_count'],
+                'enabled': bool(entry['enabled']),
+                'description': entry['description'],
+                'delivery_times': entry['delivery_times'] or 0,
+                'card_name': entry['card_name'],
+                'card_type': entry['card_type'],
+                'api_config': self._parse_api_config(entry['api_config']),
+                'text_content': entry['text_content'],
+                'data_content': entry['data_content'],
+                'card_enabled': bool(entry['card_enabled']),
+                'card_description': entry['card_description'],
+                'card_delay_seconds': entry['card_delay_seconds'] or 0,
+                'is_multi_spec': bool(entry['is_multi_spec']),
+                'spec_name': entry['spec_name'],
+                'spec_value': entry['spec_value']
+            })
+        return rules
+
+    def increment_delivery_times(self, rule_id: int):
+        """同步内存中的发货次数（影响多规格查询的排序），避免每次发货都重建索引"""
+        for entry in self.entries:
+            if entry['id'] == rule_id:
+                entry['delivery_times'] = (entry['delivery_times'] or 0) + 1
+                break
+
+
+def _read_only(method):
+    """标记只读方法：在只读连接池上执行，不占用写锁"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.reader():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _cached_setting(name: str):
+    """标记账号配置读取方法（第一个参数为 cookie_id）：结果缓存在 settings_cache 中，配置写入方法提交后失效"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, cookie_id, *args):
+            return settings_cache.get(cookie_id, (name, *args), lambda: method(self, cookie_id, *args))
+        wrapper.cached_setting = name
+        return wrapper
+    return decorator
+
+
 class DBManager:
     """SQLite数据库管理，持久化存储Cookie和关键字"""
     
@@ -45,10 +390,29 @@ class DBManager:
                 db_path = os.path.basename(db_path)
                 logger.warning(f"使用当前目录作为数据库路径: {db_path}")
 
+        # 重新初始化（如恢复备份）时先释放旧的只读连接
+        if getattr(self, '_read_pool', None) is not None:
+            self._read_pool.close()
+
         self.db_path = db_path
         logger.info(f"数据库路径: {self.db_path}")
         self.conn = None
-        self.lock = threading.RLock()  # 使用可重入锁保护数据库操作
+        self._write_lock = _WriterLock()  # 写连接使用可重入锁串行化
+        self._read_local = threading.local()
+        self._read_pool = None
+        self.read_pool_size = int(os.getenv('DB_READ_POOL_SIZE', '4'))
+        # 发货规则内存索引（规则/卡券变更时失效，下次查询时重建）
+        self._delivery_rule_index = None
+        self._delivery_rule_index_generation = 0
+        self._delivery_rule_index_lock = threading.Lock()
+        # 发货规则索引失效时的回调（账号工作进程池用于同步失效），重新初始化时保留
+        if getattr(self, '_delivery_rule_listeners', None) is None:
+            self._delivery_rule_listeners = []
+        # 账号配置缓存失效时的回调（参数为 cookie_id，None 表示全部账号），重新初始化时保留
+        if getattr(self, '_settings_listeners', None) is None:
+            self._settings_listeners = []
+        if getattr(self, '_write_queue', None) is None:
+            self._write_queue = _WriteQueue(self, int(os.getenv('DB_WRITE_BATCH_SIZE', '100')))
 
         # SQL日志配置 - 默认启用
         self.sql_log_enabled = True  # 默认启用SQL日志
@@ -63,392 +427,549 @@ class DBManager:
         logger.info(f"SQL日志已启用，日志级别: {self.sql_log_level}")
 
         self.init_db()
-    
-    def init_db(self):
-        """初始化数据库表结构"""
-        try:
-            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-            cursor = self.conn.cursor()
-            
-            # 创建用户表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
-
-            # 创建邮箱验证码表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS email_verifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT NOT NULL,
-                code TEXT NOT NULL,
-                expires_at TIMESTAMP NOT NULL,
-                used BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
-
-            # 创建图形验证码表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS captcha_codes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                code TEXT NOT NULL,
-                expires_at TIMESTAMP NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
-
-            # 创建cookies表（添加user_id字段和auto_confirm字段）
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cookies (
-                id TEXT PRIMARY KEY,
-                value TEXT NOT NULL,
-                user_id INTEGER NOT NULL,
-                auto_confirm INTEGER DEFAULT 1,
-                remark TEXT DEFAULT '',
-                pause_duration INTEGER DEFAULT 10,
-                username TEXT DEFAULT '',
-                password TEXT DEFAULT '',
-                show_browser INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-            ''')
-
-            
-            # 创建keywords表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS keywords (
-                cookie_id TEXT,
-                keyword TEXT,
-                reply TEXT,
-                item_id TEXT,
-                type TEXT DEFAULT 'text',
-                image_url TEXT,
-                FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
-            )
-            ''')
+        # 表结构就绪后再启用只读连接池，初始化/迁移期间的读取都走写连接
+        self._read_pool = _ReadConnectionPool(self.db_path, self.read_pool_size)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """当前线程应使用的连接：只读上下文中为池化的只读连接，否则为写连接"""
+        read_conn = getattr(self._read_local, 'conn', None)
+        return read_conn if read_conn is not None else self._write_conn
+
+    @conn.setter
+    def conn(self, value):
+        self._write_conn = value
+
+    @property
+    def lock(self):
+        """当前线程应使用的锁：只读上下文中为空锁，否则为写锁"""
+        if getattr(self._read_local, 'conn', None) is not None:
+            return _NO_LOCK
+        return self._write_lock
+
+    @contextmanager
+    def reader(self):
+        """只读上下文：在此范围内 self.conn 为只读连接，self.lock 不再阻塞
+
+        处于写操作内部（当前线程持有写锁）或连接池不可用时，继续使用写连接。
+        """
+        local = self._read_local
+        pool = self._read_pool
+        if getattr(local, 'conn', None) is not None or pool is None or self._write_lock.held_by_current_thread():
+            yield
+            return
 
-            # 创建cookie_status表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cookie_status (
-                cookie_id TEXT PRIMARY KEY,
-                enabled BOOLEAN DEFAULT TRUE,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
-            )
-            ''')
+        conn = pool.acquire()
+        if conn is None:
+            logger.warning("只读连接池已耗尽，回退到写连接")
+            yield
+            return
 
-            # 创建AI回复配置表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ai_reply_settings (
-                cookie_id TEXT PRIMARY KEY,
-                ai_enabled BOOLEAN DEFAULT FALSE,
-                model_name TEXT DEFAULT 'qwen-plus',
-                api_key TEXT,
-                base_url TEXT DEFAULT 'https://dashscope.aliyuncs.com/compatible-mode/v1',
-                max_discount_percent INTEGER DEFAULT 10,
-                max_discount_amount INTEGER DEFAULT 100,
-                max_bargain_rounds INTEGER DEFAULT 3,
-                custom_prompts TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
-            )
-            ''')
+        local.conn = conn
+        try:
+            yield
+        finally:
+            local.conn = None
+            pool.release(conn)
+
+    def submit_write(self, operation: Callable[[sqlite3.Cursor], Any]) -> Future:
+        """将写操作提交到单写线程队列，与同时排队的其他写操作合并提交"""
+        return self._write_queue.submit(operation)
+
+    def execute_write(self, operation: Callable[[sqlite3.Cursor], Any], timeout: float = 30) -> Any:
+        """提交写操作并等待其提交完成，返回 operation 的返回值"""
+        return self.submit_write(operation).result(timeout=timeout)
+
+    def _connect_writer(self) -> sqlite3.Connection:
+        """创建写连接并启用WAL模式"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute('PRAGMA busy_timeout = 5000')
+        except sqlite3.Error as e:
+            logger.warning(f"启用WAL模式失败，继续使用默认日志模式: {e}")
+        return conn
+
+    def checkpoint(self):
+        """将WAL中的内容写回主数据库文件（复制/下载数据库文件前调用）"""
+        with self.lock:
+            if self._write_conn:
+                try:
+                    self._write_conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                except sqlite3.Error as e:
+                    logger.warning(f"WAL检查点执行失败: {e}")
+
+    # 数据库结构迁移步骤（版本号, 说明, 方法名），按顺序执行，已执行到的版本记录在 PRAGMA user_version 中。
+    # 1~4 为引入版本号之前的初始化逻辑（均可重复执行），未记录版本号的旧数据库会全部执行一次。
+    # 新的表结构变更追加到末尾，已发布的步骤不要修改或调整顺序。
+    SCHEMA_MIGRATIONS = (
+        (1, '创建数据表与默认系统设置', '_create_base_tables'),
+        (2, '补充旧版本数据表缺失的列', '_add_legacy_columns'),
+        (3, '旧版本号（system_settings.db_version）升级与遗留数据迁移', 'check_and_upgrade_db'),
+        (4, '卡券约束、卡券库存与账号字段迁移', '_migrate_database'),
+    )
+    SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
 
-            # 创建AI对话历史表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ai_conversations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cookie_id TEXT NOT NULL,
-                chat_id TEXT NOT NULL,
-                user_id TEXT NOT NULL,
-                item_id TEXT NOT NULL,
-                role TEXT NOT NULL,
-                content TEXT NOT NULL,
-                intent TEXT,
-                bargain_count INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (cookie_id) REFERENCES cookies (id) ON DELETE CASCADE
-            )
-            ''')
+    def init_db(self):
+        """初始化数据库表结构
 
-            # 创建AI商品信息缓存表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ai_item_cache (
-                item_id TEXT PRIMARY KEY,
-                data TEXT NOT NULL,
-                price REAL,
-                description TEXT,
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
+        表结构已是最新版本时直接返回，不再逐条检查表和列；否则在同一个事务中执行尚未执行的迁移步骤，
+        任一步骤失败则整体回滚，下次启动时重试。
+        """
+        try:
+            self.conn = self._connect_writer()
+            cursor = self.conn.cursor()
 
-            # 创建卡券表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cards (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                type TEXT NOT NULL CHECK (type IN ('api', 'text', 'data', 'image')),
-                api_config TEXT,
-                text_content TEXT,
-                data_content TEXT,
-                image_url TEXT,
-                description TEXT,
-                enabled BOOLEAN DEFAULT TRUE,
-                delay_seconds INTEGER DEFAULT 0,
-                is_multi_spec BOOLEAN DEFAULT FALSE,
-                spec_name TEXT,
-                spec_value TEXT,
-                user_id INTEGER NOT NULL DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-            ''')
+            current_version = cursor.execute('PRAGMA user_version').fetchone()[0]
+            if current_version == self.SCHEMA_VERSION:
+                logger.info(f"数据库结构已是最新版本 (v{current_version})")
+                return
+            if current_version > self.SCHEMA_VERSION:
+                logger.warning(f"数据库结构版本 v{current_version} 高于当前程序支持的 v{self.SCHEMA_VERSION}，跳过迁移")
+                return
 
-            # 创建订单表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS orders (
-                order_id TEXT PRIMARY KEY,
-                item_id TEXT,
-                buyer_id TEXT,
-                spec_name TEXT,
-                spec_value TEXT,
-                quantity TEXT,
-                amount TEXT,
-                order_status TEXT DEFAULT 'unknown',
-                cookie_id TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
-            )
-            ''')
+            started = time.time()
+            # 多个进程（如账号工作进程）同时启动时只有一个执行迁移，其余进程等待写锁后重新读取版本号
+            cursor.execute('PRAGMA busy_timeout = 600000')
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('PRAGMA busy_timeout = 5000')
+            current_version = cursor.execute('PRAGMA user_version').fetchone()[0]
+            if current_version >= self.SCHEMA_VERSION:
+                self.conn.rollback()
+                logger.info(f"数据库结构已由其他进程升级到 v{current_version}")
+                return
 
-            # 检查并添加 user_id 列（用于数据库迁移）
-            try:
-                self._execute_sql(cursor, "SELECT user_id FROM cards LIMIT 1")
-            except sqlite3.OperationalError:
-                # user_id 列不存在，需要添加
-                logger.info("正在为 cards 表添加 user_id 列...")
-                self._execute_sql(cursor, "ALTER TABLE cards ADD COLUMN user_id INTEGER NOT NULL DEFAULT 1")
-                self._execute_sql(cursor, "CREATE INDEX IF NOT EXISTS idx_cards_user_id ON cards(user_id)")
-                logger.info("cards 表 user_id 列添加完成")
+            for version, description, method_name in self.SCHEMA_MIGRATIONS:
+                if version <= current_version:
+                    continue
+                logger.info(f"执行数据库迁移 v{version}: {description}")
+                getattr(self, method_name)(cursor)
+            cursor.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
 
-            # 检查并添加 delay_seconds 列（用于自动发货延时功能）
-            try:
-                self._execute_sql(cursor, "SELECT delay_seconds FROM cards LIMIT 1")
-            except sqlite3.OperationalError:
-                # delay_seconds 列不存在，需要添加
-                logger.info("正在为 cards 表添加 delay_seconds 列...")
-                self._execute_sql(cursor, "ALTER TABLE cards ADD COLUMN delay_seconds INTEGER DEFAULT 0")
-                logger.info("cards 表 delay_seconds 列添加完成")
+            self.conn.commit()
+            logger.info(f"数据库初始化完成: v{current_version} -> v{self.SCHEMA_VERSION}，耗时 {time.time() - started:.2f} 秒")
+        except Exception as e:
+            logger.error(f"数据库初始化失败: {e}")
+            self.conn.rollback()
+            raise
 
-            # 检查并添加 item_id 列（用于自动回复商品ID功能）
-            try:
-                self._execute_sql(cursor, "SELECT item_id FROM keywords LIMIT 1")
-            except sqlite3.OperationalError:
-                # item_id 列不存在，需要添加
-                logger.info("正在为 keywords 表添加 item_id 列...")
-                self._execute_sql(cursor, "ALTER TABLE keywords ADD COLUMN item_id TEXT")
-                logger.info("keywords 表 item_id 列添加完成")
+    def _create_base_tables(self, cursor):
+        """创建所有数据表、索引并插入默认系统设置"""
+        # 创建用户表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        # 创建邮箱验证码表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS email_verifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL,
+            code TEXT NOT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            used BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        # 创建图形验证码表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS captcha_codes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            code TEXT NOT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        # 创建cookies表（添加user_id字段和auto_confirm字段）
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cookies (
+            id TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            auto_confirm INTEGER DEFAULT 1,
+            remark TEXT DEFAULT '',
+            pause_duration INTEGER DEFAULT 10,
+            username TEXT DEFAULT '',
+            password TEXT DEFAULT '',
+            show_browser INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+        ''')
 
-            # 创建商品信息表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS item_info (
+        
+        # 创建keywords表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS keywords (
+            cookie_id TEXT,
+            keyword TEXT,
+            reply TEXT,
+            item_id TEXT,
+            type TEXT DEFAULT 'text',
+            image_url TEXT,
+            FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
+        )
+        ''')
+
+        # 创建cookie_status表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cookie_status (
+            cookie_id TEXT PRIMARY KEY,
+            enabled BOOLEAN DEFAULT TRUE,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
+        )
+        ''')
+
+        # 创建AI回复配置表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_reply_settings (
+            cookie_id TEXT PRIMARY KEY,
+            ai_enabled BOOLEAN DEFAULT FALSE,
+            model_name TEXT DEFAULT 'qwen-plus',
+            api_key TEXT,
+            base_url TEXT DEFAULT 'https://dashscope.aliyuncs.com/compatible-mode/v1',
+            max_discount_percent INTEGER DEFAULT 10,
+            max_discount_amount INTEGER DEFAULT 100,
+            max_bargain_rounds INTEGER DEFAULT 3,
+            custom_prompts TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
+        )
+        ''')
+
+        # 创建AI对话历史表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cookie_id TEXT NOT NULL,
+            chat_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            intent TEXT,
+            bargain_count INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (cookie_id) REFERENCES cookies (id) ON DELETE CASCADE
+        )
+        ''')
+
+        # 创建AI商品信息缓存表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_item_cache (
+            item_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            price REAL,
+            description TEXT,
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        # 创建卡券表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cards (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL CHECK (type IN ('api', 'text', 'data', 'image')),
+            api_config TEXT,
+            text_content TEXT,
+            data_content TEXT,
+            image_url TEXT,
+            description TEXT,
+            enabled BOOLEAN DEFAULT TRUE,
+            delay_seconds INTEGER DEFAULT 0,
+            is_multi_spec BOOLEAN DEFAULT FALSE,
+            spec_name TEXT,
+            spec_value TEXT,
+            user_id INTEGER NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''')
+
+        # 创建卡券库存表（批量数据卡券一行一条，按订单领取）
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS card_inventory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            card_id INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            order_id TEXT,
+            claimed_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (card_id) REFERENCES cards(id) ON DELETE CASCADE
+        )
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_card_inventory_available
+        ON card_inventory(card_id, id) WHERE claimed_at IS NULL
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_card_inventory_order
+        ON card_inventory(order_id, card_id)
+        ''')
+
+        # 创建已处理消息表（消息去重窗口持久化，重启后不重复回复同步通道重放的消息）
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS processed_messages (
+            cookie_id TEXT NOT NULL,
+            message_id TEXT NOT NULL,
+            processed_at REAL NOT NULL,
+            PRIMARY KEY (cookie_id, message_id)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_processed_messages_time
+        ON processed_messages(cookie_id, processed_at)
+        ''')
+
+        # 创建账号Token缓存表（重启后复用仍有效的 accessToken 与设备ID，跳过Token刷新）
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS account_tokens (
+            cookie_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            access_token TEXT NOT NULL,
+            device_id TEXT NOT NULL,
+            obtained_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        ''')
+
+        # 创建订单表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            order_id TEXT PRIMARY KEY,
+            item_id TEXT,
+            buyer_id TEXT,
+            spec_name TEXT,
+            spec_value TEXT,
+            quantity TEXT,
+            amount TEXT,
+            order_status TEXT DEFAULT 'unknown',
+            cookie_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
+        )
+        ''')
+
+        # 创建商品信息表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS item_info (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cookie_id TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            item_title TEXT,
+            item_description TEXT,
+            item_category TEXT,
+            item_price TEXT,
+            item_detail TEXT,
+            is_multi_spec BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE,
+            UNIQUE(cookie_id, item_id)
+        )
+        ''')
+
+        # 创建自动发货规则表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS delivery_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            keyword TEXT NOT NULL,
+            card_id INTEGER NOT NULL,
+            delivery_count INTEGER DEFAULT 1,
+            enabled BOOLEAN DEFAULT TRUE,
+            description TEXT,
+            delivery_times INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (card_id) REFERENCES cards(id) ON DELETE CASCADE
+        )
+        ''')
+
+        # 创建默认回复表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS default_replies (
+            cookie_id TEXT PRIMARY KEY,
+            enabled BOOLEAN DEFAULT FALSE,
+            reply_content TEXT,
+            reply_once BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
+        )
+        ''')
+
+        # 创建指定商品回复表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS item_replay (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cookie_id TEXT NOT NULL,
                 item_id TEXT NOT NULL,
-                item_title TEXT,
-                item_description TEXT,
-                item_category TEXT,
-                item_price TEXT,
-                item_detail TEXT,
-                is_multi_spec BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE,
-                UNIQUE(cookie_id, item_id)
-            )
-            ''')
-
-            # 检查并添加 multi_quantity_delivery 列（用于多数量发货功能）
-            try:
-                self._execute_sql(cursor, "SELECT multi_quantity_delivery FROM item_info LIMIT 1")
-            except sqlite3.OperationalError:
-                # multi_quantity_delivery 列不存在，需要添加
-                logger.info("正在为 item_info 表添加 multi_quantity_delivery 列...")
-                self._execute_sql(cursor, "ALTER TABLE item_info ADD COLUMN multi_quantity_delivery BOOLEAN DEFAULT FALSE")
-                logger.info("item_info 表 multi_quantity_delivery 列添加完成")
-
-            # 创建自动发货规则表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS delivery_rules (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                keyword TEXT NOT NULL,
-                card_id INTEGER NOT NULL,
-                delivery_count INTEGER DEFAULT 1,
-                enabled BOOLEAN DEFAULT TRUE,
-                description TEXT,
-                delivery_times INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (card_id) REFERENCES cards(id) ON DELETE CASCADE
-            )
-            ''')
-
-            # 创建默认回复表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS default_replies (
-                cookie_id TEXT PRIMARY KEY,
-                enabled BOOLEAN DEFAULT FALSE,
-                reply_content TEXT,
-                reply_once BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
-            )
-            ''')
-
-            # 添加 reply_once 字段（如果不存在）
-            try:
-                cursor.execute('ALTER TABLE default_replies ADD COLUMN reply_once BOOLEAN DEFAULT FALSE')
-                self.conn.commit()
-                logger.info("已添加 reply_once 字段到 default_replies 表")
-            except sqlite3.OperationalError as e:
-                if "duplicate column name" not in str(e).lower():
-                    logger.warning(f"添加 reply_once 字段失败: {e}")
-
-            # 创建指定商品回复表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS item_replay (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    item_id TEXT NOT NULL,
-                    cookie_id TEXT NOT NULL,
-                    reply_content TEXT NOT NULL ,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            # 创建默认回复记录表（记录已回复的chat_id）
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS default_reply_records (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
                 cookie_id TEXT NOT NULL,
-                chat_id TEXT NOT NULL,
-                replied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(cookie_id, chat_id),
-                FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
-            )
-            ''')
-
-            # 创建通知渠道表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS notification_channels (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                type TEXT NOT NULL CHECK (type IN ('qq','ding_talk','dingtalk','feishu','lark','bark','email','webhook','wechat','telegram')),
-                config TEXT NOT NULL,
-                enabled BOOLEAN DEFAULT TRUE,
+                reply_content TEXT NOT NULL ,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
-            ''')
-
-            # 创建系统设置表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS system_settings (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL,
-                description TEXT,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
-
-            # 创建消息通知配置表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS message_notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cookie_id TEXT NOT NULL,
-                channel_id INTEGER NOT NULL,
-                enabled BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE,
-                FOREIGN KEY (channel_id) REFERENCES notification_channels(id) ON DELETE CASCADE,
-                UNIQUE(cookie_id, channel_id)
-            )
-            ''')
-
-            # 创建用户设置表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_settings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                key TEXT NOT NULL,
-                value TEXT NOT NULL,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                UNIQUE(user_id, key)
-            )
-            ''')
-
-            # 创建风控日志表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS risk_control_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cookie_id TEXT NOT NULL,
-                event_type TEXT NOT NULL DEFAULT 'slider_captcha',
-                event_description TEXT,
-                processing_result TEXT,
-                processing_status TEXT DEFAULT 'processing',
-                error_message TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
-            )
-            ''')
-
-            # 插入默认系统设置（不包括管理员密码，由reply_server.py初始化）
-            cursor.execute('''
-            INSERT OR IGNORE INTO system_settings (key, value, description) VALUES
-            ('theme_color', 'blue', '主题颜色'),
-            ('registration_enabled', 'true', '是否开启用户注册'),
-            ('show_default_login_info', 'true', '是否显示默认登录信息'),
-            ('smtp_server', '', 'SMTP服务器地址'),
-            ('smtp_port', '587', 'SMTP端口'),
-            ('smtp_user', '', 'SMTP登录用户名（发件邮箱）'),
-            ('smtp_password', '', 'SMTP登录密码/授权码'),
-            ('smtp_from', '', '发件人显示名（留空则使用用户名）'),
-            ('smtp_use_tls', 'true', '是否启用TLS'),
-            ('smtp_use_ssl', 'false', '是否启用SSL'),
-            ('qq_reply_secret_key', 'xianyu_qq_reply_2024', 'QQ回复消息API秘钥')
-            ''')
-
-            # 检查并升级数据库
-            self.check_and_upgrade_db(cursor)
-
-            # 执行数据库迁移
-            self._migrate_database(cursor)
-
-            self.conn.commit()
-            logger.info("数据库初始化完成")
-        except Exception as e:
-            logger.error(f"数据库初始化失败: {e}")
-            self.conn.rollback()
-            raise
+        ''')
+
+        # 创建默认回复记录表（记录已回复的chat_id）
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS default_reply_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cookie_id TEXT NOT NULL,
+            chat_id TEXT NOT NULL,
+            replied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(cookie_id, chat_id),
+            FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
+        )
+        ''')
+
+        # 创建通知渠道表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notification_channels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL CHECK (type IN ('qq','ding_talk','dingtalk','feishu','lark','bark','email','webhook','wechat','telegram')),
+            config TEXT NOT NULL,
+            enabled BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        # 创建系统设置表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS system_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            description TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        # 创建消息通知配置表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS message_notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cookie_id TEXT NOT NULL,
+            channel_id INTEGER NOT NULL,
+            enabled BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE,
+            FOREIGN KEY (channel_id) REFERENCES notification_channels(id) ON DELETE CASCADE,
+            UNIQUE(cookie_id, channel_id)
+        )
+        ''')
+
+        # 创建用户设置表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_settings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            UNIQUE(user_id, key)
+        )
+        ''')
+
+        # 创建风控日志表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS risk_control_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cookie_id TEXT NOT NULL,
+            event_type TEXT NOT NULL DEFAULT 'slider_captcha',
+            event_description TEXT,
+            processing_result TEXT,
+            processing_status TEXT DEFAULT 'processing',
+            error_message TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (cookie_id) REFERENCES cookies(id) ON DELETE CASCADE
+        )
+        ''')
+
+        # 插入默认系统设置（不包括管理员密码，由reply_server.py初始化）
+        cursor.execute('''
+        INSERT OR IGNORE INTO system_settings (key, value, description) VALUES
+        ('theme_color', 'blue', '主题颜色'),
+        ('registration_enabled', 'true', '是否开启用户注册'),
+        ('show_default_login_info', 'true', '是否显示默认登录信息'),
+        ('smtp_server', '', 'SMTP服务器地址'),
+        ('smtp_port', '587', 'SMTP端口'),
+        ('smtp_user', '', 'SMTP登录用户名（发件邮箱）'),
+        ('smtp_password', '', 'SMTP登录密码/授权码'),
+        ('smtp_from', '', '发件人显示名（留空则使用用户名）'),
+        ('smtp_use_tls', 'true', '是否启用TLS'),
+        ('smtp_use_ssl', 'false', '是否启用SSL'),
+        ('qq_reply_secret_key', 'xianyu_qq_reply_2024', 'QQ回复消息API秘钥')
+        ''')
+
+    def _add_legacy_columns(self, cursor):
+        """为旧版本创建的数据表补充缺失的列"""
+        # 检查并添加 user_id 列（用于数据库迁移）
+        try:
+            self._execute_sql(cursor, "SELECT user_id FROM cards LIMIT 1")
+        except sqlite3.OperationalError:
+            # user_id 列不存在，需要添加
+            logger.info("正在为 cards 表添加 user_id 列...")
+            self._execute_sql(cursor, "ALTER TABLE cards ADD COLUMN user_id INTEGER NOT NULL DEFAULT 1")
+            self._execute_sql(cursor, "CREATE INDEX IF NOT EXISTS idx_cards_user_id ON cards(user_id)")
+            logger.info("cards 表 user_id 列添加完成")
+
+        # 检查并添加 delay_seconds 列（用于自动发货延时功能）
+        try:
+            self._execute_sql(cursor, "SELECT delay_seconds FROM cards LIMIT 1")
+        except sqlite3.OperationalError:
+            # delay_seconds 列不存在，需要添加
+            logger.info("正在为 cards 表添加 delay_seconds 列...")
+            self._execute_sql(cursor, "ALTER TABLE cards ADD COLUMN delay_seconds INTEGER DEFAULT 0")
+            logger.info("cards 表 delay_seconds 列添加完成")
+
+        # 检查并添加 item_id 列（用于自动回复商品ID功能）
+        try:
+            self._execute_sql(cursor, "SELECT item_id FROM keywords LIMIT 1")
+        except sqlite3.OperationalError:
+            # item_id 列不存在，需要添加
+            logger.info("正在为 keywords 表添加 item_id 列...")
+            self._execute_sql(cursor, "ALTER TABLE keywords ADD COLUMN item_id TEXT")
+            logger.info("keywords 表 item_id 列添加完成")
+
+        # 检查并添加 multi_quantity_delivery 列（用于多数量发货功能）
+        try:
+            self._execute_sql(cursor, "SELECT multi_quantity_delivery FROM item_info LIMIT 1")
+        except sqlite3.OperationalError:
+            # multi_quantity_delivery 列不存在，需要添加
+            logger.info("正在为 item_info 表添加 multi_quantity_delivery 列...")
+            self._execute_sql(cursor, "ALTER TABLE item_info ADD COLUMN multi_quantity_delivery BOOLEAN DEFAULT FALSE")
+            logger.info("item_info 表 multi_quantity_delivery 列添加完成")
+
+        # 添加 reply_once 字段（如果不存在）
+        try:
+            cursor.execute('ALTER TABLE default_replies ADD COLUMN reply_once BOOLEAN DEFAULT FALSE')
+            logger.info("已添加 reply_once 字段到 default_replies 表")
+        except sqlite3.OperationalError as e:
+            if "duplicate column name" not in str(e).lower():
+                logger.warning(f"添加 reply_once 字段失败: {e}")
 
     def _migrate_database(self, cursor):
         """执行数据库迁移"""
@@ -465,6 +986,9 @@ class DBManager:
             # 检查并更新CHECK约束（重建表以支持image类型）
             self._update_cards_table_constraints(cursor)
 
+            # 将批量数据卡券的 data_content 文本迁移到 card_inventory 表
+            self._migrate_card_data_to_inventory(cursor)
+
             # 检查cookies表是否存在remark列
             cursor.execute("PRAGMA table_info(cookies)")
             cookie_columns = [column[1] for column in cursor.fetchall()]
@@ -485,6 +1009,31 @@ class DBManager:
             # 迁移失败不应该阻止程序启动
             pass
 
+    def _migrate_card_data_to_inventory(self, cursor):
+        """将 cards.data_content 中的批量数据按行拆分写入 card_inventory，并清空原字段
+
+        迁移后 data_content 仅为兼容保留（始终为空），库存以 card_inventory 为准。
+        导入旧版备份后也会调用，保证旧格式数据被转换。
+        """
+        cursor.execute('''
+        SELECT id, data_content FROM cards
+        WHERE type = 'data' AND data_content IS NOT NULL AND data_content != ''
+        ''')
+        cards = cursor.fetchall()
+        if not cards:
+            return
+
+        total = 0
+        for card_id, data_content in cards:
+            lines = [line.strip() for line in data_content.split('\n') if line.strip()]
+            cursor.executemany(
+                "INSERT INTO card_inventory (card_id, content) VALUES (?, ?)",
+                [(card_id, line) for line in lines]
+            )
+            cursor.execute("UPDATE cards SET data_content = NULL WHERE id = ?", (card_id,))
+            total += len(lines)
+        logger.info(f"批量数据已迁移到卡券库存表: {len(cards)} 个卡券, {total} 条数据")
+
     def _update_cards_table_constraints(self, cursor):
         """更新cards表的CHECK约束以支持image类型"""
         try:
@@ -564,28 +1113,28 @@ class DBManager:
             if current_version == "1.0":
                 logger.info("开始升级数据库到版本1.0...")
                 self.update_admin_user_id(cursor)
-                self.set_system_setting("db_version", "1.0", "数据库版本号")
+                self._set_legacy_db_version(cursor, "1.0")
                 logger.info("数据库升级到版本1.0完成")
             
             # 如果版本低于需要升级的版本，执行升级
             if current_version < "1.1":
                 logger.info("开始升级数据库到版本1.1...")
                 self.upgrade_notification_channels_table(cursor)
-                self.set_system_setting("db_version", "1.1", "数据库版本号")
+                self._set_legacy_db_version(cursor, "1.1")
                 logger.info("数据库升级到版本1.1完成")
 
             # 升级到版本1.2 - 支持更多通知渠道类型
             if current_version < "1.2":
                 logger.info("开始升级数据库到版本1.2...")
                 self.upgrade_notification_channels_types(cursor)
-                self.set_system_setting("db_version", "1.2", "数据库版本号")
+                self._set_legacy_db_version(cursor, "1.2")
                 logger.info("数据库升级到版本1.2完成")
 
             # 升级到版本1.3 - 添加关键词类型和图片URL字段
             if current_version < "1.3":
                 logger.info("开始升级数据库到版本1.3...")
                 self.upgrade_keywords_table_for_image_support(cursor)
-                self.set_system_setting("db_version", "1.3", "数据库版本号")
+                self._set_legacy_db_version(cursor, "1.3")
                 logger.info("数据库升级到版本1.3完成")
             
             
@@ -593,14 +1142,14 @@ class DBManager:
             if current_version < "1.4":
                 logger.info("开始升级数据库到版本1.4...")
                 self.upgrade_notification_channels_types(cursor)
-                self.set_system_setting("db_version", "1.4", "数据库版本号")
+                self._set_legacy_db_version(cursor, "1.4")
                 logger.info("数据库升级到版本1.4完成")
 
             # 升级到版本1.5 - 为cookies表添加账号登录字段
             if current_version < "1.5":
                 logger.info("开始升级数据库到版本1.5...")
                 self.upgrade_cookies_table_for_account_login(cursor)
-                self.set_system_setting("db_version", "1.5", "数据库版本号")
+                self._set_legacy_db_version(cursor, "1.5")
                 logger.info("数据库升级到版本1.5完成")
 
             # 迁移遗留数据（在所有版本升级完成后执行）
@@ -610,6 +1159,13 @@ class DBManager:
             logger.error(f"数据库版本检查或升级失败: {e}")
             raise
             
+    def _set_legacy_db_version(self, cursor, version: str):
+        """在当前迁移事务中记录旧版本号（system_settings.db_version）"""
+        cursor.execute('''
+        INSERT OR REPLACE INTO system_settings (key, value, description, updated_at)
+        VALUES ('db_version', ?, '数据库版本号', CURRENT_TIMESTAMP)
+        ''', (version,))
+
     def update_admin_user_id(self, cursor):
         """更新admin用户ID"""
         try:
@@ -718,7 +1274,6 @@ class DBManager:
                 # 由于SQLite不支持直接修改约束，我们需要重建表
                 self._migrate_keywords_table_constraints(cursor)
 
-            self.conn.commit()
             logger.info(f"admin用户ID更新完成")
         except Exception as e:
             logger.error(f"更新admin用户ID失败: {e}")
@@ -1095,14 +1650,17 @@ class DBManager:
 
     def close(self):
         """关闭数据库连接"""
-        if self.conn:
-            self.conn.close()
-            self.conn = None
+        if self._read_pool is not None:
+            self._read_pool.close()
+        if self._write_conn:
+            self.checkpoint()
+            self._write_conn.close()
+            self._write_conn = None
     
     def get_connection(self):
         """获取数据库连接，如果已关闭则重新连接"""
-        if self.conn is None:
-            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        if self._write_conn is None:
+            self._write_conn = self._connect_writer()
         return self.conn
 
     def _log_sql(self, sql: str, params: tuple = None, operation: str = "EXECUTE"):
@@ -1177,6 +1735,7 @@ class DBManager:
                 )
 
                 self.conn.commit()
+                self._invalidate_settings(cookie_id)
                 logger.info(f"Cookie保存成功: {cookie_id} (用户ID: {user_id})")
 
                 # 验证保存结果
@@ -1200,9 +1759,14 @@ class DBManager:
                 cursor = self.conn.cursor()
                 # 删除关联的关键字
                 self._execute_sql(cursor, "DELETE FROM keywords WHERE cookie_id = ?", (cookie_id,))
+                # 删除消息去重记录
+                self._execute_sql(cursor, "DELETE FROM processed_messages WHERE cookie_id = ?", (cookie_id,))
+                # 删除Token缓存
+                self._execute_sql(cursor, "DELETE FROM account_tokens WHERE cookie_id = ?", (cookie_id,))
                 # 删除Cookie
                 self._execute_sql(cursor, "DELETE FROM cookies WHERE id = ?", (cookie_id,))
                 self.conn.commit()
+                self._invalidate_settings(cookie_id)
                 logger.debug(f"Cookie删除成功: {cookie_id}")
                 return True
             except Exception as e:
@@ -1210,6 +1774,7 @@ class DBManager:
                 self.conn.rollback()
                 return False
     
+    @_read_only
     def get_cookie(self, cookie_id: str) -> Optional[str]:
         """获取指定Cookie值"""
         with self.lock:
@@ -1222,6 +1787,7 @@ class DBManager:
                 logger.error(f"获取Cookie失败: {e}")
                 return None
     
+    @_read_only
     def get_all_cookies(self, user_id: int = None) -> Dict[str, str]:
         """获取所有Cookie（支持用户隔离）"""
         with self.lock:
@@ -1238,6 +1804,7 @@ class DBManager:
 
 
 
+    @_read_only
     def get_cookie_by_id(self, cookie_id: str) -> Optional[Dict[str, str]]:
         """根据ID获取Cookie信息
 
@@ -1264,6 +1831,7 @@ class DBManager:
                 logger.error(f"根据ID获取Cookie失败: {e}")
                 return None
 
+    @_read_only
     def get_cookie_details(self, cookie_id: str) -> Optional[Dict[str, any]]:
         """获取Cookie的详细信息，包括user_id、auto_confirm、remark、pause_duration、username、password和show_browser"""
         with self.lock:
@@ -1289,6 +1857,34 @@ class DBManager:
                 logger.error(f"获取Cookie详细信息失败: {e}")
                 return None
 
+    @_read_only
+    def get_startup_profiles(self, pending_statuses: tuple = ('processing', 'pending_ship'),
+                             since_hours: float = 72) -> Dict[str, Dict[str, Any]]:
+        """一次查询获取所有账号的启动信息（user_id 与近期待处理订单数），供启动时排序
+
+        Returns:
+            {cookie_id: {'user_id': ..., 'pending_orders': ...}}
+        """
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                placeholders = ','.join('?' * len(pending_statuses))
+                self._execute_sql(cursor, f'''
+                SELECT c.id, c.user_id, COUNT(o.order_id)
+                FROM cookies c
+                LEFT JOIN orders o ON o.cookie_id = c.id
+                    AND o.order_status IN ({placeholders})
+                    AND o.updated_at >= datetime('now', '-' || ? || ' hours')
+                GROUP BY c.id, c.user_id
+                ''', (*pending_statuses, since_hours))
+                return {
+                    row[0]: {'user_id': row[1], 'pending_orders': row[2]}
+                    for row in cursor.fetchall()
+                }
+            except Exception as e:
+                logger.error(f"获取账号启动信息失败: {e}")
+                return {}
+
     def update_auto_confirm(self, cookie_id: str, auto_confirm: bool) -> bool:
         """更新Cookie的自动确认发货设置"""
         with self.lock:
@@ -1296,6 +1892,7 @@ class DBManager:
                 cursor = self.conn.cursor()
                 self._execute_sql(cursor, "UPDATE cookies SET auto_confirm = ? WHERE id = ?", (int(auto_confirm), cookie_id))
                 self.conn.commit()
+                self._invalidate_settings(cookie_id)
                 logger.info(f"更新账号 {cookie_id} 自动确认发货设置: {'开启' if auto_confirm else '关闭'}")
                 return True
             except Exception as e:
@@ -1322,12 +1919,96 @@ class DBManager:
                 cursor = self.conn.cursor()
                 self._execute_sql(cursor, "UPDATE cookies SET pause_duration = ? WHERE id = ?", (pause_duration, cookie_id))
                 self.conn.commit()
+                self._invalidate_settings(cookie_id)
                 logger.info(f"更新账号 {cookie_id} 自动回复暂停时间: {pause_duration}分钟")
                 return True
             except Exception as e:
                 logger.error(f"更新账号自动回复暂停时间失败: {e}")
                 return False
 
+    def save_processed_messages(self, cookie_id: str, entries: List[Tuple[str, float]], expire_before: float = None) -> Future:
+        """批量保存已处理的消息ID（经单写线程队列合并提交，不等待完成）
+
+        Args:
+            cookie_id: 账号ID
+            entries: [(message_id, processed_at), ...]
+            expire_before: 同时删除该时间之前处理的记录
+        """
+        def _save(cursor):
+            cursor.executemany(
+                "INSERT OR REPLACE INTO processed_messages (cookie_id, message_id, processed_at) VALUES (?, ?, ?)",
+                [(cookie_id, message_id, processed_at) for message_id, processed_at in entries]
+            )
+            if expire_before is not None:
+                cursor.execute(
+                    "DELETE FROM processed_messages WHERE cookie_id = ? AND processed_at < ?",
+                    (cookie_id, expire_before)
+                )
+            return len(entries)
+
+        return self.submit_write(_save)
+
+    @_read_only
+    def get_processed_messages(self, cookie_id: str, since: float, limit: int = 10000) -> List[Tuple[str, float]]:
+        """获取指定时间之后处理的消息ID，按处理时间升序"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                SELECT message_id, processed_at FROM (
+                    SELECT message_id, processed_at FROM processed_messages
+                    WHERE cookie_id = ? AND processed_at >= ?
+                    ORDER BY processed_at DESC LIMIT ?
+                ) ORDER BY processed_at
+                ''', (cookie_id, since, limit))
+                return [(row[0], row[1]) for row in cursor.fetchall()]
+            except Exception as e:
+                logger.error(f"获取已处理消息记录失败: {e}")
+                return []
+
+    def save_account_token(self, cookie_id: str, user_id: str, access_token: str, device_id: str,
+                           obtained_at: float, expires_at: float) -> Future:
+        """保存账号的 accessToken 与设备ID（经单写线程队列提交，不等待完成）"""
+        def _save(cursor):
+            cursor.execute(
+                "INSERT OR REPLACE INTO account_tokens "
+                "(cookie_id, user_id, access_token, device_id, obtained_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (cookie_id, user_id, access_token, device_id, obtained_at, expires_at)
+            )
+
+        return self.submit_write(_save)
+
+    def delete_account_token(self, cookie_id: str) -> Future:
+        """删除账号的Token缓存（经单写线程队列提交，不等待完成）"""
+        return self.submit_write(
+            lambda cursor: cursor.execute("DELETE FROM account_tokens WHERE cookie_id = ?", (cookie_id,))
+        )
+
+    @_read_only
+    def get_account_token(self, cookie_id: str) -> Optional[Dict[str, Any]]:
+        """获取账号缓存的Token，不存在时返回 None"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
+                self._execute_sql(cursor, '''
+                SELECT user_id, access_token, device_id, obtained_at, expires_at
+                FROM account_tokens WHERE cookie_id = ?
+                ''', (cookie_id,))
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                return {
+                    'user_id': row[0],
+                    'access_token': row[1],
+                    'device_id': row[2],
+                    'obtained_at': row[3],
+                    'expires_at': row[4],
+                }
+            except Exception as e:
+                logger.error(f"获取账号Token缓存失败: {e}")
+                return None
+
+    @_cached_setting('pause_duration')
     def get_cookie_pause_duration(self, cookie_id: str) -> int:
         """获取Cookie的自动回复暂停时间"""
         with self.lock:
@@ -1440,6 +2121,8 @@ class DBManager:
                 self.conn.rollback()
                 return False
 
+    @_cached_setting('auto_confirm')
+    @_read_only
     def get_auto_confirm(self, cookie_id: str) -> bool:
         """获取Cookie的自动确认发货设置"""
         with self.lock:
@@ -1547,6 +2230,7 @@ class DBManager:
                 self.conn.rollback()
                 return False
     
+    @_read_only
     def get_keywords(self, cookie_id: str) -> List[Tuple[str, str]]:
         """获取指定Cookie的关键字列表（向后兼容方法）"""
         with self.lock:
@@ -1558,6 +2242,7 @@ class DBManager:
                 logger.error(f"获取关键字失败: {e}")
                 return []
 
+    @_read_only
     def get_keywords_with_item_id(self, cookie_id: str) -> List[Tuple[str, str, str]]:
         """获取指定Cookie的关键字列表（包含商品ID）"""
         with self.lock:
@@ -1569,6 +2254,7 @@ class DBManager:
                 logger.error(f"获取关键字失败: {e}")
                 return []
 
+    @_read_only
     def check_keyword_duplicate(self, cookie_id: str, keyword: str, item_id: str = None) -> bool:
         """检查关键词是否重复"""
         with self.lock:
@@ -1613,6 +2299,7 @@ class DBManager:
                 self.conn.rollback()
                 return False
 
+    @_read_only
     def get_keywords_with_type(self, cookie_id: str) -> List[Dict[str, any]]:
         """获取指定Cookie的关键字列表（包含类型信息）"""
         with self.lock:
@@ -1692,6 +2379,7 @@ class DBManager:
                 return False
 
 
+    @_read_only
     def get_all_keywords(self, user_id: int = None) -> Dict[str, List[Tuple[str, str]]]:
         """获取所有Cookie的关键字（支持用户隔离）"""
         with self.lock:
@@ -1734,6 +2422,7 @@ class DBManager:
                 logger.error(f"保存Cookie状态失败: {e}")
                 raise
 
+    @_read_only
     def get_cookie_status(self, cookie_id: str) -> bool:
         """获取Cookie的启用状态"""
         with self.lock:
@@ -1746,6 +2435,7 @@ class DBManager:
                 logger.error(f"获取Cookie状态失败: {e}")
                 return True  # 出错时默认启用
 
+    @_read_only
     def get_all_cookie_status(self) -> Dict[str, bool]:
         """获取所有Cookie的启用状态"""
         with self.lock:
@@ -1787,6 +2477,7 @@ class DBManager:
                     settings.get('custom_prompts', '')
                 ))
                 self.conn.commit()
+                self._invalidate_settings(cookie_id)
                 logger.debug(f"AI回复设置保存成功: {cookie_id}")
                 return True
             except Exception as e:
@@ -1794,6 +2485,8 @@ class DBManager:
                 self.conn.rollback()
                 return False
 
+    @_cached_setting('ai_reply_settings')
+    @_read_only
     def get_ai_reply_settings(self, cookie_id: str) -> dict:
         """获取AI回复设置"""
         with self.lock:
@@ -1843,6 +2536,7 @@ class DBManager:
                     'custom_prompts': ''
                 }
 
+    @_read_only
     def get_all_ai_reply_settings(self) -> Dict[str, dict]:
         """获取所有账号的AI回复设置"""
         with self.lock:
@@ -1885,11 +2579,14 @@ class DBManager:
                 VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
                 ''', (cookie_id, enabled, reply_content, reply_once))
                 self.conn.commit()
+                self._invalidate_settings(cookie_id)
                 logger.debug(f"保存默认回复设置: {cookie_id} -> {'启用' if enabled else '禁用'}, 只回复一次: {'是' if reply_once else '否'}")
             except Exception as e:
                 logger.error(f"保存默认回复设置失败: {e}")
                 raise
 
+    @_cached_setting('default_reply')
+    @_read_only
     def get_default_reply(self, cookie_id: str) -> Optional[Dict[str, any]]:
         """获取指定账号的默认回复设置"""
         with self.lock:
@@ -1911,6 +2608,7 @@ class DBManager:
                 logger.error(f"获取默认回复设置失败: {e}")
                 return None
 
+    @_read_only
     def get_all_default_replies(self) -> Dict[str, Dict[str, any]]:
         """获取所有账号的默认回复设置"""
         with self.lock:
@@ -1946,6 +2644,7 @@ class DBManager:
             except Exception as e:
                 logger.error(f"记录默认回复失败: {e}")
 
+    @_read_only
     def has_default_reply_record(self, cookie_id: str, chat_id: str) -> bool:
         """检查是否已经回复过该chat_id"""
         with self.lock:
@@ -1978,6 +2677,7 @@ class DBManager:
                 cursor = self.conn.cursor()
                 self._execute_sql(cursor, "DELETE FROM default_replies WHERE cookie_id = ?", (cookie_id,))
                 self.conn.commit()
+                self._invalidate_settings(cookie_id)
                 logger.debug(f"删除默认回复设置: {cookie_id}")
                 return True
             except Exception as e:
@@ -2004,6 +2704,7 @@ class DBManager:
                 self.conn.rollback()
                 raise
 
+    @_read_only
     def get_notification_channels(self, user_id: int = None) -> List[Dict[str, any]]:
         """获取所有通知渠道"""
         with self.lock:
@@ -2040,6 +2741,7 @@ class DBManager:
                 logger.error(f"获取通知渠道失败: {e}")
                 return []
 
+    @_read_only
     def get_notification_channel(self, channel_id: int) -> Optional[Dict[str, any]]:
         """获取指定通知渠道"""
         with self.lock:
@@ -2077,6 +2779,7 @@ class DBManager:
                 WHERE id = ?
                 ''', (name, config, enabled, channel_id))
                 self.conn.commit()
+                self._invalidate_settings()
                 logger.debug(f"更新通知渠道: {channel_id}")
                 return cursor.rowcount > 0
             except Exception as e:
@@ -2091,6 +2794,7 @@ class DBManager:
                 cursor = self.conn.cursor()
                 self._execute_sql(cursor, "DELETE FROM notification_channels WHERE id = ?", (channel_id,))
                 self.conn.commit()
+                self._invalidate_settings()
                 logger.debug(f"删除通知渠道: {channel_id}")
                 return cursor.rowcount > 0
             except Exception as e:
@@ -2109,6 +2813,7 @@ class DBManager:
                 VALUES (?, ?, ?)
                 ''', (cookie_id, channel_id, enabled))
                 self.conn.commit()
+                self._invalidate_settings(cookie_id)
                 logger.debug(f"设置消息通知: {cookie_id} -> {channel_id}")
                 return True
             except Exception as e:
@@ -2116,6 +2821,8 @@ class DBManager:
                 self.conn.rollback()
                 return False
 
+    @_cached_setting('account_notifications')
+    @_read_only
     def get_account_notifications(self, cookie_id: str) -> List[Dict[str, any]]:
         """获取账号的通知配置"""
         with self.lock:
@@ -2145,6 +2852,7 @@ class DBManager:
                 logger.error(f"获取账号通知配置失败: {e}")
                 return []
 
+    @_read_only
     def get_all_message_notifications(self) -> Dict[str, List[Dict[str, any]]]:
         """获取所有账号的通知配置"""
         with self.lock:
@@ -2185,6 +2893,7 @@ class DBManager:
                 cursor = self.conn.cursor()
                 self._execute_sql(cursor, "DELETE FROM message_notifications WHERE id = ?", (notification_id,))
                 self.conn.commit()
+                self._invalidate_settings()
                 logger.debug(f"删除消息通知配置: {notification_id}")
                 return cursor.rowcount > 0
             except Exception as e:
@@ -2199,6 +2908,7 @@ class DBManager:
                 cursor = self.conn.cursor()
                 self._execute_sql(cursor, "DELETE FROM message_notifications WHERE cookie_id = ?", (cookie_id,))
                 self.conn.commit()
+                self._invalidate_settings(cookie_id)
                 logger.debug(f"删除账号通知配置: {cookie_id}")
                 return cursor.rowcount > 0
             except Exception as e:
@@ -2207,6 +2917,7 @@ class DBManager:
                 return False
 
     # -------------------- 备份和恢复操作 --------------------
+    @_read_only
     def export_backup(self, user_id: int = None) -> Dict[str, any]:
         """导出系统备份数据（支持用户隔离）"""
         with self.lock:
@@ -2260,7 +2971,7 @@ class DBManager:
                 else:
                     # 系统级备份：备份所有数据
                     tables = [
-                        'cookies', 'keywords', 'cookie_status', 'cards',
+                        'cookies', 'keywords', 'cookie_status', 'cards', 'card_inventory',
                         'delivery_rules', 'default_replies', 'notification_channels',
                         'message_notifications', 'system_settings', 'item_info',
                         'ai_reply_settings', 'ai_conversations', 'ai_item_cache'
@@ -2317,7 +3028,7 @@ class DBManager:
                     # 系统级导入：清空所有数据（除了用户和管理员密码）
                     tables = [
                         'message_notifications', 'notification_channels', 'default_replies',
-                        'delivery_rules', 'cards', 'item_info', 'cookie_status', 'keywords',
+                        'delivery_rules', 'card_inventory', 'cards', 'item_info', 'cookie_status', 'keywords',
                         'ai_conversations', 'ai_reply_settings', 'ai_item_cache', 'cookies'
                     ]
 
@@ -2330,7 +3041,7 @@ class DBManager:
                 # 导入数据
                 data = backup_data['data']
                 for table_name, table_data in data.items():
-                    if table_name not in ['cookies', 'keywords', 'cookie_status', 'cards',
+                    if table_name not in ['cookies', 'keywords', 'cookie_status', 'cards', 'card_inventory',
                                         'delivery_rules', 'default_replies', 'notification_channels',
                                         'message_notifications', 'system_settings', 'item_info',
                                         'ai_reply_settings', 'ai_conversations', 'ai_item_cache']:
@@ -2363,8 +3074,13 @@ class DBManager:
                     else:
                         cursor.executemany(f"INSERT INTO {table_name} ({','.join(columns)}) VALUES ({placeholders})", rows)
 
+                # 旧版备份中的批量数据仍在 cards.data_content 中，导入后转换为库存行
+                self._migrate_card_data_to_inventory(cursor)
+
                 # 提交事务
                 self.conn.commit()
+                self._invalidate_delivery_rule_index()
+                self._invalidate_settings()
                 logger.info("导入备份成功")
                 return True
 
@@ -2374,6 +3090,7 @@ class DBManager:
                 return False
 
     # -------------------- 系统设置操作 --------------------
+    @_read_only
     def get_system_setting(self, key: str) -> Optional[str]:
         """获取系统设置"""
         with self.lock:
@@ -2403,6 +3120,7 @@ class DBManager:
                 self.conn.rollback()
                 return False
 
+    @_read_only
     def get_all_system_settings(self) -> Dict[str, str]:
         """获取所有系统设置"""
         with self.lock:
@@ -2447,6 +3165,7 @@ class DBManager:
                 self.conn.rollback()
                 return False
 
+    @_read_only
     def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
         """根据用户名获取用户信息"""
         with self.lock:
@@ -2473,6 +3192,7 @@ class DBManager:
                 logger.error(f"获取用户信息失败: {e}")
                 return None
 
+    @_read_only
     def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """根据邮箱获取用户信息"""
         with self.lock:
@@ -2546,7 +3266,8 @@ class DBManager:
             chars = string.ascii_uppercase + string.digits
             captcha_text = ''.join(random.choices(chars, k=4))
 
-            # 创建图片
+            # 创建图片（PIL 仅在生成验证码时导入）
+            from PIL import Image, ImageDraw, ImageFont
             width, height = 120, 40
             image = Image.new('RGB', (width, height), color='white')
             draw = ImageDraw.Draw(image)
@@ -2875,16 +3596,20 @@ class DBManager:
                     else:
                         api_config_str = str(api_config)
 
+                # 批量数据写入 card_inventory，cards.data_content 不再存放数据
                 cursor.execute('''
                 INSERT INTO cards (name, type, api_config, text_content, data_content, image_url,
                                  description, enabled, delay_seconds, is_multi_spec,
                                  spec_name, spec_value, user_id)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (name, card_type, api_config_str, text_content, data_content, image_url,
+                ''', (name, card_type, api_config_str, text_content, None, image_url,
                       description, enabled, delay_seconds, is_multi_spec,
                       spec_name, spec_value, user_id))
-                self.conn.commit()
                 card_id = cursor.lastrowid
+                if data_content:
+                    self._replace_card_inventory(cursor, card_id, data_content)
+                self.conn.commit()
+                self._invalidate_delivery_rule_index()
 
                 if is_multi_spec:
                     logger.info(f"创建多规格卡券成功: {name} - {spec_name}:{spec_value} (ID: {card_id})")
@@ -2895,6 +3620,7 @@ class DBManager:
                 logger.error(f"创建卡券失败: {e}")
                 raise
 
+    @_read_only
     def get_all_cards(self, user_id: int = None):
         """获取所有卡券（支持用户隔离）"""
         with self.lock:
@@ -2904,7 +3630,9 @@ class DBManager:
                     cursor.execute('''
                     SELECT id, name, type, api_config, text_content, data_content, image_url,
                            description, enabled, delay_seconds, is_multi_spec,
-                           spec_name, spec_value, created_at, updated_at
+                           spec_name, spec_value, created_at, updated_at,
+                           (SELECT COUNT(*) FROM card_inventory ci
+                            WHERE ci.card_id = cards.id AND ci.claimed_at IS NULL) as stock
                     FROM cards
                     WHERE user_id = ?
                     ORDER BY created_at DESC
@@ -2913,7 +3641,9 @@ class DBManager:
                     cursor.execute('''
                     SELECT id, name, type, api_config, text_content, data_content, image_url,
                            description, enabled, delay_seconds, is_multi_spec,
-                           spec_name, spec_value, created_at, updated_at
+                           spec_name, spec_value, created_at, updated_at,
+                           (SELECT COUNT(*) FROM card_inventory ci
+                            WHERE ci.card_id = cards.id AND ci.claimed_at IS NULL) as stock
                     FROM cards
                     ORDER BY created_at DESC
                     ''')
@@ -2945,7 +3675,9 @@ class DBManager:
                         'spec_name': row[11],
                         'spec_value': row[12],
                         'created_at': row[13],
-                        'updated_at': row[14]
+                        'updated_at': row[14],
+                        # 批量数据卡券的剩余库存（列表页不再返回完整数据，编辑时通过 get_card_by_id 获取）
+                        'stock': row[15] if row[2] == 'data' else None
                     })
 
                 return cards
@@ -2953,6 +3685,7 @@ class DBManager:
                 logger.error(f"获取卡券列表失败: {e}")
                 return []
 
+    @_read_only
     def get_card_by_id(self, card_id: int, user_id: int = None):
         """根据ID获取卡券（支持用户隔离）"""
         with self.lock:
@@ -2985,13 +3718,27 @@ class DBManager:
                             # 如果解析失败，保持原始字符串
                             pass
 
+                    data_content = row[5]
+                    stock = None
+                    if row[2] == 'data':
+                        # 批量数据从库存表还原为按行文本，供编辑界面使用
+                        cursor.execute('''
+                        SELECT content FROM card_inventory
+                        WHERE card_id = ? AND claimed_at IS NULL
+                        ORDER BY id
+                        ''', (row[0],))
+                        contents = [r[0] for r in cursor.fetchall()]
+                        data_content = '\n'.join(contents)
+                        stock = len(contents)
+
                     return {
                         'id': row[0],
                         'name': row[1],
                         'type': row[2],
                         'api_config': api_config,
                         'text_content': row[4],
-                        'data_content': row[5],
+                        'data_content': data_content,
+                        'stock': stock,
                         'image_url': row[6],
                         'description': row[7],
                         'enabled': bool(row[8]),
@@ -3043,8 +3790,8 @@ class DBManager:
                     update_fields.append("text_content = ?")
                     params.append(text_content)
                 if data_content is not None:
-                    update_fields.append("data_content = ?")
-                    params.append(data_content)
+                    # 批量数据保存在 card_inventory 中，见下方 _replace_card_inventory
+                    update_fields.append("data_content = NULL")
                 if image_url is not None:
                     update_fields.append("image_url = ?")
                     params.append(image_url)
@@ -3077,7 +3824,10 @@ class DBManager:
                 self._execute_sql(cursor, sql, params)
 
                 if cursor.rowcount > 0:
+                    if data_content is not None:
+                        self._replace_card_inventory(cursor, card_id, data_content)
                     self.conn.commit()
+                    self._invalidate_delivery_rule_index()
                     logger.info(f"更新卡券成功: ID {card_id}")
                     return True
                 else:
@@ -3100,6 +3850,7 @@ class DBManager:
                     (new_image_url, card_id))
 
                 self.conn.commit()
+                self._invalidate_delivery_rule_index()
 
                 # 检查是否有行被更新
                 if cursor.rowcount > 0:
@@ -3127,6 +3878,7 @@ class DBManager:
                 VALUES (?, ?, ?, ?, ?, ?)
                 ''', (keyword, card_id, delivery_count, enabled, description, user_id))
                 self.conn.commit()
+                self._invalidate_delivery_rule_index()
                 rule_id = cursor.lastrowid
                 logger.info(f"创建发货规则成功: {keyword} -> 卡券ID {card_id} (规则ID: {rule_id})")
                 return rule_id
@@ -3134,6 +3886,7 @@ class DBManager:
                 logger.error(f"创建发货规则失败: {e}")
                 raise
 
+    @_read_only
     def get_all_delivery_rules(self, user_id: int = None):
         """获取所有发货规则"""
         with self.lock:
@@ -3186,65 +3939,86 @@ class DBManager:
                 return []
 
     def get_delivery_rules_by_keyword(self, keyword: str):
-        """根据关键字获取匹配的发货规则"""
+        """根据关键字获取匹配的发货规则
+
+        既支持商品内容包含关键字，也支持关键字包含在商品内容中；
+        匹配在发货规则内存索引上进行，不再对全表执行双向 LIKE 扫描。
+        """
+        try:
+            return self._get_delivery_rule_index().match(keyword)
+        except Exception as e:
+            logger.error(f"根据关键字获取发货规则失败: {e}")
+            return []
+
+    @_read_only
+    def _load_delivery_rule_rows(self) -> list:
+        """加载构建发货规则索引所需的全部启用规则（已联表卡券）"""
         with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+            SELECT dr.id, dr.keyword, dr.card_id, dr.delivery_count, dr.enabled,
+                   dr.description, dr.delivery_times,
+                   c.name as card_name, c.type as card_type, c.api_config,
+                   c.text_content, c.data_content, c.image_url, c.enabled as card_enabled,
+                   c.description as card_description, c.delay_seconds as card_delay_seconds,
+                   c.is_multi_spec, c.spec_name, c.spec_value
+            FROM delivery_rules dr
+            LEFT JOIN cards c ON dr.card_id = c.id
+            WHERE dr.enabled = 1 AND c.enabled = 1
+            ''')
+            return cursor.fetchall()
+
+    def _get_delivery_rule_index(self) -> _DeliveryRuleIndex:
+        """获取发货规则索引，失效后在首次查询时重建"""
+        index = self._delivery_rule_index
+        if index is not None:
+            return index
+
+        with self._delivery_rule_index_lock:
+            generation = self._delivery_rule_index_generation
+        index = _DeliveryRuleIndex(self._load_delivery_rule_rows())
+        with self._delivery_rule_index_lock:
+            # 构建期间规则被修改则不缓存本次结果
+            if self._delivery_rule_index_generation == generation:
+                self._delivery_rule_index = index
+        logger.debug(f"发货规则索引已重建: {len(index.entries)} 条规则")
+        return index
+
+    def _invalidate_delivery_rule_index(self):
+        """使发货规则索引失效（规则或卡券变更后调用）"""
+        with self._delivery_rule_index_lock:
+            self._delivery_rule_index_generation += 1
+            self._delivery_rule_index = None
+        for listener in self._delivery_rule_listeners:
             try:
-                cursor = self.conn.cursor()
-                # 使用更灵活的匹配方式：既支持商品内容包含关键字，也支持关键字包含在商品内容中
-                cursor.execute('''
-                SELECT dr.id, dr.keyword, dr.card_id, dr.delivery_count, dr.enabled,
-                       dr.description, dr.delivery_times,
-                       c.name as card_name, c.type as card_type, c.api_config,
-                       c.text_content, c.data_content, c.image_url, c.enabled as card_enabled, c.description as card_description,
-                       c.delay_seconds as card_delay_seconds
-                FROM delivery_rules dr
-                LEFT JOIN cards c ON dr.card_id = c.id
-                WHERE dr.enabled = 1 AND c.enabled = 1
-                AND (? LIKE '%' || dr.keyword || '%' OR dr.keyword LIKE '%' || ? || '%')
-                ORDER BY
-                    CASE
-                        WHEN ? LIKE '%' || dr.keyword || '%' THEN LENGTH(dr.keyword)
-                        ELSE LENGTH(dr.keyword) / 2
-                    END DESC,
-                    dr.id ASC
-                ''', (keyword, keyword, keyword))
+                listener()
+            except Exception as e:
+                logger.error(f"发货规则索引失效回调异常: {e}")
 
-                rules = []
-                for row in cursor.fetchall():
-                    # 解析api_config JSON字符串
-                    api_config = row[9]
-                    if api_config:
-                        try:
-                            import json
-                            api_config = json.loads(api_config)
-                        except (json.JSONDecodeError, TypeError):
-                            # 如果解析失败，保持原始字符串
-                            pass
+    def add_delivery_rule_listener(self, listener):
+        """注册发货规则索引失效时的回调"""
+        self._delivery_rule_listeners.append(listener)
 
-                    rules.append({
-                        'id': row[0],
-                        'keyword': row[1],
-                        'card_id': row[2],
-                        'delivery_count': row[3],
-                        'enabled': bool(row[4]),
-                        'description': row[5],
-                        'delivery_times': row[6],
-                        'card_name': row[7],
-                        'card_type': row[8],
-                        'api_config': api_config,  # 修复字段名
-                        'text_content': row[10],
-                        'data_content': row[11],
-                        'image_url': row[12],
-                        'card_enabled': bool(row[13]),
-                        'card_description': row[14],  # 卡券备注信息
-                        'card_delay_seconds': row[15] or 0  # 延时秒数
-                    })
-
-                return rules
+    def _invalidate_settings(self, cookie_id: str = None):
+        """使账号配置缓存失效（暂停时间、AI回复、默认回复、商品回复、通知、自动确认发货等配置写入后调用）"""
+        settings_cache.invalidate(cookie_id)
+        for listener in self._settings_listeners:
+            try:
+                listener(cookie_id)
             except Exception as e:
-                logger.error(f"根据关键字获取发货规则失败: {e}")
-                return []
+                logger.error(f"账号配置缓存失效回调异常: {e}")
+
+    def add_settings_listener(self, listener):
+        """注册账号配置缓存失效时的回调"""
+        self._settings_listeners.append(listener)
+
+    def _bump_delivery_times(self, rule_id: int):
+        """发货次数变化只同步到现有索引，不触发重建"""
+        index = self._delivery_rule_index
+        if index is not None:
+            index.increment_delivery_times(rule_id)
 
+    @_read_only
     def get_delivery_rule_by_id(self, rule_id: int, user_id: int = None):
         """根据ID获取发货规则（支持用户隔离）"""
         with self.lock:
@@ -3333,6 +4107,7 @@ class DBManager:
 
                 if cursor.rowcount > 0:
                     self.conn.commit()
+                    self._invalidate_delivery_rule_index()
                     logger.info(f"更新发货规则成功: ID {rule_id}")
                     return True
                 else:
@@ -3354,149 +4129,47 @@ class DBManager:
                 WHERE id = ?
                 ''', (rule_id,))
                 self.conn.commit()
+                self._bump_delivery_times(rule_id)
                 logger.debug(f"发货规则 {rule_id} 发货次数已增加")
             except Exception as e:
                 logger.error(f"更新发货次数失败: {e}")
 
     def get_delivery_rules_by_keyword_and_spec(self, keyword: str, spec_name: str = None, spec_value: str = None):
         """根据关键字和规格信息获取匹配的发货规则（支持多规格）"""
-        with self.lock:
-            try:
-                cursor = self.conn.cursor()
-
-                # 优先匹配：卡券名称+规格名称+规格值
-                if spec_name and spec_value:
-                    cursor.execute('''
-                    SELECT dr.id, dr.keyword, dr.card_id, dr.delivery_count, dr.enabled,
-                           dr.description, dr.delivery_times,
-                           c.name as card_name, c.type as card_type, c.api_config,
-                           c.text_content, c.data_content, c.enabled as card_enabled,
-                           c.description as card_description, c.delay_seconds as card_delay_seconds,
-                           c.is_multi_spec, c.spec_name, c.spec_value
-                    FROM delivery_rules dr
-                    LEFT JOIN cards c ON dr.card_id = c.id
-                    WHERE dr.enabled = 1 AND c.enabled = 1
-                    AND (? LIKE '%' || dr.keyword || '%' OR dr.keyword LIKE '%' || ? || '%')
-                    AND c.is_multi_spec = 1 AND c.spec_name = ? AND c.spec_value = ?
-                    ORDER BY
-                        CASE
-                            WHEN ? LIKE '%' || dr.keyword || '%' THEN LENGTH(dr.keyword)
-                            ELSE LENGTH(dr.keyword) / 2
-                        END DESC,
-                        dr.delivery_times ASC
-                    ''', (keyword, keyword, spec_name, spec_value, keyword))
-
-                    rules = []
-                    for row in cursor.fetchall():
-                        # 解析api_config JSON字符串
-                        api_config = row[9]
-                        if api_config:
-                            try:
-                                import json
-                                api_config = json.loads(api_config)
-                            except (json.JSONDecodeError, TypeError):
-                                # 如果解析失败，保持原始字符串
-                                pass
-
-                        rules.append({
-                            'id': row[0],
-                            'keyword': row[1],
-                            'card_id': row[2],
-                            'delivery_count': row[3],
-                            'enabled': bool(row[4]),
-                            'description': row[5],
-                            'delivery_times': row[6] or 0,
-                            'card_name': row[7],
-                            'card_type': row[8],
-                            'api_config': api_config,
-                            'text_content': row[10],
-                            'data_content': row[11],
-                            'card_enabled': bool(row[12]),
-                            'card_description': row[13],
-                            'card_delay_seconds': row[14] or 0,
-                            'is_multi_spec': bool(row[15]),
-                            'spec_name': row[16],
-                            'spec_value': row[17]
-                        })
-
-                    if rules:
-                        logger.info(f"找到多规格匹配规则: {keyword} - {spec_name}:{spec_value}")
-                        return rules
-
-                # 兜底匹配：仅卡券名称
-                cursor.execute('''
-                SELECT dr.id, dr.keyword, dr.card_id, dr.delivery_count, dr.enabled,
-                       dr.description, dr.delivery_times,
-                       c.name as card_name, c.type as card_type, c.api_config,
-                       c.text_content, c.data_content, c.enabled as card_enabled,
-                       c.description as card_description, c.delay_seconds as card_delay_seconds,
-                       c.is_multi_spec, c.spec_name, c.spec_value
-                FROM delivery_rules dr
-                LEFT JOIN cards c ON dr.card_id = c.id
-                WHERE dr.enabled = 1 AND c.enabled = 1
-                AND (? LIKE '%' || dr.keyword || '%' OR dr.keyword LIKE '%' || ? || '%')
-                AND (c.is_multi_spec = 0 OR c.is_multi_spec IS NULL)
-                ORDER BY
-                    CASE
-                        WHEN ? LIKE '%' || dr.keyword || '%' THEN LENGTH(dr.keyword)
-                        ELSE LENGTH(dr.keyword) / 2
-                    END DESC,
-                    dr.delivery_times ASC
-                ''', (keyword, keyword, keyword))
-
-                rules = []
-                for row in cursor.fetchall():
-                    # 解析api_config JSON字符串
-                    api_config = row[9]
-                    if api_config:
-                        try:
-                            import json
-                            api_config = json.loads(api_config)
-                        except (json.JSONDecodeError, TypeError):
-                            # 如果解析失败，保持原始字符串
-                            pass
-
-                    rules.append({
-                        'id': row[0],
-                        'keyword': row[1],
-                        'card_id': row[2],
-                        'delivery_count': row[3],
-                        'enabled': bool(row[4]),
-                        'description': row[5],
-                        'delivery_times': row[6] or 0,
-                        'card_name': row[7],
-                        'card_type': row[8],
-                        'api_config': api_config,
-                        'text_content': row[10],
-                        'data_content': row[11],
-                        'card_enabled': bool(row[12]),
-                        'card_description': row[13],
-                        'card_delay_seconds': row[14] or 0,
-                        'is_multi_spec': bool(row[15]) if row[15] is not None else False,
-                        'spec_name': row[16],
-                        'spec_value': row[17]
-                    })
+        try:
+            index = self._get_delivery_rule_index()
 
+            # 优先匹配：卡券名称+规格名称+规格值
+            if spec_name and spec_value:
+                rules = index.match_spec(keyword, spec_name, spec_value)
                 if rules:
-                    logger.info(f"找到兜底匹配规则: {keyword}")
-                else:
-                    logger.info(f"未找到匹配规则: {keyword}")
+                    logger.info(f"找到多规格匹配规则: {keyword} - {spec_name}:{spec_value}")
+                    return rules
 
-                return rules
+            # 兜底匹配：仅卡券名称
+            rules = index.match_spec(keyword)
+            if rules:
+                logger.info(f"找到兜底匹配规则: {keyword}")
+            else:
+                logger.info(f"未找到匹配规则: {keyword}")
 
-            except Exception as e:
-                logger.error(f"获取发货规则失败: {e}")
-                return []
+            return rules
+
+        except Exception as e:
+            logger.error(f"获取发货规则失败: {e}")
+            return []
 
     def delete_card(self, card_id: int):
         """删除卡券"""
         with self.lock:
             try:
                 cursor = self.conn.cursor()
+                self._execute_sql(cursor, "DELETE FROM card_inventory WHERE card_id = ?", (card_id,))
                 self._execute_sql(cursor, "DELETE FROM cards WHERE id = ?", (card_id,))
 
                 if cursor.rowcount > 0:
                     self.conn.commit()
+                    self._invalidate_delivery_rule_index()
                     logger.info(f"删除卡券成功: ID {card_id}")
                     return True
                 else:
@@ -3519,6 +4192,7 @@ class DBManager:
 
                 if cursor.rowcount > 0:
                     self.conn.commit()
+                    self._invalidate_delivery_rule_index()
                     logger.info(f"删除发货规则成功: ID {rule_id} (用户ID: {user_id})")
                     return True
                 else:
@@ -3529,49 +4203,102 @@ class DBManager:
                 self.conn.rollback()
                 raise
 
-    def consume_batch_data(self, card_id: int):
-        """消费批量数据的第一条记录（线程安全）"""
+    def _replace_card_inventory(self, cursor, card_id: int, data_content: str):
+        """用新的批量数据替换卡券未领取的库存（已领取的记录保留用于订单追溯），需在写锁内调用"""
+        lines = [line.strip() for line in (data_content or '').split('\n') if line.strip()]
+        cursor.execute("DELETE FROM card_inventory WHERE card_id = ? AND claimed_at IS NULL", (card_id,))
+        if lines:
+            cursor.executemany(
+                "INSERT INTO card_inventory (card_id, content) VALUES (?, ?)",
+                [(card_id, line) for line in lines]
+            )
+        logger.info(f"卡券库存已更新: 卡券ID={card_id}, 库存={len(lines)}条")
+
+    def claim_card_inventory(self, card_id: int, order_id: str = None, quantity: int = 1) -> List[str]:
+        """按订单领取批量数据（原子操作）
+
+        - 同一订单重复领取时直接返回该订单已领取的数据，不会重复扣减库存
+        - 多数量订单在同一事务中一次领取 quantity 条，库存不足时领取剩余全部
+        - 只按主键读取/更新需要的行，不再整体重写卡券数据
+
+        Returns:
+            领取到的数据列表（按入库顺序），库存为空时返回空列表
+        """
+        quantity = max(1, int(quantity or 1))
         with self.lock:
             try:
                 cursor = self.conn.cursor()
+                # 先取得数据库写锁再查询，其他连接（账号工作进程）无法在查询与更新之间领取同一行
+                if not self.conn.in_transaction:
+                    cursor.execute('BEGIN IMMEDIATE')
 
-                # 获取卡券的批量数据
-                self._execute_sql(cursor, "SELECT data_content FROM cards WHERE id = ? AND type = 'data'", (card_id,))
-                result = cursor.fetchone()
+                if order_id:
+                    cursor.execute('''
+                    SELECT content FROM card_inventory
+                    WHERE order_id = ? AND card_id = ?
+                    ORDER BY id
+                    ''', (order_id, card_id))
+                    claimed = [row[0] for row in cursor.fetchall()]
+                    if claimed:
+                        self.conn.rollback()
+                        logger.info(f"订单已领取过批量数据，直接返回: 卡券ID={card_id}, 订单={order_id}, 数量={len(claimed)}")
+                        return claimed
+
+                cursor.execute('''
+                SELECT id, content FROM card_inventory
+                WHERE card_id = ? AND claimed_at IS NULL
+                ORDER BY id
+                LIMIT ?
+                ''', (card_id, quantity))
+                rows = cursor.fetchall()
 
-                if not result or not result[0]:
+                if not rows:
+                    self.conn.rollback()
                     logger.warning(f"卡券 {card_id} 没有批量数据")
-                    return None
+                    return []
 
-                data_content = result[0]
-                lines = [line.strip() for line in data_content.split('\n') if line.strip()]
+                # 只返回确实由本次更新领取到的行
+                claimed = []
+                for row_id, content in rows:
+                    cursor.execute('''
+                    UPDATE card_inventory
+                    SET order_id = ?, claimed_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND claimed_at IS NULL
+                    ''', (order_id, row_id))
+                    if cursor.rowcount == 1:
+                        claimed.append(content)
+                cursor.execute("UPDATE cards SET updated_at = CURRENT_TIMESTAMP WHERE id = ?", (card_id,))
+                self.conn.commit()
 
-                if not lines:
-                    logger.warning(f"卡券 {card_id} 批量数据为空")
-                    return None
+                if len(claimed) < quantity:
+                    logger.warning(f"卡券 {card_id} 库存不足: 需要{quantity}条, 实际领取{len(claimed)}条")
+                logger.info(f"领取批量数据成功: 卡券ID={card_id}, 订单={order_id}, 数量={len(claimed)}")
+                return claimed
 
-                # 获取第一条数据
-                first_line = lines[0]
+            except Exception as e:
+                logger.error(f"领取批量数据失败: {e}")
+                self.conn.rollback()
+                return []
 
-                # 移除第一条数据，更新数据库
-                remaining_lines = lines[1:]
-                new_data_content = '\n'.join(remaining_lines)
+    def consume_batch_data(self, card_id: int):
+        """消费批量数据的第一条记录（线程安全）"""
+        claimed = self.claim_card_inventory(card_id)
+        return claimed[0] if claimed else None
 
+    @_read_only
+    def get_card_stock(self, card_id: int) -> int:
+        """获取批量数据卡券的剩余库存数量"""
+        with self.lock:
+            try:
+                cursor = self.conn.cursor()
                 cursor.execute('''
-                UPDATE cards
-                SET data_content = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-                ''', (new_data_content, card_id))
-
-                self.conn.commit()
-
-                logger.info(f"消费批量数据成功: 卡券ID={card_id}, 剩余={len(remaining_lines)}条")
-                return first_line
-
+                SELECT COUNT(*) FROM card_inventory
+                WHERE card_id = ? AND claimed_at IS NULL
+                ''', (card_id,))
+                return cursor.fetchone()[0]
             except Exception as e:
-                logger.error(f"消费批量数据失败: {e}")
-                self.conn.rollback()
-                return None
+                logger.error(f"获取卡券库存失败: {e}")
+                return 0
 
     # ==================== 商品信息管理 ====================
 
@@ -3759,6 +4486,7 @@ class DBManager:
             self.conn.rollback()
             return False
 
+    @_read_only
     def get_item_info(self, cookie_id: str, item_id: str) -> Optional[Dict]:
         """获取商品信息
 
@@ -3820,6 +4548,7 @@ class DBManager:
             self.conn.rollback()
             return False
 
+    @_read_only
     def get_item_multi_spec_status(self, cookie_id: str, item_id: str) -> bool:
         """获取商品的多规格状态"""
         try:
@@ -3863,6 +4592,7 @@ class DBManager:
             self.conn.rollback()
             return False
 
+    @_read_only
     def get_item_multi_quantity_delivery_status(self, cookie_id: str, item_id: str) -> bool:
         """获取商品的多数量发货状态"""
         try:
@@ -3882,6 +4612,7 @@ class DBManager:
             logger.error(f"获取商品多数量发货状态失败: {e}")
             return False
 
+    @_read_only
     def get_items_by_cookie(self, cookie_id: str) -> List[Dict]:
         """获取指定Cookie的所有商品信息
 
@@ -3921,6 +4652,7 @@ class DBManager:
             logger.error(f"获取Cookie商品信息失败: {e}")
             return []
 
+    @_read_only
     def get_all_items(self) -> List[Dict]:
         """获取所有商品信息
 
@@ -4196,6 +4928,7 @@ class DBManager:
 
     # ==================== 用户设置管理方法 ====================
 
+    @_read_only
     def get_user_settings(self, user_id: int):
         """获取用户的所有设置"""
         with self.lock:
@@ -4221,6 +4954,7 @@ class DBManager:
                 logger.error(f"获取用户设置失败: {e}")
                 return {}
 
+    @_read_only
     def get_user_setting(self, user_id: int, key: str):
         """获取用户的特定设置"""
         with self.lock:
@@ -4265,6 +4999,7 @@ class DBManager:
 
     # ==================== 管理员专用方法 ====================
 
+    @_read_only
     def get_all_users(self):
         """获取所有用户信息（管理员专用）"""
         with self.lock:
@@ -4291,6 +5026,7 @@ class DBManager:
                 logger.error(f"获取所有用户失败: {e}")
                 return []
 
+    @_read_only
     def get_user_by_id(self, user_id: int):
         """根据ID获取用户信息"""
         with self.lock:
@@ -4329,7 +5065,8 @@ class DBManager:
                 # 1. 删除用户设置
                 cursor.execute('DELETE FROM user_settings WHERE user_id = ?', (user_id,))
 
-                # 2. 删除用户的卡券
+                # 2. 删除用户的卡券及库存
+                cursor.execute('DELETE FROM card_inventory WHERE card_id IN (SELECT id FROM cards WHERE user_id = ?)', (user_id,))
                 cursor.execute('DELETE FROM cards WHERE user_id = ?', (user_id,))
 
                 # 3. 删除用户的发货规则
@@ -4358,6 +5095,8 @@ class DBManager:
 
                 # 提交事务
                 cursor.execute('COMMIT')
+                self._invalidate_delivery_rule_index()
+                self._invalidate_settings()
 
                 logger.info(f"用户及相关数据删除成功: user_id={user_id}")
                 return True
@@ -4368,6 +5107,7 @@ class DBManager:
                 logger.error(f"删除用户及相关数据失败: {e}")
                 return False
 
+    @_read_only
     def get_table_data(self, table_name: str):
         """获取指定表的所有数据"""
         with self.lock:
@@ -4472,6 +5212,7 @@ class DBManager:
                 self.conn.rollback()
                 return False
 
+    @_read_only
     def get_order_by_id(self, order_id: str):
         """根据订单ID获取订单信息"""
         with self.lock:
@@ -4504,6 +5245,7 @@ class DBManager:
                 logger.error(f"获取订单信息失败: {order_id} - {e}")
                 return None
 
+    @_read_only
     def get_orders_by_cookie(self, cookie_id: str, limit: int = 100):
         """根据Cookie ID获取订单列表"""
         with self.lock:
@@ -4558,6 +5300,7 @@ class DBManager:
                     'item_info': 'id',
                     'message_notifications': 'id',
                     'cards': 'id',
+                    'card_inventory': 'id',
                     'delivery_rules': 'id',
                     'notification_channels': 'id',
                     'user_settings': 'id',
@@ -4574,6 +5317,8 @@ class DBManager:
 
                 if cursor.rowcount > 0:
                     self.conn.commit()
+                    if table_name in ('cards', 'delivery_rules'):
+                        self._invalidate_delivery_rule_index()
                     logger.info(f"删除表记录成功: {table_name}.{record_id}")
                     return True
                 else:
@@ -4598,6 +5343,8 @@ class DBManager:
                 cursor.execute(f"DELETE FROM sqlite_sequence WHERE name = ?", (table_name,))
 
                 self.conn.commit()
+                if table_name in ('cards', 'delivery_rules'):
+                    self._invalidate_delivery_rule_index()
                 logger.info(f"清空表数据成功: {table_name}")
                 return True
 
@@ -4632,6 +5379,7 @@ class DBManager:
         except Exception as e:
             logger.error(f"升级keywords表失败: {e}")
             raise
+    @_read_only
     def get_item_replay(self, item_id: str) -> Optional[Dict[str, Any]]:
         """
         根据商品ID获取商品回复信息，并返回统一格式
@@ -4661,6 +5409,8 @@ class DBManager:
             logger.error(f"获取商品回复失败: {e}")
             return None
 
+    @_cached_setting('item_reply')
+    @_read_only
     def get_item_reply(self, cookie_id: str, item_id: str) -> Optional[Dict[str, Any]]:
         """
         获取指定账号和商品的回复内容
@@ -4722,11 +5472,13 @@ class DBManager:
                     ''', (item_id, cookie_id, reply_content))
 
                 self.conn.commit()
+                self._invalidate_settings(cookie_id)
             return True
         except Exception as e:
             logger.error(f"更新商品回复失败: {e}")
             return False
 
+    @_read_only
     def get_itemReplays_by_cookie(self, cookie_id: str) -> List[Dict]:
         """获取指定Cookie的所有商品信息
 
@@ -4780,6 +5532,7 @@ class DBManager:
                     WHERE cookie_id = ? AND item_id = ?
                 ''', (cookie_id, item_id))
                 self.conn.commit()
+                self._invalidate_settings(cookie_id)
                 # 判断是否有删除行
                 return cursor.rowcount > 0
         except Exception as e:
@@ -4817,6 +5570,7 @@ class DBManager:
                     else:
                         failed_count += 1
                 self.conn.commit()
+                self._invalidate_settings()
         except Exception as e:
             logger.error(f"批量删除商品回复失败: {e}")
             # 整体失败则视为全部失败
@@ -4905,6 +5659,7 @@ class DBManager:
             logger.error(f"更新风控日志失败: {e}")
             return False
 
+    @_read_only
     def get_risk_control_logs(self, cookie_id: str = None, limit: int = 100, offset: int = 0) -> List[Dict]:
         """
         获取风控日志列表
@@ -4951,6 +5706,7 @@ class DBManager:
             logger.error(f"获取风控日志失败: {e}")
             return []
 
+    @_read_only
     def get_risk_control_logs_count(self, cookie_id: str = None) -> int:
         """
         获取风控日志总数
@@ -5094,8 +5850,72 @@ class DBManager:
             return {'error': str(e)}
 
 
+class AsyncDBManager:
+    """DBManager 的异步门面
+
+    协程中通过 await async_db.<方法名>(...) 调用 DBManager 的任意同步方法，
+    方法在专用线程池中执行，SQLite 操作不会阻塞事件循环。
+    线程数与连接数对应（只读连接池大小 + 1 个写连接），避免线程多于连接而在连接池上排队。
+    """
+
+    def __init__(self, manager: DBManager):
+        self._manager = manager
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._wrappers: Dict[str, Callable] = {}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self._manager.read_pool_size + 1,
+                        thread_name_prefix='db-async'
+                    )
+        return self._executor
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """在数据库线程池中执行任意同步函数"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._manager, name)
+        if not callable(attr) or asyncio.iscoroutinefunction(attr):
+            return attr
+
+        wrapper = self._wrappers.get(name)
+        if wrapper is None and getattr(attr, 'cached_setting', None):
+            setting = attr.cached_setting
+
+            async def wrapper(cookie_id, *args):
+                # 账号配置命中缓存时直接返回，不切换到数据库线程池
+                value = settings_cache.peek(cookie_id, (setting, *args))
+                if value is not MISSING:
+                    return value
+                return await self.run(getattr(self._manager, name), cookie_id, *args)
+            wrapper.__name__ = name
+            wrapper.__doc__ = attr.__doc__
+            self._wrappers[name] = wrapper
+        elif wrapper is None:
+            async def wrapper(*args, **kwargs):
+                # 每次调用时重新取绑定方法，兼容 db_manager 重新初始化
+                return await self.run(getattr(self._manager, name), *args, **kwargs)
+            wrapper.__name__ = name
+            wrapper.__doc__ = attr.__doc__
+            self._wrappers[name] = wrapper
+        return wrapper
+
+    def shutdown(self):
+        """关闭数据库线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
 # 全局单例
 db_manager = DBManager()
+async_db = AsyncDBManager(db_manager)
 
 # 确保进程结束时关闭数据库连接
 import atexit
@@ -13,7 +13,6 @@ import json
 import os
 import re
 import uvicorn
-import pandas as pd
 import io
 import asyncio
 from collections import defaultdict
@@ -25,6 +24,9 @@ from ai_reply_engine import ai_reply_engine
 from utils.qr_login import qr_login_manager
 from utils.xianyu_utils import trans_cookies
 from utils.image_utils import image_manager
+from utils.keyword_matcher import keyword_matcher_cache
+from utils.command_bus import CommandError, command_bus
+from utils.account_workers import AccountWorkerError
 
 from loguru import logger
 
@@ -260,6 +262,14 @@ def log_with_user(level: str, message: str, user_info: Dict[str, Any] = None):
         logger.info(full_message)
 
 
+def _reload_keywords(cookie_id: str = None):
+    """关键词变更后使匹配器缓存失效（启用账号工作进程时同步到账号所在的工作进程）"""
+    if cookie_manager.manager is not None:
+        cookie_manager.manager.reload_keywords(cookie_id)
+    else:
+        keyword_matcher_cache.invalidate(cookie_id)
+
+
 def match_reply(cookie_id: str, message: str) -> Optional[str]:
     """根据 cookie_id 及消息内容匹配回复
     只有启用的账号才会匹配关键字回复
@@ -453,6 +463,15 @@ async def health_check():
         }
 
 
+@app.get('/health/ready')
+async def readiness_check():
+    """启动就绪检查：数据库中的账号分批启动完成且均已就绪（或失败、超时）时返回200，否则返回503"""
+    from utils.warm_start import warm_start
+    startup = warm_start.get_status()
+    startup.pop('accounts')
+    return JSONResponse(status_code=200 if startup['ready'] else 503, content=startup)
+
+
 # 重定向根路径到登录页面
 @app.get('/', response_class=HTMLResponse)
 async def root():
@@ -1035,33 +1054,27 @@ async def send_message_api(request: SendMessageRequest):
                     message=f"参数 {param_name} 不能为空"
                 )
 
-        # 直接获取XianyuLive实例，跳过cookie_manager检查
-        from XianyuAutoAsync import XianyuLive
-        live_instance = XianyuLive.get_instance(cleaned_cookie_id)
-
-        if not live_instance:
-            logger.warning(f"账号实例不存在或未连接: {cleaned_cookie_id}")
+        if cookie_manager.manager is None:
             return SendMessageResponse(
                 success=False,
-                message="账号实例不存在或未连接，请检查账号状态"
+                message="CookieManager 未就绪"
             )
 
-        # 检查WebSocket连接状态
-        if not live_instance.ws or live_instance.ws.closed:
-            logger.warning(f"账号WebSocket连接已断开: {cleaned_cookie_id}")
+        # 经命令总线在账号所在的事件循环（或工作进程）中发送，不跨线程操作账号的WebSocket
+        try:
+            await cookie_manager.manager.call_account(
+                cleaned_cookie_id, 'send_message',
+                chat_id=cleaned_chat_id,
+                to_user_id=cleaned_to_user_id,
+                message=cleaned_message
+            )
+        except (CommandError, AccountWorkerError) as e:
+            logger.warning(f"API发送消息失败: {cleaned_cookie_id}, {e}")
             return SendMessageResponse(
                 success=False,
-                message="账号WebSocket连接已断开，请等待重连"
+                message=str(e)
             )
 
-        # 发送消息（使用清理后的所有参数）
-        await live_instance.send_msg(
-            live_instance.ws,
-            cleaned_chat_id,
-            cleaned_to_user_id,
-            cleaned_message
-        )
-
         logger.info(f"API成功发送消息: {cleaned_cookie_id} -> {cleaned_to_user_id}, 内容: {cleaned_message[:50]}{'...' if len(cleaned_message) > 50 else ''}")
 
         return SendMessageResponse(
@@ -1367,6 +1380,36 @@ def get_cookie_account_details(cid: str, current_user: Dict[str, Any] = Depends(
 
 # ========================= 账号密码登录相关接口 =========================
 
+def _send_face_verification_notification(account_id: str, message: str, current_user: Dict[str, Any],
+                                         verification_url: str = None, attachment_path: str = None):
+    """发送人脸验证通知（在后台线程中调用）
+
+    经 CookieManager 在账号所在的事件循环（或工作进程）中发送，通知使用账号自身的会话。
+    """
+    log_with_user('info', f"开始尝试发送人脸验证通知: {account_id}", current_user)
+    manager = cookie_manager.manager
+    if manager is None:
+        log_with_user('warning', f"CookieManager 未就绪，无法发送人脸验证通知: {account_id}", current_user)
+        return
+    try:
+        future = asyncio.run_coroutine_threadsafe(manager.call_account(
+            account_id, 'send_token_refresh_notification',
+            error_message=message,
+            notification_type="face_verification",
+            verification_url=verification_url,
+            attachment_path=attachment_path
+        ), manager.loop)
+        future.result()
+        log_with_user('info', f"✅ 已发送人脸验证通知: {account_id}", current_user)
+    except (CommandError, AccountWorkerError) as e:
+        # 账号未运行时没有可用的会话发送通知
+        log_with_user('warning', f"无法发送人脸验证通知: {account_id}，{e}。请确保账号已登录并运行中。", current_user)
+    except Exception as e:
+        log_with_user('error', f"发送人脸验证通知失败: {str(e)}", current_user)
+        import traceback
+        log_with_user('error', f"通知错误详情: {traceback.format_exc()}", current_user)
+
+
 async def _execute_password_login(session_id: str, account_id: str, account: str, password: str, show_browser: bool, user_id: int, current_user: Dict[str, Any]):
     """后台执行账号密码登录任务"""
     try:
@@ -1411,57 +1454,13 @@ async def _execute_password_login(session_id: str, account_id: str, account: str
                     log_with_user('info', f"人脸认证截图已保存: {session_id}, 路径: {actual_screenshot_path}", current_user)
                     
                     # 发送通知到用户配置的渠道
-                    def send_face_verification_notification():
-                        """在后台线程中发送人脸验证通知"""
-                        try:
-                            from XianyuAutoAsync import XianyuLive
-                            log_with_user('info', f"开始尝试发送人脸验证通知: {account_id}", current_user)
-                            
-                            # 尝试获取XianyuLive实例（如果账号已经存在）
-                            live_instance = XianyuLive.get_instance(account_id)
-                            
-                            if live_instance:
-                                log_with_user('info', f"找到账号实例，准备发送通知: {account_id}", current_user)
-                                # 创建新的事件循环来运行异步通知
-                                new_loop = asyncio.new_event_loop()
-                                asyncio.set_event_loop(new_loop)
-                                try:
-                                    new_loop.run_until_complete(
-                                        live_instance.send_token_refresh_notification(
-                                            error_message=message,
-                                            notification_type="face_verification",
-                                            verification_url=None,
-                                            attachment_path=actual_screenshot_path
-                                        )
-                                    )
-                                    log_with_user('info', f"✅ 已发送人脸验证通知: {account_id}", current_user)
-                                except Exception as notify_err:
-                                    log_with_user('error', f"发送人脸验证通知失败: {str(notify_err)}", current_user)
-                                    import traceback
-                                    log_with_user('error', f"通知错误详情: {traceback.format_exc()}", current_user)
-                                finally:
-                                    new_loop.close()
-                            else:
-                                # 如果账号实例不存在，记录警告并尝试从数据库获取通知配置
-                                log_with_user('warning', f"账号实例不存在: {account_id}，尝试从数据库获取通知配置", current_user)
-                                try:
-                                    # 尝试从数据库获取通知配置
-                                    notifications = db_manager.get_account_notifications(account_id)
-                                    if notifications:
-                                        log_with_user('info', f"找到 {len(notifications)} 个通知配置，但需要账号实例才能发送", current_user)
-                                        log_with_user('warning', f"账号实例不存在，无法发送通知: {account_id}。请确保账号已登录并运行中。", current_user)
-                                    else:
-                                        log_with_user('warning', f"账号 {account_id} 未配置通知渠道", current_user)
-                                except Exception as db_err:
-                                    log_with_user('error', f"获取通知配置失败: {str(db_err)}", current_user)
-                        except Exception as notify_err:
-                            log_with_user('error', f"发送人脸验证通知时出错: {str(notify_err)}", current_user)
-                            import traceback
-                            log_with_user('error', f"通知错误详情: {traceback.format_exc()}", current_user)
-                    
                     # 在后台线程中发送通知，避免阻塞登录流程
                     import threading
-                    notification_thread = threading.Thread(target=send_face_verification_notification)
+                    notification_thread = threading.Thread(
+                        target=_send_face_verification_notification,
+                        args=(account_id, message, current_user),
+                        kwargs={'attachment_path': actual_screenshot_path}
+                    )
                     notification_thread.daemon = True
                     notification_thread.start()
                     log_with_user('info', f"已启动人脸验证通知发送线程: {account_id}", current_user)
@@ -1474,56 +1473,13 @@ async def _execute_password_login(session_id: str, account_id: str, account: str
                     log_with_user('info', f"人脸认证验证链接已保存: {session_id}, URL: {verification_url}", current_user)
                     
                     # 发送通知到用户配置的渠道
-                    def send_face_verification_notification():
-                        """在后台线程中发送人脸验证通知"""
-                        try:
-                            from XianyuAutoAsync import XianyuLive
-                            log_with_user('info', f"开始尝试发送人脸验证通知: {account_id}", current_user)
-                            
-                            # 尝试获取XianyuLive实例（如果账号已经存在）
-                            live_instance = XianyuLive.get_instance(account_id)
-                            
-                            if live_instance:
-                                log_with_user('info', f"找到账号实例，准备发送通知: {account_id}", current_user)
-                                # 创建新的事件循环来运行异步通知
-                                new_loop = asyncio.new_event_loop()
-                                asyncio.set_event_loop(new_loop)
-                                try:
-                                    new_loop.run_until_complete(
-                                        live_instance.send_token_refresh_notification(
-                                            error_message=message,
-                                            notification_type="face_verification",
-                                            verification_url=verification_url
-                                        )
-                                    )
-                                    log_with_user('info', f"✅ 已发送人脸验证通知: {account_id}", current_user)
-                                except Exception as notify_err:
-                                    log_with_user('error', f"发送人脸验证通知失败: {str(notify_err)}", current_user)
-                                    import traceback
-                                    log_with_user('error', f"通知错误详情: {traceback.format_exc()}", current_user)
-                                finally:
-                                    new_loop.close()
-                            else:
-                                # 如果账号实例不存在，记录警告并尝试从数据库获取通知配置
-                                log_with_user('warning', f"账号实例不存在: {account_id}，尝试从数据库获取通知配置", current_user)
-                                try:
-                                    # 尝试从数据库获取通知配置
-                                    notifications = db_manager.get_account_notifications(account_id)
-                                    if notifications:
-                                        log_with_user('info', f"找到 {len(notifications)} 个通知配置，但需要账号实例才能发送", current_user)
-                                        log_with_user('warning', f"账号实例不存在，无法发送通知: {account_id}。请确保账号已登录并运行中。", current_user)
-                                    else:
-                                        log_with_user('warning', f"账号 {account_id} 未配置通知渠道", current_user)
-                                except Exception as db_err:
-                                    log_with_user('error', f"获取通知配置失败: {str(db_err)}", current_user)
-                        except Exception as notify_err:
-                            log_with_user('error', f"发送人脸验证通知时出错: {str(notify_err)}", current_user)
-                            import traceback
-                            log_with_user('error', f"通知错误详情: {traceback.format_exc()}", current_user)
-                    
                     # 在后台线程中发送通知，避免阻塞登录流程
                     import threading
-                    notification_thread = threading.Thread(target=send_face_verification_notification)
+                    notification_thread = threading.Thread(
+                        target=_send_face_verification_notification,
+                        args=(account_id, message, current_user),
+                        kwargs={'verification_url': verification_url}
+                    )
                     notification_thread.daemon = True
                     notification_thread.start()
                     log_with_user('info', f"已启动人脸验证通知发送线程: {account_id}", current_user)
@@ -1599,7 +1555,7 @@ async def _execute_password_login(session_id: str, account_id: str, account: str
                                 try:
                                     # 尝试使用run_coroutine_threadsafe，这是线程安全的方式
                                     fut = asyncio.run_coroutine_threadsafe(
-                                        cookie_manager.manager._run_xianyu(account_id, cookies_str, user_id),
+                                        cookie_manager.manager._run_account(account_id, cookies_str, user_id),
                                         loop
                                     )
                                     # 不等待结果，让它在后台运行
@@ -2297,10 +2253,11 @@ async def reset_qr_cookie_refresh_cooldown(
             return {'success': False, 'message': '账号不存在'}
 
         # 如果cookie_manager中有对应的实例，直接重置
-        if cookie_manager.manager and cookie_id in cookie_manager.manager.instances:
-            instance = cookie_manager.manager.instances[cookie_id]
-            remaining_time_before = instance.get_qr_cookie_refresh_remaining_time()
-            instance.reset_qr_cookie_refresh_flag()
+        cooldown = None
+        if cookie_manager.manager:
+            cooldown = await cookie_manager.manager.call_account(cookie_id, 'qr_cooldown', reset=True)
+        if cooldown is not None:
+            remaining_time_before = cooldown['remaining_time']
 
             log_with_user('info', f"已重置账号 {cookie_id} 的扫码登录冷却时间，原剩余时间: {remaining_time_before}秒", current_user)
 
@@ -2337,11 +2294,13 @@ async def get_qr_cookie_refresh_cooldown_status(
             return {'success': False, 'message': '账号不存在'}
 
         # 如果cookie_manager中有对应的实例，获取冷却状态
-        if cookie_manager.manager and cookie_id in cookie_manager.manager.instances:
-            instance = cookie_manager.manager.instances[cookie_id]
-            remaining_time = instance.get_qr_cookie_refresh_remaining_time()
-            cooldown_duration = instance.qr_cookie_refresh_cooldown
-            last_refresh_time = instance.last_qr_cookie_refresh_time
+        cooldown = None
+        if cookie_manager.manager:
+            cooldown = await cookie_manager.manager.call_account(cookie_id, 'qr_cooldown')
+        if cooldown is not None:
+            remaining_time = cooldown['remaining_time']
+            cooldown_duration = cooldown['cooldown_duration']
+            last_refresh_time = cooldown['last_refresh_time']
 
             return {
                 'success': True,
@@ -2842,6 +2801,7 @@ def remove_cookie(cid: str, current_user: Dict[str, Any] = Depends(get_current_u
             raise HTTPException(status_code=403, detail="无权限操作该Cookie")
 
         cookie_manager.manager.remove_cookie(cid)
+        _reload_keywords(cid)
         return {"msg": "removed"}
     except HTTPException:
         raise
@@ -3127,6 +3087,7 @@ def update_keywords(cid: str, body: KeywordIn, current_user: Dict[str, Any] = De
     log_with_user('info', f"更新Cookie关键字: {cid}, 数量: {len(kw_list)}", current_user)
 
     cookie_manager.manager.update_keywords(cid, kw_list)
+    _reload_keywords(cid)
     log_with_user('info', f"Cookie关键字更新成功: {cid}", current_user)
     return {"msg": "updated", "count": len(kw_list)}
 
@@ -3212,6 +3173,7 @@ def update_keywords_with_item_id(cid: str, body: KeywordWithItemIdIn, current_us
             log_with_user('error', f"保存关键词时发生未知错误: {error_msg}", current_user)
             raise HTTPException(status_code=500, detail="保存关键词失败")
 
+    _reload_keywords(cid)
     log_with_user('info', f"更新Cookie关键字(含商品ID): {cid}, 数量: {len(keywords_to_save)}", current_user)
     return {"msg": "updated", "count": len(keywords_to_save)}
 
@@ -3232,7 +3194,7 @@ def get_items_list(cid: str, current_user: Dict[str, Any] = Depends(get_current_
 
     try:
         # 获取该账号的所有商品
-        with db_manager.lock:
+        with db_manager.reader():
             cursor = db_manager.conn.cursor()
             cursor.execute('''
             SELECT item_id, item_title, item_price, created_at
@@ -3260,6 +3222,8 @@ def get_items_list(cid: str, current_user: Dict[str, Any] = Depends(get_current_
 @app.get("/keywords-export/{cid}")
 def export_keywords(cid: str, current_user: Dict[str, Any] = Depends(get_current_user)):
     """导出指定账号的关键词为Excel文件"""
+    import pandas as pd  # 导入较慢，仅在导入导出时加载
+
     if cookie_manager.manager is None:
         raise HTTPException(status_code=500, detail="CookieManager 未就绪")
 
@@ -3347,6 +3311,8 @@ def export_keywords(cid: str, current_user: Dict[str, Any] = Depends(get_current
 @app.post("/keywords-import/{cid}")
 async def import_keywords(cid: str, file: UploadFile = File(...), current_user: Dict[str, Any] = Depends(get_current_user)):
     """导入Excel文件中的关键词到指定账号"""
+    import pandas as pd  # 导入较慢，仅在导入导出时加载
+
     if cookie_manager.manager is None:
         raise HTTPException(status_code=500, detail="CookieManager 未就绪")
 
@@ -3417,6 +3383,7 @@ async def import_keywords(cid: str, file: UploadFile = File(...), current_user:
         if not success:
             raise HTTPException(status_code=500, detail="保存关键词到数据库失败")
 
+        _reload_keywords(cid)
         log_with_user('info', f"导入关键词成功: {cid}, 新增: {add_count}, 更新: {update_count}", current_user)
 
         return {
@@ -3499,6 +3466,7 @@ async def add_image_keyword(
             image_manager.delete_image(image_url)
             raise HTTPException(status_code=400, detail="图片关键词保存失败，请稍后重试")
 
+        _reload_keywords(cid)
         log_with_user('info', f"添加图片关键词成功: {cid}, 关键词: {keyword}", current_user)
 
         return {
@@ -3593,6 +3561,7 @@ def delete_keyword_by_index(cid: str, index: int, current_user: Dict[str, Any] =
             success = db_manager.delete_keyword_by_index(cid, index)
             if not success:
                 raise HTTPException(status_code=400, detail="删除关键词失败")
+            _reload_keywords(cid)
 
             # 如果是图片关键词，删除对应的图片文件
             if keyword_data.get('type') == 'image' and keyword_data.get('image_url'):
@@ -3627,11 +3596,14 @@ def debug_keywords_table_info(current_user: Dict[str, Any] = Depends(get_current
         cursor.execute("SELECT value FROM system_settings WHERE key = 'db_version'")
         version_result = cursor.fetchone()
         db_version = version_result[0] if version_result else "未知"
+        cursor.execute("PRAGMA user_version")
+        schema_version = cursor.fetchone()[0]
 
         conn.close()
 
         return {
             "db_version": db_version,
+            "schema_version": schema_version,
             "table_columns": [{"name": col[1], "type": col[2], "default": col[4]} for col in columns]
         }
     except Exception as e:
@@ -3955,6 +3927,9 @@ def import_backup(file: UploadFile = File(...), current_user: Dict[str, Any] = D
         success = db_manager.import_backup(backup_data, user_id)
 
         if success:
+            # 备份导入可能覆盖关键词，使所有账号的关键词匹配器失效
+            _reload_keywords()
+
             # 备份导入成功后，刷新 CookieManager 的内存缓存
             import cookie_manager
             if cookie_manager.manager:
@@ -3979,6 +3954,7 @@ def reload_cache(_: None = Depends(require_auth)):
     """重新加载系统缓存（用于手动刷新数据）"""
     try:
         import cookie_manager
+        _reload_keywords()
         if cookie_manager.manager:
             success = cookie_manager.manager.reload_from_db()
             if success:
@@ -4733,6 +4709,114 @@ def get_all_users(admin_user: Dict[str, Any] = Depends(require_admin)):
         log_with_user('error', f"获取用户信息失败: {str(e)}", admin_user)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get('/admin/message-queues')
+async def get_message_queue_metrics(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取各账号消息入口队列、会话执行器、消息去重与出站队列的指标（管理员专用）"""
+    try:
+        if cookie_manager.manager is None:
+            raise HTTPException(status_code=500, detail='CookieManager 未就绪')
+        # 在账号事件循环中读取，启用账号工作进程时合并各工作进程中的账号指标
+        results = [await command_bus.call('instance_metrics')]
+        worker_pool = cookie_manager.manager.worker_pool
+        if worker_pool is not None:
+            results.extend(result for result in (await worker_pool.broadcast_async('metrics')).values()
+                           if isinstance(result, dict))
+        queues, chats, dedup, outbound = {}, {}, {}, {}
+        for result in results:
+            queues.update(result['queues'])
+            chats.update(result['chats'])
+            dedup.update(result['dedup'])
+            outbound.update(result.get('outbound', {}))
+        return {
+            "queues": queues,
+            "chats": chats,
+            "dedup": dedup,
+            "outbound": outbound,
+            "total_depth": sum(metrics['depth'] for metrics in queues.values()),
+            "total_dropped": sum(metrics['dropped'] for metrics in queues.values()),
+            "total_outbound_depth": sum(metrics['depth'] for metrics in outbound.values())
+        }
+    except Exception as e:
+        log_with_user('error', f"获取消息队列指标失败: {str(e)}", admin_user)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get('/admin/timers')
+def get_timer_wheel_stats(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取时间轮各子系统未到期的定时器数量（管理员专用）"""
+    try:
+        from utils.timer_wheel import timer_wheel
+        return timer_wheel.get_stats()
+    except Exception as e:
+        log_with_user('error', f"获取定时器统计失败: {str(e)}", admin_user)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get('/admin/command-bus')
+def get_command_bus_metrics(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取命令总线的投递与执行统计（管理员专用）"""
+    try:
+        return command_bus.get_metrics()
+    except Exception as e:
+        log_with_user('error', f"获取命令总线统计失败: {str(e)}", admin_user)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get('/admin/scheduler')
+async def get_periodic_schedule(limit: int = 200, admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取即将运行的心跳、Token刷新、Cookie刷新等周期任务与全局名额占用情况（管理员专用）"""
+    try:
+        from utils.periodic_scheduler import periodic_scheduler
+        schedule = periodic_scheduler.get_schedule(limit)
+        worker_pool = cookie_manager.manager.worker_pool if cookie_manager.manager else None
+        if worker_pool is None:
+            return schedule
+        # 启用账号工作进程时，各工作进程有独立的调度器与名额，按进程分别返回
+        workers = {}
+        for index, result in (await worker_pool.broadcast_async('schedule', limit=limit)).items():
+            workers[index] = result if isinstance(result, dict) else {'error': str(result)}
+        return {**schedule, 'workers': workers}
+    except Exception as e:
+        log_with_user('error', f"获取周期任务调度失败: {str(e)}", admin_user)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get('/admin/settings-cache')
+async def get_settings_cache_stats(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取账号配置缓存的命中率与缓存规模（管理员专用）"""
+    try:
+        from utils.settings_cache import settings_cache
+        stats = settings_cache.get_stats()
+        worker_pool = cookie_manager.manager.worker_pool if cookie_manager.manager else None
+        if worker_pool is None:
+            return stats
+        # 启用账号工作进程时，各工作进程有独立的配置缓存，按进程分别返回
+        workers = {}
+        for index, result in (await worker_pool.broadcast_async('settings_cache_stats')).items():
+            workers[index] = result if isinstance(result, dict) else {'error': str(result)}
+        return {**stats, 'workers': workers}
+    except Exception as e:
+        log_with_user('error', f"获取账号配置缓存统计失败: {str(e)}", admin_user)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get('/admin/warm-start')
+def get_warm_start_status(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取账号分批启动进度与各账号启动阶段耗时（管理员专用）"""
+    try:
+        from utils.warm_start import warm_start
+        return warm_start.get_status()
+    except Exception as e:
+        log_with_user('error', f"获取账号启动进度失败: {str(e)}", admin_user)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get('/admin/workers')
+def get_account_workers_status(admin_user: Dict[str, Any] = Depends(require_admin)):
+    """获取账号工作进程的状态与账号分配（管理员专用）"""
+    try:
+        worker_pool = cookie_manager.manager.worker_pool if cookie_manager.manager else None
+        if worker_pool is None:
+            return {"enabled": False, "processes": 0, "workers": []}
+        return {"enabled": True, **worker_pool.get_status()}
+    except Exception as e:
+        log_with_user('error', f"获取工作进程状态失败: {str(e)}", admin_user)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.delete('/admin/users/{user_id}')
 def delete_user(user_id: int, admin_user: Dict[str, Any] = Depends(require_admin)):
     """删除用户（管理员专用）"""
@@ -5220,6 +5304,9 @@ def download_database_backup(admin_user: Dict[str, Any] = Depends(require_admin)
             log_with_user('error', f"数据库文件不存在: {db_file_path}", admin_user)
             raise HTTPException(status_code=404, detail="数据库文件不存在")
 
+        # WAL模式下先将日志写回主文件，保证下载的文件包含最新数据
+        db_manager.checkpoint()
+
         # 生成带时间戳的文件名
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         download_filename = f"xianyu_backup_{timestamp}.db"
@@ -5302,14 +5389,19 @@ async def upload_database_backup(admin_user: Dict[str, Any] = Depends(require_ad
         backup_filename = f"xianyu_data_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
         backup_current_path = os.path.join(db_dir, backup_filename)
 
+        db_manager.checkpoint()
         if os.path.exists(current_db_path):
             shutil.copy2(current_db_path, backup_current_path)
             log_with_user('info', f"当前数据库已备份为: {backup_current_path}", admin_user)
 
-        # 关闭当前数据库连接
-        if hasattr(db_manager, 'conn') and db_manager.conn:
-            db_manager.conn.close()
-            log_with_user('info', "已关闭当前数据库连接", admin_user)
+        # 关闭当前数据库连接（关闭前会执行WAL检查点）
+        db_manager.close()
+        log_with_user('info', "已关闭当前数据库连接", admin_user)
+
+        # 清理旧数据库遗留的WAL文件，避免被应用到新数据库上
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(current_db_path + suffix):
+                os.remove(current_db_path + suffix)
 
         # 替换数据库文件
         shutil.move(temp_file_path, current_db_path)
@@ -5317,6 +5409,7 @@ async def upload_database_backup(admin_user: Dict[str, Any] = Depends(require_ad
 
         # 重新初始化数据库连接（使用原有的db_path）
         db_manager.__init__(db_manager.db_path)
+        _reload_keywords()
         log_with_user('info', "数据库连接已重新初始化", admin_user)
 
         # 验证新数据库
@@ -5327,6 +5420,7 @@ async def upload_database_backup(admin_user: Dict[str, Any] = Depends(require_ad
             log_with_user('error', f"数据库恢复后验证失败: {str(e)}", admin_user)
             # 如果验证失败，尝试恢复原数据库
             if os.path.exists(backup_current_path):
+                db_manager.close()
                 shutil.copy2(backup_current_path, current_db_path)
                 db_manager.__init__()
                 log_with_user('info', "已恢复原数据库", admin_user)
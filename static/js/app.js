@@ -3585,9 +3585,13 @@ function renderCardsList(cards) {
 
     // 数据量显示
     let dataCount = '-';
-    if (card.type === 'data' && card.data_content) {
+    if (card.type === 'data') {
+        if (card.stock !== undefined && card.stock !== null) {
+        dataCount = card.stock;
+        } else if (card.data_content) {
         const lines = card.data_content.split('\n').filter(line => line.trim());
         dataCount = lines.length;
+        }
     } else if (card.type === 'api') {
         dataCount = '∞';
     } else if (card.type === 'text') {
@@ -0,0 +1,551 @@
+"""
+账号工作进程池
+把 XianyuLive 账号分散到 N 个工作进程中运行，突破单个事件循环 + GIL 的瓶颈
+（单进程约 40 个账号后 JSON 解析、解密和日志就会占满一个核心）
+
+- 按 cookie_id 一致性哈希分配工作进程，进程数变化时只有少量账号迁移
+- 主进程（CookieManager + API）通过本地连接向工作进程发送命令：启动/停止账号、
+  账号命令（命令总线中登记的发送消息等）、关键词与发货规则缓存失效、指标查询等；每个工作进程内运行独立的事件循环和 CookieManager
+- 监督线程定期 ping 工作进程，进程退出或连续无响应时按退避时间重启，并重新启动分配给它的账号
+- 工作进程通过 `python -m utils.account_workers --worker N` 启动，主进程退出（连接断开）时自动退出
+- 默认关闭（processes: 0），通过 global_config.yml 的 ACCOUNT_WORKERS 开启
+"""
+
+import argparse
+import asyncio
+import atexit
+import bisect
+import concurrent.futures
+import hashlib
+import itertools
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+
+
+WORKER_ADDRESS_ENV = 'XIANYU_WORKER_ADDRESS'
+WORKER_AUTHKEY_ENV = 'XIANYU_WORKER_AUTHKEY'
+
+
+class AccountWorkerError(RuntimeError):
+    """工作进程不可用或命令执行失败"""
+
+
+class ConsistentHashRing:
+    """一致性哈希环（每个节点若干虚拟节点）"""
+
+    def __init__(self, nodes, replicas: int = 160):
+        self._ring: List[Tuple[int, Any]] = []
+        for node in nodes:
+            for replica in range(replicas):
+                self._ring.append((self._hash(f'{node}#{replica}'), node))
+        self._ring.sort()
+        self._keys = [key for key, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+    def get_node(self, key: str):
+        if not self._ring:
+            raise AccountWorkerError('没有可用的工作进程')
+        position = bisect.bisect(self._keys, self._hash(key)) % len(self._ring)
+        return self._ring[position][1]
+
+
+class _WorkerHandle:
+    """主进程中一个工作进程的状态"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[subprocess.Popen] = None
+        self.conn = None
+        self.connected = threading.Event()
+        self.send_lock = threading.Lock()
+        self.pending: Dict[int, concurrent.futures.Future] = {}
+        self.started_at = 0.0
+        self.restarts = 0
+        self.missed_pings = 0
+        self.last_ping_ms: Optional[float] = None
+        self.next_restart_at: Optional[float] = None
+        self.backoff = 0.0
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def fail_pending(self, reason: str):
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(AccountWorkerError(reason))
+
+
+class AccountWorkerPool:
+    """账号工作进程池（主进程侧的监督者）"""
+
+    def __init__(self, processes: int, replicas: int = 160, health_interval: float = 5,
+                 ping_timeout: float = 5, max_missed_pings: int = 3, restart_backoff: float = 1,
+                 max_restart_backoff: float = 60, command_timeout: float = 30):
+        """
+        Args:
+            processes: 工作进程数
+            replicas: 一致性哈希中每个工作进程的虚拟节点数
+            health_interval: 健康检查间隔（秒）
+            ping_timeout: 单次 ping 的超时（秒）
+            max_missed_pings: 连续多少次 ping 无响应后重启工作进程
+            restart_backoff: 首次重启前的等待时间（秒），连续重启时翻倍
+            max_restart_backoff: 重启等待时间上限（秒）
+            command_timeout: 命令的默认超时（秒）
+        """
+        self.processes = max(1, int(processes))
+        self.ring = ConsistentHashRing(range(self.processes), replicas)
+        self.health_interval = health_interval
+        self.ping_timeout = ping_timeout
+        self.max_missed_pings = max_missed_pings
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max_restart_backoff
+        self.command_timeout = command_timeout
+
+        self._workers = [_WorkerHandle(index) for index in range(self.processes)]
+        # {cookie_id: (cookie_value, user_id)} 已在工作进程中启动的账号，工作进程重启后据此恢复
+        self._accounts: Dict[str, Tuple[str, Optional[int]]] = {}
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count(1)
+        self._authkey = secrets.token_bytes(32)
+        self._listener: Optional[Listener] = None
+        self._closed = threading.Event()
+        self._started = False
+
+    # ---------------- 生命周期 ----------------
+
+    def start(self):
+        """启动所有工作进程与监督线程"""
+        if self._started:
+            return
+        self._started = True
+        self._listener = Listener(('127.0.0.1', 0), authkey=self._authkey)
+        threading.Thread(target=self._accept_loop, name='account-workers-accept', daemon=True).start()
+        for worker in self._workers:
+            self._spawn(worker)
+        threading.Thread(target=self._monitor_loop, name='account-workers-monitor', daemon=True).start()
+        atexit.register(self.close)
+        logger.info(f"账号工作进程池已启动: {self.processes} 个工作进程")
+
+    def _spawn(self, worker: _WorkerHandle):
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        host, port = self._listener.address
+        env = dict(os.environ)
+        env[WORKER_ADDRESS_ENV] = f'{host}:{port}'
+        env[WORKER_AUTHKEY_ENV] = self._authkey.hex()
+        worker.connected.clear()
+        worker.conn = None
+        worker.missed_pings = 0
+        worker.process = subprocess.Popen(
+            [sys.executable, '-m', 'utils.account_workers', '--worker', str(worker.index)],
+            cwd=project_root, env=env
+        )
+        worker.started_at = time.time()
+        logger.info(f"工作进程 #{worker.index} 已启动 (pid={worker.process.pid})")
+
+    def _accept_loop(self):
+        """接受工作进程的连接，按握手时上报的序号绑定到对应的句柄"""
+        while not self._closed.is_set():
+            try:
+                conn = self._listener.accept()
+                index = conn.recv()
+            except Exception as e:
+                if not self._closed.is_set():
+                    logger.warning(f"接受工作进程连接失败: {e}")
+                continue
+            if not isinstance(index, int) or not 0 <= index < self.processes:
+                conn.close()
+                continue
+            worker = self._workers[index]
+            worker.conn = conn
+            worker.connected.set()
+            threading.Thread(target=self._read_loop, args=(worker, conn),
+                             name=f'account-worker-{index}-reader', daemon=True).start()
+            self._restore_accounts(worker)
+
+    def _read_loop(self, worker: _WorkerHandle, conn):
+        """读取工作进程的命令结果"""
+        while True:
+            try:
+                request_id, ok, result = conn.recv()
+            except (EOFError, OSError):
+                break
+            future = worker.pending.pop(request_id, None)
+            if future is None or future.done():
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(AccountWorkerError(result))
+        if worker.conn is conn:
+            worker.conn = None
+            worker.connected.clear()
+            worker.fail_pending(f'工作进程 #{worker.index} 连接已断开')
+
+    def _restore_accounts(self, worker: _WorkerHandle):
+        """工作进程（重新）连接后，启动分配给它的账号"""
+        with self._lock:
+            accounts = [(cookie_id, value) for cookie_id, value in self._accounts.items()
+                        if self.worker_for(cookie_id) == worker.index]
+        for cookie_id, (cookie_value, user_id) in accounts:
+            self._submit(worker, 'start', {'cookie_id': cookie_id, 'cookie_value': cookie_value, 'user_id': user_id})
+        if accounts:
+            logger.info(f"工作进程 #{worker.index} 已连接，恢复 {len(accounts)} 个账号")
+
+    def _monitor_loop(self):
+        while not self._closed.wait(self.health_interval):
+            for worker in self._workers:
+                try:
+                    self._check_worker(worker)
+                except Exception as e:
+                    logger.error(f"检查工作进程 #{worker.index} 失败: {e}")
+
+    def _check_worker(self, worker: _WorkerHandle):
+        if not worker.alive:
+            if worker.next_restart_at is None:
+                code = worker.process.returncode if worker.process else None
+                self._schedule_restart(worker, f"已退出 (返回码 {code})")
+            elif time.monotonic() >= worker.next_restart_at:
+                worker.next_restart_at = None
+                worker.restarts += 1
+                self._spawn(worker)
+            return
+        if not worker.connected.is_set():
+            # 刚启动尚未连接，超过 ping 超时仍未连接按无响应处理
+            if time.time() - worker.started_at < self.ping_timeout * self.max_missed_pings:
+                return
+            worker.missed_pings = self.max_missed_pings
+        else:
+            started = time.perf_counter()
+            try:
+                self._submit(worker, 'ping', {}).result(timeout=self.ping_timeout)
+                worker.last_ping_ms = round((time.perf_counter() - started) * 1000, 1)
+                worker.missed_pings = 0
+                # 稳定运行一段时间后重置退避
+                if time.time() - worker.started_at > self.max_restart_backoff:
+                    worker.backoff = 0.0
+                return
+            except Exception:
+                worker.missed_pings += 1
+                logger.warning(f"工作进程 #{worker.index} ping 无响应 ({worker.missed_pings}/{self.max_missed_pings})")
+        if worker.missed_pings >= self.max_missed_pings:
+            self._schedule_restart(worker, "持续无响应")
+
+    def _schedule_restart(self, worker: _WorkerHandle, reason: str):
+        """结束工作进程，按退避时间在之后的健康检查中重新启动"""
+        if worker.alive:
+            worker.process.kill()
+            try:
+                worker.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+        if worker.conn is not None:
+            try:
+                worker.conn.close()
+            except Exception:
+                pass
+            worker.conn = None
+        worker.connected.clear()
+        worker.fail_pending(f'工作进程 #{worker.index} 正在重启')
+        worker.backoff = min(self.max_restart_backoff, worker.backoff * 2 if worker.backoff else self.restart_backoff)
+        worker.next_restart_at = time.monotonic() + worker.backoff
+        logger.warning(f"工作进程 #{worker.index} {reason}，{worker.backoff:.0f} 秒后重启")
+
+    def close(self):
+        """通知所有工作进程退出"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        for worker in self._workers:
+            if worker.connected.is_set():
+                try:
+                    self._submit(worker, 'shutdown', {})
+                except Exception:
+                    pass
+        for worker in self._workers:
+            if worker.process is None:
+                continue
+            try:
+                worker.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+            worker.fail_pending('工作进程池已关闭')
+        if self._listener is not None:
+            try:
+                self._listener.close()
+            except Exception:
+                pass
+        logger.info("账号工作进程池已关闭")
+
+    # ---------------- 命令 ----------------
+
+    def worker_for(self, cookie_id: str) -> int:
+        """账号所属的工作进程序号"""
+        return self.ring.get_node(cookie_id)
+
+    def _submit(self, worker: _WorkerHandle, command: str, kwargs: Dict[str, Any]) -> concurrent.futures.Future:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        conn = worker.conn
+        if conn is None:
+            future.set_exception(AccountWorkerError(f'工作进程 #{worker.index} 不可用'))
+            return future
+        request_id = next(self._request_ids)
+        worker.pending[request_id] = future
+        try:
+            with worker.send_lock:
+                conn.send((request_id, command, kwargs))
+        except Exception as e:
+            worker.pending.pop(request_id, None)
+            future.set_exception(AccountWorkerError(f'向工作进程 #{worker.index} 发送命令失败: {e}'))
+        return future
+
+    def submit(self, cookie_id: str, command: str, **kwargs) -> concurrent.futures.Future:
+        """向账号所属的工作进程发送命令（cookie_id 作为命令参数一并传入）"""
+        return self._submit(self._workers[self.worker_for(cookie_id)], command, dict(kwargs, cookie_id=cookie_id))
+
+    def call(self, cookie_id: str, command: str, timeout: float = None, **kwargs) -> Any:
+        """同步调用（阻塞等待结果，不要在事件循环中使用）"""
+        return self.submit(cookie_id, command, **kwargs).result(timeout=timeout or self.command_timeout)
+
+    async def call_async(self, cookie_id: str, command: str, timeout: float = None, **kwargs) -> Any:
+        """在事件循环中调用"""
+        future = asyncio.wrap_future(self.submit(cookie_id, command, **kwargs))
+        return await asyncio.wait_for(future, timeout=timeout or self.command_timeout)
+
+    async def broadcast_async(self, command: str, timeout: float = None, **kwargs) -> Dict[int, Any]:
+        """向所有工作进程发送命令，返回 {序号: 结果或异常}"""
+        futures = [asyncio.wrap_future(self._submit(worker, command, kwargs)) for worker in self._workers]
+        done = await asyncio.wait_for(asyncio.gather(*futures, return_exceptions=True),
+                                      timeout=timeout or self.command_timeout)
+        return dict(enumerate(done))
+
+    def broadcast(self, command: str, **kwargs) -> List[concurrent.futures.Future]:
+        """向所有已连接的工作进程发送命令（不等待结果）"""
+        return [self._submit(worker, command, kwargs) for worker in self._workers if worker.conn is not None]
+
+    async def start_account(self, cookie_id: str, cookie_value: str, user_id: int = None):
+        """在所属工作进程中启动账号（工作进程暂不可用时，连接后自动启动）"""
+        with self._lock:
+            self._accounts[cookie_id] = (cookie_value, user_id)
+        return await self.call_async(cookie_id, 'start', cookie_value=cookie_value, user_id=user_id)
+
+    async def stop_account(self, cookie_id: str):
+        """停止工作进程中的账号"""
+        with self._lock:
+            self._accounts.pop(cookie_id, None)
+        return await self.call_async(cookie_id, 'stop')
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            assigned: Dict[int, List[str]] = {worker.index: [] for worker in self._workers}
+            for cookie_id in self._accounts:
+                assigned[self.worker_for(cookie_id)].append(cookie_id)
+        return {
+            'processes': self.processes,
+            'accounts': sum(len(accounts) for accounts in assigned.values()),
+            'workers': [{
+                'index': worker.index,
+                'pid': worker.process.pid if worker.process else None,
+                'alive': worker.alive,
+                'connected': worker.connected.is_set(),
+                'accounts': sorted(assigned[worker.index]),
+                'restarts': worker.restarts,
+                'missed_pings': worker.missed_pings,
+                'last_ping_ms': worker.last_ping_ms,
+                'uptime': round(time.time() - worker.started_at, 1) if worker.alive else 0,
+                'pending_commands': len(worker.pending),
+            } for worker in self._workers]
+        }
+
+
+# ---------------- 工作进程侧 ----------------
+
+class _WorkerRuntime:
+    """工作进程：在本进程的事件循环中运行分配到的账号并执行主进程的命令"""
+
+    def __init__(self, index: int, conn):
+        self.index = index
+        self.conn = conn
+        self.manager = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._account_locks: Dict[str, asyncio.Lock] = {}
+
+    async def run(self):
+        import cookie_manager as cm
+
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        cm.manager = cm.CookieManager(loop)
+        self.manager = cm.manager
+        threading.Thread(target=self._read_commands, args=(loop,), name='worker-commands', daemon=True).start()
+        logger.info(f"工作进程 #{self.index} 已就绪 (pid={os.getpid()})")
+
+        await self._stopped.wait()
+
+        tasks = list(self.manager.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info(f"工作进程 #{self.index} 已退出")
+
+    def _read_commands(self, loop: asyncio.AbstractEventLoop):
+        while True:
+            try:
+                request_id, command, kwargs = self.conn.recv()
+            except (EOFError, OSError):
+                # 主进程已退出
+                loop.call_soon_threadsafe(self._stopped.set)
+                return
+            asyncio.run_coroutine_threadsafe(self._execute(request_id, command, kwargs), loop)
+
+    async def _execute(self, request_id: int, command: str, kwargs: Dict[str, Any]):
+        handler = getattr(self, f'_cmd_{command}', None)
+        try:
+            if handler is None:
+                raise AccountWorkerError(f'未知命令: {command}')
+            reply = (request_id, True, await handler(**kwargs))
+        except Exception as e:
+            reply = (request_id, False, str(e) or type(e).__name__)
+        try:
+            self.conn.send(reply)
+        except Exception as e:
+            logger.error(f"工作进程 #{self.index} 返回命令结果失败: {e}")
+
+    def _lock(self, cookie_id: str) -> asyncio.Lock:
+        if cookie_id not in self._account_locks:
+            self._account_locks[cookie_id] = asyncio.Lock()
+        return self._account_locks[cookie_id]
+
+    async def _stop_task(self, cookie_id: str):
+        task = self.manager.tasks.pop(cookie_id, None)
+        if task is None or task.done():
+            return
+        task.cancel()
+        try:
+            await asyncio.wait_for(task, timeout=10.0)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            logger.error(f"【{cookie_id}】等待任务停止时出错: {e}")
+
+    # ---------------- 命令处理 ----------------
+
+    async def _cmd_ping(self):
+        return {'pid': os.getpid(), 'accounts': len(self.manager.tasks)}
+
+    async def _cmd_start(self, cookie_id: str, cookie_value: str, user_id: int = None):
+        async with self._lock(cookie_id):
+            task = self.manager.tasks.get(cookie_id)
+            if task is not None and not task.done() and self.manager.cookies.get(cookie_id) == cookie_value:
+                # 工作进程连接时的恢复与主进程的启动命令可能重复，Cookie 未变时不重启
+                return True
+            await self._stop_task(cookie_id)
+            self.manager.cookies[cookie_id] = cookie_value
+            self.manager.cookie_status[cookie_id] = True
+            self.manager.tasks[cookie_id] = asyncio.get_running_loop().create_task(
+                self.manager._run_xianyu(cookie_id, cookie_value, user_id))
+        logger.info(f"【{cookie_id}】已在工作进程 #{self.index} 中启动")
+        return True
+
+    async def _cmd_stop(self, cookie_id: str):
+        async with self._lock(cookie_id):
+            await self._stop_task(cookie_id)
+            self.manager.cookies.pop(cookie_id, None)
+        logger.info(f"【{cookie_id}】已在工作进程 #{self.index} 中停止")
+        return True
+
+    async def _cmd_set_status(self, cookie_id: str, enabled: bool):
+        self.manager.cookie_status[cookie_id] = enabled
+        return True
+
+    async def _cmd_reload_keywords(self, cookie_id: str = None):
+        from utils.keyword_matcher import keyword_matcher_cache
+        keyword_matcher_cache.invalidate(cookie_id)
+        return True
+
+    async def _cmd_invalidate_delivery_rules(self):
+        from db_manager import db_manager
+        db_manager._invalidate_delivery_rule_index()
+        return True
+
+    async def _cmd_invalidate_settings(self, cookie_id: str = None):
+        from utils.settings_cache import settings_cache
+        settings_cache.invalidate(cookie_id)
+        return True
+
+    async def _cmd_settings_cache_stats(self):
+        from utils.settings_cache import settings_cache
+        return settings_cache.get_stats()
+
+    async def _cmd_reload_from_db(self):
+        self.manager.reload_from_db()
+        from utils.keyword_matcher import keyword_matcher_cache
+        keyword_matcher_cache.invalidate()
+        return True
+
+    async def _cmd_command(self, cookie_id: str, name: str, kwargs: Dict[str, Any]):
+        """执行命令总线中登记的账号命令"""
+        from utils.command_bus import command_bus
+        return await command_bus.call(name, cookie_id=cookie_id, **kwargs)
+
+    async def _cmd_metrics(self):
+        from utils.command_bus import command_bus
+        return await command_bus.call('instance_metrics')
+
+    async def _cmd_schedule(self, limit: int = 200):
+        from utils.periodic_scheduler import periodic_scheduler
+        return periodic_scheduler.get_schedule(limit)
+
+    async def _cmd_shutdown(self):
+        self._stopped.set()
+        return True
+
+
+def run_worker(index: int):
+    """工作进程入口：连接主进程并运行"""
+    host, port = os.environ[WORKER_ADDRESS_ENV].rsplit(':', 1)
+    conn = Client((host, int(port)), authkey=bytes.fromhex(os.environ[WORKER_AUTHKEY_ENV]))
+    conn.send(index)
+    asyncio.run(_WorkerRuntime(index, conn).run())
+
+
+def create_account_worker_pool() -> Optional[AccountWorkerPool]:
+    """按 ACCOUNT_WORKERS 配置创建工作进程池，未开启时返回 None"""
+    try:
+        from config import config
+        worker_config = config.get('ACCOUNT_WORKERS', {}) or {}
+    except Exception:
+        worker_config = {}
+    processes = int(worker_config.get('processes', 0) or 0)
+    if processes <= 0:
+        return None
+    if getattr(sys, 'frozen', False):
+        logger.warning("打包运行环境不支持账号工作进程，所有账号在主进程中运行")
+        return None
+    return AccountWorkerPool(
+        processes,
+        replicas=worker_config.get('replicas', 160),
+        health_interval=worker_config.get('health_interval', 5),
+        ping_timeout=worker_config.get('ping_timeout', 5),
+        max_missed_pings=worker_config.get('max_missed_pings', 3),
+        restart_backoff=worker_config.get('restart_backoff', 1),
+        max_restart_backoff=worker_config.get('max_restart_backoff', 60),
+        command_timeout=worker_config.get('command_timeout', 30),
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='账号工作进程（由主进程启动）')
+    parser.add_argument('--worker', type=int, required=True, help='工作进程序号')
+    run_worker(parser.parse_args().worker)
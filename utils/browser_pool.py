@@ -0,0 +1,572 @@
+"""
+共享浏览器池
+进程内所有无头浏览器自动化（商品详情、订单详情、商品搜索、Cookie刷新）共用的 Chromium 池
+
+- 每个事件循环一个 Playwright 实例，浏览器按需启动并在空闲超时后关闭
+- 按账号租用 BrowserContext，Cookie 预先写入；同账号空闲的上下文直接复用，页面归还后回收再用
+- 限制全进程的浏览器数量与上下文数量，超出时复用/淘汰空闲资源或排队等待，避免同时冷启动导致内存耗尽
+- 浏览器崩溃（断开连接）后自动丢弃其上下文，下次租用时重新启动
+
+Playwright 对象绑定创建它的事件循环，因此池状态按事件循环隔离（主循环与 reply_server 循环各自一份），
+数量上限在全进程范围内统一计算。
+"""
+
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+
+DEFAULT_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                      '(KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36')
+
+DEFAULT_VIEWPORT = {'width': 1920, 'height': 1080}
+
+BROWSER_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-accelerated-2d-canvas',
+    '--no-first-run',
+    '--no-zygote',
+    '--disable-gpu',
+    '--disable-background-timer-throttling',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-renderer-backgrounding',
+    '--disable-features=TranslateUI',
+    '--disable-ipc-flooding-protection',
+    '--disable-extensions',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-translate',
+    '--hide-scrollbars',
+    '--mute-audio',
+    '--no-default-browser-check',
+    '--no-pings'
+]
+
+# Docker环境中追加的参数
+DOCKER_BROWSER_ARGS = [
+    '--disable-background-networking',
+    '--disable-client-side-phishing-detection',
+    '--disable-hang-monitor',
+    '--disable-popup-blocking',
+    '--disable-prompt-on-repost',
+    '--disable-web-resources',
+    '--metrics-recording-only',
+    '--safebrowsing-disable-auto-update',
+    '--enable-automation',
+    '--password-store=basic',
+    '--use-mock-keychain'
+]
+
+
+def parse_cookie_string(cookies_str: str, domain: str = '.goofish.com') -> List[Dict[str, str]]:
+    """将 'a=1; b=2' 格式的Cookie字符串转换为 Playwright add_cookies 所需的列表"""
+    cookies = []
+    for cookie_pair in (cookies_str or '').split(';'):
+        cookie_pair = cookie_pair.strip()
+        if '=' in cookie_pair:
+            name, value = cookie_pair.split('=', 1)
+            cookies.append({
+                'name': name.strip(),
+                'value': value.strip(),
+                'domain': domain,
+                'path': '/'
+            })
+    return cookies
+
+
+class _BrowserEntry:
+    """池中的一个浏览器进程"""
+
+    def __init__(self, browser, headless: bool):
+        self.browser = browser
+        self.headless = headless
+        self.contexts: List['_ContextEntry'] = []
+        self.alive = True
+        self.idle_since = time.time()
+
+    def is_alive(self) -> bool:
+        if not self.alive:
+            return False
+        try:
+            return self.browser.is_connected()
+        except Exception:
+            return False
+
+
+class _ContextEntry:
+    """池中的一个浏览器上下文（归属某个账号）"""
+
+    def __init__(self, key: tuple, cookie_id: str, context, browser_entry: _BrowserEntry,
+                 storage_state_path: Optional[str]):
+        self.key = key
+        self.cookie_id = cookie_id
+        self.context = context
+        self.browser_entry = browser_entry
+        self.storage_state_path = storage_state_path
+        self.cookies_str: Optional[str] = None
+        self.idle_pages: list = []
+        self.in_use = False
+        self.last_used = time.time()
+
+
+class _LoopState:
+    """单个事件循环内的池状态"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.playwright = None
+        self.browsers: List[_BrowserEntry] = []
+        self.contexts: List[_ContextEntry] = []
+        # 结构修改（启动浏览器、创建/关闭上下文）串行执行，避免同时冷启动多个浏览器
+        self.lock = asyncio.Lock()
+        self.changed = asyncio.Condition()
+        self.reaper_task: Optional[asyncio.Task] = None
+
+
+class BrowserLease:
+    """一次浏览器租用：持有上下文与页面，用完后归还给池"""
+
+    def __init__(self, pool: 'BrowserPool', state: _LoopState, entry: _ContextEntry, page):
+        self._pool = pool
+        self._state = state
+        self._entry = entry
+        self.cookie_id = entry.cookie_id
+        self.browser = entry.browser_entry.browser
+        self.context = entry.context
+        self.page = page
+        self.released = False
+        self._extra_pages = []
+
+    async def new_page(self):
+        """在同一上下文中再打开一个页面（归还时一并关闭）"""
+        page = await self.context.new_page()
+        self._extra_pages.append(page)
+        return page
+
+    async def release(self, keep_page: bool = True, discard: bool = False):
+        """归还租用
+
+        Args:
+            keep_page: 是否回收主页面供下次复用（页面上注册过事件监听器时应传 False）
+            discard: 是否直接关闭该上下文（页面/上下文状态异常时使用）
+        """
+        # shield：调用方任务被取消（如实例重启）时仍完成归还，避免上下文一直处于占用状态
+        await asyncio.shield(self._pool.release(self, keep_page=keep_page, discard=discard))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.release()
+
+
+class BrowserPool:
+    """进程级共享浏览器池"""
+
+    def __init__(self, max_browsers: int = 2, max_contexts_per_browser: int = 6, max_contexts: int = 12,
+                 idle_timeout: int = 300, acquire_timeout: int = 120, page_reset_timeout: int = 5):
+        """
+        Args:
+            max_browsers: 全进程最多同时运行的浏览器数
+            max_contexts_per_browser: 单个浏览器最多承载的上下文数
+            max_contexts: 全进程最多同时存在的上下文数
+            idle_timeout: 空闲上下文/浏览器的保留时间（秒）
+            acquire_timeout: 租用等待的最长时间（秒）
+            page_reset_timeout: 回收页面时重置到空白页的超时（秒）
+        """
+        self.max_browsers = max(1, int(max_browsers))
+        self.max_contexts_per_browser = max(1, int(max_contexts_per_browser))
+        self.max_contexts = max(1, int(max_contexts))
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.page_reset_timeout = page_reset_timeout
+
+        self._states: Dict[Any, _LoopState] = {}
+        self._states_lock = threading.Lock()
+        self.stats = {'launches': 0, 'crashes': 0, 'contexts_created': 0, 'contexts_reused': 0,
+                      'pages_reused': 0, 'waits': 0, 'evictions': 0}
+
+    # ------------------------------------------------------------------ #
+    # 状态与计数
+    # ------------------------------------------------------------------ #
+
+    def _get_state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        with self._states_lock:
+            # 清理已关闭事件循环的残留状态，避免其计数一直占用上限
+            for dead_loop in [l for l in self._states if l.is_closed()]:
+                del self._states[dead_loop]
+            state = self._states.get(loop)
+            if state is None:
+                state = _LoopState(loop)
+                self._states[loop] = state
+            return state
+
+    def _count(self) -> tuple:
+        """返回全进程 (存活浏览器数, 上下文数)"""
+        with self._states_lock:
+            states = list(self._states.values())
+        browsers = sum(1 for state in states for entry in state.browsers if entry.alive)
+        contexts = sum(len(state.contexts) for state in states)
+        return browsers, contexts
+
+    def _prune(self, state: _LoopState):
+        """丢弃已崩溃浏览器及其上下文"""
+        for browser_entry in list(state.browsers):
+            if browser_entry.is_alive():
+                continue
+            browser_entry.alive = False
+            state.browsers.remove(browser_entry)
+            for entry in browser_entry.contexts:
+                if entry in state.contexts:
+                    state.contexts.remove(entry)
+            browser_entry.contexts = []
+            logger.warning(f"浏览器池: 检测到浏览器已断开，已丢弃（剩余 {len(state.browsers)} 个）")
+
+    # ------------------------------------------------------------------ #
+    # 启动与关闭
+    # ------------------------------------------------------------------ #
+
+    async def _ensure_playwright(self, state: _LoopState):
+        if state.playwright is None:
+            from playwright.async_api import async_playwright
+            state.playwright = await asyncio.wait_for(async_playwright().start(), timeout=30.0)
+        return state.playwright
+
+    async def _launch_browser(self, state: _LoopState, headless: bool) -> _BrowserEntry:
+        playwright = await self._ensure_playwright(state)
+        browser_args = list(BROWSER_ARGS)
+        if os.getenv('DOCKER_ENV'):
+            browser_args.extend(DOCKER_BROWSER_ARGS)
+
+        start = time.perf_counter()
+        browser = await playwright.chromium.launch(headless=headless, args=browser_args)
+        entry = _BrowserEntry(browser, headless)
+
+        def on_disconnected(*_):
+            if entry.alive:
+                entry.alive = False
+                self.stats['crashes'] += 1
+        browser.on('disconnected', on_disconnected)
+
+        state.browsers.append(entry)
+        self.stats['launches'] += 1
+        logger.info(f"浏览器池: 已启动浏览器（headless={headless}），耗时 {time.perf_counter() - start:.2f}秒，"
+                    f"当前 {len(state.browsers)} 个")
+        return entry
+
+    async def _close_context(self, state: _LoopState, entry: _ContextEntry):
+        if entry in state.contexts:
+            state.contexts.remove(entry)
+        if entry in entry.browser_entry.contexts:
+            entry.browser_entry.contexts.remove(entry)
+            if not entry.browser_entry.contexts:
+                entry.browser_entry.idle_since = time.time()
+        entry.idle_pages = []
+        try:
+            await asyncio.wait_for(entry.context.close(), timeout=5.0)
+        except Exception as e:
+            logger.debug(f"浏览器池: 关闭上下文出错（可忽略）: {e}")
+
+    async def _close_browser(self, state: _LoopState, browser_entry: _BrowserEntry):
+        for entry in list(browser_entry.contexts):
+            if entry in state.contexts:
+                state.contexts.remove(entry)
+        browser_entry.contexts = []
+        browser_entry.alive = False
+        if browser_entry in state.browsers:
+            state.browsers.remove(browser_entry)
+        try:
+            await asyncio.wait_for(browser_entry.browser.close(), timeout=5.0)
+        except Exception as e:
+            logger.debug(f"浏览器池: 关闭浏览器出错（可忽略）: {e}")
+
+    async def _stop_playwright_if_idle(self, state: _LoopState):
+        if state.playwright is not None and not state.browsers:
+            playwright, state.playwright = state.playwright, None
+            try:
+                await asyncio.wait_for(playwright.stop(), timeout=5.0)
+            except Exception as e:
+                logger.debug(f"浏览器池: 停止Playwright出错（可忽略）: {e}")
+
+    async def _evict_idle_context(self, state: _LoopState, browser_entry: _BrowserEntry = None) -> bool:
+        """关闭最久未使用的空闲上下文，成功返回 True"""
+        candidates = [entry for entry in state.contexts if not entry.in_use
+                      and (browser_entry is None or entry.browser_entry is browser_entry)]
+        if not candidates:
+            return False
+        victim = min(candidates, key=lambda entry: entry.last_used)
+        await self._close_context(state, victim)
+        self.stats['evictions'] += 1
+        logger.debug(f"浏览器池: 已淘汰账号 {victim.cookie_id} 的空闲上下文")
+        return True
+
+    async def _pick_browser(self, state: _LoopState, headless: bool) -> Optional[_BrowserEntry]:
+        """选择（必要时启动）一个有空余上下文名额的浏览器，无可用名额返回 None"""
+        candidates = [entry for entry in state.browsers
+                      if entry.headless == headless and len(entry.contexts) < self.max_contexts_per_browser]
+        if candidates:
+            return min(candidates, key=lambda entry: len(entry.contexts))
+
+        browser_count, _ = self._count()
+        if browser_count < self.max_browsers:
+            return await self._launch_browser(state, headless)
+
+        # 浏览器数已达上限：同模式浏览器上淘汰一个空闲上下文腾出名额
+        for entry in state.browsers:
+            if entry.headless == headless and await self._evict_idle_context(state, entry):
+                return entry
+
+        # 关闭一个完全空闲的其他模式浏览器，换成所需模式
+        for entry in state.browsers:
+            if all(not context_entry.in_use for context_entry in entry.contexts):
+                await self._close_browser(state, entry)
+                return await self._launch_browser(state, headless)
+        return None
+
+    async def _create_context(self, state: _LoopState, key: tuple, cookie_id: str, headless: bool,
+                              storage_state_path: Optional[str], context_options: dict) -> Optional[_ContextEntry]:
+        _, context_count = self._count()
+        if context_count >= self.max_contexts and not await self._evict_idle_context(state):
+            return None
+
+        browser_entry = await self._pick_browser(state, headless)
+        if browser_entry is None:
+            return None
+
+        options = dict(context_options)
+        options.setdefault('user_agent', DEFAULT_USER_AGENT)
+        options.setdefault('viewport', DEFAULT_VIEWPORT)
+        if storage_state_path and os.path.exists(storage_state_path):
+            options['storage_state'] = storage_state_path
+
+        context = await browser_entry.browser.new_context(**options)
+        entry = _ContextEntry(key, cookie_id, context, browser_entry, storage_state_path)
+        browser_entry.contexts.append(entry)
+        state.contexts.append(entry)
+        self.stats['contexts_created'] += 1
+        return entry
+
+    # ------------------------------------------------------------------ #
+    # 租用与归还
+    # ------------------------------------------------------------------ #
+
+    async def acquire(self, cookie_id: str, cookies_str: str = None, headless: bool = True,
+                      storage_state_path: str = None, **context_options) -> BrowserLease:
+        """租用账号的浏览器上下文和页面
+
+        Args:
+            cookie_id: 账号ID，同账号同配置的空闲上下文会被复用
+            cookies_str: 需要写入上下文的Cookie字符串（与上次写入的不同时重新写入）
+            headless: 是否无头模式
+            storage_state_path: 持久化存储状态文件（归还时保存，下次创建上下文时加载）
+            **context_options: 传给 browser.new_context 的参数（user_agent、viewport、locale等）
+
+        Raises:
+            TimeoutError: 在 acquire_timeout 内没有可用的浏览器名额
+        """
+        state = self._get_state()
+        self._ensure_reaper(state)
+        key = (cookie_id, headless, storage_state_path, repr(sorted(context_options.items())))
+        deadline = time.time() + self.acquire_timeout
+
+        while True:
+            async with state.lock:
+                self._prune(state)
+                entry = next((entry for entry in state.contexts
+                              if entry.key == key and not entry.in_use), None)
+                if entry is not None:
+                    self.stats['contexts_reused'] += 1
+                else:
+                    entry = await self._create_context(state, key, cookie_id, headless,
+                                                       storage_state_path, context_options)
+                if entry is not None:
+                    entry.in_use = True
+                    break
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError(f"浏览器池已满，等待 {self.acquire_timeout} 秒仍无可用浏览器")
+            self.stats['waits'] += 1
+            logger.info(f"【{cookie_id}】浏览器池已满，等待其他任务归还...")
+            async with state.changed:
+                try:
+                    # 限制单次等待时长：其他事件循环归还的名额不会通知到本循环
+                    await asyncio.wait_for(state.changed.wait(), timeout=min(remaining, 1.0))
+                except asyncio.TimeoutError:
+                    pass
+
+        try:
+            if cookies_str is not None and cookies_str != entry.cookies_str:
+                await entry.context.clear_cookies()
+                await entry.context.add_cookies(parse_cookie_string(cookies_str))
+                entry.cookies_str = cookies_str
+
+            page = None
+            while entry.idle_pages:
+                candidate = entry.idle_pages.pop()
+                if not candidate.is_closed():
+                    page = candidate
+                    self.stats['pages_reused'] += 1
+                    break
+            if page is None:
+                page = await entry.context.new_page()
+        except Exception:
+            # 上下文不可用（通常是浏览器已崩溃），丢弃后抛出
+            entry.in_use = False
+            async with state.lock:
+                await self._close_context(state, entry)
+            await self._notify(state)
+            raise
+
+        return BrowserLease(self, state, entry, page)
+
+    @asynccontextmanager
+    async def lease(self, cookie_id: str, cookies_str: str = None, headless: bool = True,
+                    storage_state_path: str = None, keep_page: bool = True, **context_options):
+        """acquire/release 的上下文管理器形式，异常退出时丢弃上下文"""
+        browser_lease = await self.acquire(cookie_id, cookies_str, headless, storage_state_path, **context_options)
+        try:
+            yield browser_lease
+        except BaseException:
+            await browser_lease.release(keep_page=False, discard=not browser_lease._entry.browser_entry.is_alive())
+            raise
+        else:
+            await browser_lease.release(keep_page=keep_page)
+
+    async def release(self, browser_lease: BrowserLease, keep_page: bool = True, discard: bool = False):
+        """归还租用（可重复调用）"""
+        if browser_lease.released:
+            return
+        browser_lease.released = True
+        state = browser_lease._state
+        entry = browser_lease._entry
+
+        for extra_page in browser_lease._extra_pages:
+            try:
+                await extra_page.close()
+            except Exception:
+                pass
+
+        alive = entry.browser_entry.is_alive() and entry in state.contexts
+        page = browser_lease.page
+        if alive and not discard:
+            if keep_page and not page.is_closed():
+                try:
+                    await page.goto('about:blank', timeout=self.page_reset_timeout * 1000)
+                    entry.idle_pages.append(page)
+                except Exception:
+                    keep_page = False
+            if not keep_page:
+                try:
+                    await page.close()
+                except Exception:
+                    pass
+            if entry.storage_state_path:
+                try:
+                    await entry.context.storage_state(path=entry.storage_state_path)
+                except Exception as e:
+                    logger.debug(f"浏览器池: 保存存储状态失败: {e}")
+
+        entry.in_use = False
+        entry.last_used = time.time()
+        if discard or not alive:
+            async with state.lock:
+                await self._close_context(state, entry)
+        await self._notify(state)
+
+    async def _notify(self, state: _LoopState):
+        async with state.changed:
+            state.changed.notify_all()
+
+    # ------------------------------------------------------------------ #
+    # 空闲回收
+    # ------------------------------------------------------------------ #
+
+    def _ensure_reaper(self, state: _LoopState):
+        if state.reaper_task is None or state.reaper_task.done():
+            state.reaper_task = asyncio.create_task(self._reaper(state))
+
+    async def _reaper(self, state: _LoopState):
+        interval = max(1, min(30, self.idle_timeout / 2))
+        while True:
+            await asyncio.sleep(interval)
+            await self.reap_idle(state)
+            if not state.browsers and not state.contexts:
+                break
+
+    async def reap_idle(self, state: _LoopState = None):
+        """关闭超过空闲时间的上下文与浏览器，所有浏览器关闭后停止 Playwright"""
+        state = state or self._get_state()
+        now = time.time()
+        async with state.lock:
+            self._prune(state)
+            for entry in list(state.contexts):
+                if not entry.in_use and now - entry.last_used > self.idle_timeout:
+                    await self._close_context(state, entry)
+            for browser_entry in list(state.browsers):
+                if not browser_entry.contexts and now - browser_entry.idle_since > self.idle_timeout:
+                    await self._close_browser(state, browser_entry)
+                    logger.info(f"浏览器池: 空闲浏览器已关闭，剩余 {len(state.browsers)} 个")
+            await self._stop_playwright_if_idle(state)
+
+    async def close_account(self, cookie_id: str):
+        """关闭账号的所有空闲上下文（账号停止时调用）"""
+        state = self._get_state()
+        async with state.lock:
+            for entry in list(state.contexts):
+                if entry.cookie_id == cookie_id and not entry.in_use:
+                    await self._close_context(state, entry)
+        await self._notify(state)
+
+    async def close(self):
+        """关闭当前事件循环中的全部浏览器并停止 Playwright"""
+        state = self._get_state()
+        if state.reaper_task and not state.reaper_task.done():
+            state.reaper_task.cancel()
+        async with state.lock:
+            for browser_entry in list(state.browsers):
+                await self._close_browser(state, browser_entry)
+            state.contexts = []
+            await self._stop_playwright_if_idle(state)
+        with self._states_lock:
+            self._states.pop(state.loop, None)
+        logger.info("浏览器池已关闭")
+
+    def get_status(self) -> Dict[str, Any]:
+        """池状态（全进程）"""
+        with self._states_lock:
+            states = list(self._states.values())
+        return {
+            'browsers': sum(len(state.browsers) for state in states),
+            'contexts': sum(len(state.contexts) for state in states),
+            'contexts_in_use': sum(1 for state in states for entry in state.contexts if entry.in_use),
+            'max_browsers': self.max_browsers,
+            'max_contexts': self.max_contexts,
+            **self.stats
+        }
+
+
+def _create_browser_pool() -> BrowserPool:
+    try:
+        from config import config
+        pool_config = config.get('BROWSER_POOL', {}) or {}
+    except Exception:
+        pool_config = {}
+    return BrowserPool(
+        max_browsers=pool_config.get('max_browsers', 2),
+        max_contexts_per_browser=pool_config.get('max_contexts_per_browser', 6),
+        max_contexts=pool_config.get('max_contexts', 12),
+        idle_timeout=pool_config.get('idle_timeout', 300),
+        acquire_timeout=pool_config.get('acquire_timeout', 120)
+    )
+
+
+# 全局浏览器池实例
+browser_pool = _create_browser_pool()
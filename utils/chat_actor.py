@@ -0,0 +1,131 @@
+"""
+会话级消息执行器（mailbox/actor）
+替代「每条消息取消旧任务、创建新防抖任务」的做法
+
+- 每个会话一个轻量邮箱：防抖窗口内的连续消息合并，只回复最后一条
+- 同一会话的回复严格按顺序执行：回复进行中收到的新消息会合并到下一次回复，不会并发回复
+- 空闲会话不持有任何任务：邮箱只在有待处理消息时存在，等待期间仅占用一个时间轮定时器，
+  收到新消息时只推迟截止时间，不取消/重建定时器
+- 统计接收、合并、处理的消息数
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from loguru import logger
+
+from utils.timer_wheel import TimerHandle, timer_wheel
+
+
+class _Mailbox:
+    __slots__ = ('chat_id', 'pending', 'pending_count', 'deadline', 'timer', 'task')
+
+    def __init__(self, chat_id: str):
+        self.chat_id = chat_id
+        self.pending: Optional[Any] = None  # 最新的待处理消息
+        self.pending_count = 0  # 本轮合并的消息数
+        self.deadline = 0.0  # 防抖截止时间（time.monotonic）
+        self.timer: Optional[TimerHandle] = None
+        self.task: Optional[asyncio.Task] = None  # 正在执行回复的任务
+
+
+class ChatActorExecutor:
+    """单个账号的会话执行器"""
+
+    def __init__(self, cookie_id: str, handler: Callable[[str, Any], Awaitable[None]],
+                 debounce_delay: float = 1.0):
+        """
+        Args:
+            cookie_id: 账号ID（用于日志）
+            handler: 处理会话最新消息的协程函数 handler(chat_id, payload)
+            debounce_delay: 防抖时间（秒）：会话停止发送消息该时长后才回复
+        """
+        self.cookie_id = cookie_id
+        self.handler = handler
+        self.debounce_delay = debounce_delay
+        self._mailboxes: Dict[str, _Mailbox] = {}
+        self.stats = {'received': 0, 'coalesced': 0, 'processed': 0, 'failed': 0}
+
+    def submit(self, chat_id: str, payload: Any):
+        """投递会话消息（不等待）：在防抖窗口结束后处理该会话最新的一条消息"""
+        mailbox = self._mailboxes.get(chat_id)
+        if mailbox is None:
+            mailbox = self._mailboxes[chat_id] = _Mailbox(chat_id)
+
+        self.stats['received'] += 1
+        if mailbox.pending is not None:
+            # 上一条消息尚未回复即被新消息取代
+            self.stats['coalesced'] += 1
+        mailbox.pending = payload
+        mailbox.pending_count += 1
+        mailbox.deadline = time.monotonic() + self.debounce_delay
+
+        # 回复进行中：结束后再处理最新消息；已有定时器：到期时按新的截止时间顺延
+        if mailbox.task is None and mailbox.timer is None:
+            self._arm(mailbox)
+
+    def _arm(self, mailbox: _Mailbox):
+        mailbox.timer = timer_wheel.call_at(mailbox.deadline, self._on_timer, mailbox, subsystem='chat_debounce')
+
+    def _on_timer(self, mailbox: _Mailbox):
+        mailbox.timer = None
+        if self._mailboxes.get(mailbox.chat_id) is not mailbox or mailbox.pending is None:
+            return
+        if time.monotonic() < mailbox.deadline:
+            # 等待期间又收到消息，顺延到新的截止时间
+            self._arm(mailbox)
+            return
+        mailbox.task = asyncio.create_task(self._run(mailbox))
+
+    async def _run(self, mailbox: _Mailbox):
+        """依次处理会话的待回复消息，处理期间到达的消息合并到下一轮"""
+        try:
+            while mailbox.pending is not None:
+                if time.monotonic() < mailbox.deadline:
+                    # 新消息的防抖窗口尚未结束，交给定时器，释放任务
+                    self._arm(mailbox)
+                    return
+
+                payload, merged = mailbox.pending, mailbox.pending_count
+                mailbox.pending = None
+                mailbox.pending_count = 0
+                if merged > 1:
+                    logger.info(f"【{self.cookie_id}】chat_id {mailbox.chat_id} 防抖窗口内合并 {merged} 条消息，回复最后一条")
+
+                try:
+                    await self.handler(mailbox.chat_id, payload)
+                    self.stats['processed'] += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.stats['failed'] += 1
+                    logger.error(f"【{self.cookie_id}】处理防抖回复时发生错误: {e}")
+        finally:
+            mailbox.task = None
+            # 没有待处理消息也没有定时器：会话空闲，移除邮箱
+            if mailbox.pending is None and mailbox.timer is None \
+                    and self._mailboxes.get(mailbox.chat_id) is mailbox:
+                del self._mailboxes[mailbox.chat_id]
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'active_chats': len(self._mailboxes),
+            'running': sum(1 for mailbox in self._mailboxes.values() if mailbox.task is not None),
+            'debounce_delay': self.debounce_delay,
+            **self.stats
+        }
+
+    async def close(self):
+        """取消所有定时器和进行中的回复"""
+        tasks = []
+        for mailbox in self._mailboxes.values():
+            if mailbox.timer is not None:
+                mailbox.timer.cancel()
+                mailbox.timer = None
+            mailbox.pending = None
+            if mailbox.task is not None:
+                mailbox.task.cancel()
+                tasks.append(mailbox.task)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._mailboxes.clear()
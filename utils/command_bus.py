@@ -0,0 +1,188 @@
+"""
+跨事件循环命令总线
+API 服务运行在后台线程的独立事件循环中，而账号的 WebSocket、aiohttp 会话和任务都属于主事件循环，
+直接在 API 线程中 await 账号对象的协程（如 send_msg）会跨线程操作 WebSocket 内部状态。
+命令总线把这类操作按名称登记为命令，由调用方投递到账号事件循环执行，通过 Future 返回结果。
+
+- 命令在登记时绑定处理协程，投递时先按处理函数签名校验参数，参数错误在调用方线程立即抛出
+- 超时在账号事件循环中执行（超时即取消处理任务），调用方不会留下仍在运行的孤儿操作
+- 批量投递：同一时间段内的多个命令只唤醒一次事件循环，单次最多处理 max_batch 个
+- 在账号事件循环内部调用时直接执行，不经过队列
+"""
+
+import asyncio
+import concurrent.futures
+import inspect
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+from loguru import logger
+
+
+class CommandError(RuntimeError):
+    """命令执行失败（可直接展示给调用方的业务错误）"""
+
+
+class CommandBus:
+    """把其他线程发起的命令投递到所属事件循环执行"""
+
+    def __init__(self, default_timeout: float = 30.0, max_batch: int = 64):
+        """
+        Args:
+            default_timeout: 命令默认超时（秒）
+            max_batch: 每次唤醒事件循环最多处理的命令数
+        """
+        self.default_timeout = default_timeout
+        self.max_batch = max(1, int(max_batch))
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._handlers: Dict[str, Callable] = {}
+        self._signatures: Dict[str, inspect.Signature] = {}
+        self._pending: deque = deque()
+        self._lock = threading.Lock()
+        self._drain_scheduled = False
+        self._wait_ms: deque = deque(maxlen=1000)
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'timed_out': 0, 'batches': 0}
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """绑定命令执行所在的事件循环"""
+        self.loop = loop
+
+    def register(self, name: str, handler: Callable):
+        """登记命令，handler 为协程函数，重复登记时覆盖"""
+        if not asyncio.iscoroutinefunction(handler):
+            raise TypeError(f"命令 {name} 的处理函数必须是协程函数")
+        self._handlers[name] = handler
+        self._signatures[name] = inspect.signature(handler)
+
+    def _prepare(self, name: str, kwargs: Dict[str, Any]) -> Callable:
+        handler = self._handlers.get(name)
+        if handler is None:
+            raise KeyError(f"未登记的命令: {name}")
+        # 参数错误在调用方抛出，而不是在事件循环中失败
+        self._signatures[name].bind(**kwargs)
+        return handler
+
+    def _in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    # ---------------- 投递 ----------------
+
+    def submit(self, name: str, timeout: float = None, **kwargs) -> concurrent.futures.Future:
+        """线程安全地投递命令，返回 concurrent.futures.Future"""
+        handler = self._prepare(name, kwargs)
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            raise RuntimeError('命令总线未绑定事件循环')
+
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        entry = (name, handler, kwargs, timeout or self.default_timeout, future, time.perf_counter())
+        with self._lock:
+            self._pending.append(entry)
+            self.stats['submitted'] += 1
+            schedule = not self._drain_scheduled
+            self._drain_scheduled = True
+        if schedule:
+            try:
+                loop.call_soon_threadsafe(self._drain)
+            except RuntimeError:
+                # 事件循环已关闭
+                self._fail_pending(RuntimeError('账号事件循环已关闭'))
+        return future
+
+    async def call(self, name: str, timeout: float = None, **kwargs) -> Any:
+        """在任意事件循环中调用命令并等待结果"""
+        timeout = timeout or self.default_timeout
+        if self._in_loop():
+            handler = self._prepare(name, kwargs)
+            return await asyncio.wait_for(handler(**kwargs), timeout=timeout)
+        return await asyncio.wrap_future(self.submit(name, timeout=timeout, **kwargs))
+
+    def call_sync(self, name: str, timeout: float = None, **kwargs) -> Any:
+        """在非事件循环线程中调用命令并阻塞等待结果"""
+        if self._in_loop():
+            raise RuntimeError(f"不能在所属事件循环中同步等待命令: {name}")
+        timeout = timeout or self.default_timeout
+        # 超时由事件循环一侧执行，这里多等一会以取得超时异常而不是提前放弃
+        return self.submit(name, timeout=timeout, **kwargs).result(timeout=timeout + 5)
+
+    # ---------------- 执行（所属事件循环） ----------------
+
+    def _drain(self):
+        with self._lock:
+            batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.max_batch))]
+            if self._pending:
+                self.loop.call_soon(self._drain)
+            else:
+                self._drain_scheduled = False
+        if not batch:
+            return
+        self.stats['batches'] += 1
+        now = time.perf_counter()
+        for name, handler, kwargs, timeout, future, submitted_at in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            self._wait_ms.append((now - submitted_at) * 1000)
+            task = self.loop.create_task(asyncio.wait_for(handler(**kwargs), timeout=timeout))
+            task.add_done_callback(lambda done, name=name, future=future: self._complete(name, future, done))
+
+    def _complete(self, name: str, future: concurrent.futures.Future, task: asyncio.Task):
+        if task.cancelled():
+            self.stats['failed'] += 1
+            future.set_exception(CommandError(f"命令 {name} 已取消"))
+            return
+        error = task.exception()
+        if error is None:
+            self.stats['completed'] += 1
+            future.set_result(task.result())
+            return
+        if isinstance(error, asyncio.TimeoutError):
+            self.stats['timed_out'] += 1
+            logger.warning(f"命令 {name} 执行超时")
+        else:
+            self.stats['failed'] += 1
+            if not isinstance(error, CommandError):
+                logger.error(f"命令 {name} 执行异常: {error}")
+        future.set_exception(error)
+
+    def _fail_pending(self, error: Exception):
+        with self._lock:
+            pending, self._pending = self._pending, deque()
+            self._drain_scheduled = False
+        for entry in pending:
+            future = entry[4]
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    # ---------------- 状态 ----------------
+
+    def get_metrics(self) -> Dict[str, Any]:
+        waits = sorted(self._wait_ms)
+        batches = self.stats['batches']
+        return {
+            'commands': sorted(self._handlers),
+            'depth': len(self._pending),
+            'wait_ms_p50': round(waits[len(waits) // 2], 3) if waits else 0,
+            'wait_ms_p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0,
+            'avg_batch': round((self.stats['submitted'] - len(self._pending)) / batches, 2) if batches else 0,
+            **self.stats
+        }
+
+
+def _create_command_bus() -> CommandBus:
+    try:
+        from config import config
+        bus_config = config.get('COMMAND_BUS', {}) or {}
+    except Exception:
+        bus_config = {}
+    return CommandBus(
+        default_timeout=bus_config.get('default_timeout', 30),
+        max_batch=bus_config.get('max_batch', 64)
+    )
+
+
+# 全局命令总线（由 CookieManager 绑定到账号事件循环并登记命令）
+command_bus = _create_command_bus()
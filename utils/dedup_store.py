@@ -0,0 +1,136 @@
+"""
+消息去重存储（TTL + LRU）
+记录已处理的消息ID，替代「字典 + 超限时全量扫描并排序淘汰一半」的做法
+
+- 按处理时间有序保存（OrderedDict），插入、查询、过期淘汰均为均摊 O(1)：
+  过期和超出容量的记录总是位于头部，逐条弹出即可，无需扫描或排序
+- 可选持久化到 SQLite：新记录缓冲后经单写线程队列批量写入，启动时加载 TTL 窗口内的记录，
+  重启后同步通道重放的消息不会被重复回复
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+
+from utils.timer_wheel import TimerHandle, timer_wheel
+
+
+class MessageDedupStore:
+    """单个账号的已处理消息ID存储"""
+
+    def __init__(self, cookie_id: str, ttl: float = 3600, max_size: int = 10000,
+                 persist: bool = True, flush_interval: float = 1.0):
+        """
+        Args:
+            cookie_id: 账号ID
+            ttl: 记录有效期（秒），过期后同一消息可再次回复
+            max_size: 内存中最多保留的记录数，超出时淘汰最早处理的记录
+            persist: 是否持久化到数据库
+            flush_interval: 持久化的批量写入间隔（秒）
+        """
+        self.cookie_id = cookie_id
+        self.ttl = ttl
+        self.max_size = max(1, int(max_size))
+        self.persist = persist
+        self.flush_interval = flush_interval
+
+        # {message_id: processed_at}，按处理时间升序
+        self._entries: 'OrderedDict[str, float]' = OrderedDict()
+        self._unsaved: List[Tuple[str, float]] = []
+        self._flush_timer: Optional[TimerHandle] = None
+        self.stats = {'hits': 0, 'marked': 0, 'expired': 0, 'evicted': 0, 'loaded': 0, 'saved': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, message_id: str) -> bool:
+        return self.seen_at(message_id) is not None
+
+    def seen_at(self, message_id: str) -> Optional[float]:
+        """返回消息在有效期内的处理时间，未处理或已过期返回 None"""
+        self._expire()
+        processed_at = self._entries.get(message_id)
+        if processed_at is not None:
+            self.stats['hits'] += 1
+        return processed_at
+
+    def mark(self, message_id: str, processed_at: float = None):
+        """标记消息为已处理（已存在的记录移到末尾）"""
+        if processed_at is None:
+            processed_at = time.time()
+        self._entries[message_id] = processed_at
+        self._entries.move_to_end(message_id)
+        self.stats['marked'] += 1
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats['evicted'] += 1
+
+        if self.persist:
+            self._unsaved.append((message_id, processed_at))
+            if self._flush_timer is None:
+                self._flush_timer = timer_wheel.call_later(self.flush_interval, self.flush, subsystem='dedup_flush')
+
+    def _expire(self):
+        """弹出头部已过期的记录"""
+        expire_before = time.time() - self.ttl
+        entries = self._entries
+        while entries:
+            message_id, processed_at = next(iter(entries.items()))
+            if processed_at >= expire_before:
+                break
+            entries.popitem(last=False)
+            self.stats['expired'] += 1
+
+    def flush(self):
+        """把缓冲的新记录提交到单写线程队列（不等待写入完成）"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._unsaved:
+            return
+        # 启动时最多只加载 max_size 条，更早的记录无需写入
+        entries, self._unsaved = self._unsaved[-self.max_size:], []
+        try:
+            from db_manager import db_manager
+            db_manager.save_processed_messages(self.cookie_id, entries, expire_before=time.time() - self.ttl)
+            self.stats['saved'] += len(entries)
+        except Exception as e:
+            logger.error(f"【{self.cookie_id}】保存消息去重记录失败: {e}")
+
+    async def load(self):
+        """从数据库加载有效期内的记录（账号启动时调用）"""
+        if not self.persist:
+            return
+        try:
+            from db_manager import async_db
+            rows = await async_db.get_processed_messages(self.cookie_id, time.time() - self.ttl, self.max_size)
+        except Exception as e:
+            logger.error(f"【{self.cookie_id}】加载消息去重记录失败: {e}")
+            return
+
+        # 启动期间可能已有新记录，合并后保持按处理时间排序
+        merged = dict(rows)
+        for message_id, processed_at in self._entries.items():
+            merged[message_id] = max(processed_at, merged.get(message_id, 0))
+        self._entries = OrderedDict(sorted(merged.items(), key=lambda entry: entry[1]))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self.stats['loaded'] += len(rows)
+        if rows:
+            logger.info(f"【{self.cookie_id}】已加载 {len(rows)} 条消息去重记录")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'unsaved': len(self._unsaved),
+            **self.stats
+        }
+
+    def close(self):
+        """写出缓冲中的记录"""
+        if self.persist:
+            self.flush()
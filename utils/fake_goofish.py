@@ -0,0 +1,499 @@
+"""
+本地模拟闲鱼服务端与压测工具
+不能对生产环境压测，用本地模拟服务端评估单机可承载的账号数与回复延迟
+
+模拟服务端（FakeGoofishServer，基于 aiohttp）:
+- WebSocket: /reg 注册、/! 心跳、/r/SyncStatus/ackDiff、syncPushPackage 推送买家消息、
+  /r/MessageSend/sendByReceiverScope 接收回复（按会话统计从推送到收到回复的延迟）
+- mtop 接口: API_ENDPOINTS 中的 token、message_headinfo、item_detail、item_list、login_check
+
+压测（python -m utils.fake_goofish）:
+- 在子进程中运行 N 个真实的 XianyuLive 实例（使用临时数据库，WebSocket/接口地址指向模拟服务端），
+  模拟服务端按每个买家 R 条/秒（泊松分布）向 N 个账号 x M 个买家推送消息
+- 统计回复延迟分位数（包含会话防抖时间）与子进程的 CPU、RSS
+
+用法:
+    python -m utils.fake_goofish --accounts 10 --buyers 20 --rate 0.1 --duration 60
+    python -m utils.fake_goofish --accounts 50 --buyers 10 --rate 0.05 --duration 120 --json
+"""
+
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import os
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from aiohttp import WSMsgType, web
+
+
+# 压测账号的关键词回复（买家消息从关键词中随机选取，保证走完整的匹配 + 回复流程）
+LOADTEST_KEYWORDS = [
+    ('在吗', '在的，请问有什么可以帮您'),
+    ('包邮', '亲，全国包邮哦'),
+    ('价格', '亲，价格已经是最低了'),
+    ('发货', '付款后马上发货'),
+]
+LOADTEST_USER_ID_BASE = 2200000000000
+LOADTEST_BUYER_ID_BASE = 3100000000000
+
+
+def encode_msgpack(obj: Any) -> bytes:
+    """最小的 MessagePack 编码器（dict/list/str/int/bool/None），用于构造同步包"""
+    if obj is None:
+        return b'\xc0'
+    if obj is True:
+        return b'\xc3'
+    if obj is False:
+        return b'\xc2'
+    if isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            return bytes([obj])
+        if obj >= 0:
+            return b'\xcf' + struct.pack('>Q', obj)
+        return b'\xd3' + struct.pack('>q', obj)
+    if isinstance(obj, str):
+        data = obj.encode('utf-8')
+        length = len(data)
+        if length < 32:
+            return bytes([0xa0 | length]) + data
+        if length < 0x100:
+            return b'\xd9' + bytes([length]) + data
+        if length < 0x10000:
+            return b'\xda' + struct.pack('>H', length) + data
+        return b'\xdb' + struct.pack('>I', length) + data
+    if isinstance(obj, (list, tuple)):
+        length = len(obj)
+        head = bytes([0x90 | length]) if length < 16 else b'\xdc' + struct.pack('>H', length)
+        return head + b''.join(encode_msgpack(value) for value in obj)
+    if isinstance(obj, dict):
+        length = len(obj)
+        head = bytes([0x80 | length]) if length < 16 else b'\xde' + struct.pack('>H', length)
+        return head + b''.join(encode_msgpack(key) + encode_msgpack(value) for key, value in obj.items())
+    raise TypeError(f"不支持的类型: {type(obj)}")
+
+
+def build_chat_frame(chat_id: str, buyer_id: str, item_id: str, text: str, message_id: str) -> Dict[str, Any]:
+    """构造一条买家聊天消息的 syncPushPackage 帧"""
+    message = {
+        '1': {
+            '2': f'{chat_id}@goofish',
+            '5': int(time.time() * 1000),
+            '10': {
+                'reminderContent': text,
+                'reminderTitle': f'买家{buyer_id[-4:]}',
+                'senderNick': f'买家{buyer_id[-4:]}',
+                'senderUserId': buyer_id,
+                'sessionType': '1',
+                'reminderUrl': f'fleamarket://message_chat?itemId={item_id}&peerUserId={buyer_id}&sid={chat_id}',
+                'bizTag': json.dumps({'sourceId': 'S:1', 'messageId': message_id}),
+            }
+        }
+    }
+    return {
+        'lwp': '/s/para',
+        'headers': {'mid': message_id, 'sid': chat_id},
+        'body': {'syncPushPackage': {'data': [{'data': base64.b64encode(encode_msgpack(message)).decode()}]}}
+    }
+
+
+def fake_api_endpoints(http_base: str) -> Dict[str, str]:
+    """与 global_config.yml 中 API_ENDPOINTS 对应的模拟地址"""
+    return {
+        'login_check': f'{http_base}/newlogin/hasLogin.do',
+        'message_headinfo': f'{http_base}/h5/mtop.idle.trade.pc.message.headinfo/1.0/',
+        'token': f'{http_base}/h5/mtop.taobao.idlemessage.pc.login.token/1.0/',
+        'item_detail': f'{http_base}/h5/mtop.taobao.idle.pc.detail/1.0/',
+        'item_list': f'{http_base}/h5/mtop.idle.web.xyh.item.list/1.0/',
+    }
+
+
+def _summarize(samples: List[float]) -> Dict[str, Any]:
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 1)
+
+    return {
+        'count': len(ordered),
+        'avg': round(sum(ordered) / len(ordered), 1),
+        'p50': percentile(0.5),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'max': round(ordered[-1], 1),
+    }
+
+
+class FakeGoofishServer:
+    """本地模拟闲鱼 WebSocket 与 mtop 接口"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+        # {user_id: WebSocketResponse} 已注册的账号连接
+        self.connections: Dict[str, web.WebSocketResponse] = {}
+        # {(user_id, chat_id): 首条未回复消息的推送时间}
+        self._pending: Dict[tuple, float] = {}
+        self.reply_latencies_ms: List[float] = []
+        self._mids = itertools.count(1)
+        self.stats = defaultdict(int)
+
+    @property
+    def http_base(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    @property
+    def ws_url(self) -> str:
+        return f'ws://{self.host}:{self.port}/'
+
+    def api_endpoints(self) -> Dict[str, str]:
+        return fake_api_endpoints(self.http_base)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/', self._handle_ws)
+        app.router.add_route('*', '/h5/{api}/{version}/', self._handle_mtop)
+        app.router.add_route('*', '/newlogin/hasLogin.do', self._handle_login_check)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if not self.port:
+            self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for ws in list(self.connections.values()):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # ---------------- mtop 接口 ----------------
+
+    @staticmethod
+    def _user_id_from_cookie(cookie: str) -> str:
+        for pair in (cookie or '').split(';'):
+            if '=' in pair:
+                key, value = pair.split('=', 1)
+                if key.strip() == 'unb':
+                    return value.strip()
+        return ''
+
+    async def _handle_mtop(self, request: web.Request):
+        api = request.match_info['api']
+        self.stats[f'mtop:{api}'] += 1
+        data: Dict[str, Any] = {}
+        if api == 'mtop.taobao.idlemessage.pc.login.token':
+            user_id = self._user_id_from_cookie(request.headers.get('cookie', ''))
+            data = {'accessToken': f'fake-token-{user_id}', 'refreshToken': f'fake-refresh-{user_id}'}
+        elif api == 'mtop.taobao.idle.pc.detail':
+            item_id = ''
+            try:
+                item_id = json.loads((await request.post()).get('data', '{}')).get('itemId', '')
+            except Exception:
+                pass
+            data = {'itemDO': {'itemId': item_id, 'title': f'压测商品{item_id}', 'soldPrice': '9.90',
+                               'desc': '压测商品描述'}}
+        elif api == 'mtop.idle.web.xyh.item.list':
+            data = {'cardList': [], 'nextPage': False}
+        return web.json_response({'api': api, 'v': request.match_info['version'],
+                                  'ret': ['SUCCESS::调用成功'], 'data': data})
+
+    async def _handle_login_check(self, request: web.Request):
+        return web.json_response({'content': {'success': True}, 'hasError': False})
+
+    # ---------------- WebSocket ----------------
+
+    async def _handle_ws(self, request: web.Request):
+        ws = web.WebSocketResponse(heartbeat=None, max_msg_size=0)
+        await ws.prepare(request)
+        user_id = self._user_id_from_cookie(request.headers.get('Cookie', ''))
+        self.stats['ws_connections'] += 1
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    frame = json.loads(msg.data)
+                except ValueError:
+                    continue
+                lwp = frame.get('lwp')
+                if lwp is None:
+                    # 客户端对推送消息的确认
+                    self.stats['acks'] += 1
+                    continue
+                mid = (frame.get('headers') or {}).get('mid', '')
+                if lwp == '/reg':
+                    self.connections[user_id] = ws
+                    self.stats['registered'] += 1
+                elif lwp == '/!':
+                    self.stats['heartbeats'] += 1
+                elif lwp == '/r/MessageSend/sendByReceiverScope':
+                    self._record_reply(user_id, frame)
+                await ws.send_str(json.dumps({'code': 200, 'headers': {'mid': mid, 'sid': user_id}, 'body': {}}))
+        finally:
+            if self.connections.get(user_id) is ws:
+                del self.connections[user_id]
+        return ws
+
+    def _record_reply(self, user_id: str, frame: Dict[str, Any]):
+        self.stats['replies'] += 1
+        try:
+            chat_id = frame['body'][0]['cid'].split('@')[0]
+        except (KeyError, IndexError, TypeError, AttributeError):
+            return
+        pushed_at = self._pending.pop((user_id, chat_id), None)
+        if pushed_at is not None:
+            self.reply_latencies_ms.append((time.perf_counter() - pushed_at) * 1000)
+
+    async def push_message(self, user_id: str, chat_id: str, buyer_id: str, item_id: str, text: str) -> bool:
+        """向账号推送一条买家消息，账号未连接时返回 False"""
+        ws = self.connections.get(user_id)
+        if ws is None or ws.closed:
+            self.stats['push_skipped'] += 1
+            return False
+        message_id = f'fake{next(self._mids)}'
+        self._pending.setdefault((user_id, chat_id), time.perf_counter())
+        await ws.send_str(json.dumps(build_chat_frame(chat_id, buyer_id, item_id, text, message_id)))
+        self.stats['pushed'] += 1
+        return True
+
+    def reset_latencies(self):
+        self._pending.clear()
+        self.reply_latencies_ms = []
+
+    @property
+    def unanswered(self) -> int:
+        return len(self._pending)
+
+
+# ---------------- 被测进程：运行 N 个 XianyuLive 实例 ----------------
+
+def _loadtest_account(index: int) -> Dict[str, str]:
+    user_id = str(LOADTEST_USER_ID_BASE + index)
+    return {
+        'cookie_id': f'loadtest_{index}',
+        'user_id': user_id,
+        'cookies': f'unb={user_id}; _m_h5_tk=fake{index}_{int(time.time() * 1000)}; cookie2=fake{index}'
+    }
+
+
+async def run_accounts(http_base: str, ws_url: str, accounts: int):
+    """在当前进程中运行 N 个连接模拟服务端的 XianyuLive 实例（压测子进程入口）"""
+    from config import API_ENDPOINTS, WEBSOCKET_HEADERS, config
+    from db_manager import db_manager
+    from XianyuAutoAsync import XianyuLive
+
+    # 接口地址指向模拟服务端；商品详情不启动浏览器
+    API_ENDPOINTS.update(fake_api_endpoints(http_base))
+    # websockets 会自动生成 Host/Connection，配置中写死的线上值在本地服务端会被判为重复请求头
+    for name in ('Host', 'Connection'):
+        WEBSOCKET_HEADERS.pop(name, None)
+    config.set('ITEM_DETAIL.auto_fetch.enabled', False)
+
+    lives = []
+    for index in range(accounts):
+        account = _loadtest_account(index)
+        db_manager.save_cookie(account['cookie_id'], account['cookies'])
+        db_manager.save_keywords(account['cookie_id'], LOADTEST_KEYWORDS)
+        live = XianyuLive(cookies_str=account['cookies'], cookie_id=account['cookie_id'])
+        live.base_url = ws_url
+        live.cookie_refresh_enabled = False
+        lives.append(live)
+    await asyncio.gather(*(live.main() for live in lives), return_exceptions=True)
+
+
+# ---------------- 压测驱动 ----------------
+
+class _ProcessSampler:
+    """定期采样被测进程的 CPU 与 RSS"""
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        import psutil
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.cpu: List[float] = []
+        self.rss_mb: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.process.cpu_percent(None)
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.cpu.append(self.process.cpu_percent(None))
+                self.rss_mb.append(self.process.memory_info().rss / 1024 / 1024)
+            except Exception:
+                return
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'cpu_percent_avg': round(sum(self.cpu) / len(self.cpu), 1) if self.cpu else 0,
+            'cpu_percent_max': round(max(self.cpu), 1) if self.cpu else 0,
+            'rss_mb_avg': round(sum(self.rss_mb) / len(self.rss_mb), 1) if self.rss_mb else 0,
+            'rss_mb_max': round(max(self.rss_mb), 1) if self.rss_mb else 0,
+        }
+
+
+async def _buyer_loop(server: FakeGoofishServer, user_id: str, buyer_index: int, rate: float, deadline: float):
+    buyer_id = str(LOADTEST_BUYER_ID_BASE + buyer_index)
+    chat_id = f'{user_id[-6:]}{buyer_index:06d}'
+    item_id = str(900000000000 + buyer_index)
+    for sequence in itertools.count(1):
+        # 泊松到达：指数分布的间隔
+        await asyncio.sleep(random.expovariate(rate))
+        if time.monotonic() >= deadline:
+            return
+        # 带上序号，避免相同内容被消息去重跳过
+        text = f'{random.choice(LOADTEST_KEYWORDS)[0]} {sequence}'
+        await server.push_message(user_id, chat_id, buyer_id, item_id, text)
+
+
+async def run_load_test(accounts: int, buyers: int, rate: float, duration: float,
+                        connect_timeout: float = 60, drain_seconds: float = 5,
+                        db_path: str = None, verbose: bool = False) -> Dict[str, Any]:
+    """启动模拟服务端与被测子进程，施加负载并返回报告"""
+    server = FakeGoofishServer()
+    await server.start()
+
+    # 被测进程在临时目录中运行：logs/、realtime.log 等按相对路径写入的文件不会落到项目目录
+    workdir = tempfile.mkdtemp(prefix='xianyu_loadtest_')
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['DB_PATH'] = os.path.abspath(db_path) if db_path else os.path.join(workdir, 'loadtest.db')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [project_root, env.get('PYTHONPATH')]))
+    env.setdefault('SQL_LOG_ENABLED', 'false')
+    output = None if verbose else subprocess.DEVNULL
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'utils.fake_goofish', '--run-accounts', str(accounts),
+         '--http', server.http_base, '--ws', server.ws_url],
+        cwd=workdir, env=env, stdout=output, stderr=output
+    )
+    sampler = None
+    try:
+        # 等待所有账号完成注册
+        connect_started = time.monotonic()
+        while len(server.connections) < accounts:
+            if process.poll() is not None:
+                raise RuntimeError(f'被测进程已退出，返回码 {process.returncode}')
+            if time.monotonic() - connect_started > connect_timeout:
+                raise RuntimeError(f'{connect_timeout}秒内仅 {len(server.connections)}/{accounts} 个账号完成注册')
+            await asyncio.sleep(0.2)
+        connect_seconds = time.monotonic() - connect_started
+
+        sampler = _ProcessSampler(process.pid)
+        sampler.start()
+        server.reset_latencies()
+        pushed_before = server.stats['pushed']
+        started = time.monotonic()
+        deadline = started + duration
+        await asyncio.gather(*(
+            _buyer_loop(server, user_id, buyer_index, rate, deadline)
+            for user_id in list(server.connections)
+            for buyer_index in range(buyers)
+        ))
+        # 等待最后一批消息回复
+        drain_deadline = time.monotonic() + drain_seconds
+        while server.unanswered and time.monotonic() < drain_deadline:
+            await asyncio.sleep(0.1)
+        elapsed = time.monotonic() - started
+        await sampler.stop()
+
+        pushed = server.stats['pushed'] - pushed_before
+        return {
+            'accounts': accounts,
+            'buyers_per_account': buyers,
+            'rate_per_buyer': rate,
+            'duration': duration,
+            'connect_seconds': round(connect_seconds, 2),
+            'messages_pushed': pushed,
+            'messages_per_second': round(pushed / elapsed, 1) if elapsed > 0 else 0,
+            'replies': len(server.reply_latencies_ms),
+            'unanswered_chats': server.unanswered,
+            'reply_latency_ms': _summarize(server.reply_latencies_ms),
+            'process': sampler.summary(),
+            'server': dict(server.stats),
+        }
+    finally:
+        if sampler is not None:
+            await sampler.stop()
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        await server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    latency = report['reply_latency_ms']
+    process = report['process']
+    lines = [
+        f"账号 {report['accounts']} x 买家 {report['buyers_per_account']} x {report['rate_per_buyer']} 条/秒，"
+        f"持续 {report['duration']} 秒（注册耗时 {report['connect_seconds']} 秒）",
+        f"推送 {report['messages_pushed']} 条（{report['messages_per_second']} 条/秒），"
+        f"回复 {report['replies']} 次，未回复会话 {report['unanswered_chats']}",
+    ]
+    if latency['count']:
+        lines.append(f"回复延迟(ms，含防抖): 平均 {latency['avg']}  p50 {latency['p50']}  p95 {latency['p95']}  "
+                     f"p99 {latency['p99']}  最大 {latency['max']}")
+    lines.append(f"被测进程: CPU 平均 {process['cpu_percent_avg']}% / 峰值 {process['cpu_percent_max']}%，"
+                 f"RSS 平均 {process['rss_mb_avg']}MB / 峰值 {process['rss_mb_max']}MB")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='本地模拟闲鱼服务端压测')
+    parser.add_argument('--accounts', type=int, default=5, help='账号数 N')
+    parser.add_argument('--buyers', type=int, default=10, help='每个账号的买家数 M')
+    parser.add_argument('--rate', type=float, default=0.1, help='每个买家每秒发送的消息数 R')
+    parser.add_argument('--duration', type=float, default=60, help='施压时长（秒）')
+    parser.add_argument('--connect-timeout', type=float, default=60, help='等待账号注册的最长时间（秒）')
+    parser.add_argument('--db', help='被测进程使用的数据库（默认临时文件）')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出报告')
+    parser.add_argument('--verbose', action='store_true', help='输出被测进程日志')
+    # 被测子进程参数
+    parser.add_argument('--run-accounts', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--http', help=argparse.SUPPRESS)
+    parser.add_argument('--ws', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_accounts:
+        asyncio.run(run_accounts(args.http, args.ws, args.run_accounts))
+        return 0
+
+    if args.rate <= 0:
+        parser.error('--rate 必须大于 0')
+    report = asyncio.run(run_load_test(args.accounts, args.buyers, args.rate, args.duration,
+                                       connect_timeout=args.connect_timeout, db_path=args.db,
+                                       verbose=args.verbose))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
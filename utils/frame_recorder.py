@@ -0,0 +1,149 @@
+"""
+WebSocket 帧录制
+把收到的原始帧连同时间戳写入 JSONL 抓包文件，供 utils.frame_replay 离线回放和性能回归测试
+
+- 第一行为文件头（账号ID、用户ID、开始时间），之后每行一帧
+- 写入前脱敏：cookie/token/sid/sign 等字段替换为 ***，帧中出现的 Cookie 值同样替换
+- 默认关闭，通过 global_config.yml 的 FRAME_RECORDER 开启
+"""
+
+import json
+import os
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from loguru import logger
+
+
+REDACTED = '***'
+# 需要脱敏的字段名
+SENSITIVE_KEY_PATTERN = re.compile(r'cookie|token|^sid$|sign|password|secret|authorization', re.IGNORECASE)
+# Cookie 中不脱敏的字段（unb 为用户ID，回放时用于区分买家/卖家消息）
+PUBLIC_COOKIE_KEYS = {'unb'}
+# 长度小于该值的 Cookie 值不做全文替换，避免误伤普通内容
+MIN_SECRET_LENGTH = 8
+
+
+def _cookie_secrets(cookies_str: str) -> List[str]:
+    secrets = []
+    for pair in (cookies_str or '').split(';'):
+        if '=' not in pair:
+            continue
+        key, value = pair.split('=', 1)
+        value = value.strip()
+        if key.strip() not in PUBLIC_COOKIE_KEYS and len(value) >= MIN_SECRET_LENGTH:
+            secrets.append(value)
+    # 先替换长的值，避免短值是长值的子串时替换不完整
+    return sorted(set(secrets), key=len, reverse=True)
+
+
+def redact_frame(obj: Any, secrets: List[str] = ()) -> Any:
+    """返回脱敏后的帧副本"""
+    if isinstance(obj, dict):
+        return {
+            key: REDACTED if isinstance(key, str) and SENSITIVE_KEY_PATTERN.search(key) else redact_frame(value, secrets)
+            for key, value in obj.items()
+        }
+    if isinstance(obj, list):
+        return [redact_frame(value, secrets) for value in obj]
+    if isinstance(obj, str) and secrets:
+        for secret in secrets:
+            if secret in obj:
+                obj = obj.replace(secret, REDACTED)
+    return obj
+
+
+class FrameRecorder:
+    """单个账号的帧录制器"""
+
+    def __init__(self, cookie_id: str, myid: str, cookies_str: str,
+                 directory: str = 'recordings', max_frames: int = 100000):
+        """
+        Args:
+            cookie_id: 账号ID
+            myid: 当前账号的用户ID（写入文件头）
+            cookies_str: 账号 Cookie，其中的值会从帧中脱敏
+            directory: 抓包文件目录
+            max_frames: 单个文件最多录制的帧数，达到后停止录制
+        """
+        self.cookie_id = cookie_id
+        self.myid = myid
+        self.directory = directory
+        self.max_frames = max_frames
+        self._secrets = _cookie_secrets(cookies_str)
+        self._file = None
+        self.path: Optional[str] = None
+        self.frames = 0
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"{self.cookie_id}_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+        self._file = open(self.path, 'a', encoding='utf-8')
+        header = {'type': 'header', 'cookie_id': self.cookie_id, 'myid': self.myid, 'started_at': time.time()}
+        self._file.write(json.dumps(header, ensure_ascii=False) + '\n')
+        logger.info(f"【{self.cookie_id}】开始录制WebSocket帧: {self.path}")
+
+    def record(self, message_data: Any):
+        """录制一帧（message_data 为解析后的 JSON）"""
+        if self.frames >= self.max_frames:
+            return
+        try:
+            if self._file is None:
+                self._open()
+            line = {'type': 'frame', 't': time.time(), 'frame': redact_frame(message_data, self._secrets)}
+            self._file.write(json.dumps(line, ensure_ascii=False) + '\n')
+            self.frames += 1
+            if self.frames % 100 == 0:
+                self._file.flush()
+            if self.frames >= self.max_frames:
+                logger.warning(f"【{self.cookie_id}】已录制 {self.frames} 帧，达到上限，停止录制")
+                self.close()
+        except Exception as e:
+            logger.error(f"【{self.cookie_id}】录制WebSocket帧失败: {e}")
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            finally:
+                self._file = None
+            logger.info(f"【{self.cookie_id}】WebSocket帧录制结束，共 {self.frames} 帧: {self.path}")
+
+
+def iter_capture(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """逐行读取抓包文件，产出 (类型, 记录)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            yield record.get('type', 'frame'), record
+
+
+def read_capture(path: str) -> Tuple[Dict[str, Any], List[Tuple[float, Any]]]:
+    """读取抓包文件，返回 (文件头, [(时间戳, 帧), ...])"""
+    header: Dict[str, Any] = {}
+    frames = []
+    for record_type, record in iter_capture(path):
+        if record_type == 'header':
+            header = record
+        else:
+            frames.append((record.get('t', 0), record.get('frame')))
+    return header, frames
+
+
+def create_frame_recorder(cookie_id: str, myid: str, cookies_str: str) -> Optional[FrameRecorder]:
+    """按 FRAME_RECORDER 配置创建录制器，未开启时返回 None"""
+    try:
+        from config import config
+        recorder_config = config.get('FRAME_RECORDER', {}) or {}
+    except Exception:
+        recorder_config = {}
+    if not recorder_config.get('enabled', False):
+        return None
+    return FrameRecorder(
+        cookie_id, myid, cookies_str,
+        directory=recorder_config.get('directory', 'recordings'),
+        max_frames=recorder_config.get('max_frames', 100000)
+    )
@@ -0,0 +1,261 @@
+"""
+WebSocket 帧回放
+把 utils.frame_recorder 录制的抓包文件离线送入 XianyuLive 的消息处理流水线
+（入口队列 -> handle_message -> 会话执行器 -> 回复），发送端为本地桩 WebSocket，
+统计各阶段耗时与吞吐量，用于升级前的性能回归测试
+
+用法:
+    python -m utils.frame_replay recordings/xxx.jsonl               # 按录制时的节奏（1x）
+    python -m utils.frame_replay recordings/xxx.jsonl --speed 10    # 10 倍速
+    python -m utils.frame_replay recordings/xxx.jsonl --speed max   # 不等待，尽快送入
+    python -m utils.frame_replay recordings/xxx.jsonl --speed max --json
+
+说明:
+- 关键词、默认回复等配置读取当前数据库（DB_PATH），建议指向数据库副本；
+  账号配置了 AI/API 回复或通知时，回放期间同样会调用外部接口
+- 订单详情补全在回放中不启动浏览器，直接返回空结果
+- 消息去重记录不持久化，防抖时间默认设为 0（可通过 --debounce 指定）
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+
+# 各阶段对应的 XianyuLive 方法
+STAGES = {
+    'decode': ['_ingress_routing'],
+    'classify': ['handle_message'],
+    'match': ['get_api_reply', 'get_keyword_reply', 'get_ai_reply', 'get_default_reply'],
+    'reply': ['send_msg', 'send_image_msg'],
+}
+
+
+class StubWebSocket:
+    """本地桩 WebSocket：记录发送的帧，不做网络IO"""
+
+    def __init__(self):
+        self.sent = 0
+        self.sent_bytes = 0
+
+    async def send(self, data):
+        self.sent += 1
+        self.sent_bytes += len(data)
+
+
+class StageRecorder:
+    """包装实例方法，记录每次调用耗时（毫秒）"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def wrap(self, obj, name: str, stage: str):
+        original = getattr(obj, name, None)
+        if original is None:
+            return
+        samples = self.samples[stage]
+
+        if asyncio.iscoroutinefunction(original):
+            @functools.wraps(original)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    samples.append((time.perf_counter() - start) * 1000)
+        else:
+            @functools.wraps(original)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    samples.append((time.perf_counter() - start) * 1000)
+        setattr(obj, name, timed)
+
+
+def _summarize(samples: List[float]) -> Dict[str, Any]:
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 3)
+
+    return {
+        'count': len(ordered),
+        'avg_ms': round(sum(ordered) / len(ordered), 3),
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+
+async def _wait_idle(live, timeout: float):
+    """等待入口队列、会话执行器与出站队列处理完所有消息"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        queue_metrics = live.ingress_queue.get_metrics()
+        if queue_metrics['depth'] == 0 and queue_metrics['in_flight'] == 0 \
+                and live.chat_executor.get_metrics()['active_chats'] == 0 and len(live.outbound_queue) == 0:
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+async def replay(path: str, speed: Optional[float] = 1.0, debounce: float = 0.0,
+                 cookie_id: str = None, drain_timeout: float = 60) -> Dict[str, Any]:
+    """回放抓包文件
+
+    Args:
+        path: 抓包文件
+        speed: 回放倍速，None 表示不等待（max）
+        debounce: 会话防抖时间（秒）
+        cookie_id: 覆盖文件头中的账号ID（决定使用哪个账号的关键词等配置）
+        drain_timeout: 送完所有帧后等待处理完成的最长时间（秒）
+
+    Returns:
+        回放报告
+    """
+    from utils.frame_recorder import read_capture
+    from XianyuAutoAsync import XianyuLive
+
+    header, frames = read_capture(path)
+    cookie_id = cookie_id or header.get('cookie_id') or 'replay'
+    myid = header.get('myid') or '0'
+
+    live = XianyuLive(cookies_str=f"unb={myid}", cookie_id=cookie_id)
+    live.message_dedup.persist = False
+    live.chat_executor.debounce_delay = debounce
+    # 桩 WebSocket 没有风控限制，不按令牌桶限速，测量的是处理流水线本身
+    live.outbound_queue.rate = 0
+
+    async def no_enrichment(order_id, item_id=None, buyer_id=None):
+        return None
+    live.order_enrichment.fetcher = no_enrichment
+
+    stages = StageRecorder()
+    for stage, methods in STAGES.items():
+        for name in methods:
+            stages.wrap(live, name, stage)
+
+    # 端到端：会话的首条待回复消息入队 -> 该会话发出回复
+    pending_since: Dict[str, float] = {}
+    end_to_end: List[float] = []
+    send_msg = live.send_msg
+
+    async def tracked_send_msg(ws, cid, toid, text, **kwargs):
+        result = await send_msg(ws, cid, toid, text, **kwargs)
+        started = pending_since.pop(cid, None)
+        if started is not None:
+            end_to_end.append((time.perf_counter() - started) * 1000)
+        return result
+    live.send_msg = tracked_send_msg
+
+    websocket = StubWebSocket()
+    started_at = time.perf_counter()
+    first_t = frames[0][0] if frames else 0
+    try:
+        for recorded_at, frame in frames:
+            if speed is not None:
+                delay = (recorded_at - first_t) / speed - (time.perf_counter() - started_at)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            chat_key, decoded_message, protected = live._ingress_routing(frame)
+            if chat_key is not None:
+                pending_since.setdefault(chat_key, time.perf_counter())
+            await live.ingress_queue.put(chat_key, (frame, websocket, decoded_message), protected=protected)
+        fed_at = time.perf_counter()
+        drained = await _wait_idle(live, drain_timeout)
+        finished_at = time.perf_counter()
+    finally:
+        await live.ingress_queue.close()
+        await live.chat_executor.close()
+        await live.outbound_queue.close()
+        await live.order_enrichment.close()
+        live._unregister_instance()
+
+    elapsed = finished_at - started_at
+    return {
+        'capture': path,
+        'cookie_id': cookie_id,
+        'frames': len(frames),
+        'speed': 'max' if speed is None else speed,
+        'debounce': debounce,
+        'drained': drained,
+        'feed_seconds': round(fed_at - started_at, 3),
+        'total_seconds': round(elapsed, 3),
+        'frames_per_second': round(len(frames) / elapsed, 1) if elapsed > 0 else 0,
+        'replies': len(end_to_end),
+        'frames_sent': websocket.sent,
+        'stages': {stage: _summarize(stages.samples[stage]) for stage in STAGES},
+        'end_to_end': _summarize(end_to_end),
+        'ingress': live.ingress_queue.get_metrics(),
+        'chats': live.chat_executor.get_metrics(),
+        'outbound': live.outbound_queue.get_metrics(),
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"抓包文件: {report['capture']}（账号 {report['cookie_id']}）",
+        f"帧数: {report['frames']}，倍速: {report['speed']}，防抖: {report['debounce']}秒"
+        f"{'' if report['drained'] else '，未在超时内处理完'}",
+        f"耗时: 送入 {report['feed_seconds']}秒 / 总计 {report['total_seconds']}秒，"
+        f"吞吐: {report['frames_per_second']} 帧/秒，回复 {report['replies']} 条，发送 {report['frames_sent']} 帧",
+        '',
+        f"{'阶段':<12}{'次数':>8}{'平均ms':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'最大':>10}",
+    ]
+    rows = list(report['stages'].items()) + [('end_to_end', report['end_to_end'])]
+    for stage, summary in rows:
+        if not summary['count']:
+            lines.append(f"{stage:<12}{0:>8}")
+            continue
+        lines.append(f"{stage:<12}{summary['count']:>8}{summary['avg_ms']:>10}{summary['p50_ms']:>10}"
+                     f"{summary['p95_ms']:>10}{summary['p99_ms']:>10}{summary['max_ms']:>10}")
+    ingress = report['ingress']
+    lines.append('')
+    lines.append(f"入口队列: 峰值深度 {ingress['peak_depth']}，等待 p95 {ingress['wait_ms_p95']}ms，"
+                 f"丢弃 {ingress['dropped']}，失败 {ingress['failed']}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='回放录制的WebSocket帧并统计各阶段耗时')
+    parser.add_argument('capture', help='抓包文件（FRAME_RECORDER 录制的 JSONL）')
+    parser.add_argument('--speed', default='1', help='回放倍速，如 1、10，或 max 表示不等待')
+    parser.add_argument('--debounce', type=float, default=0.0, help='会话防抖时间（秒），默认 0')
+    parser.add_argument('--cookie-id', help='使用指定账号的配置（默认取抓包文件头中的账号）')
+    parser.add_argument('--drain-timeout', type=float, default=60, help='等待处理完成的最长时间（秒）')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出报告')
+    parser.add_argument('--verbose', action='store_true', help='输出流水线日志')
+    args = parser.parse_args(argv)
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    if speed is not None and speed <= 0:
+        parser.error('--speed 必须大于 0 或为 max')
+
+    # 导入 XianyuAutoAsync 时会配置日志输出，回放默认只保留警告以上
+    import XianyuAutoAsync  # noqa: F401
+    from loguru import logger
+    if not args.verbose:
+        logger.remove()
+        logger.add(sys.stderr, level='WARNING')
+
+    report = asyncio.run(replay(args.capture, speed=speed, debounce=args.debounce,
+                                cookie_id=args.cookie_id, drain_timeout=args.drain_timeout))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(report))
+    return 0 if report['drained'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
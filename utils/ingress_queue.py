@@ -0,0 +1,214 @@
+"""
+消息入口队列
+替代「每个WebSocket帧创建一个任务」的处理方式，限制待处理消息的数量与内存占用
+
+- 每个账号一个有界队列，由固定数量的工作协程消费
+- 按会话（chat_id）分道：同一会话的消息严格按到达顺序逐条处理，不同会话之间并行，
+  单个会话处理缓慢（如自动发货等待订单详情）不会阻塞其他会话
+- 队列满时按溢出策略处理：drop_oldest（丢弃最早的消息）、drop_newest（丢弃新消息）、
+  block（阻塞接收循环，形成背压）
+- 受保护的消息（订单、系统消息，如「我已付款，等待你发货」）不计入容量、不会被丢弃也不会阻塞，
+  积压时只丢弃普通聊天消息，自动发货不会因溢出而丢失
+- 记录队列深度、等待时间等指标，供管理接口查询
+"""
+
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional
+from loguru import logger
+
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+
+class IngressQueue:
+    """单个账号的有界消息入口队列（会话内有序、会话间并行）"""
+
+    def __init__(self, cookie_id: str, handler: Callable[[Any], Awaitable[None]],
+                 workers: int = 16, max_size: int = 1000, overflow: str = 'drop_oldest'):
+        """
+        Args:
+            cookie_id: 账号ID（用于日志）
+            handler: 处理单条消息的协程函数 handler(item)
+            workers: 工作协程数（同时处理的最大消息数）
+            max_size: 队列中最多保留的待处理普通消息数（受保护的消息不计入）
+            overflow: 队列满时的策略，见 OVERFLOW_POLICIES
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            logger.warning(f"【{cookie_id}】未知的入口队列溢出策略 {overflow}，使用 drop_oldest")
+            overflow = 'drop_oldest'
+        self.cookie_id = cookie_id
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.max_size = max(1, int(max_size))
+        self.overflow = overflow
+
+        # {key: deque[(入队时间, item, 是否受保护)]} 每个会话一条通道
+        self._lanes: Dict[Hashable, Deque[tuple]] = {}
+        # 已调度的通道（在就绪队列中或正在被处理），保证同一通道同时只有一个工作协程
+        self._scheduled = set()
+        self._ready: Optional[asyncio.Queue] = None
+        self._space: Optional[asyncio.Condition] = None
+        self._worker_tasks = []
+        self._sequence = itertools.count()
+        self._size = 0
+        # 待处理的普通（可丢弃）消息数，容量限制只针对这部分
+        self._evictable = 0
+        self._in_flight = 0
+
+        # 指标
+        self._waits_ms: Deque[float] = deque(maxlen=1000)
+        self.stats = {'enqueued': 0, 'protected': 0, 'processed': 0, 'dropped': 0, 'failed': 0, 'peak_depth': 0}
+
+    def _ensure_workers(self):
+        """在当前事件循环中按需启动工作协程"""
+        if self._ready is None:
+            self._ready = asyncio.Queue()
+            self._space = asyncio.Condition()
+        self._worker_tasks = [task for task in self._worker_tasks if not task.done()]
+        while len(self._worker_tasks) < self.workers:
+            self._worker_tasks.append(asyncio.create_task(self._worker()))
+
+    def __len__(self):
+        return self._size
+
+    async def put(self, key: Optional[Hashable], item: Any, protected: bool = False) -> bool:
+        """消息入队
+
+        Args:
+            key: 会话键，相同键的消息按顺序处理；None 表示与其他消息无顺序要求
+            item: 待处理的消息
+            protected: 受保护的消息（订单/系统消息）不计入容量，总是入队且不会被溢出策略丢弃
+
+        Returns:
+            是否入队成功（drop_newest 策略下队列满时返回 False）
+        """
+        self._ensure_workers()
+
+        if not protected and self._evictable >= self.max_size:
+            if self.overflow == 'block':
+                async with self._space:
+                    await self._space.wait_for(lambda: self._evictable < self.max_size)
+            elif self.overflow == 'drop_newest':
+                self._record_drop()
+                return False
+            else:
+                self._drop_oldest()
+
+        if key is None:
+            key = ('_', next(self._sequence))
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = deque()
+        lane.append((time.monotonic(), item, protected))
+        self._size += 1
+        if protected:
+            self.stats['protected'] += 1
+        else:
+            self._evictable += 1
+        self.stats['enqueued'] += 1
+        if self._size > self.stats['peak_depth']:
+            self.stats['peak_depth'] = self._size
+
+        if key not in self._scheduled:
+            self._scheduled.add(key)
+            self._ready.put_nowait(key)
+        return True
+
+    def _drop_oldest(self):
+        """丢弃所有通道中最早入队的一条普通消息（跳过受保护的消息）"""
+        oldest_key = None
+        oldest_index = None
+        oldest_time = None
+        for key, lane in self._lanes.items():
+            # 通道内按入队时间有序，只需找到每个通道中第一条普通消息
+            for index, (enqueued_at, _, protected) in enumerate(lane):
+                if not protected:
+                    if oldest_time is None or enqueued_at < oldest_time:
+                        oldest_key, oldest_index, oldest_time = key, index, enqueued_at
+                    break
+        if oldest_key is None:
+            return
+        del self._lanes[oldest_key][oldest_index]
+        self._size -= 1
+        self._evictable -= 1
+        self._record_drop()
+
+    def _record_drop(self):
+        self.stats['dropped'] += 1
+        dropped = self.stats['dropped']
+        # 限频输出，避免积压时刷屏
+        if dropped == 1 or dropped % 100 == 0:
+            logger.warning(f"【{self.cookie_id}】消息入口队列已满（{self.max_size}），"
+                           f"按 {self.overflow} 策略累计丢弃 {dropped} 条普通消息")
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            lane = self._lanes.get(key)
+            if not lane:
+                # 通道中的消息已被溢出策略丢弃
+                self._lanes.pop(key, None)
+                self._scheduled.discard(key)
+                continue
+
+            enqueued_at, item, protected = lane.popleft()
+            self._size -= 1
+            if not protected:
+                self._evictable -= 1
+            self._waits_ms.append((time.monotonic() - enqueued_at) * 1000)
+            if self.overflow == 'block' and not protected:
+                async with self._space:
+                    self._space.notify()
+
+            self._in_flight += 1
+            try:
+                await self.handler(item)
+                self.stats['processed'] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"【{self.cookie_id}】消息处理异常: {e}")
+            finally:
+                self._in_flight -= 1
+                # 通道还有消息则重新排队（排到其他会话之后，保证公平），否则释放通道
+                if lane:
+                    self._ready.put_nowait(key)
+                else:
+                    self._lanes.pop(key, None)
+                    self._scheduled.discard(key)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """队列深度与等待时间指标"""
+        waits = sorted(self._waits_ms)
+        return {
+            'depth': self._size,
+            'lanes': len(self._lanes),
+            'in_flight': self._in_flight,
+            'workers': self.workers,
+            'max_size': self.max_size,
+            'overflow': self.overflow,
+            'wait_ms_avg': round(sum(waits) / len(waits), 2) if waits else 0,
+            'wait_ms_p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else 0,
+            'wait_ms_max': round(waits[-1], 2) if waits else 0,
+            **self.stats
+        }
+
+    async def close(self):
+        """停止工作协程并丢弃未处理的消息"""
+        for task in self._worker_tasks:
+            task.cancel()
+        if self._worker_tasks:
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        if self._size:
+            logger.info(f"【{self.cookie_id}】消息入口队列关闭，丢弃 {self._size} 条未处理消息")
+        self._lanes.clear()
+        self._scheduled.clear()
+        self._size = 0
+        self._evictable = 0
+        self._ready = None
+        self._space = None
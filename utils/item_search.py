@@ -46,6 +46,7 @@ class XianyuSearcher:
         self.browser = None
         self.context = None
         self.page = None
+        self.browser_lease = None
         self.api_responses = []
         self.user_id = "default"  # 默认用户ID
 
@@ -683,88 +684,49 @@ class XianyuSearcher:
             return False
 
     async def init_browser(self):
-        """初始化浏览器（使用持久化上下文，保留缓存和cookies）"""
+        """从共享浏览器池租用浏览器上下文（存储状态持久化到磁盘，保留cookies和localStorage）"""
         if not PLAYWRIGHT_AVAILABLE:
             raise Exception("Playwright 未安装，无法使用真实搜索功能")
 
-        if not self.browser:
-            playwright = await async_playwright().start()
-            
-            # 设置持久化数据目录（保存缓存、cookies等）
+        if not self.browser_lease:
+            from utils.browser_pool import browser_pool
+
+            # 设置持久化数据目录（保存cookies、localStorage等）
             import tempfile
             user_data_dir = os.path.join(tempfile.gettempdir(), 'xianyu_browser_cache')
             os.makedirs(user_data_dir, exist_ok=True)
-            logger.info(f"使用持久化数据目录（保留缓存）: {user_data_dir}")
-            
-            # 简化的浏览器启动参数，避免冲突
-            browser_args = [
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-dev-shm-usage',
-                '--no-first-run',
-                '--disable-extensions',
-                '--disable-default-apps',
-                '--no-default-browser-check',
-                # 中文语言设置
-                '--lang=zh-CN',
-                '--accept-lang=zh-CN,zh,en-US,en'
-            ]
+            storage_state_path = os.path.join(user_data_dir, 'storage_state.json')
+            logger.info(f"使用持久化存储状态: {storage_state_path}")
 
-            # 只在确实是Docker环境时添加额外参数
-            if os.getenv('DOCKER_ENV') == 'true':
-                browser_args.extend([
-                    '--disable-gpu',
-                    # 移除--single-process参数，使用多进程模式提高稳定性
-                    # '--single-process'  # 注释掉，避免崩溃
-                ])
-
-            logger.info("正在启动浏览器（中文模式，持久化缓存）...")
-            
-            # 使用 launch_persistent_context 实现跨会话的缓存持久化
-            # 这样通过一次滑块验证后，下次搜索可以复用缓存，避免再次出现滑块
-            self.context = await playwright.chromium.launch_persistent_context(
-                user_data_dir,  # 第一个参数是用户数据目录，用于持久化
-                headless=True,  # 无头模式，后台运行
-                args=browser_args,
+            # 搜索上下文在池中复用，通过一次滑块验证后，下次搜索可以复用状态，避免再次出现滑块
+            self.browser_lease = await browser_pool.acquire(
+                'item_search',
+                storage_state_path=storage_state_path,
                 user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
                 viewport={'width': 1280, 'height': 720},
                 locale='zh-CN',  # 设置语言为中文
-                # 持久化上下文会自动保存和加载：
-                # - Cookies
-                # - 缓存
-                # - LocalStorage
-                # - SessionStorage
-                # - 其他浏览器状态
             )
-            
-            # launch_persistent_context 返回的是 context，不是 browser
-            # 需要通过 context.browser 获取 browser 对象
-            self.browser = self.context.browser
+            self.context = self.browser_lease.context
+            self.browser = self.browser_lease.browser
+            self.page = self.browser_lease.page
 
-            logger.info("浏览器启动成功（持久化上下文已创建）...")
-
-            logger.info("创建页面...")
-            self.page = await self.context.new_page()
-
-            logger.info("浏览器初始化完成（缓存将持久化保存）")
+            logger.info("浏览器初始化完成（存储状态将持久化保存）")
 
     async def close_browser(self):
-        """关闭浏览器（持久化上下文会自动保存缓存和cookies）"""
+        """归还浏览器租用（存储状态会自动保存，上下文保留在池中复用）"""
         try:
-            if self.page:
-                await self.page.close()
-                self.page = None
-            # 注意：使用 persistent_context 时，关闭 context 会自动保存所有数据
-            if self.context:
-                await self.context.close()
-                self.context = None
-            # persistent_context 的 browser 会在 context 关闭时自动关闭
-            # 不需要单独关闭 browser
-            self.browser = None
-            logger.debug("商品搜索器浏览器已关闭（缓存已保存）")
+            if self.browser_lease:
+                # 页面上注册过响应监听器，不回收页面
+                await self.browser_lease.release(keep_page=False)
+            logger.debug("商品搜索器浏览器已归还（存储状态已保存）")
         except Exception as e:
             logger.warning(f"关闭商品搜索器浏览器时出错: {e}")
-    
+        finally:
+            self.browser_lease = None
+            self.page = None
+            self.context = None
+            self.browser = None
+
     async def search_items(self, keyword: str, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
         """
         搜索闲鱼商品 - 使用 Playwright 获取真实数据
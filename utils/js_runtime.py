@@ -0,0 +1,249 @@
+"""
+常驻 Node.js 运行时
+替代导入时用 execjs.compile 编译 JS 文件的做法：execjs 每次 call 都会启动一个新的 Node 进程，
+且模块导入时就要求系统存在 JS 运行时，导入 xianyu_utils 的进程、工具都要承担这部分启动开销。
+
+- 懒加载：首次调用 JS 函数时才启动 Node 进程并加载脚本，导入模块不启动任何进程
+- 常驻：Node 进程长期运行，调用通过标准输入/输出按行传递 JSON 请求与结果
+- 进程异常退出或调用超时后自动在下次调用时重启
+- 兼容 execjs 的 call(name, *args) 接口；只能调用脚本顶层声明的函数，函数名不会作为代码执行
+- 导入本模块不加载 loguru（日志只在启动进程、出错时才需要）
+"""
+
+import atexit
+import json
+import os
+import queue
+import subprocess
+import threading
+from typing import Any, Optional
+
+
+def _logger():
+    """延迟导入 loguru，避免拖慢 utils.xianyu_utils 等模块的导入"""
+    from loguru import logger
+    return logger
+
+
+# Node 端引导脚本：加载目标脚本（顶层声明在全局作用域可见），逐行读取请求并调用同名函数。
+# 可调用的函数只来自脚本自身：加载后按顶层声明（function/const/let/var/class）收集为函数表，
+# 请求中的函数名只在该表中查找，不会被当作代码执行，也无法调用 eval、Function、require 等全局函数。
+# 脚本中的 console 输出重定向到 stderr，避免干扰 stdout 上的应答。
+_BOOTSTRAP = r"""
+const fs = require('fs');
+const vm = require('vm');
+const readline = require('readline');
+globalThis.require = require;
+const write = (msg) => process.stdout.write(JSON.stringify(msg) + '\n');
+console.log = console.info = console.debug = console.error;
+const functions = new Map();
+try {
+    const source = fs.readFileSync(process.argv[1], 'utf8');
+    vm.runInThisContext(source, {filename: process.argv[1]});
+    // const/let/class 声明不会挂到 globalThis 上，按脚本中的声明名（合法标识符）取值
+    const declaration = /^(?:async\s+)?(?:function\*?|const|let|var|class)\s+([A-Za-z_$][\w$]*)/gm;
+    for (const match of source.matchAll(declaration)) {
+        const name = match[1];
+        const value = vm.runInThisContext(name);
+        if (typeof value === 'function') {
+            functions.set(name, value);
+        }
+    }
+} catch (e) {
+    write({id: 0, error: 'load: ' + (e && e.stack || e)});
+    process.exit(1);
+}
+write({id: 0, result: 'ready'});
+readline.createInterface({input: process.stdin}).on('line', (line) => {
+    let req;
+    try {
+        req = JSON.parse(line);
+        const fn = functions.get(req.fn);
+        if (typeof fn !== 'function') {
+            throw new Error('not a function: ' + String(req.fn));
+        }
+        const result = fn.apply(null, req.args);
+        write({id: req.id, result: result === undefined ? null : result});
+    } catch (e) {
+        write({id: req ? req.id : -1, error: String(e && e.stack || e)});
+    }
+});
+"""
+
+
+class JsRuntimeError(RuntimeError):
+    """JS 运行时不可用、调用超时或通信失败"""
+
+
+class JsCallError(JsRuntimeError):
+    """JS 函数执行时抛出异常（运行时本身正常）"""
+
+
+class NodeJsRuntime:
+    """常驻 Node 进程中加载的 JS 脚本（线程安全，同一时刻只执行一个调用）"""
+
+    def __init__(self, script_path: str, node_path: str = None, call_timeout: float = None):
+        """
+        Args:
+            script_path: JS 脚本路径
+            node_path: node 可执行文件，None 时读取配置 JS_RUNTIME.node_path（默认 node）
+            call_timeout: 单次调用超时（秒），None 时读取配置 JS_RUNTIME.call_timeout（默认 10）
+        """
+        self.script_path = script_path
+        self.node_path = node_path
+        self.call_timeout = call_timeout
+        self._process: Optional[subprocess.Popen] = None
+        self._responses: Optional[queue.Queue] = None
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.stats = {'starts': 0, 'calls': 0, 'errors': 0}
+
+    def _load_settings(self):
+        """首次启动时读取配置（导入本模块不读取配置）"""
+        if self.node_path is not None and self.call_timeout is not None:
+            return
+        try:
+            from config import config
+            runtime_config = config.get('JS_RUNTIME', {}) or {}
+        except Exception:
+            runtime_config = {}
+        if self.node_path is None:
+            self.node_path = runtime_config.get('node_path') or 'node'
+        if self.call_timeout is None:
+            self.call_timeout = float(runtime_config.get('call_timeout', 10))
+
+    # ---------------- 进程管理 ----------------
+
+    def _start(self):
+        self._load_settings()
+        try:
+            process = subprocess.Popen(
+                [self.node_path, '-e', _BOOTSTRAP, self.script_path],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                encoding='utf-8', bufsize=1
+            )
+        except FileNotFoundError:
+            logger = _logger()
+            logger.error(f"未找到Node.js可执行文件: {self.node_path}")
+            logger.error("解决方案:")
+            logger.error("1. 确保已安装Node.js: apt-get install nodejs")
+            logger.error("2. 检查PATH环境变量是否包含Node.js路径，或在 JS_RUNTIME.node_path 中配置完整路径")
+            raise JsRuntimeError(f"无法启动JavaScript运行时: 未找到 {self.node_path}")
+
+        responses: queue.Queue = queue.Queue()
+        threading.Thread(target=self._read_stdout, args=(process, responses), daemon=True,
+                         name='js-runtime-stdout').start()
+        threading.Thread(target=self._read_stderr, args=(process,), daemon=True,
+                         name='js-runtime-stderr').start()
+        self._process = process
+        self._responses = responses
+        self.stats['starts'] += 1
+
+        try:
+            self._wait_response(0)
+        except JsRuntimeError:
+            self._stop()
+            raise
+        _logger().info(f"JavaScript运行时已启动 (pid={process.pid}): {os.path.basename(self.script_path)}")
+
+    @staticmethod
+    def _read_stdout(process: subprocess.Popen, responses: queue.Queue):
+        for line in process.stdout:
+            try:
+                responses.put(json.loads(line))
+            except ValueError:
+                _logger().debug(f"JavaScript运行时输出: {line.rstrip()}")
+        responses.put(None)  # 进程已退出
+
+    @staticmethod
+    def _read_stderr(process: subprocess.Popen):
+        for line in process.stderr:
+            _logger().debug(f"JavaScript运行时: {line.rstrip()}")
+
+    def _stop(self):
+        process, self._process = self._process, None
+        self._responses = None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+        except Exception:
+            pass
+        try:
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def close(self):
+        """停止 Node 进程（下次调用时重新启动）"""
+        with self._lock:
+            self._stop()
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    # ---------------- 调用 ----------------
+
+    def _wait_response(self, request_id: int) -> Any:
+        while True:
+            try:
+                response = self._responses.get(timeout=self.call_timeout)
+            except queue.Empty:
+                raise JsRuntimeError(f"JavaScript调用超时（{self.call_timeout} 秒）")
+            if response is None:
+                raise JsRuntimeError(f"JavaScript运行时已退出 (返回码 {self._process.poll()})")
+            if response.get('id') != request_id:
+                # 超时调用的迟到应答
+                continue
+            if 'error' in response:
+                error_class = JsCallError if request_id else JsRuntimeError
+                raise error_class(response['error'])
+            return response.get('result')
+
+    def call(self, name: str, *args) -> Any:
+        """调用脚本中的全局函数，参数与返回值需可 JSON 序列化"""
+        with self._lock:
+            if not self.running:
+                if self._process is not None:
+                    _logger().warning("JavaScript运行时已退出，重新启动")
+                    self._stop()
+                self._start()
+            self._next_id += 1
+            request_id = self._next_id
+            self.stats['calls'] += 1
+            try:
+                self._process.stdin.write(json.dumps({'id': request_id, 'fn': name, 'args': list(args)}) + '\n')
+                self._process.stdin.flush()
+                return self._wait_response(request_id)
+            except JsCallError:
+                self.stats['errors'] += 1
+                raise
+            except (OSError, ValueError) as e:
+                self.stats['errors'] += 1
+                self._stop()
+                raise JsRuntimeError(f"JavaScript运行时通信失败: {e}")
+            except JsRuntimeError:
+                # 超时或进程退出：停止进程，下次调用时重启
+                self.stats['errors'] += 1
+                self._stop()
+                raise
+
+
+_runtimes = []
+
+
+def create_node_runtime(script_path: str, **kwargs) -> NodeJsRuntime:
+    """创建常驻 Node 运行时（进程退出时自动停止）"""
+    runtime = NodeJsRuntime(script_path, **kwargs)
+    _runtimes.append(runtime)
+    return runtime
+
+
+@atexit.register
+def _close_runtimes():
+    for runtime in _runtimes:
+        try:
+            runtime.close()
+        except Exception:
+            pass
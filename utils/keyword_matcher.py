@@ -0,0 +1,209 @@
+"""
+关键词匹配器
+基于 Aho-Corasick 自动机实现的账号级关键词匹配，一次扫描消息即可找出所有命中的关键词
+
+- 每个账号编译一次，按商品ID拆分为「商品专属关键词」与「通用关键词」两组自动机
+- 保持原有优先级语义：先匹配商品专属关键词，再匹配通用关键词；同组内按数据库顺序取第一个命中项
+- 关键词变更（reply_server 的 /keywords* 接口）时调用 invalidate 使缓存失效，下次匹配时重新编译
+"""
+
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional, Any
+from loguru import logger
+
+
+class AhoCorasickAutomaton:
+    """Aho-Corasick 多模式匹配自动机
+
+    只返回命中模式中优先级最高（序号最小）的那一个，
+    因此每个状态只需记录沿失败链可达的最小序号，无需保存完整输出列表。
+    """
+
+    __slots__ = ('_goto', '_fail', '_best', '_empty_best')
+
+    def __init__(self, patterns: List[tuple]):
+        """构建自动机
+
+        Args:
+            patterns: [(pattern, priority)]，pattern 应已转为小写，priority 越小优先级越高
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._best: List[Optional[int]] = [None]
+        # 空关键词对任何消息都命中（与 '' in text 的行为一致）
+        self._empty_best: Optional[int] = None
+
+        for pattern, priority in patterns:
+            if not pattern:
+                if self._empty_best is None or priority < self._empty_best:
+                    self._empty_best = priority
+                continue
+            state = 0
+            for ch in pattern:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                state = next_state
+            best = self._best[state]
+            if best is None or priority < best:
+                self._best[state] = priority
+
+        self._build_fail_links()
+
+    def _build_fail_links(self):
+        """广度优先构建失败指针，并沿失败链合并最小优先级"""
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                inherited = self._best[self._fail[next_state]]
+                if inherited is not None and (self._best[next_state] is None or inherited < self._best[next_state]):
+                    self._best[next_state] = inherited
+
+    def search(self, text: str) -> Optional[int]:
+        """扫描文本，返回命中模式中最小的优先级序号，未命中返回 None"""
+        goto = self._goto
+        fail = self._fail
+        best_of = self._best
+        best = self._empty_best
+        if best == 0:
+            return best
+
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            hit = best_of[state]
+            if hit is not None and (best is None or hit < best):
+                best = hit
+                if best == 0:
+                    break
+        return best
+
+
+class KeywordMatcher:
+    """单个账号的已编译关键词匹配器"""
+
+    def __init__(self, keywords: List[Dict[str, Any]]):
+        """
+        Args:
+            keywords: db_manager.get_keywords_with_type 返回的关键词列表（顺序即优先级）
+        """
+        self.keywords = keywords
+        self.built_at = time.time()
+
+        item_patterns: Dict[str, List[tuple]] = {}
+        generic_patterns: List[tuple] = []
+        for index, keyword_data in enumerate(keywords):
+            pattern = (keyword_data['keyword'] or '').lower()
+            keyword_item_id = keyword_data.get('item_id')
+            if keyword_item_id:
+                item_patterns.setdefault(keyword_item_id, []).append((pattern, index))
+            else:
+                generic_patterns.append((pattern, index))
+
+        self._item_automatons = {item_id: AhoCorasickAutomaton(patterns)
+                                 for item_id, patterns in item_patterns.items()}
+        self._generic_automaton = AhoCorasickAutomaton(generic_patterns) if generic_patterns else None
+        self.item_keyword_count = sum(len(patterns) for patterns in item_patterns.values())
+        self.generic_keyword_count = len(generic_patterns)
+
+    def match_item(self, message_lower: str, item_id: str) -> Optional[Dict[str, Any]]:
+        """匹配指定商品的专属关键词"""
+        if not item_id:
+            return None
+        automaton = self._item_automatons.get(item_id)
+        if automaton is None:
+            return None
+        index = automaton.search(message_lower)
+        return self.keywords[index] if index is not None else None
+
+    def match_generic(self, message_lower: str) -> Optional[Dict[str, Any]]:
+        """匹配通用关键词（未绑定商品ID）"""
+        if self._generic_automaton is None:
+            return None
+        index = self._generic_automaton.search(message_lower)
+        return self.keywords[index] if index is not None else None
+
+    def match(self, message: str, item_id: str = None) -> Optional[Dict[str, Any]]:
+        """按优先级匹配关键词：商品专属关键词优先，其次通用关键词
+
+        Returns:
+            命中的关键词数据字典，未命中返回 None
+        """
+        message_lower = message.lower()
+        return self.match_item(message_lower, item_id) or self.match_generic(message_lower)
+
+
+class KeywordMatcherCache:
+    """按账号缓存已编译的关键词匹配器（线程安全，供事件循环与API线程共享）"""
+
+    def __init__(self):
+        self._matchers: Dict[str, KeywordMatcher] = {}
+        # 每次失效递增，用于丢弃编译期间已过期的结果
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'builds': 0, 'invalidations': 0}
+
+    def get(self, cookie_id: str) -> KeywordMatcher:
+        """获取账号的关键词匹配器，不存在时从数据库加载并编译"""
+        matcher = self._matchers.get(cookie_id)
+        if matcher is not None:
+            self.stats['hits'] += 1
+            return matcher
+
+        with self._lock:
+            generation = self._generation
+
+        from db_manager import db_manager
+        start = time.perf_counter()
+        matcher = KeywordMatcher(db_manager.get_keywords_with_type(cookie_id))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            # 编译期间关键词被修改则不缓存本次结果，避免覆盖更新
+            if self._generation == generation:
+                self._matchers[cookie_id] = matcher
+            self.stats['builds'] += 1
+
+        logger.info(f"【{cookie_id}】关键词匹配器已编译: 商品关键词 {matcher.item_keyword_count} 条, "
+                    f"通用关键词 {matcher.generic_keyword_count} 条, 耗时 {elapsed_ms:.1f}ms")
+        return matcher
+
+    async def get_async(self, cookie_id: str) -> KeywordMatcher:
+        """异步获取匹配器：命中缓存直接返回，未命中时在线程池中加载编译，不阻塞事件循环"""
+        matcher = self._matchers.get(cookie_id)
+        if matcher is not None:
+            self.stats['hits'] += 1
+            return matcher
+        return await asyncio.to_thread(self.get, cookie_id)
+
+    def invalidate(self, cookie_id: str = None):
+        """使指定账号（或全部账号）的匹配器失效，下次匹配时重新编译"""
+        with self._lock:
+            self._generation += 1
+            if cookie_id is None:
+                self._matchers.clear()
+            else:
+                self._matchers.pop(cookie_id, None)
+            self.stats['invalidations'] += 1
+        logger.debug(f"关键词匹配器缓存已失效: {cookie_id or '全部账号'}")
+
+
+# 全局关键词匹配器缓存实例
+keyword_matcher_cache = KeywordMatcherCache()
@@ -0,0 +1,183 @@
+"""
+订单详情补全队列
+将订单详情拉取（可能启动浏览器，耗时5-20秒）移出消息回复的关键路径
+
+- 每个账号一个队列，由固定数量的工作协程消费，限制同时拉取的订单数量
+- 同一订单ID的重复提交会合并为一次拉取，所有等待方共享同一结果
+- 后台提交的订单按普通优先级排队；自动发货等需要立即使用结果的调用方通过 wait_for
+  等待指定订单，若该订单仍在排队则提升为高优先级
+- 成功结果短期缓存，后续等待同一订单时直接返回
+"""
+
+import asyncio
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from loguru import logger
+
+
+# 优先级：数值越小越先处理
+PRIORITY_URGENT = 0
+PRIORITY_BACKGROUND = 1
+
+
+class OrderEnrichmentQueue:
+    """单个账号的订单详情补全队列"""
+
+    def __init__(self, cookie_id: str,
+                 fetcher: Callable[[str, Optional[str], Optional[str]], Awaitable[Any]],
+                 max_concurrency: int = 2, result_ttl: int = 600):
+        """
+        Args:
+            cookie_id: 账号ID（用于日志）
+            fetcher: 实际拉取订单详情的协程函数 fetcher(order_id, item_id, buyer_id)
+            max_concurrency: 同时拉取的最大订单数
+            result_ttl: 成功结果的缓存时间（秒）
+        """
+        self.cookie_id = cookie_id
+        self.fetcher = fetcher
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.result_ttl = result_ttl
+
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers = []
+        self._sequence = itertools.count()
+        # {order_id: Future} 排队中或拉取中的订单
+        self._pending: Dict[str, asyncio.Future] = {}
+        # {order_id: (item_id, buyer_id)} 拉取参数
+        self._params: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        # 已开始拉取的订单（不再响应优先级提升）
+        self._running = set()
+        # 已提升为高优先级的订单
+        self._urgent = set()
+        # {order_id: (完成时间, 结果)}
+        self._results: Dict[str, Tuple[float, Any]] = {}
+        self.stats = {'submitted': 0, 'coalesced': 0, 'fetched': 0, 'cache_hits': 0, 'failed': 0}
+
+    def _ensure_workers(self):
+        """在当前事件循环中按需启动工作协程"""
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        self._workers = [task for task in self._workers if not task.done()]
+        while len(self._workers) < self.max_concurrency:
+            index = len(self._workers)
+            self._workers.append(asyncio.create_task(self._worker(index)))
+
+    def _get_cached(self, order_id: str) -> Optional[Any]:
+        cached = self._results.get(order_id)
+        if cached is None:
+            return None
+        finished_at, result = cached
+        if time.time() - finished_at > self.result_ttl:
+            del self._results[order_id]
+            return None
+        return result
+
+    def _cleanup_results(self):
+        now = time.time()
+        expired = [order_id for order_id, (finished_at, _) in self._results.items()
+                   if now - finished_at > self.result_ttl]
+        for order_id in expired:
+            del self._results[order_id]
+
+    def submit(self, order_id: str, item_id: str = None, buyer_id: str = None,
+               urgent: bool = False) -> asyncio.Future:
+        """提交订单详情拉取请求（不等待），返回可等待的 Future
+
+        已缓存的订单返回已完成的 Future；排队中/拉取中的订单直接复用同一个 Future。
+        """
+        loop = asyncio.get_running_loop()
+
+        cached = self._get_cached(order_id)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            future = loop.create_future()
+            future.set_result(cached)
+            return future
+
+        self._ensure_workers()
+
+        future = self._pending.get(order_id)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            # 补充之前缺失的参数
+            old_item_id, old_buyer_id = self._params.get(order_id, (None, None))
+            self._params[order_id] = (old_item_id or item_id, old_buyer_id or buyer_id)
+            if urgent and order_id not in self._running and order_id not in self._urgent:
+                # 仍在排队：以高优先级再入队一次，先被取到的那次生效
+                self._urgent.add(order_id)
+                self._queue.put_nowait((PRIORITY_URGENT, next(self._sequence), order_id))
+            return future
+
+        future = loop.create_future()
+        self._pending[order_id] = future
+        self._params[order_id] = (item_id, buyer_id)
+        priority = PRIORITY_URGENT if urgent else PRIORITY_BACKGROUND
+        if urgent:
+            self._urgent.add(order_id)
+        self._queue.put_nowait((priority, next(self._sequence), order_id))
+        self.stats['submitted'] += 1
+        logger.info(f"【{self.cookie_id}】订单 {order_id} 已加入详情补全队列"
+                    f"（{'优先' if urgent else '后台'}，排队 {self._queue.qsize()}）")
+        return future
+
+    async def wait_for(self, order_id: str, item_id: str = None, buyer_id: str = None,
+                       timeout: float = None) -> Optional[Any]:
+        """等待指定订单的详情（未提交则立即以高优先级提交），超时或失败返回 None"""
+        future = self.submit(order_id, item_id, buyer_id, urgent=True)
+        try:
+            # shield：单个等待方超时/取消不影响其他等待方和正在进行的拉取
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"【{self.cookie_id}】等待订单 {order_id} 详情超时（{timeout}秒）")
+            return None
+
+    async def _worker(self, index: int):
+        while True:
+            _, _, order_id = await self._queue.get()
+            try:
+                future = self._pending.get(order_id)
+                # 重复入队（优先级提升）的条目：订单已处理或正在处理时跳过
+                if future is None or future.done() or order_id in self._running:
+                    continue
+
+                self._running.add(order_id)
+                item_id, buyer_id = self._params.get(order_id, (None, None))
+                result = None
+                try:
+                    result = await self.fetcher(order_id, item_id, buyer_id)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"【{self.cookie_id}】订单 {order_id} 详情补全异常: {e}")
+
+                if result:
+                    self._results[order_id] = (time.time(), result)
+                    self.stats['fetched'] += 1
+                else:
+                    # 失败结果不缓存，后续请求可重新拉取
+                    self.stats['failed'] += 1
+
+                self._finish(order_id, result)
+                self._cleanup_results()
+            finally:
+                self._queue.task_done()
+
+    def _finish(self, order_id: str, result: Any):
+        future = self._pending.pop(order_id, None)
+        self._params.pop(order_id, None)
+        self._running.discard(order_id)
+        self._urgent.discard(order_id)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    async def close(self):
+        """停止工作协程，未完成的等待方得到 None"""
+        for task in self._workers:
+            task.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for order_id in list(self._pending):
+            self._finish(order_id, None)
+        self._queue = None
@@ -0,0 +1,262 @@
+"""
+消息出站队列
+账号的所有 WebSocket 写操作（回复、自动发货、API 发送、ACK、心跳）统一经由单个写协程发出，
+避免多个协程同时调用 ws.send 造成写入交错，并按令牌桶控制聊天消息的发送速率。
+
+- 优先级：控制帧（ACK、心跳、注册）> 自动发货 > 自动回复 > 手动发送/通知回显
+- 控制帧不消耗令牌，其余消息按令牌桶限速（rate 条/秒，允许 burst 条突发），
+  多数量发货按令牌桶的最大安全速率连续发出，不再手动 sleep
+- 合并：排队中的相同消息（同一 coalesce_key）只发送一次，所有调用方共享发送结果
+- 消息帧由调用方预先构造并序列化，写协程只负责发送
+- 记录排队等待时间、限速等待、各优先级发送数量等指标，供管理接口查询
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, List, Optional
+from loguru import logger
+
+
+PRIORITY_CONTROL = 0  # 控制帧：ACK、心跳、注册，不限速
+PRIORITY_DELIVERY = 1  # 自动发货
+PRIORITY_REPLY = 2  # 自动回复
+PRIORITY_ECHO = 3  # 手动发送/通知回显
+
+PRIORITY_NAMES = {
+    PRIORITY_CONTROL: 'control',
+    PRIORITY_DELIVERY: 'delivery',
+    PRIORITY_REPLY: 'reply',
+    PRIORITY_ECHO: 'echo',
+}
+
+
+class _Outgoing:
+    """排队中的一帧"""
+
+    __slots__ = ('ws', 'payload', 'priority', 'coalesce_key', 'enqueued_at', 'waiters')
+
+    def __init__(self, ws, payload: str, priority: int, coalesce_key: Optional[Hashable]):
+        self.ws = ws
+        self.payload = payload
+        self.priority = priority
+        self.coalesce_key = coalesce_key
+        self.enqueued_at = time.monotonic()
+        self.waiters: List[asyncio.Future] = []
+
+    def abandoned(self) -> bool:
+        """所有等待方都已取消（如心跳超时），无需再发送"""
+        return bool(self.waiters) and all(waiter.cancelled() for waiter in self.waiters)
+
+    def resolve(self, error: Optional[BaseException] = None):
+        for waiter in self.waiters:
+            if waiter.done():
+                continue
+            if error is None:
+                waiter.set_result(True)
+            else:
+                waiter.set_exception(error)
+
+
+class OutboundQueue:
+    """单个账号的出站队列（单写协程 + 优先级 + 令牌桶限速）"""
+
+    def __init__(self, cookie_id: str, rate: float = 2.0, burst: int = 3,
+                 max_size: int = 500, send_timeout: float = 10.0):
+        """
+        Args:
+            cookie_id: 账号ID（用于日志）
+            rate: 聊天消息每秒发送条数，<= 0 表示不限速
+            burst: 令牌桶容量（允许连续突发发送的条数）
+            max_size: 最多排队的聊天消息数（控制帧不计入）
+            send_timeout: 单帧发送超时（秒）
+        """
+        self.cookie_id = cookie_id
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.max_size = max(1, int(max_size))
+        self.send_timeout = send_timeout
+
+        self._heap: List[tuple] = []
+        self._pending_by_key: Dict[Hashable, _Outgoing] = {}
+        self._sequence = itertools.count()
+        self._paced_depth = 0
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._writer_task: Optional[asyncio.Task] = None
+
+        # 指标
+        self._waits_ms: Dict[int, Deque[float]] = {priority: deque(maxlen=1000) for priority in PRIORITY_NAMES}
+        self._sent_by_priority = {priority: 0 for priority in PRIORITY_NAMES}
+        self.stats = {'enqueued': 0, 'sent': 0, 'coalesced': 0, 'failed': 0, 'abandoned': 0,
+                      'rejected': 0, 'throttled_ms': 0.0, 'peak_depth': 0}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _ensure_writer(self):
+        """在当前事件循环中按需启动写协程"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.create_task(self._writer())
+
+    # ---------------- 入队 ----------------
+
+    def _enqueue(self, ws, payload: str, priority: int, coalesce_key: Optional[Hashable],
+                 waiter: Optional[asyncio.Future]):
+        self._ensure_writer()
+
+        if coalesce_key is not None:
+            pending = self._pending_by_key.get(coalesce_key)
+            if pending is not None and pending.ws is ws:
+                if waiter is not None:
+                    pending.waiters.append(waiter)
+                self.stats['coalesced'] += 1
+                return
+
+        paced = priority != PRIORITY_CONTROL
+        if paced and self._paced_depth >= self.max_size:
+            self.stats['rejected'] += 1
+            raise asyncio.QueueFull(f"【{self.cookie_id}】出站队列已满（{self.max_size}）")
+
+        entry = _Outgoing(ws, payload, priority, coalesce_key)
+        if waiter is not None:
+            entry.waiters.append(waiter)
+        if coalesce_key is not None:
+            self._pending_by_key[coalesce_key] = entry
+        if paced:
+            self._paced_depth += 1
+        heapq.heappush(self._heap, (priority, next(self._sequence), entry))
+        self.stats['enqueued'] += 1
+        if len(self._heap) > self.stats['peak_depth']:
+            self.stats['peak_depth'] = len(self._heap)
+        self._wakeup.set()
+
+    async def send(self, ws, payload: str, priority: int = PRIORITY_REPLY,
+                   coalesce_key: Optional[Hashable] = None):
+        """消息入队并等待实际发出，发送失败时抛出异常
+
+        Args:
+            ws: 目标 WebSocket
+            payload: 已序列化的消息帧
+            priority: 优先级，见 PRIORITY_*
+            coalesce_key: 合并键，排队中的相同键的消息只发送一次；None 表示不合并
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        self._enqueue(ws, payload, priority, coalesce_key, waiter)
+        await waiter
+
+    def send_nowait(self, ws, payload: str, priority: int = PRIORITY_CONTROL):
+        """消息入队后立即返回，不关心发送结果（用于 ACK 等控制帧）"""
+        self._enqueue(ws, payload, priority, None, None)
+
+    # ---------------- 写协程 ----------------
+
+    def _throttle_delay(self) -> float:
+        """补充令牌，返回还需等待多少秒才有可用令牌"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def _pop(self) -> _Outgoing:
+        _, _, entry = heapq.heappop(self._heap)
+        if entry.priority != PRIORITY_CONTROL:
+            self._paced_depth -= 1
+        if entry.coalesce_key is not None and self._pending_by_key.get(entry.coalesce_key) is entry:
+            del self._pending_by_key[entry.coalesce_key]
+        return entry
+
+    async def _writer(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            priority, _, entry = self._heap[0]
+            if entry.abandoned():
+                self._pop()
+                self.stats['abandoned'] += 1
+                continue
+
+            if priority != PRIORITY_CONTROL:
+                delay = self._throttle_delay()
+                if delay > 0:
+                    # 等待令牌期间若有更高优先级的帧入队，提前醒来重新选择
+                    self._wakeup.clear()
+                    throttle_start = time.monotonic()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    self.stats['throttled_ms'] += (time.monotonic() - throttle_start) * 1000
+                    continue
+                self._tokens -= 1
+
+            self._pop()
+            self._waits_ms[priority].append((time.monotonic() - entry.enqueued_at) * 1000)
+            try:
+                await asyncio.wait_for(entry.ws.send(entry.payload), timeout=self.send_timeout)
+            except asyncio.CancelledError:
+                entry.resolve(ConnectionError('出站队列已关闭'))
+                raise
+            except Exception as e:
+                self.stats['failed'] += 1
+                if entry.waiters:
+                    entry.resolve(e)
+                else:
+                    logger.debug(f"【{self.cookie_id}】出站帧发送失败: {e}")
+                continue
+            self.stats['sent'] += 1
+            self._sent_by_priority[priority] += 1
+            entry.resolve()
+
+    # ---------------- 状态 ----------------
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """队列深度、排队等待时间与限速指标"""
+        all_waits = sorted(wait for waits in self._waits_ms.values() for wait in waits)
+        by_priority = {}
+        for priority, name in PRIORITY_NAMES.items():
+            waits = sorted(self._waits_ms[priority])
+            by_priority[name] = {
+                'sent': self._sent_by_priority[priority],
+                'wait_ms_p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else 0,
+            }
+        return {
+            'depth': len(self._heap),
+            'rate': self.rate,
+            'burst': self.burst,
+            'tokens': round(self._tokens, 2),
+            'wait_ms_p50': round(all_waits[len(all_waits) // 2], 2) if all_waits else 0,
+            'wait_ms_p95': round(all_waits[min(len(all_waits) - 1, int(len(all_waits) * 0.95))], 2) if all_waits else 0,
+            'wait_ms_max': round(all_waits[-1], 2) if all_waits else 0,
+            'priorities': by_priority,
+            **self.stats,
+            'throttled_ms': round(self.stats['throttled_ms'], 2),
+        }
+
+    async def close(self):
+        """停止写协程，未发送的消息以 ConnectionError 结束"""
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            await asyncio.gather(self._writer_task, return_exceptions=True)
+            self._writer_task = None
+        if self._heap:
+            logger.info(f"【{self.cookie_id}】出站队列关闭，丢弃 {len(self._heap)} 条未发送消息")
+        error = ConnectionError('出站队列已关闭')
+        for _, _, entry in self._heap:
+            entry.resolve(error)
+        self._heap.clear()
+        self._pending_by_key.clear()
+        self._paced_depth = 0
+        self._wakeup = None
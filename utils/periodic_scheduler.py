@@ -0,0 +1,304 @@
+"""
+周期任务调度器
+统一管理所有账号的心跳、Token刷新、Cookie刷新和清理等周期任务的运行时间，避免进程重启后
+所有账号在同一时刻请求 Token 接口、同时启动浏览器刷新 Cookie（集中刷新会触发大面积滑块验证）。
+
+- 每个账号的周期任务登记为一个 ScheduledJob，等待时间由调度器按抖动（±jitter）计算，
+  首次运行在启动后的一个周期内随机分散
+- 唤醒由进程级时间轮驱动，不为每次等待创建 sleep 任务
+- 全局并发名额：同时刷新 Token、同时进行浏览器刷新的账号数有上限，超出的账号排队等待；
+  已持有名额的流程内部再次申请（如 Token 刷新触发浏览器刷新）时直接放行，避免互相等待造成死锁
+- 提供即将运行的任务列表与名额占用情况，供管理接口查询
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from loguru import logger
+
+from utils.timer_wheel import timer_wheel
+
+
+# 当前上下文（任务）已持有的名额组，用于重入判断
+_held_slots: contextvars.ContextVar = contextvars.ContextVar('periodic_scheduler_held_slots', default=frozenset())
+
+
+class ScheduledJob:
+    """单个账号的一个周期任务"""
+
+    def __init__(self, scheduler: 'PeriodicScheduler', cookie_id: str, name: str, interval: float, jitter: float):
+        self.scheduler = scheduler
+        self.cookie_id = cookie_id
+        self.name = name
+        self.interval = float(interval)
+        self.jitter = max(0.0, min(float(jitter), 0.9))
+        self.state = 'idle'  # idle / scheduled / running / stopped
+        self.next_run: Optional[float] = None  # 下次运行时间（time.time）
+        self.last_run: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.runs = 0
+        self._factor = 1.0
+        self._timer = None
+        self._waiter: Optional[asyncio.Future] = None
+        self.rejitter()
+
+    def rejitter(self):
+        """重新抽取本周期的抖动系数"""
+        self._factor = random.uniform(1 - self.jitter, 1 + self.jitter) if self.jitter else 1.0
+
+    def period(self) -> float:
+        """本周期带抖动的间隔（秒）"""
+        return self.interval * self._factor
+
+    def startup_delay(self) -> float:
+        """首次运行的随机延迟，使各账号的首次运行分散在启动后的一段时间内"""
+        return random.uniform(0, self.interval * self.scheduler.startup_spread)
+
+    async def sleep(self, delay: float, jitter: bool = True):
+        """等待到下次运行
+
+        Args:
+            delay: 等待时间（秒）
+            jitter: 是否对等待时间加抖动
+        """
+        if self.state == 'running' and self.last_run is not None:
+            self.last_duration = time.time() - self.last_run
+        if jitter and self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        delay = max(0.0, delay)
+
+        loop = asyncio.get_running_loop()
+        self._waiter = loop.create_future()
+        self.next_run = time.time() + delay
+        self.state = 'scheduled'
+        self._timer = timer_wheel.call_later(delay, self._wake, subsystem=f'scheduler_{self.name}')
+        try:
+            await self._waiter
+        finally:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._waiter = None
+        if self.state != 'stopped':
+            self.state = 'running'
+            self.next_run = None
+            self.last_run = time.time()
+            self.runs += 1
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def cancel(self):
+        """注销任务"""
+        self.state = 'stopped'
+        self.next_run = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.scheduler._unregister(self)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            'cookie_id': self.cookie_id,
+            'job': self.name,
+            'state': self.state,
+            'interval': self.interval,
+            'next_run': self.next_run,
+            'due_in': round(self.next_run - now, 1) if self.next_run else None,
+            'last_run': self.last_run,
+            'last_duration': round(self.last_duration, 3) if self.last_duration is not None else None,
+            'runs': self.runs,
+        }
+
+
+class _SlotWaiter:
+    __slots__ = ('holder', 'since', 'loop', 'future', 'granted')
+
+    def __init__(self, holder: str, loop: Optional[asyncio.AbstractEventLoop] = None,
+                 future: Optional[asyncio.Future] = None):
+        self.holder = holder
+        self.since = time.time()
+        self.loop = loop
+        self.future = future
+        self.granted = False
+
+
+class _SlotGroup:
+    """一组全局并发名额（线程安全，可在多个事件循环中使用）"""
+
+    def __init__(self, limit: int):
+        self.limit = int(limit)
+        self.holders: List[_SlotWaiter] = []
+        self.waiters: Deque[_SlotWaiter] = deque()
+        self.stats = {'acquired': 0, 'queued': 0, 'max_wait': 0.0}
+
+
+class PeriodicScheduler:
+    """进程级周期任务调度器"""
+
+    def __init__(self, jitter: float = 0.1, heartbeat_jitter: float = 0.05, startup_spread: float = 1.0,
+                 limits: Dict[str, int] = None):
+        """
+        Args:
+            jitter: Token/Cookie刷新、清理等任务间隔的抖动比例
+            heartbeat_jitter: 心跳间隔的抖动比例（心跳需要保持规律，抖动应较小）
+            startup_spread: 首次运行的分散范围（占任务周期的比例）
+            limits: {名额组: 全局同时运行数}，<= 0 表示不限制
+        """
+        self.jitter = jitter
+        self.heartbeat_jitter = heartbeat_jitter
+        self.startup_spread = max(0.0, float(startup_spread))
+        self._jobs: Dict[tuple, ScheduledJob] = {}
+        self._groups: Dict[str, _SlotGroup] = {name: _SlotGroup(limit) for name, limit in (limits or {}).items()}
+        self._lock = threading.Lock()
+
+    # ---------------- 周期任务 ----------------
+
+    def register(self, cookie_id: str, name: str, interval: float, jitter: float = None) -> ScheduledJob:
+        """登记账号的周期任务（同名任务重新登记时替换旧任务）"""
+        if jitter is None:
+            jitter = self.heartbeat_jitter if name == 'heartbeat' else self.jitter
+        job = ScheduledJob(self, cookie_id, name, interval, jitter)
+        with self._lock:
+            previous = self._jobs.get((cookie_id, name))
+            self._jobs[(cookie_id, name)] = job
+        if previous is not None and previous.state != 'stopped':
+            previous.state = 'stopped'
+        return job
+
+    def _unregister(self, job: ScheduledJob):
+        with self._lock:
+            if self._jobs.get((job.cookie_id, job.name)) is job:
+                del self._jobs[(job.cookie_id, job.name)]
+
+    # ---------------- 全局并发名额 ----------------
+
+    @contextlib.asynccontextmanager
+    async def slot(self, group: str, holder: str = None):
+        """占用一个全局并发名额，名额用尽时排队等待
+
+        当前上下文已持有同一组名额时直接放行（嵌套的刷新流程不会重复占用）；其他组的名额仍需占用。
+        多个组嵌套占用时按固定顺序获取（先 token_refresh 后 browser_refresh），不会互相等待形成死锁。
+        """
+        held = _held_slots.get()
+        slots = self._groups.get(group)
+        if group in held or slots is None or slots.limit <= 0:
+            yield
+            return
+
+        entry = await self._acquire(slots, group, holder or '-')
+        token = _held_slots.set(held | {group})
+        try:
+            yield
+        finally:
+            _held_slots.reset(token)
+            self._release(slots, entry)
+
+    async def _acquire(self, slots: _SlotGroup, group: str, holder: str) -> _SlotWaiter:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if len(slots.holders) < slots.limit and not slots.waiters:
+                entry = _SlotWaiter(holder)
+                entry.granted = True
+                slots.holders.append(entry)
+                slots.stats['acquired'] += 1
+                return entry
+            entry = _SlotWaiter(holder, loop, loop.create_future())
+            slots.waiters.append(entry)
+            slots.stats['queued'] += 1
+            position = len(slots.waiters)
+        logger.info(f"【{holder}】{group} 全局名额已满（{slots.limit}），排队等待（第 {position} 位）")
+        try:
+            await entry.future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = entry.granted
+                if not granted:
+                    slots.waiters.remove(entry)
+            if granted:
+                self._release(slots, entry)
+            raise
+        waited = time.time() - entry.since
+        slots.stats['max_wait'] = max(slots.stats['max_wait'], waited)
+        logger.info(f"【{holder}】获得 {group} 全局名额（等待 {waited:.1f} 秒）")
+        entry.since = time.time()
+        return entry
+
+    def _release(self, slots: _SlotGroup, entry: _SlotWaiter):
+        with self._lock:
+            if entry in slots.holders:
+                slots.holders.remove(entry)
+            while slots.waiters and len(slots.holders) < slots.limit:
+                waiter = slots.waiters.popleft()
+                waiter.granted = True
+                slots.holders.append(waiter)
+                slots.stats['acquired'] += 1
+                try:
+                    waiter.loop.call_soon_threadsafe(self._grant, waiter.future)
+                except RuntimeError:
+                    # 等待方所在事件循环已关闭
+                    slots.holders.remove(waiter)
+
+    @staticmethod
+    def _grant(future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
+
+    # ---------------- 状态 ----------------
+
+    def get_schedule(self, limit: int = 200) -> Dict[str, Any]:
+        """即将运行的周期任务（按时间排序）与全局名额占用情况"""
+        with self._lock:
+            jobs = [job.snapshot() for job in self._jobs.values()]
+            now = time.time()
+            groups = {
+                name: {
+                    'limit': slots.limit,
+                    'running': [{'cookie_id': entry.holder, 'seconds': round(now - entry.since, 1)}
+                                for entry in slots.holders],
+                    'waiting': [{'cookie_id': entry.holder, 'seconds': round(now - entry.since, 1)}
+                                for entry in slots.waiters],
+                    **slots.stats,
+                    'max_wait': round(slots.stats['max_wait'], 1),
+                }
+                for name, slots in self._groups.items()
+            }
+        upcoming = sorted((job for job in jobs if job['next_run']), key=lambda job: job['next_run'])
+        running = [job for job in jobs if job['state'] == 'running']
+        counts: Dict[str, int] = {}
+        for job in jobs:
+            counts[job['job']] = counts.get(job['job'], 0) + 1
+        return {
+            'jobs': counts,
+            'running': running,
+            'upcoming': upcoming[:limit],
+            'slots': groups,
+        }
+
+
+def _create_periodic_scheduler() -> PeriodicScheduler:
+    try:
+        from config import config
+        scheduler_config = config.get('SCHEDULER', {}) or {}
+    except Exception:
+        scheduler_config = {}
+    return PeriodicScheduler(
+        jitter=scheduler_config.get('jitter', 0.1),
+        heartbeat_jitter=scheduler_config.get('heartbeat_jitter', 0.05),
+        startup_spread=scheduler_config.get('startup_spread', 1.0),
+        limits={
+            'token_refresh': scheduler_config.get('max_concurrent_token_refresh', 2),
+            'browser_refresh': scheduler_config.get('max_concurrent_browser_refresh', 1),
+        }
+    )
+
+
+# 全局周期任务调度器
+periodic_scheduler = _create_periodic_scheduler()
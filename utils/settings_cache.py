@@ -0,0 +1,128 @@
+"""
+账号配置读穿缓存
+每条买家消息都会读取暂停时间、AI回复设置、默认回复、商品回复、通知配置、自动确认发货等账号配置，
+这些配置很少变化，缓存后消息处理路径上不再逐条查询 SQLite。
+
+- 按账号缓存，键为 (配置名, 参数)；未命中时调用加载函数读取数据库并写入缓存
+- 版本号：每个账号有独立版本号，失效时递增；加载期间版本变化（配置被修改）则不缓存本次结果，避免覆盖更新
+- 由 db_manager 的配置写入方法在提交后调用 invalidate（API 修改配置、/system/reload-cache 均经由此处），
+  启用账号工作进程时同步到工作进程
+- ttl 兜底：直接修改数据库等绕过写入方法的变更最多延迟 ttl 秒生效
+- 返回值为缓存值的副本，调用方修改返回值不会影响缓存
+"""
+
+import copy
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+from loguru import logger
+
+
+# peek 未命中时的返回值
+MISSING = object()
+
+
+class SettingsCache:
+    """按账号缓存配置读取结果（线程安全，供事件循环、API线程与数据库线程池共享）"""
+
+    def __init__(self, enabled: bool = True, ttl: float = 300):
+        """
+        Args:
+            enabled: 是否启用缓存，关闭时每次都读取数据库
+            ttl: 缓存有效期（秒），<= 0 表示只依赖失效通知
+        """
+        self.enabled = enabled
+        self.ttl = ttl
+        # {cookie_id: {key: (value, loaded_at)}}
+        self._entries: Dict[str, Dict[Hashable, Tuple[Any, float]]] = {}
+        # {cookie_id: version}，全部失效时递增 _generation
+        self._versions: Dict[str, int] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self._misses_by_name: Dict[str, int] = {}
+
+    def _version(self, cookie_id: str) -> Tuple[int, int]:
+        return self._generation, self._versions.get(cookie_id, 0)
+
+    def peek(self, cookie_id: str, key: Hashable) -> Any:
+        """只查缓存，未命中时返回 MISSING（不计入未命中次数）"""
+        if not self.enabled:
+            return MISSING
+        entries = self._entries.get(cookie_id)
+        entry = entries.get(key) if entries else None
+        if entry is None:
+            return MISSING
+        value, loaded_at = entry
+        if self.ttl > 0 and time.monotonic() - loaded_at > self.ttl:
+            return MISSING
+        self.stats['hits'] += 1
+        return copy.deepcopy(value)
+
+    def get(self, cookie_id: str, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """读取配置，未命中时调用 loader 加载并缓存
+
+        Args:
+            cookie_id: 账号ID
+            key: 缓存键，通常为 (配置名, 其他参数...)
+            loader: 加载函数（读取数据库）
+        """
+        value = self.peek(cookie_id, key)
+        if value is not MISSING:
+            return value
+        if not self.enabled:
+            return loader()
+
+        with self._lock:
+            version = self._version(cookie_id)
+            self.stats['misses'] += 1
+            name = key[0] if isinstance(key, tuple) and key else key
+            self._misses_by_name[name] = self._misses_by_name.get(name, 0) + 1
+        value = loader()
+        with self._lock:
+            if self._version(cookie_id) == version:
+                self._entries.setdefault(cookie_id, {})[key] = (copy.deepcopy(value), time.monotonic())
+        return value
+
+    def invalidate(self, cookie_id: str = None):
+        """使指定账号（或全部账号）的配置缓存失效"""
+        with self._lock:
+            if cookie_id is None:
+                self._generation += 1
+                self._entries.clear()
+                self._versions.clear()
+            else:
+                self._versions[cookie_id] = self._versions.get(cookie_id, 0) + 1
+                self._entries.pop(cookie_id, None)
+            self.stats['invalidations'] += 1
+        logger.debug(f"账号配置缓存已失效: {cookie_id or '全部账号'}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """命中率与缓存规模"""
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                'enabled': self.enabled,
+                'ttl': self.ttl,
+                'accounts': len(self._entries),
+                'entries': sum(len(entries) for entries in self._entries.values()),
+                **self.stats,
+                'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else 0,
+                'misses_by_setting': dict(self._misses_by_name),
+            }
+
+
+def _create_settings_cache() -> SettingsCache:
+    try:
+        from config import config
+        cache_config = config.get('SETTINGS_CACHE', {}) or {}
+    except Exception:
+        cache_config = {}
+    return SettingsCache(
+        enabled=cache_config.get('enabled', True),
+        ttl=cache_config.get('ttl', 300)
+    )
+
+
+# 全局账号配置缓存实例
+settings_cache = _create_settings_cache()
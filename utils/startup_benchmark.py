@@ -0,0 +1,271 @@
+"""
+启动耗时基准测试
+容器重新调度后，启动耗时内到达的买家消息都会延迟处理，用本工具跟踪启动各阶段的耗时并防止回退。
+
+- 导入耗时：在独立子进程中以 -X importtime 导入 XianyuAutoAsync、reply_server 等模块，
+  记录总耗时与最慢的直接依赖
+- Web 服务就绪耗时：以临时数据库启动 Start.py，记录从进程启动到 API 端口可连接的时间
+- 首个 WebSocket 连接耗时：启动本地模拟闲鱼服务端（utils.fake_goofish），记录从进程启动到
+  首个 XianyuLive 实例完成注册的时间
+- 各项取多次运行的最小值，与 BUDGETS 中的阈值比较；轻量模块不得在导入时加载 FORBIDDEN_IMPORTS 中的依赖，
+  --check 时超出阈值或加载了禁止的依赖返回非零退出码
+
+用法:
+    python -m utils.startup_benchmark
+    python -m utils.startup_benchmark --repeat 5 --check
+    python -m utils.startup_benchmark --only imports --json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 导入耗时测量的模块（按依赖从轻到重）
+IMPORT_TARGETS = ['utils.xianyu_utils', 'db_manager', 'XianyuAutoAsync', 'cookie_manager', 'reply_server']
+
+# 回退阈值（毫秒）：参考机器上的测量值（注释中）留出约 50% 余量，优化后应同步下调
+BUDGETS = {
+    'import:utils.xianyu_utils': 40,  # 24
+    'import:db_manager': 250,  # 116
+    'import:XianyuAutoAsync': 650,  # 417
+    'import:cookie_manager': 300,  # 149
+    'import:reply_server': 1500,  # 991
+    'listen:api': 2000,  # 1270
+    'ws:first_connected': 1000,  # 614
+}
+
+# 导入时禁止加载的依赖（按顶层包名匹配）：这些模块在消息解析等轻量场景中被导入，重依赖应在使用时再导入
+FORBIDDEN_IMPORTS = {
+    'utils.xianyu_utils': ('loguru',),
+}
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( +)(\S+)\s*$')
+
+
+def _child_env(workdir: str) -> Dict[str, str]:
+    """被测子进程环境：临时数据库、关闭 SQL 日志
+
+    子进程以临时目录为工作目录（logs/、realtime.log 等相对路径文件写入临时目录），
+    通过 PYTHONPATH 导入项目模块。
+    """
+    env = dict(os.environ)
+    env['DB_PATH'] = os.path.join(workdir, 'benchmark.db')
+    env['SQL_LOG_ENABLED'] = 'false'
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [PROJECT_ROOT, env.get('PYTHONPATH')]))
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _stop_process(process: subprocess.Popen):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+# ---------------- 导入耗时 ----------------
+
+def parse_importtime(stderr: str, module: str, top: int = 10, forbidden=()) -> Dict[str, Any]:
+    """解析 -X importtime 输出，返回模块总耗时、最慢的直接依赖（毫秒）与加载了的禁止依赖"""
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((len(indent) // 2, name, int(self_us), int(cumulative_us)))
+
+    # 目标模块的记录在其所有依赖之后，依赖的层级比目标模块深一层
+    for index in range(len(entries) - 1, -1, -1):
+        level, name, self_us, cumulative_us = entries[index]
+        if name == module and level == 0:
+            break
+    else:
+        raise ValueError(f'未找到模块 {module} 的导入记录')
+
+    children = []
+    for child_level, child_name, _, child_cumulative in reversed(entries[:index]):
+        if child_level == 0:
+            break
+        if child_level == 1:
+            children.append((child_name, child_cumulative))
+    children.sort(key=lambda item: item[1], reverse=True)
+    loaded_forbidden = sorted({name.split('.')[0] for _, name, _, _ in entries[:index] if name.split('.')[0] in forbidden})
+    return {
+        'total_ms': round(cumulative_us / 1000, 1),
+        'self_ms': round(self_us / 1000, 1),
+        'modules': index + 1,
+        'heaviest': [{'module': name, 'ms': round(us / 1000, 1)} for name, us in children[:top]],
+        'forbidden': loaded_forbidden,
+    }
+
+
+def measure_import(module: str, workdir: str) -> Dict[str, Any]:
+    """在新的解释器中导入模块并测量导入耗时"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=workdir, env=_child_env(workdir), capture_output=True, text=True,
+        encoding='utf-8', errors='replace', timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'导入 {module} 失败: {result.stderr.strip().splitlines()[-1:]}')
+    return parse_importtime(result.stderr, module, forbidden=FORBIDDEN_IMPORTS.get(module, ()))
+
+
+# ---------------- Web 服务就绪耗时 ----------------
+
+# Start.py 的端口以配置文件为准，基准测试通过引导代码改为空闲端口后再运行 Start.py
+_START_BOOTSTRAP = (
+    "import runpy, sys; from config import config; "
+    "config.set('AUTO_REPLY.api.host', '127.0.0.1'); config.set('AUTO_REPLY.api.port', int(sys.argv[1])); "
+    "runpy.run_path(sys.argv[2], run_name='__main__')"
+)
+
+
+def measure_listen(workdir: str, timeout: float = 60) -> float:
+    """启动 Start.py，返回从进程启动到 API 端口可连接的毫秒数"""
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-c', _START_BOOTSTRAP, str(port), os.path.join(PROJECT_ROOT, 'Start.py')],
+        cwd=workdir, env=_child_env(workdir), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f'Start.py 已退出，返回码 {process.returncode}')
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                    return round((time.perf_counter() - started) * 1000, 1)
+            except OSError:
+                pass
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError(f'{timeout} 秒内 API 端口 {port} 未就绪')
+            time.sleep(0.05)
+    finally:
+        _stop_process(process)
+
+
+# ---------------- 首个 WebSocket 连接耗时 ----------------
+
+async def _measure_first_connected(workdir: str, timeout: float) -> float:
+    from utils.fake_goofish import FakeGoofishServer
+
+    server = FakeGoofishServer()
+    await server.start()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'utils.fake_goofish', '--run-accounts', '1',
+         '--http', server.http_base, '--ws', server.ws_url],
+        cwd=workdir, env=_child_env(workdir), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while not server.connections:
+            if process.poll() is not None:
+                raise RuntimeError(f'被测进程已退出，返回码 {process.returncode}')
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError(f'{timeout} 秒内没有账号完成注册')
+            await asyncio.sleep(0.02)
+        return round((time.perf_counter() - started) * 1000, 1)
+    finally:
+        _stop_process(process)
+        await server.stop()
+
+
+def measure_first_connected(workdir: str, timeout: float = 60) -> float:
+    """启动一个连接本地模拟服务端的 XianyuLive 进程，返回从进程启动到完成注册的毫秒数"""
+    return asyncio.run(_measure_first_connected(workdir, timeout))
+
+
+# ---------------- 汇总 ----------------
+
+def run_benchmark(repeat: int = 3, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    """运行各项基准测试，每项取 repeat 次中的最小值"""
+    only = only or ['imports', 'listen', 'ws']
+    results: Dict[str, Any] = {}
+    details: Dict[str, Any] = {}
+    workdir = tempfile.mkdtemp(prefix='xianyu_startup_')
+    try:
+        if 'imports' in only:
+            for module in IMPORT_TARGETS:
+                runs = [measure_import(module, workdir) for _ in range(repeat)]
+                best = min(runs, key=lambda run: run['total_ms'])
+                results[f'import:{module}'] = best['total_ms']
+                details[f'import:{module}'] = best
+        if 'listen' in only:
+            results['listen:api'] = min(measure_listen(workdir) for _ in range(repeat))
+        if 'ws' in only:
+            results['ws:first_connected'] = min(measure_first_connected(workdir) for _ in range(repeat))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    over_budget = {name: {'ms': value, 'budget_ms': BUDGETS[name]}
+                   for name, value in results.items() if name in BUDGETS and value > BUDGETS[name]}
+    forbidden_imports = {name: detail['forbidden'] for name, detail in details.items() if detail['forbidden']}
+    return {
+        'python': sys.version.split()[0],
+        'repeat': repeat,
+        'results_ms': results,
+        'budgets_ms': {name: BUDGETS[name] for name in results if name in BUDGETS},
+        'over_budget': over_budget,
+        'forbidden_imports': forbidden_imports,
+        'imports': details,
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [f"启动耗时（Python {report['python']}，{report['repeat']} 次取最小值）"]
+    for name, value in report['results_ms'].items():
+        budget = report['budgets_ms'].get(name)
+        flag = '  超出阈值!' if name in report['over_budget'] else ''
+        lines.append(f"  {name:<28} {value:>8.1f} ms" + (f"  (阈值 {budget} ms){flag}" if budget else ''))
+        detail = report['imports'].get(name)
+        if detail:
+            heaviest = ', '.join(f"{item['module']} {item['ms']}" for item in detail['heaviest'][:5])
+            lines.append(f"      最慢的直接依赖(ms): {heaviest}")
+        forbidden = report['forbidden_imports'].get(name)
+        if forbidden:
+            lines.append(f"      导入时加载了禁止的依赖: {', '.join(forbidden)}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='启动耗时基准测试')
+    parser.add_argument('--repeat', type=int, default=3, help='每项运行次数（取最小值）')
+    parser.add_argument('--only', help='只运行指定项，逗号分隔: imports,listen,ws')
+    parser.add_argument('--check', action='store_true', help='超出阈值时返回非零退出码')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出报告')
+    args = parser.parse_args(argv)
+
+    only = [item.strip() for item in args.only.split(',')] if args.only else None
+    report = run_benchmark(repeat=max(1, args.repeat), only=only)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(report))
+    if args.check and (report['over_budget'] or report['forbidden_imports']):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""
+分层时间轮（hashed hierarchical timing wheel）
+进程内统一的定时器服务，替代「每个过期项一个 sleep 任务」和「周期性全量扫描字典」的做法
+
+- 注册、取消定时器均为 O(1)；到期处理只触及当前刻度的槽位，不扫描全部定时器
+- 4 层、每层 64 个槽位，刻度默认 0.1 秒，覆盖约 19 天，更远的定时器在最高层循环降级
+- 整个进程只有一个驱动线程：没有定时器时线程休眠，不占用任何事件循环任务
+- 回调在注册时所在的事件循环中执行（线程安全地投递），同一刻度到期的回调合并为一次投递；
+  在没有事件循环的线程中注册的回调直接在驱动线程执行，应保持简短
+- 按子系统统计未到期的定时器数量，供管理接口查询
+"""
+
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, MutableMapping, Optional
+from loguru import logger
+
+
+WHEEL_BITS = 6
+WHEEL_SIZE = 1 << WHEEL_BITS  # 每层槽位数
+WHEEL_MASK = WHEEL_SIZE - 1
+WHEEL_LEVELS = 4
+
+
+class TimerHandle:
+    """定时器句柄，可通过 cancel() 取消"""
+    __slots__ = ('when', 'expires', 'callback', 'args', 'subsystem', 'loop', 'cancelled', '_slot', '_wheel')
+
+    def __init__(self, wheel: 'TimerWheel', when: float, expires: int, callback: Callable, args: tuple,
+                 subsystem: str, loop: Optional[asyncio.AbstractEventLoop]):
+        self.when = when  # 到期时间（time.monotonic）
+        self.expires = expires  # 到期刻度
+        self.callback = callback
+        self.args = args
+        self.subsystem = subsystem
+        self.loop = loop
+        self.cancelled = False
+        self._slot: Optional[set] = None
+        self._wheel = wheel
+
+    def cancel(self):
+        """取消定时器（已到期或已取消时无操作）"""
+        self._wheel._cancel(self)
+
+    def __repr__(self):
+        return f"<TimerHandle {self.subsystem} when={self.when:.3f} cancelled={self.cancelled}>"
+
+
+class TimerWheel:
+    """进程级分层时间轮"""
+
+    def __init__(self, tick_interval: float = 0.1):
+        """
+        Args:
+            tick_interval: 刻度（秒），即定时器的精度
+        """
+        self.tick_interval = max(0.001, float(tick_interval))
+        self._levels: List[List[set]] = [[set() for _ in range(WHEEL_SIZE)] for _ in range(WHEEL_LEVELS)]
+        self._origin = time.monotonic()
+        self._current = 0  # 已处理到的刻度
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        # {subsystem: 未到期数量}
+        self._outstanding: Dict[str, int] = defaultdict(int)
+        self.stats = {'scheduled': 0, 'cancelled': 0, 'fired': 0, 'failed': 0}
+
+    # ---------------- 注册与取消 ----------------
+
+    def call_later(self, delay: float, callback: Callable, *args, subsystem: str = 'default') -> TimerHandle:
+        """delay 秒后执行 callback(*args)"""
+        return self.call_at(time.monotonic() + max(0.0, delay), callback, *args, subsystem=subsystem)
+
+    def call_at(self, when: float, callback: Callable, *args, subsystem: str = 'default') -> TimerHandle:
+        """在 time.monotonic() 时间点 when 执行 callback(*args)"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        # 向上取整到刻度，保证不早于 when 触发
+        expires = int(-(-(when - self._origin) // self.tick_interval))
+        handle = TimerHandle(self, when, expires, callback, args, subsystem, loop)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('时间轮已关闭')
+            self._insert(handle)
+            self._outstanding[subsystem] += 1
+            self.stats['scheduled'] += 1
+            self._ensure_thread()
+            self._wakeup.notify()
+        return handle
+
+    def expire_key(self, mapping: MutableMapping, key: Any, delay: float, subsystem: str = 'default') -> TimerHandle:
+        """delay 秒后从 mapping 中删除 key
+
+        仅当届时 mapping[key] 仍是注册时的值（同一对象）才删除，期间被重新赋值的条目
+        由新值对应的定时器负责，因此调用方无需保存和取消旧的句柄。
+        """
+        return self.call_later(delay, _expire_mapping_key, mapping, key, mapping.get(key), subsystem=subsystem)
+
+    def _cancel(self, handle: TimerHandle):
+        with self._lock:
+            # 已出槽但尚未执行的回调也会在执行前检查该标记
+            handle.cancelled = True
+            if handle._slot is None:
+                return
+            handle._slot.discard(handle)
+            handle._slot = None
+            self._outstanding[handle.subsystem] -= 1
+            self.stats['cancelled'] += 1
+
+    def _insert(self, handle: TimerHandle):
+        """按距到期的刻度数放入对应层级的槽位（调用方持有锁）"""
+        expires = handle.expires
+        delta = expires - self._current
+        if delta <= 0:
+            # 已到期：放入下一个处理的槽位
+            slot = self._levels[0][(self._current + 1) & WHEEL_MASK]
+        else:
+            for level in range(WHEEL_LEVELS):
+                if delta < 1 << (WHEEL_BITS * (level + 1)):
+                    slot = self._levels[level][(expires >> (WHEEL_BITS * level)) & WHEEL_MASK]
+                    break
+            else:
+                # 超出最高层范围：放在最高层最远的槽位，降级时重新计算
+                top = WHEEL_LEVELS - 1
+                far = self._current + (WHEEL_MASK << (WHEEL_BITS * top))
+                slot = self._levels[top][(far >> (WHEEL_BITS * top)) & WHEEL_MASK]
+        slot.add(handle)
+        handle._slot = slot
+
+    # ---------------- 驱动 ----------------
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='timer-wheel', daemon=True)
+            self._thread.start()
+
+    def _has_timers(self) -> bool:
+        return any(count > 0 for count in self._outstanding.values())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._closed and not self._has_timers():
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                target = int((time.monotonic() - self._origin) // self.tick_interval)
+                if target <= self._current:
+                    # 等到下一个刻度（新注册的定时器会提前唤醒，但不会早于其刻度触发）
+                    next_tick_at = self._origin + (self._current + 1) * self.tick_interval
+                    self._wakeup.wait(max(0.0, next_tick_at - time.monotonic()))
+                    continue
+                due = []
+                while self._current < target:
+                    self._current += 1
+                    self._cascade()
+                    slot = self._levels[0][self._current & WHEEL_MASK]
+                    if slot:
+                        for handle in slot:
+                            handle._slot = None
+                            self._outstanding[handle.subsystem] -= 1
+                        due.extend(slot)
+                        slot.clear()
+            if due:
+                self._dispatch(due)
+
+    def _cascade(self):
+        """当前刻度跨越高层槽位边界时，把该槽位的定时器重新分配到低层（调用方持有锁）"""
+        for level in range(1, WHEEL_LEVELS):
+            if self._current & ((1 << (WHEEL_BITS * level)) - 1):
+                break
+            slot = self._levels[level][(self._current >> (WHEEL_BITS * level)) & WHEEL_MASK]
+            if not slot:
+                continue
+            handles = list(slot)
+            slot.clear()
+            for handle in handles:
+                # 到期刻度等于当前刻度的定时器直接放入当前槽位，随后本刻度处理
+                if handle.expires <= self._current:
+                    current_slot = self._levels[0][self._current & WHEEL_MASK]
+                    current_slot.add(handle)
+                    handle._slot = current_slot
+                else:
+                    self._insert(handle)
+
+    def _dispatch(self, due: List[TimerHandle]):
+        """按事件循环分组投递到期回调"""
+        due.sort(key=lambda handle: handle.when)
+        by_loop: Dict[Optional[asyncio.AbstractEventLoop], List[TimerHandle]] = defaultdict(list)
+        for handle in due:
+            by_loop[handle.loop].append(handle)
+
+        for loop, handles in by_loop.items():
+            if loop is None:
+                self._fire(handles)
+                continue
+            try:
+                loop.call_soon_threadsafe(self._fire, handles)
+            except RuntimeError:
+                # 事件循环已关闭，其定时器无需再执行
+                logger.debug(f"时间轮丢弃 {len(handles)} 个已关闭事件循环的定时器")
+
+    def _fire(self, handles: List[TimerHandle]):
+        for handle in handles:
+            if handle.cancelled:
+                continue
+            try:
+                handle.callback(*handle.args)
+                self.stats['fired'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"时间轮定时器回调异常（{handle.subsystem}）: {e}")
+
+    # ---------------- 状态 ----------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """按子系统统计未到期的定时器数量"""
+        with self._lock:
+            outstanding = {subsystem: count for subsystem, count in self._outstanding.items() if count > 0}
+        return {
+            'outstanding': outstanding,
+            'total_outstanding': sum(outstanding.values()),
+            'tick_interval': self.tick_interval,
+            **self.stats
+        }
+
+    def close(self):
+        """停止驱动线程并丢弃所有未到期的定时器"""
+        with self._lock:
+            self._closed = True
+            for level in self._levels:
+                for slot in level:
+                    for handle in slot:
+                        handle._slot = None
+                        handle.cancelled = True
+                    slot.clear()
+            self._outstanding.clear()
+            self._wakeup.notify_all()
+
+
+def _expire_mapping_key(mapping: MutableMapping, key: Any, expected: Any):
+    if key in mapping and mapping[key] is expected:
+        del mapping[key]
+
+
+def _create_timer_wheel() -> TimerWheel:
+    try:
+        from config import config
+        wheel_config = config.get('TIMER_WHEEL', {}) or {}
+    except Exception:
+        wheel_config = {}
+    return TimerWheel(tick_interval=wheel_config.get('tick_interval', 0.1))
+
+
+# 全局时间轮实例
+timer_wheel = _create_timer_wheel()
@@ -0,0 +1,254 @@
+"""
+账号分批预热启动
+替代启动时「逐个查询账号信息、同时创建所有账号任务」的做法，避免所有账号同时建立连接、同时刷新Token。
+
+- 启动前一次查询预加载所有账号的 user_id 与待处理订单数
+- 按优先级排队启动：有待处理订单（待发货/处理中）的账号优先，其余按账号ID排序
+- 同时处于启动阶段的账号数有上限：账号连接就绪、失败或超过就绪等待时间后才放行下一个账号
+- 记录每个账号各启动阶段的耗时，供就绪检查接口查询（接口在 API 线程读取，阶段记录由锁保护）
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+from loguru import logger
+
+
+# 启动阶段（按顺序）
+PHASES = ('queued', 'starting', 'token', 'connected')
+# 视为已就绪的阶段：本进程中运行的账号以连接就绪为准，工作进程中运行的账号以工作进程启动完成为准
+READY_PHASES = ('connected', 'worker_started')
+
+
+class WarmStart:
+    """账号分批启动编排与启动阶段记录"""
+
+    def __init__(self, max_concurrent: int = 5, ready_timeout: float = 60.0, stagger: float = 0.2,
+                 pending_order_hours: float = 72):
+        """
+        Args:
+            max_concurrent: 同时处于启动阶段的账号数上限，<= 0 表示不限制
+            ready_timeout: 单个账号等待连接就绪的最长时间（秒），超时后放行下一个账号
+            stagger: 相邻两个账号启动之间的间隔（秒）
+            pending_order_hours: 统计待处理订单的时间范围（小时）
+        """
+        self.max_concurrent = int(max_concurrent)
+        self.ready_timeout = ready_timeout
+        self.stagger = stagger
+        self.pending_order_hours = pending_order_hours
+        self._accounts: Dict[str, Dict[str, Any]] = {}
+        self._ready_events: Dict[str, asyncio.Event] = {}
+        # 保护 _accounts 与启动时间字段：事件循环写入，API 线程通过 get_status 读取
+        self._lock = threading.Lock()
+        # 持有后台任务的强引用（事件循环只保留弱引用），停止时统一取消
+        self._tasks: Set[asyncio.Task] = set()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.launching = False
+
+    # ---------------- 阶段记录 ----------------
+
+    def mark(self, cookie_id: str, phase: str, error: str = None):
+        """记录账号到达某个启动阶段（只记录首次到达，未参与分批启动的账号忽略）"""
+        with self._lock:
+            account = self._accounts.get(cookie_id)
+            if account is None or phase in account['timings']:
+                return
+            account['timings'][phase] = time.time()
+            if error:
+                account['error'] = error
+            settled = phase in READY_PHASES or phase == 'failed'
+            if settled or account['phase'] not in READY_PHASES:
+                account['phase'] = phase
+        if settled:
+            event = self._ready_events.get(cookie_id)
+            if event is not None:
+                event.set()
+
+    # ---------------- 后台任务 ----------------
+
+    def _track(self, coro, name: str) -> asyncio.Task:
+        """创建并持有后台任务，任务异常退出时记录日志"""
+        task = asyncio.get_running_loop().create_task(coro, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+        return task
+
+    def _on_task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.opt(exception=task.exception()).error(f"账号分批启动任务异常退出: {task.get_name()}")
+
+    def start(self, manager) -> asyncio.Task:
+        """在当前事件循环中后台执行分批启动"""
+        return self._track(self.run(manager), 'warm_start.run')
+
+    def cancel(self):
+        """取消分批启动及名额等待任务（程序退出时调用）"""
+        for task in list(self._tasks):
+            task.cancel()
+
+    # ---------------- 分批启动 ----------------
+
+    async def run(self, manager):
+        """按优先级分批启动 CookieManager 中所有启用的账号"""
+        from db_manager import async_db
+
+        with self._lock:
+            self.started_at = time.time()
+            self.launching = True
+        try:
+            accounts = {cid: value for cid, value in manager.cookies.items() if manager.get_cookie_status(cid)}
+            skipped = len(manager.cookies) - len(accounts)
+            if skipped:
+                logger.info(f"跳过 {skipped} 个禁用的账号")
+            try:
+                profiles = await async_db.get_startup_profiles(
+                    pending_statuses=('processing', 'pending_ship'),
+                    since_hours=self.pending_order_hours
+                )
+            except Exception as e:
+                logger.error(f"预加载账号启动信息失败: {e}")
+                profiles = {}
+
+            order = sorted(accounts, key=lambda cid: (-profiles.get(cid, {}).get('pending_orders', 0), cid))
+            with self._lock:
+                for priority, cookie_id in enumerate(order):
+                    profile = profiles.get(cookie_id, {})
+                    self._accounts[cookie_id] = {
+                        'priority': priority,
+                        'pending_orders': profile.get('pending_orders', 0),
+                        'phase': 'queued',
+                        'timings': {'queued': self.started_at},
+                        'error': None,
+                    }
+            logger.info(f"开始分批启动 {len(order)} 个账号（同时启动上限 {self.max_concurrent}，"
+                        f"其中 {sum(1 for cid in order if profiles.get(cid, {}).get('pending_orders', 0))} 个有待处理订单优先启动）")
+
+            limiter = asyncio.Semaphore(self.max_concurrent) if self.max_concurrent > 0 else None
+            for cookie_id in order:
+                if limiter is not None:
+                    await limiter.acquire()
+                if not self._launch(manager, cookie_id, accounts[cookie_id], profiles.get(cookie_id, {}), limiter):
+                    if limiter is not None:
+                        limiter.release()
+                    continue
+                if self.stagger > 0:
+                    await asyncio.sleep(self.stagger)
+        finally:
+            with self._lock:
+                self.launching = False
+                self.finished_at = time.time()
+            logger.info(f"账号分批启动完成，耗时 {self.finished_at - self.started_at:.1f} 秒")
+
+    def _launch(self, manager, cookie_id: str, cookie_value: str, profile: Dict[str, Any],
+                limiter: Optional[asyncio.Semaphore]) -> bool:
+        """启动单个账号，返回是否启动（账号已被删除或已由其他途径启动时跳过）"""
+        if manager.cookies.get(cookie_id) is None or cookie_id in manager.tasks:
+            with self._lock:
+                self._accounts.pop(cookie_id, None)
+            return False
+        try:
+            task = manager.loop.create_task(manager._run_account(cookie_id, cookie_value, profile.get('user_id')))
+        except Exception as e:
+            logger.error(f"启动 Cookie 任务失败: {cookie_id}, {e}")
+            self.mark(cookie_id, 'failed', str(e))
+            return False
+        manager.tasks[cookie_id] = task
+        self._ready_events[cookie_id] = asyncio.Event()
+        self.mark(cookie_id, 'starting')
+        logger.info(f"启动账号任务: {cookie_id} (用户ID: {profile.get('user_id')}，"
+                    f"待处理订单: {profile.get('pending_orders', 0)})")
+        self._track(self._hold_slot(cookie_id, task, limiter), f'warm_start.hold_slot:{cookie_id}')
+        return True
+
+    async def _hold_slot(self, cookie_id: str, task: asyncio.Task, limiter: Optional[asyncio.Semaphore]):
+        """等待账号就绪（或失败、超时）后释放启动名额"""
+        event = self._ready_events[cookie_id]
+        waiter = asyncio.ensure_future(event.wait())
+        try:
+            done, _ = await asyncio.wait({waiter, task}, timeout=self.ready_timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                with self._lock:
+                    account = self._accounts.get(cookie_id)
+                    if account is not None:
+                        account['timed_out'] = True
+                logger.warning(f"【{cookie_id}】{self.ready_timeout} 秒内未就绪，继续启动后续账号")
+            elif task in done and not event.is_set():
+                error = None if task.cancelled() else task.exception()
+                self.mark(cookie_id, 'failed', str(error) if error else '账号任务已结束')
+        finally:
+            waiter.cancel()
+            self._ready_events.pop(cookie_id, None)
+            if limiter is not None:
+                limiter.release()
+
+    # ---------------- 状态 ----------------
+
+    def get_status(self) -> Dict[str, Any]:
+        """启动进度与各账号启动阶段耗时（毫秒，相对排队时间），可在任意线程调用"""
+        # 在锁内复制一份快照，之后的统计不受事件循环并发写入影响
+        with self._lock:
+            snapshot = {
+                cookie_id: dict(account, timings=dict(account['timings']))
+                for cookie_id, account in self._accounts.items()
+            }
+            started_at = self.started_at
+            finished_at = self.finished_at
+            launching = self.launching
+
+        accounts = {}
+        counts: Dict[str, int] = {}
+        for cookie_id, account in snapshot.items():
+            timings = account['timings']
+            queued = timings['queued']
+            accounts[cookie_id] = {
+                'phase': account['phase'],
+                'priority': account['priority'],
+                'pending_orders': account['pending_orders'],
+                'timings_ms': {phase: round((at - queued) * 1000) for phase, at in timings.items() if phase != 'queued'},
+                'timed_out': account.get('timed_out', False),
+                'error': account['error'],
+            }
+            counts[account['phase']] = counts.get(account['phase'], 0) + 1
+
+        ready = sum(counts.get(phase, 0) for phase in READY_PHASES)
+        settled = ready + counts.get('failed', 0) + sum(
+            1 for account in snapshot.values()
+            if account.get('timed_out') and account['phase'] not in READY_PHASES and account['phase'] != 'failed'
+        )
+        ready_times = sorted(
+            min(account['timings'][phase] for phase in READY_PHASES if phase in account['timings']) - started_at
+            for account in snapshot.values() if account['phase'] in READY_PHASES
+        )
+        return {
+            'ready': started_at is not None and not launching and settled == len(snapshot),
+            'total': len(snapshot),
+            'ready_accounts': ready,
+            'phases': counts,
+            'launching': launching,
+            'launch_seconds': round((finished_at or time.time()) - started_at, 1) if started_at else 0,
+            'first_ready_seconds': round(ready_times[0], 2) if ready_times else None,
+            'all_ready_seconds': round(ready_times[-1], 2) if ready_times and ready == len(snapshot) else None,
+            'accounts': accounts,
+        }
+
+
+def _create_warm_start() -> WarmStart:
+    try:
+        from config import config
+        warm_config = config.get('WARM_START', {}) or {}
+    except Exception:
+        warm_config = {}
+    return WarmStart(
+        max_concurrent=warm_config.get('max_concurrent', 5),
+        ready_timeout=warm_config.get('ready_timeout', 60),
+        stagger=warm_config.get('stagger', 0.2),
+        pending_order_hours=warm_config.get('pending_order_hours', 72)
+    )
+
+
+# 全局启动编排器（Start.main 启动账号，XianyuLive 记录启动阶段，/health/ready 查询）
+warm_start = _create_warm_start()
@@ -1,18 +1,12 @@
 import base64
 import json
-import subprocess
-from functools import partial
 import time
 import hashlib
 import struct
 import os
 from typing import Any, Dict, List
 
-import blackboxprotobuf
-from loguru import logger
-
-subprocess.Popen = partial(subprocess.Popen, encoding="utf-8")
-import execjs
+from utils.js_runtime import create_node_runtime
 
 def get_js_path():
     """获取JavaScript文件的路径"""
@@ -21,39 +15,8 @@ def get_js_path():
     js_path = os.path.join(root_dir, 'static', 'xianyu_js_version_2.js')
     return js_path
 
-try:
-    # 检查JavaScript运行时是否可用
-    available_runtimes = execjs.runtime_names
-    logger.info(f"可用的JavaScript运行时: {available_runtimes}")
-
-    # 尝试获取默认运行时
-    current_runtime = execjs.get()
-    logger.info(f"当前JavaScript运行时: {current_runtime.name}")
-
-    xianyu_js = execjs.compile(open(get_js_path(), 'r', encoding='utf-8').read())
-    logger.info("JavaScript文件加载成功")
-except Exception as e:
-    error_msg = str(e)
-    logger.error(f"JavaScript运行时错误: {error_msg}")
-
-    if "Could not find an available JavaScript runtime" in error_msg:
-        logger.error("解决方案:")
-        logger.error("1. 确保已安装Node.js: apt-get install nodejs")
-        logger.error("2. 或安装其他JS运行时: apt-get install nodejs npm")
-        logger.error("3. 检查PATH环境变量是否包含Node.js路径")
-
-        # 尝试检测系统中的JavaScript运行时
-        import subprocess
-        try:
-            result = subprocess.run(['node', '--version'], capture_output=True, text=True)
-            if result.returncode == 0:
-                logger.info(f"检测到Node.js版本: {result.stdout.strip()}")
-            else:
-                logger.error("Node.js未正确安装或不在PATH中")
-        except FileNotFoundError:
-            logger.error("未找到Node.js可执行文件")
-
-    raise RuntimeError(f"无法加载JavaScript文件: {error_msg}")
+# 闲鱼JS脚本运行时：首次调用 xianyu_js.call(...) 时才启动常驻 Node 进程，导入本模块不启动任何进程
+xianyu_js = create_node_runtime(get_js_path())
 
 def trans_cookies(cookies_str: str) -> dict:
     """将cookies字符串转换为字典"""
@@ -325,6 +288,208 @@ class MessagePackDecoder:
         return self.decode_value()
 
 
+_STRUCT_UINT8 = struct.Struct('>B').unpack_from
+_STRUCT_UINT16 = struct.Struct('>H').unpack_from
+_STRUCT_UINT32 = struct.Struct('>I').unpack_from
+_STRUCT_UINT64 = struct.Struct('>Q').unpack_from
+_STRUCT_INT8 = struct.Struct('>b').unpack_from
+_STRUCT_INT16 = struct.Struct('>h').unpack_from
+_STRUCT_INT32 = struct.Struct('>i').unpack_from
+_STRUCT_INT64 = struct.Struct('>q').unpack_from
+_STRUCT_FLOAT32 = struct.Struct('>f').unpack_from
+_STRUCT_FLOAT64 = struct.Struct('>d').unpack_from
+
+# 定长头部格式: 首字节 -> (unpack_from, 字节数, 类型)
+# 类型: 0=数值 1=str长度 2=bin长度 3=array长度 4=map长度
+_FIXED_FORMATS = {
+    0xcc: (_STRUCT_UINT8, 1, 0),
+    0xcd: (_STRUCT_UINT16, 2, 0),
+    0xce: (_STRUCT_UINT32, 4, 0),
+    0xcf: (_STRUCT_UINT64, 8, 0),
+    0xd0: (_STRUCT_INT8, 1, 0),
+    0xd1: (_STRUCT_INT16, 2, 0),
+    0xd2: (_STRUCT_INT32, 4, 0),
+    0xd3: (_STRUCT_INT64, 8, 0),
+    0xca: (_STRUCT_FLOAT32, 4, 0),
+    0xcb: (_STRUCT_FLOAT64, 8, 0),
+    0xd9: (_STRUCT_UINT8, 1, 1),
+    0xda: (_STRUCT_UINT16, 2, 1),
+    0xdb: (_STRUCT_UINT32, 4, 1),
+    0xc4: (_STRUCT_UINT8, 1, 2),
+    0xc5: (_STRUCT_UINT16, 2, 2),
+    0xc6: (_STRUCT_UINT32, 4, 2),
+    0xdc: (_STRUCT_UINT16, 2, 3),
+    0xdd: (_STRUCT_UINT32, 4, 3),
+    0xde: (_STRUCT_UINT16, 2, 4),
+    0xdf: (_STRUCT_UINT32, 4, 4),
+}
+
+# 正 fixint 字典键（闲鱼消息的字段编号）对应的字符串键
+_FIXINT_KEYS = tuple(str(i) for i in range(0x80))
+
+
+def _json_key(key: Any) -> str:
+    """将MessagePack字典键转换为与 json.dumps 一致的字符串键"""
+    if isinstance(key, str):
+        return key
+    if key is True:
+        return 'true'
+    if key is False:
+        return 'false'
+    if key is None:
+        return 'null'
+    if isinstance(key, float):
+        return json.dumps(key)
+    return str(key)
+
+
+class FastMessagePackDecoder:
+    """基于 memoryview 的 MessagePack 解码器
+
+    - 字符串直接从 memoryview 切片解码，不复制中间 bytes
+    - 数值使用模块级预编译的 struct.Struct(...).unpack_from 按偏移读取
+    - 单次遍历即输出与 json.loads(decrypt(...)) 等价的对象：字典键转为字符串，bin 数据按 UTF-8 解码为字符串
+    """
+
+    __slots__ = ('view', 'length')
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.length = len(self.view)
+
+    def decode(self) -> Any:
+        """解码整个MessagePack数据"""
+        view = self.view
+        length = self.length
+        pos = 0
+
+        def read_str(size: int, errors: str = 'strict') -> str:
+            nonlocal pos
+            start = pos
+            pos += size
+            if pos > length:
+                raise ValueError("Unexpected end of data")
+            return str(view[start:pos], 'utf-8', errors)
+
+        def read_map(size: int) -> Dict[str, Any]:
+            nonlocal pos
+            result = {}
+            for _ in range(size):
+                if pos >= length:
+                    raise ValueError("Unexpected end of data")
+                # 键绝大多数是 fixint 字段编号或 fixstr，直接内联处理
+                b = view[pos]
+                if b <= 0x7f:
+                    pos += 1
+                    key = _FIXINT_KEYS[b]
+                elif 0xa0 <= b <= 0xbf:
+                    start = pos + 1
+                    pos = start + (b & 0x1f)
+                    if pos > length:
+                        raise ValueError("Unexpected end of data")
+                    key = str(view[start:pos], 'utf-8')
+                else:
+                    key = read_value()
+                    if key.__class__ is not str:
+                        key = _json_key(key)
+                # 值为 fixstr / fixint 时同样内联，省去递归调用
+                if pos < length:
+                    b = view[pos]
+                    if 0xa0 <= b <= 0xbf:
+                        start = pos + 1
+                        pos = start + (b & 0x1f)
+                        if pos > length:
+                            raise ValueError("Unexpected end of data")
+                        result[key] = str(view[start:pos], 'utf-8')
+                        continue
+                    if b <= 0x7f:
+                        pos += 1
+                        result[key] = b
+                        continue
+                result[key] = read_value()
+            return result
+
+        def read_value() -> Any:
+            nonlocal pos
+            if pos >= length:
+                raise ValueError("Unexpected end of data")
+            b = view[pos]
+            pos += 1
+
+            # 按出现频率排列：fixstr、fixint、fixmap、fixarray；fixstr 内联解码，省去一次函数调用
+            if 0xa0 <= b <= 0xbf:
+                start = pos
+                pos += b & 0x1f
+                if pos > length:
+                    raise ValueError("Unexpected end of data")
+                return str(view[start:pos], 'utf-8')
+            if b <= 0x7f:
+                return b
+            if b <= 0x8f:
+                return read_map(b & 0x0f)
+            if b <= 0x9f:
+                return [read_value() for _ in range(b & 0x0f)]
+            if b >= 0xe0:
+                return b - 0x100
+
+            fixed = _FIXED_FORMATS.get(b)
+            if fixed is None:
+                if b == 0xc0:
+                    return None
+                if b == 0xc2:
+                    return False
+                if b == 0xc3:
+                    return True
+                raise ValueError(f"Unknown format byte: {b:02x}")
+
+            unpack, size, kind = fixed
+            if pos + size > length:
+                raise ValueError("Unexpected end of data")
+            value = unpack(view, pos)[0]
+            pos += size
+            if kind == 0:
+                return value
+            if kind == 1:
+                return read_str(value)
+            if kind == 2:
+                return read_str(value, 'ignore')
+            if kind == 3:
+                return [read_value() for _ in range(value)]
+            return read_map(value)
+
+        return read_value()
+
+
+def _b64decode_payload(data: str) -> bytes:
+    """Base64解码消息数据，兼容非ASCII字符和缺失填充的情况"""
+    if not isinstance(data, str):
+        data = str(data)
+
+    try:
+        data.encode('ascii')
+    except UnicodeEncodeError:
+        data = data.encode('utf-8', errors='ignore').decode('ascii', errors='ignore')
+
+    try:
+        return base64.b64decode(data)
+    except Exception:
+        missing_padding = len(data) % 4
+        if missing_padding:
+            data += '=' * (4 - missing_padding)
+        return base64.b64decode(data)
+
+
+def decrypt_to_dict(data: str) -> Any:
+    """解密消息数据并直接返回Python对象（跳过 JSON 序列化/反序列化往返）
+
+    返回结果与 json.loads(decrypt(data)) 一致（字典键均为字符串）。
+    """
+    try:
+        return FastMessagePackDecoder(_b64decode_payload(data)).decode()
+    except Exception as e:
+        raise Exception(f"解密失败: {str(e)}")
+
+
 def decrypt(data: str) -> str:
     """解密消息数据"""
     import json as json_module  # 使用别名避免作用域冲突
@@ -376,4 +541,26 @@ if __name__ == '__main__':
     msg = "ggGLAYEBsjMxNDk2MzcwNjNAZ29vZmlzaAKzNDc5ODMzODkwOTZAZ29vZmlzaAOxMzQxNjU2NTI3NDU0Mi5QTk0EAAXPAAABlbKji20GggFlA4UBoAK6W+aIkeW3suaLjeS4i++8jOW+heS7mOasvl0DoAQaBdoEKnsiY29udGVudFR5cGUiOjI2LCJkeENhcmQiOnsiaXRlbSI6eyJtYWluIjp7ImNsaWNrUGFyYW0iOnsiYXJnMSI6Ik1zZ0NhcmQiLCJhcmdzIjp7InNvdXJjZSI6ImltIiwidGFza19pZCI6IjNleFFKSE9UbVBVMSIsIm1zZ19pZCI6ImNjOGJjMmRmN2M5MzRkZjA4NmUwNTY3Y2I2OWYxNTczIn19LCJleENvbnRlbnQiOnsiYmdDb2xvciI6IiNGRkZGRkYiLCJidXR0b24iOnsiYmdDb2xvciI6IiNGRkU2MEYiLCJib3JkZXJDb2xvciI6IiNGRkU2MEYiLCJjbGlja1BhcmFtIjp7ImFyZzEiOiJNc2dDYXJkQWN0aW9uIiwiYXJncyI6eyJzb3VyY2UiOiJpbSIsInRhc2tfaWQiOiIzZXhRSkhPVG1QVTEiLCJtc2dfaWQiOiJjYzhiYzJkZjdjOTM0ZGYwODZlMDU2N2NiNjlmMTU3MyJ9fSwiZm9udENvbG9yIjoiIzMzMzMzMyIsInRhcmdldFVybCI6ImZsZWFtYXJrZXQ6Ly9hZGp1c3RfcHJpY2U/Zmx1dHRlcj10cnVlJmJpek9yZGVySWQ9MjUwMzY4ODEyNjM1NjYzNjM3MCIsInRleHQiOiLkv67mlLnku7fmoLwifSwiZGVzYyI6Iuivt+WPjOaWueayn+mAmuWPiuaXtuehruiupOS7t+agvCIsImRlc2NDb2xvciI6IiNBM0EzQTMiLCJ0aXRsZSI6IuaIkeW3suaLjeS4i++8jOW+heS7mOasviIsInVwZ3JhZGUiOnsidGFyZ2V0VXJsIjoiaHR0cHM6Ly9oNS5tLmdvb2Zpc2guY29tL2FwcC9pZGxlRmlzaC1GMmUvZm0tZG93bmxhb2QvaG9tZS5odG1sP25vUmVkcmllY3Q9dHJ1ZSZjYW5CYWNrPXRydWUmY2hlY2tWZXJzaW9uPXRydWUiLCJ2ZXJzaW9uIjoiNy43LjkwIn19LCJ0YXJnZXRVcmwiOiJmbGVhbWFya2V0Oi8vb3JkZXJfZGV0YWlsP2lkPTI1MDM2ODgxMjYzNTY2MzYzNzAmcm9sZT1zZWxsZXIifX0sInRlbXBsYXRlIjp7Im5hbWUiOiJpZGxlZmlzaF9tZXNzYWdlX3RyYWRlX2NoYXRfY2FyZCIsInVybCI6Imh0dHBzOi8vZGluYW1pY3guYWxpYmFiYXVzZXJjb250ZW50LmNvbS9wdWIvaWRsZWZpc2hfbWVzc2FnZV90cmFkZV9jaGF0X2NhcmQvMTY2NzIyMjA1Mjc2Ny9pZGxlZmlzaF9tZXNzYWdlX3RyYWRlX2NoYXRfY2FyZC56aXAiLCJ2ZXJzaW9uIjoiMTY2NzIyMjA1Mjc2NyJ9fX0HAQgBCQAK3gAQpmJpelRhZ9oAe3sic291cmNlSWQiOiJDMkM6M2V4UUpIT1RtUFUxIiwidGFza05hbWUiOiLlt7Lmi43kuItf5pyq5LuY5qy+X+WNluWutiIsIm1hdGVyaWFsSWQiOiIzZXhRSkhPVG1QVTEiLCJ0YXNrSWQiOiIzZXhRSkhPVG1QVTEifbFjbG9zZVB1c2hSZWNlaXZlcqVmYWxzZbFjbG9zZVVucmVhZE51bWJlcqVmYWxzZaxkZXRhaWxOb3RpY2W6W+aIkeW3suaLjeS4i++8jOW+heS7mOasvl2nZXh0SnNvbtoBr3sibXNnQXJncyI6eyJ0YXNrX2lkIjoiM2V4UUpIT1RtUFUxIiwic291cmNlIjoiaW0iLCJtc2dfaWQiOiJjYzhiYzJkZjdjOTM0ZGYwODZlMDU2N2NiNjlmMTU3MyJ9LCJxdWlja1JlcGx5IjoiMSIsIm1zZ0FyZzEiOiJNc2dDYXJkIiwidXBkYXRlS2V5IjoiNDc5ODMzODkwOTY6MjUwMzY4ODEyNjM1NjYzNjM3MDoxX25vdF9wYXlfc2VsbGVyIiwibWVzc2FnZUlkIjoiY2M4YmMyZGY3YzkzNGRmMDg2ZTA1NjdjYjY5ZjE1NzMiLCJtdWx0aUNoYW5uZWwiOnsiaHVhd2VpIjoiRVhQUkVTUyIsInhpYW9taSI6IjEwODAwMCIsIm9wcG8iOiJFWFBSRVNTIiwiaG9ub3IiOiJOT1JNQUwiLCJhZ29vIjoicHJvZHVjdCIsInZpdm8iOiJPUkRFUiJ9LCJjb250ZW50VHlwZSI6IjI2IiwiY29ycmVsYXRpb25Hcm91cElkIjoiM2V4UUpIT1RtUFUxX0ZGcjRHT1NuOE9RbyJ9qHJlY2VpdmVyrTIyMDI2NDA5MTgwNzmrcmVkUmVtaW5kZXKy562J5b6F5Lmw5a625LuY5qy+sHJlZFJlbWluZGVyU3R5bGWhMa9yZW1pbmRlckNvbnRlbnS6W+aIkeW3suaLjeS4i++8jOW+heS7mOasvl2ucmVtaW5kZXJOb3RpY2W75Lmw5a625bey5ouN5LiL77yM5b6F5LuY5qy+rXJlbWluZGVyVGl0bGW75Lmw5a625bey5ouN5LiL77yM5b6F5LuY5qy+q3JlbWluZGVyVXJs2gCaZmxlYW1hcmtldDovL21lc3NhZ2VfY2hhdD9pdGVtSWQ9OTAwMDUyNjQ0Mjc3JnBlZXJVc2VySWQ9MzE0OTYzNzA2MyZwZWVyVXNlck5pY2s955S3KioqeSZzaWQ9NDc5ODMzODkwOTYmbWVzc2FnZUlkPWNjOGJjMmRmN2M5MzRkZjA4NmUwNTY3Y2I2OWYxNTczJmFkdj1ub6xzZW5kZXJVc2VySWSqMzE0OTYzNzA2M65zZW5kZXJVc2VyVHlwZaEwq3Nlc3Npb25UeXBloTGqdXBkYXRlSGVhZKR0cnVlDAEDgahuZWVkUHVzaKR0cnVl"
 
     res = decrypt(msg)
-    print(res)
\ No newline at end of file
+    print(res)
+
+    # 微基准测试：旧版 decrypt + json.loads / MessagePackDecoder 对比 decrypt_to_dict / FastMessagePackDecoder
+    # 需在项目根目录以模块方式运行：python -m utils.xianyu_utils
+    import timeit
+    assert decrypt_to_dict(msg) == json.loads(res), "decrypt_to_dict 与 decrypt 结果不一致"
+    payload = base64.b64decode(msg)
+    rounds = 2000
+    benchmarks = [
+        ("decrypt + json.loads", lambda: json.loads(decrypt(msg))),
+        ("decrypt_to_dict", lambda: decrypt_to_dict(msg)),
+        ("MessagePackDecoder (payload)", lambda: MessagePackDecoder(payload).decode()),
+        ("FastMessagePackDecoder (payload)", lambda: FastMessagePackDecoder(payload).decode()),
+    ]
+    print(f"\n样例消息: {len(msg)} 字符 / MessagePack {len(payload)} 字节, 每项 {rounds} 次")
+    timings = {}
+    for name, func in benchmarks:
+        timings[name] = min(timeit.repeat(func, number=rounds, repeat=5)) / rounds
+        print(f"  {name:<34} {timings[name] * 1e6:8.1f} us/次")
+    print(f"\ndecrypt_to_dict 相比 decrypt + json.loads 提速 "
+          f"{timings['decrypt + json.loads'] / timings['decrypt_to_dict']:.2f}x")
+    print(f"FastMessagePackDecoder 相比 MessagePackDecoder 提速 "
+          f"{timings['MessagePackDecoder (payload)'] / timings['FastMessagePackDecoder (payload)']:.2f}x")
\ No newline at end of file